@@ -0,0 +1,323 @@
+"""
+Statistical process control charts for the BNT113 CVLP sites.
+
+Every site x metric series is a p-chart (a proportion of the month's referrals,
+e.g. randomised) or a u-chart (a count per site-month open, e.g. referrals).
+All series are held in (metric, site, month) arrays, so counting, control
+limits and the Western Electric rules are computed for every chart at once.
+
+Centre lines come from a fixed baseline: each site's first BASELINE_MONTHS
+months, or the network value for a site with no baseline data. Once the
+baseline months have passed, adding a month never moves the limits of the
+months before it. ``ControlCharts.update`` therefore only counts the new
+months' tracker rows and evaluates the rules over each series' trailing window;
+the months already held are only checked against per-site totals, and
+everything is recomputed if they no longer match the tracker.
+
+p-chart months are referral cohorts: a patient counts in the month they were
+referred, with their current status, so the latest cohorts are still maturing.
+"""
+
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import (
+    MAIN_TRIAL_REFERRAL_COLUMN, PROJECTION_MONTHS, resolve_cvlp_site_column, valid_site_values,
+)
+from recruitment_forecast import month_bounds, referral_dates
+
+# Months from the start of each series that set its centre line
+BASELINE_MONTHS = 6
+
+# Western Electric rules, as bit flags in ControlCharts.violations
+RULE_BEYOND_3_SIGMA = 1
+RULE_2_OF_3_BEYOND_2_SIGMA = 2
+RULE_4_OF_5_BEYOND_1_SIGMA = 4
+RULE_8_SAME_SIDE = 8
+
+RULE_DESCRIPTIONS = {
+    RULE_BEYOND_3_SIGMA: "1 point beyond 3σ",
+    RULE_2_OF_3_BEYOND_2_SIGMA: "2 of 3 beyond 2σ",
+    RULE_4_OF_5_BEYOND_1_SIGMA: "4 of 5 beyond 1σ",
+    RULE_8_SAME_SIDE: "8 on one side",
+}
+
+# Longest run a rule looks back over; new months only need this much history
+RULE_WINDOW = 8
+
+
+@dataclass(frozen=True)
+class ChartMetric:
+    name: str
+    # 'p' (proportion of the month's referrals) or 'u' (count per site-month open)
+    kind: str
+    # p-charts: flag column counted among the referrals; u-charts: event date column ('' for the referral date)
+    source: str
+
+
+CHART_METRICS = (
+    ChartMetric('Referrals', 'u', ''),
+    ChartMetric('Main Trial Referrals', 'u', MAIN_TRIAL_REFERRAL_COLUMN),
+    ChartMetric('Main Trial Referral Rate', 'p', 'is_referred_to_main_trial'),
+    ChartMetric('Randomisation Rate', 'p', 'is_randomised'),
+    ChartMetric('Screen Failure Rate', 'p', 'is_screen_failure'),
+)
+
+
+def closed_months(as_of):
+    """Projection months that have fully ended by ``as_of``"""
+    return [m for m in PROJECTION_MONTHS if month_bounds(m)[1] < pd.Timestamp(as_of).normalize()]
+
+
+def _month_index(dates, months):
+    """Index into ``months`` of each date's month, -1 outside them"""
+    periods = pd.PeriodIndex([month_bounds(m)[0].to_period('M') for m in months])
+    codes = periods.get_indexer(pd.DatetimeIndex(dates).to_period('M'))
+    return np.asarray(codes)
+
+
+def count_events(df, sites, months, site_opening_dates, metrics=CHART_METRICS):
+    """Numerators and denominators of every chart, shape (metrics, sites, months)"""
+    shape = (len(metrics), len(sites), len(months))
+    numerators, denominators = np.zeros(shape), np.zeros(shape)
+    if df.empty or not months:
+        return numerators, denominators
+    site_col, _ = resolve_cvlp_site_column(df)
+    site_index = pd.Index(sites).get_indexer(df[site_col].astype(str)) if site_col is not None else np.full(len(df), -1)
+
+    referred = referral_dates(df)
+    referral_month = _month_index(referred, months)
+    in_chart = (site_index >= 0) & (referral_month >= 0)
+
+    # Site-months open, for the u-charts; a site opens at its opening date or first referral
+    first_referral = referred.groupby(site_index).min()
+    month_starts = np.array([month_bounds(m)[0] for m in months], dtype='datetime64[ns]')
+    month_ends = np.array([month_bounds(m)[1] for m in months], dtype='datetime64[ns]')
+    opened = np.array([
+        min((d for d in (site_opening_dates.get(site), first_referral.get(i)) if pd.notna(d)),
+            default=pd.Timestamp.max.normalize())
+        for i, site in enumerate(sites)
+    ], dtype='datetime64[ns]')
+    days_open = (month_ends[None, :] - np.maximum(opened[:, None], month_starts[None, :])) / np.timedelta64(1, 'D') + 1
+    days_in_month = (month_ends - month_starts) / np.timedelta64(1, 'D') + 1
+    exposure = np.clip(days_open / days_in_month[None, :], 0, 1)
+
+    for k, metric in enumerate(metrics):
+        if metric.kind == 'p':
+            flags = df[metric.source].fillna(False).astype(bool).to_numpy() if metric.source in df.columns else np.zeros(len(df), bool)
+            np.add.at(denominators[k], (site_index[in_chart], referral_month[in_chart]), 1)
+            np.add.at(numerators[k], (site_index[in_chart], referral_month[in_chart]), flags[in_chart])
+        else:
+            if metric.source:
+                event_month = _month_index(pd.to_datetime(df[metric.source], errors='coerce'), months) \
+                    if metric.source in df.columns else np.full(len(df), -1)
+            else:
+                event_month = referral_month
+            counted = (site_index >= 0) & (event_month >= 0)
+            np.add.at(numerators[k], (site_index[counted], event_month[counted]), 1)
+            denominators[k] = exposure
+    return numerators, denominators
+
+
+def centre_lines(numerators, denominators, kinds):
+    """Each series' centre from its first BASELINE_MONTHS months with data, else the network's"""
+    has_data = denominators > 0
+    in_baseline = has_data & (np.cumsum(has_data, axis=-1) <= BASELINE_MONTHS)
+    base_num = np.where(in_baseline, numerators, 0).sum(axis=-1)
+    base_den = np.where(in_baseline, denominators, 0).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        network = base_num.sum(axis=1) / base_den.sum(axis=1)
+        centre = np.where(base_den > 0, base_num / base_den, network[:, None])
+    return centre
+
+
+def sigma(centre, denominators, kinds):
+    """Per-point standard error: binomial for p-charts, Poisson for u-charts"""
+    is_p = (np.asarray(kinds) == 'p')[:, None]
+    spread = np.where(is_p, centre * (1 - centre), centre)[..., None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt(spread / denominators)
+
+
+def z_scores(numerators, denominators, centre, kinds):
+    """Distance of every point from its centre line in standard errors (NaN where there is no data)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = numerators / denominators
+        difference = values - centre[..., None]
+        z = difference / sigma(centre, denominators, kinds)
+    # Zero spread (a 0% or 100% centre): on the line, or infinitely far off it
+    z = np.where(np.isnan(z) & (difference == 0), 0.0, z)
+    return np.where(denominators > 0, z, np.nan)
+
+
+def _window_count(condition, window):
+    """Number of True values among each point and the ``window - 1`` before it"""
+    if condition.shape[-1] == 0:
+        return np.zeros(condition.shape, int)
+    padded = np.concatenate([np.zeros(condition.shape[:-1] + (window - 1,), bool), condition], axis=-1)
+    return np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1).sum(axis=-1)
+
+
+def western_electric_violations(z):
+    """Bit flags of the Western Electric rules broken at each point, for any (..., months) array of z-scores"""
+    violations = np.zeros(z.shape, np.uint8)
+    with np.errstate(invalid='ignore'):
+        violations |= np.where(np.abs(z) > 3, RULE_BEYOND_3_SIGMA, 0).astype(np.uint8)
+        for side in (1, -1):
+            sided = side * z
+            # Each rule fires on a point that is itself on the offending side
+            violations |= np.where((sided > 2) & (_window_count(sided > 2, 3) >= 2), RULE_2_OF_3_BEYOND_2_SIGMA, 0).astype(np.uint8)
+            violations |= np.where((sided > 1) & (_window_count(sided > 1, 5) >= 4), RULE_4_OF_5_BEYOND_1_SIGMA, 0).astype(np.uint8)
+            violations |= np.where(_window_count(sided > 0, 8) >= 8, RULE_8_SAME_SIDE, 0).astype(np.uint8)
+    return violations
+
+
+@dataclass(frozen=True)
+class ControlCharts:
+    """Every site x metric control chart for a run of closed months"""
+    metrics: tuple
+    sites: tuple
+    months: tuple
+    numerators: np.ndarray
+    denominators: np.ndarray
+    centre: np.ndarray
+    violations: np.ndarray
+
+    @classmethod
+    def build(cls, df, site_opening_dates, as_of, metrics=CHART_METRICS):
+        """Count and evaluate every chart from the whole tracker"""
+        site_col, _ = resolve_cvlp_site_column(df)
+        sites = tuple(str(s) for s in valid_site_values(df, site_col)) if site_col is not None else ()
+        months = tuple(closed_months(as_of))
+        numerators, denominators = count_events(df, sites, months, site_opening_dates, metrics)
+        return cls._evaluate(metrics, sites, months, numerators, denominators)
+
+    @classmethod
+    def _evaluate(cls, metrics, sites, months, numerators, denominators):
+        # Series start at the network's first month with referrals
+        active = np.nonzero(denominators[[m.kind == 'p' for m in metrics]].sum(axis=(0, 1)) > 0)[0]
+        start = active[0] if len(active) else len(months)
+        months, numerators, denominators = months[start:], numerators[..., start:], denominators[..., start:]
+        kinds = [m.kind for m in metrics]
+        centre = centre_lines(numerators, denominators, kinds)
+        violations = western_electric_violations(z_scores(numerators, denominators, centre, kinds))
+        return cls(tuple(metrics), tuple(sites), tuple(months), numerators, denominators, centre, violations)
+
+    @property
+    def kinds(self):
+        return [m.kind for m in self.metrics]
+
+    def update(self, df, site_opening_dates, as_of):
+        """Charts as of ``as_of``, counting only the months not held yet.
+
+        The months held are trusted as long as the tracker's per-site totals
+        over them still match; otherwise (back-dated entries, corrections) or
+        while the baseline months are still filling, everything is rebuilt.
+        """
+        months = tuple(closed_months(as_of))
+        site_col, _ = resolve_cvlp_site_column(df)
+        sites = tuple(str(s) for s in valid_site_values(df, site_col)) if site_col is not None else ()
+        held = len(self.months)
+        if (held <= BASELINE_MONTHS or self.months[0] not in months
+                or months[months.index(self.months[0]):][:held] != self.months
+                or set(sites) != set(self.sites)
+                or not self._history_matches(df)):
+            return ControlCharts.build(df, site_opening_dates, as_of, self.metrics)
+
+        new_months = months[months.index(self.months[-1]) + 1:]
+        if not new_months:
+            return self
+
+        new_num, new_den = count_events(df, self.sites, new_months, site_opening_dates, self.metrics)
+        numerators = np.concatenate([self.numerators, new_num], axis=-1)
+        denominators = np.concatenate([self.denominators, new_den], axis=-1)
+
+        centre = centre_lines(numerators, denominators, self.kinds)
+        if not np.allclose(centre, self.centre, equal_nan=True):
+            # A series was still filling its baseline, so its earlier months move too
+            return ControlCharts._evaluate(self.metrics, self.sites, self.months + new_months, numerators, denominators)
+        # Only the new months' rules are evaluated, over each series' trailing window
+        tail = len(new_months) + RULE_WINDOW - 1
+        z = z_scores(numerators[..., -tail:], denominators[..., -tail:], centre, self.kinds)
+        new_violations = western_electric_violations(z)[..., -len(new_months):]
+        return replace(
+            self, months=self.months + new_months, numerators=numerators, denominators=denominators,
+            violations=np.concatenate([self.violations, new_violations], axis=-1),
+        )
+
+    def _history_matches(self, df):
+        """Whether the tracker still gives the held per-site totals of every chart's counts"""
+        site_col, _ = resolve_cvlp_site_column(df)
+        site_index = pd.Index(self.sites).get_indexer(df[site_col].astype(str))
+        referred = referral_dates(df)
+        first, last = month_bounds(self.months[0])[0], month_bounds(self.months[-1])[1]
+        if referred.min() < first:
+            return False
+        for k, metric in enumerate(self.metrics):
+            if metric.kind == 'p':
+                in_range = (referred >= first) & (referred <= last)
+                weights = df[metric.source].fillna(False).astype(bool) if metric.source in df.columns else in_range & False
+                totals = [(in_range, self.denominators[k]), (in_range & weights, self.numerators[k])]
+            else:
+                dates = pd.to_datetime(df[metric.source], errors='coerce') if metric.source else referred
+                totals = [((dates >= first) & (dates <= last), self.numerators[k])]
+            for mask, held in totals:
+                counted = mask.to_numpy() & (site_index >= 0)
+                if not np.array_equal(np.bincount(site_index[counted], minlength=len(self.sites)), held.sum(axis=-1)):
+                    return False
+        return True
+
+    # -- views ---------------------------------------------------------------
+
+    def limits(self):
+        """(lower, upper) 3σ control limits for every point; p-chart limits are clipped to 0..1"""
+        s = sigma(self.centre, self.denominators, self.kinds)
+        lower = np.maximum(self.centre[..., None] - 3 * s, 0)
+        upper = self.centre[..., None] + 3 * s
+        is_p = (np.asarray(self.kinds) == 'p')[:, None, None]
+        return lower, np.where(is_p, np.minimum(upper, 1), upper)
+
+    def chart(self, metric, site):
+        """One chart as a frame: Month, Value, Centre, LCL, UCL, n, Rules"""
+        k, s = [m.name for m in self.metrics].index(metric), self.sites.index(site)
+        lower, upper = self.limits()
+        scale = 100 if self.metrics[k].kind == 'p' else 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = self.numerators[k, s] / self.denominators[k, s]
+        frame = pd.DataFrame({
+            'Month': list(self.months),
+            'Value': np.where(self.denominators[k, s] > 0, values, np.nan) * scale,
+            'Centre': self.centre[k, s] * scale,
+            'LCL': np.where(self.denominators[k, s] > 0, lower[k, s], np.nan) * scale,
+            'UCL': np.where(self.denominators[k, s] > 0, upper[k, s], np.nan) * scale,
+            'n': self.denominators[k, s],
+            'Rules': [describe_rules(v) for v in self.violations[k, s]],
+        })
+        return frame
+
+    def summary(self, recent_months=3):
+        """Site x metric overview: latest value, centre and the rules broken in the last few months"""
+        recent = self.violations[..., -recent_months:]
+        rows = []
+        for k, metric in enumerate(self.metrics):
+            scale = 100 if metric.kind == 'p' else 1
+            for s, site in enumerate(self.sites):
+                with_data = np.nonzero(self.denominators[k, s] > 0)[0]
+                latest = self.numerators[k, s, with_data[-1]] / self.denominators[k, s, with_data[-1]] * scale if len(with_data) else np.nan
+                flags = int(np.bitwise_or.reduce(recent[k, s])) if recent.shape[-1] else 0
+                rows.append({
+                    'Site': site,
+                    'Metric': metric.name,
+                    'Chart': f"{metric.kind}-chart",
+                    'Latest': latest,
+                    'Centre': self.centre[k, s] * scale,
+                    f'Signals (last {recent_months} months)': int(np.count_nonzero(recent[k, s])),
+                    'Rules': describe_rules(flags),
+                })
+        return pd.DataFrame(rows)
+
+
+def describe_rules(flags):
+    return ", ".join(text for bit, text in RULE_DESCRIPTIONS.items() if flags & bit)
@@ -0,0 +1,267 @@
+"""
+CPGC turnaround metrics computed from the Master Tracker.
+
+The timing columns of the CPGC BNT Reporting table (dispatch to receipt,
+receipt to shipment, result delivery) are worked out from the tracker's
+milestone dates instead of being typed in. Each patient's CVLP site is mapped
+to its CPGC through the table's "Corresponding CVLP recruiting sites", and
+every interval is counted in working days: weekdays that are not England and
+Wales bank holidays. The holidays come from a rule-based calendar held here,
+so nothing is downloaded.
+
+All intervals of a tracker are counted in one ``np.busday_count`` call per
+metric. A metric whose milestone columns the tracker doesn't have keeps the
+hand-entered value from the reporting workbook's CPGC BNT Reporting sheet
+(``dashboard_content.CPGC_REPORTING`` by default), as do the deviation and
+accreditation columns, which have no tracker source.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from dashboard_content import CPGC_REPORTING
+from dashboard_metrics import is_yes, resolve_cvlp_site_column
+
+# Milestone dates of a tissue sample, first matching column wins
+MILESTONE_COLUMNS = {
+    'notified': ('Date CPGC notified', 'Date notification sent to CPGC', 'CPGC notification date'),
+    'dispatched': (
+        'Please input the date  tissue block sent to CPGC\n(dd/mm/yyyy)',
+        'Please input the date tissue block sent to CPGC\n(dd/mm/yyyy)',
+        'Date tissue block sent to CPGC',
+    ),
+    'received': ('Date tissue block received by CPGC', 'Date received at CPGC', 'CPGC receipt date'),
+    'shipped': ('Date samples shipped to LabCorp', 'Date sample shipped', 'Shipment date'),
+    'result': ('Date result received', 'Date PD-L1 result received', 'Result date'),
+}
+# Yes where the result was requested urgently
+URGENT_COLUMNS = ('Urgent result requested', 'Result urgency', 'Urgent')
+# Rows with the same sample tracking ID (or lab accession number) are one
+# sample; rows with the same airway bill or shipping tracking ID went in one shipment
+SAMPLE_ID_COLUMNS = ('Sample tracking ID', 'Accession number')
+SHIPMENT_ID_COLUMNS = ('Airway bill number', 'Shipping tracking ID', 'Shipment tracking ID')
+
+# Working days allowed from shipment to result (Instances ... outside of window)
+URGENT_RESULT_DAYS = 5
+NON_URGENT_RESULT_DAYS = 10
+
+# England and Wales bank holidays moved from their usual date, and one-off holidays
+MOVED_BANK_HOLIDAYS = {
+    (1995, 'early_may'): date(1995, 5, 8),
+    (2002, 'spring'): date(2002, 6, 4),
+    (2012, 'spring'): date(2012, 6, 4),
+    (2020, 'early_may'): date(2020, 5, 8),
+    (2022, 'spring'): date(2022, 6, 2),
+}
+EXTRA_BANK_HOLIDAYS = (
+    date(1999, 12, 31), date(2002, 6, 3), date(2011, 4, 29), date(2012, 6, 5),
+    date(2022, 6, 3), date(2022, 9, 19), date(2023, 5, 8),
+)
+
+TOTALS_LABEL = "Totals / Average"
+
+
+@dataclass(frozen=True)
+class TurnaroundMetric:
+    # Column of the CPGC BNT Reporting table
+    name: str
+    start: str
+    end: str
+    # 'mean' working days, 'within' (% at most ``limit`` days) or 'over' (instances over ``limit`` days)
+    statistic: str
+    limit: int = None
+    # Only urgent (True) or non-urgent (False) results; None for every sample
+    urgent: bool = None
+
+
+TURNAROUND_METRICS = (
+    TurnaroundMetric('Average number of days between CVLP dispatch & CPGC receipt', 'dispatched', 'received', 'mean'),
+    TurnaroundMetric('Average number of days before shipment of samples', 'received', 'shipped', 'mean'),
+    TurnaroundMetric('% prepared within 3 working days', 'received', 'shipped', 'within', 3),
+    TurnaroundMetric('Instances of 1st set sent >3 days from notification', 'notified', 'shipped', 'over', 3),
+    TurnaroundMetric('Average number of days to provide non-urgent results', 'shipped', 'result', 'mean', urgent=False),
+    TurnaroundMetric('Instances of non-urgent results provided outside of window', 'shipped', 'result', 'over',
+                     NON_URGENT_RESULT_DAYS, urgent=False),
+    TurnaroundMetric('Average number of days to provide urgent results', 'shipped', 'result', 'mean', urgent=True),
+    TurnaroundMetric('Instances of urgent results provided outside of window', 'shipped', 'result', 'over',
+                     URGENT_RESULT_DAYS, urgent=True),
+)
+
+
+# === Working-day calendar ===
+
+def _easter_sunday(year):
+    """Gregorian Easter Sunday (Meeus/Jones/Butcher algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _first_monday(year, month):
+    first = date(year, month, 1)
+    return first + timedelta(days=-first.weekday() % 7)
+
+
+def _last_monday(year, month):
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=last.weekday())
+
+
+def uk_bank_holidays(year):
+    """England and Wales bank holidays of a year, weekend ones substituted by the next free weekday"""
+    easter = _easter_sunday(year)
+    rules = {
+        'early_may': _first_monday(year, 5),
+        'spring': _last_monday(year, 5),
+        'summer': _last_monday(year, 8),
+    }
+    holidays = {easter - timedelta(days=2), easter + timedelta(days=1)}
+    holidays.update(MOVED_BANK_HOLIDAYS.get((year, name), day) for name, day in rules.items())
+    holidays.update(day for day in EXTRA_BANK_HOLIDAYS if day.year == year)
+    # New Year's Day, Christmas Day and Boxing Day move off weekends
+    for day in (date(year, 1, 1), date(year, 12, 25), date(year, 12, 26)):
+        while day.weekday() >= 5 or day in holidays:
+            day += timedelta(days=1)
+        holidays.add(day)
+    return sorted(holidays)
+
+
+@lru_cache(maxsize=8)
+def working_day_calendar(first_year, last_year):
+    """numpy business-day calendar: Monday to Friday, less bank holidays"""
+    holidays = [day for year in range(first_year, last_year + 1) for day in uk_bank_holidays(year)]
+    return np.busdaycalendar(weekmask='1111100', holidays=np.array(holidays, dtype='datetime64[D]'))
+
+
+def working_days_between(start, end):
+    """Working days from each start date to its end date (0 on the same day); NaN where either is missing or end is earlier"""
+    start = pd.to_datetime(pd.Series(start), errors='coerce').to_numpy('datetime64[D]')
+    end = pd.to_datetime(pd.Series(end), errors='coerce').to_numpy('datetime64[D]')
+    days = np.full(len(start), np.nan)
+    valid = ~(np.isnat(start) | np.isnat(end))
+    if not valid.any():
+        return days
+    years = np.concatenate([start[valid], end[valid]]).astype('datetime64[Y]').astype(int) + 1970
+    calendar = working_day_calendar(int(years.min()), int(years.max()))
+    days[valid] = np.busday_count(start[valid], end[valid], busdaycal=calendar)
+    days[days < 0] = np.nan
+    return days
+
+
+# === CPGC mapping ===
+
+def _site_words(name):
+    return re.sub(r'[^a-z0-9]+', ' ', str(name).lower().replace('&', ' and ')).split()
+
+
+def _same_site(a, b):
+    """Site names match when one's words appear in order within the other's ('Bath' ~ 'Royal United Hospitals Bath')"""
+    a, b = _site_words(a), _site_words(b)
+    short, long = sorted((a, b), key=len)
+    return bool(short) and any(long[i:i + len(short)] == short for i in range(len(long) - len(short) + 1))
+
+
+def cpgc_of_sites(sites, reporting=CPGC_REPORTING):
+    """CPGC of each CVLP site name, from the reporting table's recruiting sites (None if unmapped)"""
+    recruiting = [
+        (row['CPGC'], name.strip())
+        for row in reporting if row.get('CPGC')
+        for name in re.split(r'[/,;]', row.get('Corresponding CVLP recruiting sites', ''))
+        if name.strip() and name.strip().upper() != 'N/A'
+    ]
+    return {site: next((cpgc for cpgc, name in recruiting if _same_site(site, name)), None) for site in sites}
+
+
+# === Metrics ===
+
+def _first_column(df, candidates):
+    return next((col for col in candidates if col in df.columns), None)
+
+
+def available_turnaround_metrics(df):
+    """Names of the turnaround metrics the tracker's columns can answer"""
+    milestones = {name for name, columns in MILESTONE_COLUMNS.items() if _first_column(df, columns)}
+    has_urgency = _first_column(df, URGENT_COLUMNS) is not None
+    return [
+        metric.name for metric in TURNAROUND_METRICS
+        if {metric.start, metric.end} <= milestones and (metric.urgent is None or has_urgency)
+    ]
+
+
+def tissue_samples(df):
+    """One row per tissue sample: CVLP site, urgency and the earliest date of each milestone"""
+    site_col, _ = resolve_cvlp_site_column(df)
+    samples = pd.DataFrame({'site': df[site_col] if site_col else None}, index=df.index)
+    for name, columns in MILESTONE_COLUMNS.items():
+        col = _first_column(df, columns)
+        samples[name] = pd.to_datetime(df[col], errors='coerce') if col else pd.NaT
+    urgent_col = _first_column(df, URGENT_COLUMNS)
+    samples['urgent'] = is_yes(df[urgent_col]) if urgent_col else False
+
+    shipment_col = _first_column(df, SHIPMENT_ID_COLUMNS)
+    if shipment_col:
+        # A shipment date recorded on any sample of a shipment dates all of them
+        shipment = df[shipment_col].astype('str').str.strip().where(df[shipment_col].notna())
+        samples['shipped'] = samples['shipped'].fillna(samples.groupby(shipment)['shipped'].transform('min'))
+    sample_col = _first_column(df, SAMPLE_ID_COLUMNS)
+    if sample_col:
+        sample = df[sample_col].astype('str').str.strip().where(df[sample_col].notna())
+        # Rows without a tracking ID are samples of their own
+        sample = sample.fillna(pd.Series(df.index.astype('str'), index=df.index).radd('row:'))
+        samples = samples.groupby(sample, sort=False).agg(
+            {'site': 'first', 'urgent': 'any', **{name: 'min' for name in MILESTONE_COLUMNS}}
+        )
+    return samples.reset_index(drop=True)
+
+
+def _statistic(days, metric):
+    """The metric's value formatted as in the reporting table, over measured intervals only"""
+    days = days[~np.isnan(days)]
+    if metric.statistic == 'mean':
+        return f"{days.mean():.1f}" if len(days) else "N/A"
+    if not len(days):
+        return "-"
+    if metric.statistic == 'within':
+        return f"{(days <= metric.limit).mean() * 100:.2f}%"
+    return str(int((days > metric.limit).sum()))
+
+
+def compute_cpgc_reporting(df, reporting=CPGC_REPORTING):
+    """The CPGC BNT Reporting table with every turnaround metric the tracker answers recomputed
+
+    Rows and columns are those of ``reporting``; the totals row covers every
+    sample of a mapped CVLP site.
+    """
+    table = pd.DataFrame(reporting)
+    metrics = set(available_turnaround_metrics(df)) if not df.empty else set()
+    if not metrics or table.empty:
+        return table
+
+    samples = tissue_samples(df)
+    sites = cpgc_of_sites(samples['site'].dropna().unique(), reporting)
+    cpgc = samples['site'].map(sites).to_numpy(dtype=object)
+    mapped = pd.notna(cpgc)
+    totals = (table['GLH'] == TOTALS_LABEL).to_numpy()
+    for metric in TURNAROUND_METRICS:
+        if metric.name not in metrics:
+            continue
+        days = working_days_between(samples[metric.start], samples[metric.end])
+        if metric.urgent is not None:
+            days[samples['urgent'].to_numpy(dtype=bool) != metric.urgent] = np.nan
+        table[metric.name] = [
+            _statistic(days[mapped] if is_total else days[cpgc == name], metric)
+            for name, is_total in zip(table['CPGC'], totals)
+        ]
+    return table
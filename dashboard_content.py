@@ -0,0 +1,110 @@
+"""
+Reporting content for the BNT113 dashboard that is maintained by hand.
+
+The Achievements & Barriers and CPGC sections show monthly reporting that is
+not derived from the Master Tracker. It is read here so the dashboard sections
+and the PDF report (``report_pdf``) show the same entries.
+The Achievements & Barriers log is kept in config/reporting_log.yaml
+(BNT113_REPORTING_LOG to use another file), as it grows every month;
+``reporting_log`` indexes it for search. Achievements use <strong> for
+emphasis, as rendered in the dashboard.
+
+The CPGC status, trial site status and CPGC BNT Reporting tables are sheets of
+the CVLP BNT113 reporting workbook (BNT113_REPORTING_WORKBOOK to use another
+file), one row per entry under a header row. The dashboard reloads the workbook
+when it changes (``data_watcher``); the module-level tables are its contents at
+import, for scripts and defaults.
+"""
+
+import io
+import os
+from dataclasses import dataclass, field
+from datetime import date
+
+import pandas as pd
+import yaml
+
+REPORTING_LOG_PATH = os.environ.get("BNT113_REPORTING_LOG", os.path.join("config", "reporting_log.yaml"))
+REPORTING_WORKBOOK_PATH = os.environ.get(
+    "BNT113_REPORTING_WORKBOOK", os.path.join("data", "CVLP BNT113 reporting.xlsx")
+)
+
+# Workbook sheet of each CPGC table
+REPORTING_SHEETS = {
+    # CPGC activation status and training (CPGC and Trial Site Set Up section)
+    'cpgc_status': 'CPGC Status',
+    # Trial site activation status (CPGC and Trial Site Set Up section)
+    'trial_site_status': 'Trial Site Status',
+    # CPGC performance, deviations and LabCorp reporting, last row holds the totals (CPGC BNT Reporting section).
+    # Turnaround columns are recomputed from the Master Tracker where it has the dates (cpgc_turnaround)
+    'cpgc_reporting': 'CPGC BNT Reporting',
+}
+
+
+def load_reporting_log(path=REPORTING_LOG_PATH):
+    """(achievements, month ahead aims, issues and barriers) from the log file; empty lists if it is missing"""
+    if not os.path.isfile(path):
+        return [], [], []
+    with open(path, encoding="utf-8") as f:
+        log = yaml.safe_load(f) or {}
+    return (list(log.get('achievements') or []), list(log.get('month_ahead_aims') or []),
+            [dict(entry) for entry in log.get('issues_and_barriers') or []])
+
+
+# Achievements for the reporting month, aims for the month ahead and the
+# Issues & Barriers log (Achievements & Barriers section)
+ACHIEVEMENTS, MONTH_AHEAD_AIMS, ISSUES_AND_BARRIERS = load_reporting_log()
+
+
+@dataclass(frozen=True)
+class CpgcReportingContent:
+    """The CPGC tables of the reporting workbook, each a list of row dicts keyed by column header"""
+    cpgc_status: list = field(default_factory=list)
+    trial_site_status: list = field(default_factory=list)
+    cpgc_reporting: list = field(default_factory=list)
+
+
+def _cell_text(value):
+    """A workbook cell as the text the tables show: dates as DD-Mon-YY, whole numbers without decimals, blanks empty"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, date):
+        return f"{value:%d-%b-%y}"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_reporting_workbook(content):
+    """The CPGC tables from the reporting workbook's bytes; raises ValueError if a sheet is missing"""
+    with pd.ExcelFile(io.BytesIO(content)) as workbook:
+        missing = [sheet for sheet in REPORTING_SHEETS.values() if sheet not in workbook.sheet_names]
+        if missing:
+            raise ValueError(f"missing sheet(s) {', '.join(repr(s) for s in missing)}")
+        # Cells read as typed: "N/A" is an entry, not a missing value
+        sheets = workbook.parse(list(REPORTING_SHEETS.values()), dtype=object, keep_default_na=False)
+    tables = {}
+    for name, sheet in REPORTING_SHEETS.items():
+        df = sheets[sheet]
+        columns = [str(col).strip() for col in df.columns]
+        rows = ([_cell_text(value) for value in row] for row in df.itertuples(index=False))
+        tables[name] = [dict(zip(columns, row)) for row in rows if any(row)]
+    return CpgcReportingContent(**tables)
+
+
+def load_reporting_workbook(path=REPORTING_WORKBOOK_PATH):
+    """The CPGC tables from the reporting workbook file; empty tables if it is missing"""
+    if not os.path.isfile(path):
+        return CpgcReportingContent()
+    with open(path, "rb") as f:
+        return read_reporting_workbook(f.read())
+
+
+try:
+    _workbook = load_reporting_workbook()
+except (OSError, ValueError):
+    # An unreadable workbook leaves the tables empty; the dashboard's watcher reports why
+    _workbook = CpgcReportingContent()
+CPGC_STATUS, TRIAL_SITE_STATUS, CPGC_REPORTING = (
+    _workbook.cpgc_status, _workbook.trial_site_status, _workbook.cpgc_reporting
+)
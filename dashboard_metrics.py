@@ -0,0 +1,1363 @@
+"""
+Data computations behind the BNT113 dashboard tables.
+
+Everything here is plain pandas and importable without Streamlit, so the same
+code serves the interactive dashboard and the offline snapshot builder
+(``python -m dashboard_snapshot``). Functions take the prepared Master Tracker
+and return frames or plain values; rendering stays in the dashboard script.
+
+The analytics path runs under pandas copy-on-write (always on from pandas 3,
+switched on below for pandas 2): a frame derived from another never writes
+through to it, so no function takes a defensive copy of the tracker. Callers
+must still not modify a frame they were handed in place; take a shallow copy
+(``df.copy(deep=False)``) first, which copies only the columns then written.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Privacy levels offered in the dashboard sidebar
+PRIVACY_LEVELS = ["Pseudonymized (Safe)", "Full Data (Admin)"]
+
+# Headline KPI tiles and the derived flag column each one sums
+KPI_SNAPSHOT_COLUMNS = {
+    'referred': 'is_referred',
+    'referred_to_prescreen': 'is_referred_to_prescreen',
+    'referred_to_main_trial': 'is_referred_to_main_trial',
+    'recruited_to_cvlp': 'is_recruited_to_cvlp',
+    'consented_prescreen': 'is_consented_prescreen',
+    'randomised': 'is_randomised',
+    'screen_failures': 'is_screen_failure',
+}
+
+# Display names of the headline KPIs, as on the overview tiles
+KPI_SNAPSHOT_LABELS = {
+    'referred': 'Total Referred',
+    'referred_to_prescreen': 'Pre-screen Referrals',
+    'referred_to_main_trial': 'Main Trial Referrals',
+    'recruited_to_cvlp': 'CVLP Recruited',
+    'consented_prescreen': 'BNT113-01 Consented',
+    'randomised': 'Randomised',
+    'screen_failures': 'Screen Failures',
+}
+
+# Patient identifiers masked by pseudonymize_data
+SENSITIVE_COLUMNS = [
+    'Patient full name',
+    'NHS Number',
+    'CVLP Participant ID',
+    'Main trial participant ID',
+    'Pre-screening ID',
+    'Sample tracking ID',
+    'Tissue Block ID',
+    'Accession number',
+    'Airway bill number',
+    'Shipping tracking ID for curls & slides'
+]
+
+
+def read_master_tracker(source, header=0):
+    """Read the 'CVLP - Master Tracker' sheet, dropping empty rows and unnamed columns"""
+    df = pd.read_excel(source, sheet_name="CVLP - Master Tracker", header=header, index_col=False)
+    df = df.dropna(how='all').reset_index(drop=True)
+    return df.loc[:, ~df.columns.astype(str).str.contains('^Unnamed')]
+
+
+# Add pseudonymization function
+def pseudonymize_data(df):
+    """
+    Pseudonymize sensitive patient data for dashboard display
+    """
+    if df.empty:
+        return df
+    
+    # Only the masked columns are copied
+    df_pseudo = df.copy(deep=False)
+    
+    for col in SENSITIVE_COLUMNS:
+        if col in df_pseudo.columns:
+            # Create pseudonymized versions
+            if col == 'Patient full name':
+                # Replace with Patient-XXX format
+                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
+                    f"Patient-{hash(str(x)) % 9999:04d}" if pd.notna(x) and str(x).strip() != '' else x)
+            
+            elif col == 'NHS Number':
+                # Replace with NHS-XXX format, keeping length
+                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
+                    f"NHS-{'X' * (len(str(x)) - 4)}" if pd.notna(x) and str(x).strip() != '' else x)
+            
+            elif 'ID' in col or 'Number' in col:
+                # Replace with masked format keeping prefix
+                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
+                    f"{str(x)[:4]}***{str(x)[-3:]}" if pd.notna(x) and len(str(x)) > 7 
+                    else f"{str(x)[:2]}***" if pd.notna(x) and str(x).strip() != '' else x)
+            
+            else:
+                # Generic masking for other sensitive fields
+                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
+                    f"***{hash(str(x)) % 999:03d}" if pd.notna(x) and str(x).strip() != '' else x)
+    
+    # Optionally mask dates to just show month/year for additional privacy
+    date_columns = [
+        'Date of Birth',
+        'Date patient consented into CVLP',
+        'Date pre-screening referral form sent to trial site',
+        'Date main trial screening referral form sent to trial site'
+    ]
+    
+    for col in date_columns:
+        if col in df_pseudo.columns:
+            if col == 'Date of Birth':
+                # Show only year for DOB
+                df_pseudo[col] = pd.to_datetime(df_pseudo[col], errors='coerce').dt.year
+            # Other dates keep as-is for analytics but could be further masked if needed
+    
+    return df_pseudo
+
+
+# Data preprocessing function adapted for real data
+def preprocess_real_data(df):
+    if df.empty:
+        return df, datetime.now(), datetime(2024, 12, 31)
+    
+    # Map your column names to what the dashboard expects (define at top of function)
+    prescreen_referral_col = 'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)'
+    main_trial_referral_col = 'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)'
+    cvlp_consent_col = 'Please input the date the patient signed the consent form (dd/mm/yyyy)'
+    cvlp_status_col = 'Please select the CVLP consent status'
+    
+    # Map additional columns from your file
+    prescreen_consent_col = 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail)'
+    enrolled_col = 'To be confirmed by trial site (enrolled = Yes, screen fail = No)'
+    
+    # Map screen failure columns from your file
+    prescreen_fail_col = 'Clinical Liaison to confirm screen fail with CVLP site'
+    main_trial_fail_col = 'Email the CVLP site to confirm that patient has not consented to the main trial'
+    enrolment_fail_col = 'Email the CVLP site to confirm that patient has not enrolled to the trial'
+    
+    # DEBUG: Show which key columns we're looking for vs what we found
+    key_columns_to_check = {
+        'CVLP Site': 'CVLP Site',
+        'Trial Site': 'Trial Site', 
+        'CVLP Consent': cvlp_consent_col,
+        'Prescreen Referral': prescreen_referral_col,
+        'Main Trial Referral': main_trial_referral_col,
+        'CVLP Status': cvlp_status_col
+    }
+    
+    # Check which columns exist
+    found_columns = {}
+    missing_columns = []
+    
+    for label, col_name in key_columns_to_check.items():
+        if col_name in df.columns:
+            found_columns[label] = col_name
+        else:
+            missing_columns.append(label)
+    
+    # Convert date columns to datetime using the actual column names from your file
+    date_columns = [
+        cvlp_consent_col,
+        prescreen_referral_col,
+        main_trial_referral_col,
+        'Please input the date  tissue block sent to CPGC\n(dd/mm/yyyy)',
+        'Please confirm date of next surveillance visit for patients referred to pre-screening. The Clinical Liaison will use this to check for updates on main trial eligibility',
+        'Date of advanced diagnosis (confirmed by CVLP site by email or on referral form)'
+    ]
+    
+    for col in date_columns:
+        if col in df.columns:
+            try:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+            except:
+                pass
+    
+    # Calculate today's date and intervals
+    today = datetime.now()
+    dec_2024 = pd.Timestamp('2024-12-31')
+    
+    # Create calculated fields using the actual column names from your file
+    
+    # Referred (Count of SINGLE patients referral - either pre-screening OR main trial)
+    df['is_referred'] = False
+    if prescreen_referral_col in df.columns:
+        df['is_referred'] = df['is_referred'] | (~df[prescreen_referral_col].isna())
+    if main_trial_referral_col in df.columns:
+        df['is_referred'] = df['is_referred'] | (~df[main_trial_referral_col].isna())
+    
+    # Referred to pre-screen
+    df['is_referred_to_prescreen'] = False
+    if prescreen_referral_col in df.columns:
+        df['is_referred_to_prescreen'] = ~df[prescreen_referral_col].isna()
+    
+    # Referred to main trial
+    df['is_referred_to_main_trial'] = False
+    if main_trial_referral_col in df.columns:
+        df['is_referred_to_main_trial'] = ~df[main_trial_referral_col].isna()
+    
+    # Recruited to CVLP (CVLP consented patients)
+    df['is_recruited_to_cvlp'] = False
+    if cvlp_status_col in df.columns:
+        df['is_recruited_to_cvlp'] = df[cvlp_status_col].astype(str).str.strip().str.lower() == 'obtained'
+    elif cvlp_consent_col in df.columns:
+        df['is_recruited_to_cvlp'] = ~df[cvlp_consent_col].isna()
+    
+    # Consented BNT113-01 (pre-screen)
+    df['is_consented_prescreen'] = False
+    if prescreen_consent_col in df.columns:
+        df['is_consented_prescreen'] = df[prescreen_consent_col].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
+    
+    # Randomised BNT113-01 (enrolled participants)
+    df['is_randomised'] = False
+    if enrolled_col in df.columns:
+        df['is_randomised'] = df[enrolled_col].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
+    
+    # BNT113-01 Screen Failures
+    df['is_screen_failure'] = False
+    
+    # Screen failures could be derived from various columns
+    if prescreen_fail_col in df.columns:
+        df['is_screen_failure'] = df['is_screen_failure'] | (~df[prescreen_fail_col].isna())
+    if main_trial_fail_col in df.columns:
+        df['is_screen_failure'] = df['is_screen_failure'] | (~df[main_trial_fail_col].isna())
+    if enrolment_fail_col in df.columns:
+        df['is_screen_failure'] = df['is_screen_failure'] | (~df[enrolment_fail_col].isna())
+    
+    # Every funnel stage packed into one small integer per patient
+    df[FUNNEL_MASK_COLUMN] = funnel_stage_mask(df)
+    
+    return df, today, dec_2024
+
+
+def prepare_tracker_data(master_df, privacy_level):
+    """Pseudonymize (when required) and preprocess the Master Tracker; ``master_df`` itself is left as it was"""
+    if privacy_level == "Pseudonymized (Safe)" and not master_df.empty:
+        master_df = pseudonymize_data(master_df)
+    else:
+        # Preprocessing adds and converts columns in place
+        master_df = master_df.copy(deep=False)
+    processed, _, _ = preprocess_real_data(master_df)
+    return processed
+
+
+# === Funnel cube ===
+# Counts of every funnel stage by CVLP site x trial site x month, built once per
+# dataset and privacy level; the tables below read slices of it
+
+PRESCREEN_REFERRAL_COLUMN = 'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)'
+MAIN_TRIAL_REFERRAL_COLUMN = 'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)'
+MAIN_TRIAL_CONSENT_COLUMN = 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail).1'
+
+# CVLP consent date, first match wins
+CVLP_CONSENT_DATE_COLUMNS = [
+    'Date patient consented into CVLP',
+    'Please input the date the patient signed the consent form (dd/mm/yyyy)',
+    'CVLP consent date',
+    'Date of CVLP consent',
+    'Date patient consented into CVLP ',  # with trailing space
+    'Please input the date the patient signed the consent form',
+    'Patient consent date',
+    'CVLP Site consent date'
+]
+
+# Master Tracker milestone dates by position: columns AD, AM and BN, and the screen fail dates AC, AK and BL
+PRESCREEN_CONSENT_DATE_POSITION = 29
+MAIN_TRIAL_CONSENT_DATE_POSITION = 38
+RANDOMISATION_DATE_POSITION = 65
+SCREEN_FAIL_DATE_POSITIONS = (28, 36, 63)
+
+# Stages with an event date are filed under that date's month; status flags
+# under the patient's referral month. Undated entries go in a final month slot.
+FUNNEL_STAGES = (
+    'patients',                  # every tracker row
+    'referred',                  # earliest pre-screening or main trial referral
+    'referred_to_prescreen',
+    'referred_to_main_trial',
+    'cvlp_consented',            # CVLP consent date
+    'recruited_to_cvlp',         # status flags (as the KPI tiles)
+    'consented_prescreen',
+    'consented_main_trial',
+    'randomised',
+    'screen_failures',
+    'consented_prescreen_dated',  # milestone dates (as the monthly table)
+    'consented_main_trial_dated',
+    'randomised_dated',
+    'screen_failures_dated',
+)
+
+
+def is_yes(values):
+    """Yes/Y/True answers in a tracker column"""
+    return values.astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
+
+
+def parse_day_first_dates(values):
+    """Tracker and Screening Logs dates: date cells as they are, text as DD/MM/YYYY, NaT for anything else (e.g. Pending)"""
+    cells = pd.Series(values)
+    if cells.dtype.kind == 'M':
+        return cells
+    cells = cells.astype(object)
+    is_date = cells.map(lambda value: isinstance(value, date)).astype(bool)
+    dates = pd.to_datetime(cells.where(is_date), errors='coerce')
+    text = cells.where(~is_date).fillna('').astype('str').str.strip()
+    return dates.fillna(pd.to_datetime(text, format='%d/%m/%Y', errors='coerce'))
+
+
+def _event_dates(df, columns):
+    """Earliest date per row across the given columns (names or positions); NaT where there is none"""
+    dates = []
+    for col in columns:
+        if isinstance(col, int):
+            if len(df.columns) <= col:
+                continue
+            values = df.iloc[:, col]
+        elif col in df.columns:
+            values = df[col]
+        else:
+            continue
+        dates.append(parse_day_first_dates(values))
+    if not dates:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return dates[0] if len(dates) == 1 else pd.concat(dates, axis=1).min(axis=1)
+
+
+def funnel_stage_events(df):
+    """(in stage, event date) per row for every funnel stage"""
+    referral = _event_dates(df, [PRESCREEN_REFERRAL_COLUMN, MAIN_TRIAL_REFERRAL_COLUMN])
+    cvlp_consent_col = next((col for col in CVLP_CONSENT_DATE_COLUMNS if col in df.columns), None)
+
+    def flag(col):
+        return df[col].fillna(False).astype(bool) if col in df.columns else pd.Series(False, index=df.index)
+
+    def dated(columns):
+        dates = _event_dates(df, columns)
+        return dates.notna(), dates
+
+    events = {
+        'patients': (pd.Series(True, index=df.index), referral),
+        'referred': (referral.notna(), referral),
+        'referred_to_prescreen': dated([PRESCREEN_REFERRAL_COLUMN]),
+        'referred_to_main_trial': dated([MAIN_TRIAL_REFERRAL_COLUMN]),
+        'cvlp_consented': dated([cvlp_consent_col] if cvlp_consent_col else []),
+        'recruited_to_cvlp': (flag('is_recruited_to_cvlp'), referral),
+        'consented_prescreen': (flag('is_consented_prescreen'), referral),
+        'consented_main_trial': (is_yes(df[MAIN_TRIAL_CONSENT_COLUMN]) if MAIN_TRIAL_CONSENT_COLUMN in df.columns
+                                 else pd.Series(False, index=df.index), referral),
+        'randomised': (flag('is_randomised'), referral),
+        'screen_failures': (flag('is_screen_failure'), referral),
+        'consented_prescreen_dated': dated([PRESCREEN_CONSENT_DATE_POSITION]),
+        'consented_main_trial_dated': dated([MAIN_TRIAL_CONSENT_DATE_POSITION]),
+        'randomised_dated': dated([RANDOMISATION_DATE_POSITION]),
+        'screen_failures_dated': dated(list(SCREEN_FAIL_DATE_POSITIONS)),
+    }
+    return {stage: events[stage] for stage in FUNNEL_STAGES}
+
+
+# Per-patient stage bitmask: bit k set when the patient is in FUNNEL_STAGES[k]
+FUNNEL_MASK_COLUMN = 'funnel_stages'
+FUNNEL_MASK_DTYPE = np.uint16
+FUNNEL_STAGE_BITS = {stage: 1 << k for k, stage in enumerate(FUNNEL_STAGES)}
+
+# Stages filed under the referral month; the rest carry their own event date
+REFERRAL_DATED_STAGES = ('patients', 'referred', 'recruited_to_cvlp', 'consented_prescreen',
+                         'consented_main_trial', 'randomised', 'screen_failures')
+
+
+def funnel_stage_mask(df, events=None):
+    """Stage bitmask per row (FUNNEL_STAGE_BITS), packed from funnel_stage_events"""
+    events = events if events is not None else funnel_stage_events(df)
+    mask = np.zeros(len(df), dtype=FUNNEL_MASK_DTYPE)
+    for stage, bit in FUNNEL_STAGE_BITS.items():
+        mask |= np.where(events[stage][0].to_numpy(dtype=bool), bit, 0).astype(FUNNEL_MASK_DTYPE)
+    return mask
+
+
+def stage_bits(masks, stages=FUNNEL_STAGES):
+    """(mask, stage) 0/1 table of which stages each mask value includes"""
+    bits = np.array([FUNNEL_STAGE_BITS[stage] for stage in stages], dtype=FUNNEL_MASK_DTYPE)
+    return (np.asarray(masks, dtype=FUNNEL_MASK_DTYPE)[:, None] & bits != 0).astype(np.int64)
+
+
+def month_period(month):
+    """Period of a 'Mon-YY' month label"""
+    return pd.Period(pd.to_datetime(f"01-{month}", format='%d-%b-%y'), freq='M')
+
+
+def _site_codes(df, site_col):
+    """Index of each row's site, and the sites; blank rows get the slot after the last site"""
+    if site_col is None:
+        return np.zeros(len(df), dtype=np.int64), pd.Index([])
+    codes, sites = pd.factorize(df[site_col])
+    return np.where(codes < 0, len(sites), codes), pd.Index(sites)
+
+
+@dataclass(frozen=True)
+class FunnelCube:
+    """Funnel stage counts by CVLP site x trial site x month, with the first and last event date per CVLP site"""
+    cvlp_site_col: str
+    trial_site_col: str
+    cvlp_sites: pd.Index
+    trial_sites: pd.Index
+    # Months with any event; counts have one more month slot for undated entries
+    months: pd.PeriodIndex
+    stages: tuple
+    # (cvlp site + blank, trial site + blank, month + undated, stage)
+    counts: np.ndarray
+    # (cvlp site + blank, stage), NaT where a site has no dated event
+    first_dates: np.ndarray
+    last_dates: np.ndarray
+
+    @classmethod
+    def build(cls, df):
+        """Count every stage of the prepared tracker from its stage bitmask (FUNNEL_MASK_COLUMN)
+
+        Status stages share the referral month, so they are counted together in a
+        single bincount over (site, trial site, month, mask); stages with their own
+        event date get one bincount each. An unprepared frame has its mask packed here.
+        """
+        cvlp_site_col, _ = resolve_cvlp_site_column(df)
+        trial_site_col, _ = resolve_trial_site_column(df)
+        cvlp_codes, cvlp_sites = _site_codes(df, cvlp_site_col)
+        trial_codes, trial_sites = _site_codes(df, trial_site_col)
+
+        events = funnel_stage_events(df)
+        if FUNNEL_MASK_COLUMN in df.columns:
+            mask = df[FUNNEL_MASK_COLUMN].to_numpy(dtype=FUNNEL_MASK_DTYPE)
+        else:
+            mask = funnel_stage_mask(df, events)
+        # Stages sharing a date series (the referral-dated ones) convert it once
+        converted = {}
+        for stage, (_, dates) in events.items():
+            if id(dates) not in converted:
+                index = pd.DatetimeIndex(dates).as_unit('ns')
+                converted[id(dates)] = (index.asi8, index.to_period('M'))
+        stamps = {stage: converted[id(dates)][0] for stage, (_, dates) in events.items()}
+        periods = {stage: converted[id(dates)][1] for stage, (_, dates) in events.items()}
+        ordinals = np.unique(np.concatenate([p.asi8[~p.isna()] for p in (period for _, period in converted.values())]))
+        months = pd.PeriodIndex.from_ordinals(ordinals, freq='M')
+
+        def month_slots(stage):
+            return np.where(periods[stage].isna(), len(months), np.searchsorted(ordinals, periods[stage].asi8))
+
+        shape = (len(cvlp_sites) + 1, len(trial_sites) + 1, len(months) + 1, len(FUNNEL_STAGES))
+        counts = np.zeros(shape, dtype=np.int64)
+
+        # Stages filed under the referral month: one bincount over the distinct
+        # masks in each cell, then each mask counted towards the stages it holds
+        referral_stages = [FUNNEL_STAGES.index(stage) for stage in REFERRAL_DATED_STAGES]
+        masks, mask_codes = np.unique(mask, return_inverse=True)
+        cell_shape = (*shape[:3], len(masks))
+        by_mask = np.bincount(
+            np.ravel_multi_index((cvlp_codes, trial_codes, month_slots('referred'), mask_codes.ravel()), cell_shape),
+            minlength=int(np.prod(cell_shape)),
+        ).reshape(cell_shape)
+        counts[..., referral_stages] = by_mask @ stage_bits(masks, REFERRAL_DATED_STAGES)
+
+        no_date, last_date = np.iinfo(np.int64).max, np.iinfo(np.int64).min
+        first_dates = np.full((shape[0], shape[-1]), no_date)
+        last_dates = np.full((shape[0], shape[-1]), last_date)
+        for k, stage in enumerate(FUNNEL_STAGES):
+            in_stage = (mask & FUNNEL_STAGE_BITS[stage]) != 0
+            month = month_slots(stage)
+            if stage not in REFERRAL_DATED_STAGES:
+                cells = np.ravel_multi_index((cvlp_codes[in_stage], trial_codes[in_stage], month[in_stage]), shape[:3])
+                counts[..., k] = np.bincount(cells, minlength=int(np.prod(shape[:3]))).reshape(shape[:3])
+            with_date = in_stage & (month < len(months))
+            np.minimum.at(first_dates[:, k], cvlp_codes[with_date], stamps[stage][with_date])
+            np.maximum.at(last_dates[:, k], cvlp_codes[with_date], stamps[stage][with_date])
+
+        def as_dates(stamps, missing):
+            return np.where(stamps == missing, np.datetime64('NaT'), stamps.astype('datetime64[ns]'))
+
+        return cls(
+            cvlp_site_col, trial_site_col, cvlp_sites, trial_sites, months, FUNNEL_STAGES, counts,
+            as_dates(first_dates, no_date), as_dates(last_dates, last_date),
+        )
+
+    # -- rollups ---------------------------------------------------------------
+
+    def _by_month(self, stage, cvlp_site=None, trial_site=None):
+        """Counts per month slot (the last one undated), over all sites unless one is given"""
+        counts = self.counts[..., self.stages.index(stage)]
+        if cvlp_site is not None:
+            i = self.cvlp_sites.get_indexer([cvlp_site])[0]
+            counts = counts[i:i + 1] if i >= 0 else counts[:0]
+        if trial_site is not None:
+            i = self.trial_sites.get_indexer([trial_site])[0]
+            counts = counts[:, i:i + 1] if i >= 0 else counts[:, :0]
+        return counts.sum(axis=(0, 1))
+
+    def total(self, stage, cvlp_site=None, trial_site=None):
+        """Count of a stage, dated or not"""
+        return int(self._by_month(stage, cvlp_site, trial_site).sum())
+
+    def monthly(self, stage, months, cvlp_site=None, trial_site=None, cumulative=False):
+        """Counts of a stage in each 'Mon-YY' month, or up to the end of each month if ``cumulative``"""
+        dated = self._by_month(stage, cvlp_site, trial_site)[:-1]
+        targets = pd.PeriodIndex([month_period(m) for m in months]).asi8
+        ordinals = self.months.asi8
+        if cumulative:
+            upto = np.searchsorted(ordinals, targets, side='right')
+            return np.concatenate([[0], np.cumsum(dated)])[upto]
+        at = np.searchsorted(ordinals, targets)
+        found = at < len(ordinals)
+        found[found] = ordinals[at[found]] == targets[found]
+        return np.where(found, dated[np.minimum(at, len(dated) - 1)] if len(dated) else 0, 0)
+
+    def by_cvlp_site(self, stage, trial_site=None):
+        """Totals of a stage per CVLP site (blank sites left out), for one trial site if given"""
+        counts = self.counts[:-1, ..., self.stages.index(stage)]
+        if trial_site is not None:
+            i = self.trial_sites.get_indexer([trial_site])[0]
+            counts = counts[:, i:i + 1] if i >= 0 else counts[:, :0]
+        return pd.Series(counts.sum(axis=(1, 2)), index=self.cvlp_sites)
+
+    def by_trial_site(self, stage, cvlp_site=None):
+        """Totals of a stage per trial site (blank sites left out), for one CVLP site if given"""
+        counts = self.counts[:, :-1, :, self.stages.index(stage)]
+        if cvlp_site is not None:
+            i = self.cvlp_sites.get_indexer([cvlp_site])[0]
+            counts = counts[i:i + 1] if i >= 0 else counts[:0]
+        return pd.Series(counts.sum(axis=(0, 2)), index=self.trial_sites)
+
+    def first_date(self, stage, cvlp_site):
+        """Earliest event date of a stage at a CVLP site (NaT if none)"""
+        i = self.cvlp_sites.get_indexer([cvlp_site])[0]
+        return pd.Timestamp(self.first_dates[i, self.stages.index(stage)]) if i >= 0 else pd.NaT
+
+    def last_date(self, stage, cvlp_site):
+        """Latest event date of a stage at a CVLP site (NaT if none)"""
+        i = self.cvlp_sites.get_indexer([cvlp_site])[0]
+        return pd.Timestamp(self.last_dates[i, self.stages.index(stage)]) if i >= 0 else pd.NaT
+
+
+# Month range of the monthly projections table (Contract ends Nov-26)
+PROJECTION_MONTHS = [
+    'Apr-25', 'May-25', 'Jun-25', 'Jul-25', 'Aug-25', 'Sep-25', 'Oct-25', 'Nov-25', 'Dec-25',
+    'Jan-26', 'Feb-26', 'Mar-26', 'Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26', 'Sep-26', 
+    'Oct-26', 'Nov-26'
+]
+
+# Site opening targets (updated from colleague's data) - ends at Nov-26
+SITE_OPENING_TARGETS = [7, 12, 18, 22, 26, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30]
+
+# Projected cumulative referral targets (updated from colleague's data) - ends at Nov-26
+PROJECTED_REFERRAL_TARGETS = [1, 2, 4, 7, 11, 17, 24, 31, 35, 40, 50, 60, 66, 73, 81, 90, 100, 111, 123, 136]
+
+
+# Function to create the monthly breakdown table matching the Excel structure
+def compute_monthly_projections(master_df, context, cube=None, linkage=None):
+    """Compute the monthly trial metrics (cumulative actuals against site and referral targets)
+
+    Site opening dates and Screening Logs columns come from the shared data context;
+    Master Tracker counts from the funnel cube. With a patient linkage that includes
+    Screening Logs patients, Referred and Recruited to CVLP count each linked patient
+    once across both sources.
+    """
+    cube = cube if cube is not None else FunnelCube.build(master_df)
+    months = PROJECTION_MONTHS
+    site_targets = SITE_OPENING_TARGETS
+    projected_targets = PROJECTED_REFERRAL_TARGETS
+    
+    # Create the DataFrame structure with actual calculations
+    table_data = []
+    
+    # Master Tracker counts up to the end of each month (undated entries never count)
+    cumulative = {
+        stage: [int(count) for count in cube.monthly(stage, months, cumulative=True)]
+        for stage in ('referred', 'referred_to_prescreen', 'referred_to_main_trial', 'cvlp_consented',
+                      'consented_prescreen_dated', 'consented_main_trial_dated', 'randomised_dated',
+                      'screen_failures_dated')
+    }
+    
+    # Linked, de-duplicated patients from both sources, up to the last day of each month
+    linked = None
+    if linkage is not None and linkage.has_logs:
+        month_ends = pd.PeriodIndex([month_period(m) for m in months]).to_timestamp(how='end').normalize()
+        linked = {stage: [int(count) for count in linkage.cumulative(stage, month_ends)]
+                  for stage in ('referred', 'cvlp_consented')}
+    
+    # Get current date for determining future months
+    current_date = pd.Timestamp.now()
+    
+    for i, month in enumerate(months):
+        # Parse month and year for date calculations
+        month_parts = month.split('-')
+        year = int('20' + month_parts[1])
+        month_name = month_parts[0]
+        
+        # Map month name to number
+        month_map = {
+            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+        }
+        
+        if month_name in month_map:
+            month_num = month_map[month_name]
+            
+            # Define end date for this month (last day of month)
+            if month_num == 12:
+                end_date = pd.Timestamp(year + 1, 1, 1) - pd.Timedelta(days=1)
+            else:
+                end_date = pd.Timestamp(year, month_num + 1, 1) - pd.Timedelta(days=1)
+            
+            # Check if this month is in the future
+            is_future_month = end_date > current_date
+            
+            # Calculate actual values from data
+            
+            # 1. Open Sites - Actual: count sites that opened by the end of this month
+            site_data = context.site_opening_dates
+            if site_data:
+                open_sites_actual = sum(1 for opening_date in site_data.values()
+                                      if opening_date <= end_date)
+            else:
+                # Fallback: assume all 9 sites are open
+                open_sites_actual = 9
+            
+            # 2. Referred - Actual: CUMULATIVE count of unique patients referred UP TO this month
+            # (linked across the Screening Logs and Master Tracker when logs are uploaded)
+            referred_actual = linked['referred'][i] if linked is not None else cumulative['referred'][i]
+            
+            # 3-4. Referred to pre-screen / main trial - Actual (CUMULATIVE)
+            referred_prescreen_actual = cumulative['referred_to_prescreen'][i]
+            referred_main_trial_actual = cumulative['referred_to_main_trial'][i]
+            
+            # 5. Recruited to CVLP - Actual (CUMULATIVE, each patient once across both sources)
+            recruited_cvlp_actual = linked['cvlp_consented'][i] if linked is not None else cumulative['cvlp_consented'][i]
+            
+            # 5a. Reviewed - Actual (from Screening Logs - all sheets combined) - CUMULATIVE
+            reviewed_actual = 0
+            screening_df = context.screening_logs.screening
+            if not screening_df.empty:
+                # The combined data has "Date of Screening" column
+                if 'Date of Screening' in screening_df.columns:
+                    try:
+                        # Convert to datetime and filter - CUMULATIVE (up to end of this month)
+                        screening_dates = pd.to_datetime(screening_df['Date of Screening'], errors='coerce')
+                        # Count all non-null dates UP TO the end of this month (cumulative)
+                        valid_dates = screening_dates.dropna()
+                        reviewed_actual = (valid_dates <= end_date).sum()
+                        
+                        # Debug for first few months
+                    except Exception:
+                        pass  # Silently handle errors
+            
+            # 6-9. Consented (pre-screen / main trial), randomised and screen failures - Actual (cumulative up to this month)
+            # From the tracker's milestone date columns AD, AM and BN, and the earliest of the screen fail dates AC, AK and BL
+            consented_prescreen_actual = cumulative['consented_prescreen_dated'][i]
+            consented_main_trial_actual = cumulative['consented_main_trial_dated'][i]
+            randomised_actual = cumulative['randomised_dated'][i]
+            screen_failures_actual = cumulative['screen_failures_dated'][i]
+            
+            # Calculate targets
+            sites_target = site_targets[i] if i < len(site_targets) else 30
+            projected_target = projected_targets[i] if i < len(projected_targets) else 216
+            
+            # Calculate Referred - Target (0.25/site) as ACCUMULATIVE target
+            if i == 0:
+                # For first month (Apr-25), there are no previous open sites, so target = 0
+                referred_target_per_site = 0
+            else:
+                # Calculate accumulative target: sum of all monthly targets up to current month
+                accumulative_target = 0
+                for j in range(1, i + 1):  # Start from month 1 (skip first month)
+                    if j <= len(table_data):
+                        # Use previous month's actual sites for each month's contribution
+                        prev_month_data = table_data[j-1] if j > 0 else None
+                        if prev_month_data:
+                            prev_actual_sites = prev_month_data['Open Sites - Actual']
+                            # Handle "-" string for future months - skip calculation
+                            if isinstance(prev_actual_sites, str) and prev_actual_sites == '-':
+                                continue  # Skip future months in accumulative calculation
+                            monthly_contribution = prev_actual_sites * 0.25
+                            accumulative_target += monthly_contribution
+                
+                referred_target_per_site = round(accumulative_target)
+            
+            # Add row to monthly data
+            # For future months, use "-" for actual values but keep target values
+            row = {
+                'Month': month,
+                'Open Sites - Actual': '-' if is_future_month else open_sites_actual,
+                'Open Sites - Target': sites_target,
+                'Referred - Actual': '-' if is_future_month else referred_actual,
+                'Referred - Target (0.25/site)': referred_target_per_site,
+                'Referred - Target (projected)': projected_target,
+                'Referred to pre-screen - Actual': '-' if is_future_month else referred_prescreen_actual,
+                'Referred to main trial - Actual': '-' if is_future_month else referred_main_trial_actual,
+                'Reviewed - Actual': '-' if is_future_month else reviewed_actual,
+                'Recruited to CVLP - Actual': '-' if is_future_month else recruited_cvlp_actual,
+                'Consented BNT113-01 (pre-screen) - Actual': '-' if is_future_month else consented_prescreen_actual,
+                'Consented BNT113-01 (main trial) - Actual': '-' if is_future_month else consented_main_trial_actual,
+                'Randomised BNT113-01 - Actual': '-' if is_future_month else randomised_actual,
+                'BNT113-01 Screen Failures - Actual': '-' if is_future_month else screen_failures_actual
+            }
+            table_data.append(row)
+    
+    # Create DataFrame
+    return pd.DataFrame(table_data)
+
+
+# Months for the trial referral reporting period (Contract ends Nov-26)
+TRIAL_REFERRAL_MONTHS = ['May-25', 'Jun-25', 'Jul-25', 'Aug-25', 'Sep-25', 'Oct-25', 'Nov-25', 'Dec-25', 
+                         'Jan-26', 'Feb-26', 'Mar-26', 'Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26', 
+                         'Sep-26', 'Oct-26', 'Nov-26']
+
+
+def detect_trial_referral_date_columns(master_df):
+    """Map referral/consent/randomisation roles to the tracker's column names"""
+    date_columns = {
+        'prescreen_referral': None,
+        'main_trial_referral': None,
+        'cvlp_consent': None,
+        'prescreen_consent': None,
+        'main_trial_consent': None,
+        'randomisation': None
+    }
+    
+    # Auto-detect date columns based on your actual column names
+    for col in master_df.columns:
+        col_lower = str(col).lower()
+        if 'pre-screening referral form was sent' in col_lower:
+            date_columns['prescreen_referral'] = col
+        elif 'main trial screening referral form was sent' in col_lower:
+            date_columns['main_trial_referral'] = col
+        elif 'cvlp' in col_lower and ('consent' in col_lower or 'recruited' in col_lower):
+            date_columns['cvlp_consent'] = col
+        elif 'pre' in col_lower and 'screen' in col_lower and 'consent' in col_lower:
+            date_columns['prescreen_consent'] = col
+        elif 'main' in col_lower and 'trial' in col_lower and 'consent' in col_lower:
+            date_columns['main_trial_consent'] = col
+        elif ('enrolled = yes' in col_lower or 'enrolled = Yes' in col_lower or 'enrolled' in col_lower) and ('screen fail' in col_lower):
+            date_columns['randomisation'] = col
+        elif 'trial site acknowledged pre-screening referral' in col_lower:
+            date_columns['prescreen_acknowledgment'] = col
+        elif 'consent confirmed' in col_lower or 'screen fail' in col_lower:
+            date_columns['consent_confirmation'] = col
+    
+    return date_columns
+
+
+def compute_trial_referral_reporting(master_df, trial_sites, cube=None):
+    """Compute per-trial-site referral totals and the monthly referral breakdown"""
+    cube = cube if cube is not None else FunnelCube.build(master_df)
+    months = TRIAL_REFERRAL_MONTHS
+    
+    # Main trial consents are read from a column headed as such, not the cube's confirmation column
+    main_trial_consent_col = detect_trial_referral_date_columns(master_df)['main_trial_consent']
+    main_trial_consents = pd.Series(dtype=int)
+    if main_trial_consent_col and cube.trial_site_col:
+        main_trial_consents = is_yes(master_df[main_trial_consent_col]).groupby(master_df[cube.trial_site_col]).sum()
+    
+    # Create table data
+    table_data = []
+    
+    for site in sorted(trial_sites):
+        if cube.total('patients', trial_site=site) == 0:
+            continue
+        
+        # Referrals count unique patients (OR logic, not additive)
+        total_referrals = cube.total('referred', trial_site=site)
+        total_pre_screening = cube.total('referred_to_prescreen', trial_site=site)
+        total_main_trial = cube.total('referred_to_main_trial', trial_site=site)
+        
+        total_pre_screening_consents = cube.total('consented_prescreen', trial_site=site)
+        total_main_trial_consents = int(main_trial_consents.get(site, 0))
+        total_randomised = cube.total('randomised', trial_site=site)
+        drop_out = 0
+        
+        total_patients = total_pre_screening_consents + total_main_trial_consents
+        awaiting_consent = total_referrals - total_patients
+        
+        # Create row with totals
+        row = {
+            'Trial Site': site,
+            'Total Referrals': total_referrals,
+            'Total Pre-Screening Referrals': total_pre_screening,
+            'Total Main Trial Referrals': total_main_trial,
+            'Total Patients': total_patients,
+            'Total Pre-Screening Consents': total_pre_screening_consents,
+            'Total Main Trial Consents': total_main_trial_consents,
+            'Awaiting Consent': awaiting_consent,
+            'Total Randomised': total_randomised,
+            'Drop Out': drop_out  # This would need specific logic based on your data
+        }
+        
+        # Add monthly breakdown: pre-screen and main trial referral forms sent in each month
+        monthly_referrals = (cube.monthly('referred_to_prescreen', months, trial_site=site) +
+                             cube.monthly('referred_to_main_trial', months, trial_site=site))
+        row.update({month: int(count) for month, count in zip(months, monthly_referrals)})
+        
+        table_data.append(row)
+    
+    # Create DataFrame
+    return pd.DataFrame(table_data)
+
+
+def compute_site_based_metrics(master_df, sites, cube=None):
+    """Compute referral, consent and conversion metrics for each CVLP site"""
+    cube = cube if cube is not None else FunnelCube.build(master_df)
+    # Create the DataFrame structure with actual calculations
+    site_data = []
+    
+    for site in sorted(sites):
+        if cube.total('patients', cvlp_site=site) == 0:
+            continue
+        
+        # 1. Site Opening Date (first patient consent to CVLP)
+        first_consent = cube.first_date('cvlp_consented', site)
+        site_opening_date = first_consent.strftime('%d-%b-%y') if pd.notna(first_consent) else "N/A"
+        
+        # 2-4. Referred: unique patients referred to either pre-screen or main trial, and to each
+        total_referred = cube.total('referred', cvlp_site=site)
+        referred_prescreen = cube.total('referred_to_prescreen', cvlp_site=site)
+        referred_main_trial = cube.total('referred_to_main_trial', cvlp_site=site)
+        
+        # 5. Recruited to CVLP (consented to CVLP)
+        recruited_cvlp = cube.total('cvlp_consented', cvlp_site=site)
+        
+        # 6-9. Consented BNT113-01 (pre-screen / main trial), randomised and screen failures
+        consented_prescreen = cube.total('consented_prescreen', cvlp_site=site)
+        consented_main_trial = cube.total('consented_main_trial', cvlp_site=site)
+        randomised = cube.total('randomised', cvlp_site=site)
+        screen_failures = cube.total('screen_failures', cvlp_site=site)
+        
+        # 10. Calculate key conversion rates
+        # CVLP→Referral Rate: How many referred vs recruited to CVLP
+        cvlp_to_referral_rate = (total_referred / recruited_cvlp * 100) if recruited_cvlp > 0 else 0
+        
+        # Referral→Randomisation Rate: Conversion from referral to randomisation
+        referral_to_randomisation_rate = (randomised / total_referred * 100) if total_referred > 0 else 0
+        
+        # Add row to site data (Recruited to CVLP before Total Referred)
+        row = {
+            'Site': site,
+            'Site Opening Date': site_opening_date,
+            'Recruited to CVLP': recruited_cvlp,
+            'Total Referred': total_referred,
+            'Referred to Pre-screen': referred_prescreen,
+            'Referred to Main Trial': referred_main_trial,
+            'Consented BNT113-01 (Pre-screen)': consented_prescreen,
+            'Consented BNT113-01 (Main Trial)': consented_main_trial,
+            'Randomised BNT113-01': randomised,
+            'Screen Failures': screen_failures,
+            'CVLP→Referral Rate (%)': round(cvlp_to_referral_rate, 1),
+            'Referral→Randomisation Rate (%)': round(referral_to_randomisation_rate, 1)
+        }
+        site_data.append(row)
+    
+    # Create DataFrame
+    return pd.DataFrame(site_data)
+
+
+def compute_cvlp_site_performance(df, uploaded_file=None, cube=None):
+    """Compute monthly activity, referral timeliness and recruitment rates for every CVLP site"""
+    cube = cube if cube is not None else FunnelCube.build(df)
+    # First, try to get the official site list and pre-calculated data from "CVLP Site Data" sheet
+    official_sites = []
+    site_data_dict = {}  # Store pre-calculated data from CVLP Site Data sheet
+    site_data_columns = None  # Which CVLP Site Data columns were detected (debug)
+    
+    if uploaded_file is not None:
+        try:
+            # Try different possible sheet names
+            excel_file = pd.ExcelFile(uploaded_file)
+            available_sheets = excel_file.sheet_names
+            possible_sheet_names = ["CVLP Site Data", "CVLP Site Data ", "Site Data", "CVLP Sites", "Sites"]
+            sheet_found = None
+            
+            for sheet_name in possible_sheet_names:
+                if sheet_name in available_sheets:
+                    sheet_found = sheet_name
+                    break
+            
+            if sheet_found:
+                # Try different header rows in case data doesn't start at row 0
+                site_col_found = False
+                for header_row in [0, 1, 2, 3]:
+                    try:
+                        cvlp_site_data = pd.read_excel(uploaded_file, sheet_name=sheet_found, header=header_row)
+                        
+                        # Look for the CVLP Site column
+                        site_col = None
+                        possible_site_cols = ['CVLP Site', 'CVLP site', 'Site name', 'Site Name', 'Site']
+                        for col in cvlp_site_data.columns:
+                            if str(col) in possible_site_cols:
+                                site_col = col
+                                break
+                        
+                        if site_col:
+                            # Extract official site names, filtering out empty/NaN values and placeholder text
+                            official_sites = cvlp_site_data[site_col].dropna().unique().tolist()
+                            official_sites = [site for site in official_sites if str(site).strip() != '' and 
+                                            'enter' not in str(site).lower() and 
+                                            'placeholder' not in str(site).lower() and
+                                            'cvlp site' not in str(site).lower()]
+                            
+                            if len(official_sites) > 0:
+                                site_col_found = True
+                                
+                                # Remove any sites that are actually column headers
+                                official_sites = [s for s in official_sites if not any(
+                                    header_word in str(s).lower() 
+                                    for header_word in ['site name', 'green light', 'date', 'screened']
+                                )]
+                                
+                                # Now read additional columns from CVLP Site Data
+                                # Look for "Days Since Site Active" (Total days since last patient referred / site opened)
+                                days_since_col = None
+                                possible_days_cols = [
+                                    'Days Since Site Active',
+                                    'Days since site active',
+                                    'Total days since last patient referred / site opened',
+                                    'Total days since last patient referred/site opened',
+                                    'Days since last referral',
+                                    'Days since last patient referred'
+                                ]
+                                for col in cvlp_site_data.columns:
+                                    col_str = str(col).strip()
+                                    if any(possible.lower() in col_str.lower() for possible in possible_days_cols):
+                                        days_since_col = col
+                                        break
+                                
+                                # Look for "Days Between Site Open & Referral" (days from site open to first referral)
+                                days_to_referral_col = None
+                                possible_days_to_ref_cols = [
+                                    'Days Between Site Open & Referral',
+                                    'Days between site open & referral',
+                                    'Days to first referral'
+                                ]
+                                for col in cvlp_site_data.columns:
+                                    col_str = str(col).strip()
+                                    if any(possible.lower() in col_str.lower() for possible in possible_days_to_ref_cols):
+                                        days_to_referral_col = col
+                                        break
+                                
+                                # Look for green light date column (site opened date) - keeping for potential future use
+                                green_light_col = None
+                                possible_green_light_cols = [
+                                    'Go-Live Date',
+                                    'Go live date',
+                                    'Enter green light date',
+                                    'Green light date',
+                                    'Site opened date',
+                                    'Site open date'
+                                ]
+                                for col in cvlp_site_data.columns:
+                                    col_str = str(col).strip()
+                                    if any(possible.lower() in col_str.lower() for possible in possible_green_light_cols):
+                                        green_light_col = col
+                                        break
+                                
+                                # Look for first referral date column - keeping for potential future use
+                                first_pt_col = None
+                                possible_first_pt_cols = [
+                                    'Date of first referral',
+                                    'Date of First Referral',
+                                    'Enter date first pt screened at site',
+                                    'Date first pt screened at site',
+                                    'First patient screened',
+                                    'First screening date'
+                                ]
+                                for col in cvlp_site_data.columns:
+                                    col_str = str(col).strip()
+                                    if any(possible.lower() in col_str.lower() for possible in possible_first_pt_cols):
+                                        first_pt_col = col
+                                        break
+                                
+                                # Debug: Show what columns were found (temporary)
+                                site_data_columns = {
+                                    'green_light_col': green_light_col,
+                                    'first_pt_col': first_pt_col,
+                                    'days_since_col': days_since_col,
+                                    'days_to_referral_col': days_to_referral_col,
+                                    'all_columns': list(cvlp_site_data.columns)
+                                }
+                                
+                                # Store the data in a dictionary for quick lookup
+                                for idx, row in cvlp_site_data.iterrows():
+                                    if pd.notna(row[site_col]):
+                                        site_name = row[site_col]
+                                        site_data_dict[site_name] = {}
+                                        
+                                        # Read "Days Since Site Active" (total days since last patient referred / site opened)
+                                        if days_since_col and days_since_col in row.index:
+                                            days_since_value = row[days_since_col]
+                                            if pd.notna(days_since_value):
+                                                try:
+                                                    site_data_dict[site_name]['days_since_last_referral'] = float(days_since_value)
+                                                except:
+                                                    pass
+                                        
+                                        # Read "Days Between Site Open & Referral" (days from site open to first referral)
+                                        if days_to_referral_col and days_to_referral_col in row.index:
+                                            days_to_ref_value = row[days_to_referral_col]
+                                            if pd.notna(days_to_ref_value):
+                                                try:
+                                                    site_data_dict[site_name]['days_to_first_referral'] = float(days_to_ref_value)
+                                                except:
+                                                    pass
+                                        
+                                        # Read green light date and first referral date for potential future use
+                                        if green_light_col and green_light_col in row.index:
+                                            green_light_date = pd.to_datetime(row[green_light_col], errors='coerce')
+                                            site_data_dict[site_name]['green_light_date'] = green_light_date
+                                        
+                                        if first_pt_col and first_pt_col in row.index:
+                                            first_pt_date = pd.to_datetime(row[first_pt_col], errors='coerce')
+                                            site_data_dict[site_name]['first_pt_screened_date'] = first_pt_date
+                                
+                                break
+                    except:
+                        continue
+                
+                if not site_col_found:
+                    # If we can't read the sheet properly, use all 19 CVLP sites (exact names)
+                    official_sites = [
+                        "Coventry and Warwickshire",
+                        "Bath",
+                        "Gloucestershire",
+                        "Univeristy Hospitals Dorset",
+                        "Mid & South Essex - Broomfield",
+                        "Mid & South Essex - Southend",
+                        "Bedfordshire",
+                        "Hull",
+                        "Royal Surrey",
+                        "Royal Berkshire",
+                        "United Lincolnshire",
+                        "York & Scarborough",
+                        "Royal Free (North Middlesex)",
+                        "Barking Havering and Redbridge",
+                        "East & North Herefordshire (Lister)",
+                        "North Cumbria",
+                        "West Suffolk",
+                        "Maidstone",
+                        "Leicester"
+                    ]
+
+            else:
+                # Use all 19 CVLP sites as fallback (exact names)
+                official_sites = [
+                    "Coventry and Warwickshire",
+                    "Bath",
+                    "Gloucestershire",
+                    "Univeristy Hospitals Dorset",
+                    "Mid & South Essex - Broomfield",
+                    "Mid & South Essex - Southend",
+                    "Bedfordshire",
+                    "Hull",
+                    "Royal Surrey",
+                    "Royal Berkshire",
+                    "United Lincolnshire",
+                    "York & Scarborough",
+                    "Royal Free (North Middlesex)",
+                    "Barking Havering and Redbridge",
+                    "East & North Herefordshire (Lister)",
+                    "North Cumbria",
+                    "West Suffolk",
+                    "Maidstone",
+                    "Leicester"
+                ]
+
+                    
+        except Exception:
+            # Use all 19 CVLP sites as fallback on any error (exact names)
+            official_sites = [
+                "Coventry and Warwickshire",
+                "Bath",
+                "Gloucestershire",
+                "Univeristy Hospitals Dorset",
+                "Mid & South Essex - Broomfield",
+                "Mid & South Essex - Southend",
+                "Bedfordshire",
+                "Hull",
+                "Royal Surrey",
+                "Royal Berkshire",
+                "United Lincolnshire",
+                "York & Scarborough",
+                "Royal Free (North Middlesex)",
+                "Barking Havering and Redbridge",
+                "East & North Herefordshire (Lister)",
+                "North Cumbria",
+                "West Suffolk",
+                "Maidstone",
+                "Leicester"
+            ]
+
+    
+    # If we couldn't get official sites, use comprehensive list of all 19 CVLP sites as final fallback (exact names)
+    if not official_sites:
+        official_sites = [
+            "Coventry and Warwickshire",
+            "Bath",
+            "Gloucestershire",
+            "Univeristy Hospitals Dorset",
+            "Mid & South Essex - Broomfield",
+            "Mid & South Essex - Southend",
+            "Bedfordshire",
+            "Hull",
+            "Royal Surrey",
+            "Royal Berkshire",
+            "United Lincolnshire",
+            "York & Scarborough",
+            "Royal Free (North Middlesex)",
+            "Barking Havering and Redbridge",
+            "East & North Herefordshire (Lister)",
+            "North Cumbria",
+            "West Suffolk",
+            "Maidstone",
+            "Leicester"
+        ]
+
+    
+    # Define months for analysis (Apr-25 to current)
+    months = []
+    current_date = datetime.now()
+    start_date = pd.Timestamp('2025-04-01')
+    
+    # Generate month list
+    temp_date = start_date
+    while temp_date <= current_date:
+        months.append({
+            'name': temp_date.strftime('%b-%y'),
+            'start': temp_date,
+            'end': temp_date + pd.DateOffset(months=1) - pd.Timedelta(days=1)
+        })
+        temp_date = temp_date + pd.DateOffset(months=1)
+    
+    month_names = [month['name'] for month in months]
+    sep_2025_end = pd.Timestamp('2025-09-30')
+    aug_2025_end_ts = pd.Timestamp('2025-08-31')
+    
+    # Create performance data structure
+    performance_data = []
+    
+    for site in official_sites:
+        # Initialize site row - all official sites are considered open and active
+        site_row = {
+            'Site name': site,
+            'Site opened': 'Yes'  # All official CVLP sites are open
+        }
+        
+        # Monthly counts for this site (zero for sites without tracker rows)
+        monthly_counts = {
+            'Consented to CVLP': cube.monthly('cvlp_consented', month_names, cvlp_site=site),
+            'Referred to pre-screen': cube.monthly('referred_to_prescreen', month_names, cvlp_site=site),
+            'Referred to main trial': cube.monthly('referred_to_main_trial', month_names, cvlp_site=site),
+            'Consented to pre-screen': cube.monthly('consented_prescreen_dated', month_names, cvlp_site=site),
+        }
+        for m, month_name in enumerate(month_names):
+            for label, counts in monthly_counts.items():
+                site_row[f'{label}_{month_name}'] = int(counts[m])
+        
+        # Calculate site opened date (earliest CVLP consent date for this site)
+        site_opened_date = cube.first_date('cvlp_consented', site)
+        site_opened_date = site_opened_date if pd.notna(site_opened_date) else None
+        
+        # Get days from site open to first referral - prioritize CVLP Site Data sheet
+        days_to_first_referral = None
+        days_to_first_referral_status = None
+        
+        # First try to get from the CVLP Site Data sheet
+        if site in site_data_dict and 'days_to_first_referral' in site_data_dict[site]:
+            days_to_first_referral = site_data_dict[site]['days_to_first_referral']
+        
+        # If not found in CVLP Site Data, calculate it from main tracker data
+        if days_to_first_referral is None:
+            # First referral date (either pre-screen or main trial)
+            first_referral_date = cube.first_date('referred', site)
+            if site_opened_date and pd.notna(first_referral_date):
+                days_to_first_referral = (first_referral_date - site_opened_date).days
+        
+        # Apply color coding
+        if days_to_first_referral is not None:
+            # Color coding: Green <60, Orange 60-90, Red >90
+            if days_to_first_referral > 90:
+                days_to_first_referral_status = 'RED'
+            elif days_to_first_referral >= 60:
+                days_to_first_referral_status = 'ORANGE'
+        else:
+                days_to_first_referral_status = 'GREEN'
+        
+        site_row['Days from site open to first referral'] = days_to_first_referral
+        site_row['Days from site open to first referral (Status)'] = days_to_first_referral_status
+        
+        # Calculate total days since last patient referred / site opened
+        # Formula: Today - date of last referral (or site opened if no referrals)
+        # Use the most recent date from either pre-screening or main trial referral
+        days_since_last_referral = None
+        days_since_last_referral_status = None
+        last_referral_dates = [
+            date for date in (cube.last_date('referred_to_prescreen', site), cube.last_date('referred_to_main_trial', site))
+            if pd.notna(date)
+        ]
+        
+        if last_referral_dates:
+            # Has referrals - use the most recent referral date
+            last_referral_date = max(last_referral_dates)
+            days_since_last_referral = (current_date - last_referral_date).days
+        else:
+            # No referrals yet - use site opened date (first CVLP consent date)
+            if site_opened_date:
+                days_since_last_referral = (current_date - site_opened_date).days
+            else:
+                # If no site opened date either, try to get from CVLP Site Data
+                if site in site_data_dict and 'green_light_date' in site_data_dict[site]:
+                    green_light = site_data_dict[site]['green_light_date']
+                    if pd.notna(green_light):
+                        days_since_last_referral = (current_date - green_light).days
+        
+        # Apply color coding
+        if days_since_last_referral is not None:
+            # Color coding: Green <30, Orange 30-60, Red >60
+            if days_since_last_referral > 60:
+                days_since_last_referral_status = 'RED'
+            elif days_since_last_referral >= 30:
+                days_since_last_referral_status = 'ORANGE'
+            else:
+                days_since_last_referral_status = 'GREEN'
+        
+        site_row['Total days since last patient referred / site opened'] = days_since_last_referral
+        site_row['Total days since last patient referred / site opened (Status)'] = days_since_last_referral_status
+        
+        # Average monthly recruitment and referrals up to the end of Sep-25 and of Aug-25
+        # Formula: Total up to then / (Days site active / 30.44)
+        # Days site active = End of month - Date of first patient screened at site (earliest CVLP consent date)
+        first_screening_date = site_opened_date
+        consents_to = cube.monthly('cvlp_consented', ['Aug-25', 'Sep-25'], cvlp_site=site, cumulative=True)
+        referrals_to = (cube.monthly('referred_to_prescreen', ['Aug-25', 'Sep-25'], cvlp_site=site, cumulative=True) +
+                        cube.monthly('referred_to_main_trial', ['Aug-25', 'Sep-25'], cvlp_site=site, cumulative=True))
+        
+        avg_monthly_recruitment = 0
+        avg_monthly_referrals = 0
+        if first_screening_date and first_screening_date <= sep_2025_end:
+            days_active = (sep_2025_end - first_screening_date).days
+            if days_active > 0:
+                months_active = days_active / 30.44
+                avg_monthly_recruitment = int(consents_to[1]) / months_active
+                avg_monthly_referrals = int(referrals_to[1]) / months_active
+        
+        site_row['Average monthly recruitment up to Sep-25'] = avg_monthly_recruitment
+        site_row['Average monthly referrals up to Sep-25'] = avg_monthly_referrals
+        
+        # Calculate change in average monthly recruitment (comparing current month to previous month)
+        aug_avg_recruitment = 0
+        aug_avg_referrals = 0
+        if first_screening_date and first_screening_date <= aug_2025_end_ts:
+            days_active_aug = (aug_2025_end_ts - first_screening_date).days
+            if days_active_aug > 0:
+                months_active_aug = days_active_aug / 30.44
+                aug_avg_recruitment = int(consents_to[0]) / months_active_aug
+                aug_avg_referrals = int(referrals_to[0]) / months_active_aug
+        
+        # Calculate change from August to September
+        change_in_recruitment = None
+        change_in_referrals = None
+        
+        if aug_avg_recruitment > 0 and avg_monthly_recruitment > 0:
+            change_in_recruitment = ((avg_monthly_recruitment - aug_avg_recruitment) / aug_avg_recruitment) * 100
+        
+        if aug_avg_referrals > 0 and avg_monthly_referrals > 0:
+            change_in_referrals = ((avg_monthly_referrals - aug_avg_referrals) / aug_avg_referrals) * 100
+        
+        site_row['Change in average monthly recruitment'] = change_in_recruitment
+        site_row['Change in average monthly referrals'] = change_in_referrals
+        
+        performance_data.append(site_row)
+    
+    return {
+        'performance_df': pd.DataFrame(performance_data),
+        'official_sites': official_sites,
+        'months': months,
+        'site_data_columns': site_data_columns,
+    }
+
+
+def compute_kpi_snapshot(df, cube=None):
+    """Headline KPI counts shown in the overview tiles, defaulting to 0 for missing columns"""
+    cube = cube if cube is not None else FunnelCube.build(df)
+    return {name: cube.total(name) for name in KPI_SNAPSHOT_COLUMNS}
+
+
+def kpi_snapshot_column_totals(snapshot):
+    """The snapshot's counts keyed by flag column, for KPI plans summing those columns"""
+    return {KPI_SNAPSHOT_COLUMNS[name]: value for name, value in snapshot.items() if name in KPI_SNAPSHOT_COLUMNS}
+
+
+def kpi_snapshot_mismatches(df, snapshot):
+    """Every headline count that disagrees with the flag column sums of ``df``, as (column, KPI, expected, found)"""
+    mismatches = []
+    for name, col in KPI_SNAPSHOT_COLUMNS.items():
+        expected = snapshot.get(name, 0)
+        if col in df.columns:
+            found = int(df[col].fillna(False).astype(bool).sum())
+            if found != expected:
+                mismatches.append((col, name, expected, found))
+    return mismatches
+
+
+def valid_site_values(master_df, site_col):
+    """Distinct site names in a column, skipping blanks and template placeholders"""
+    sites = master_df[site_col].dropna().unique()
+    return [site for site in sites if str(site).strip() != '' and
+            'enter' not in str(site).lower() and
+            'placeholder' not in str(site).lower()]
+
+
+def resolve_trial_site_column(master_df):
+    """Return (trial site column, used CVLP Site demo fallback); the column is None if not found"""
+    trial_site_col = 'Trial Site'
+    if trial_site_col not in master_df.columns:
+        # Try alternative column names
+        possible_trial_site_cols = [
+            'Please choose the Trial site from the drop down',
+            'trial site',
+            'Trial site',
+            'Referring Site',
+            'Site',
+            'Hospital',
+            'Hospital Site'
+        ]
+        for col in possible_trial_site_cols:
+            if col in master_df.columns:
+                trial_site_col = col
+                break
+
+    # If still not found, try to use CVLP Site as fallback for demo data
+    if trial_site_col not in master_df.columns:
+        if 'CVLP Site' in master_df.columns:
+            return 'CVLP Site', True
+        return None, False
+    return trial_site_col, False
+
+
+def resolve_cvlp_site_column(master_df):
+    """Return (CVLP site column, used Trial Site demo fallback); the column is None if not found"""
+    cvlp_site_col = 'CVLP Site'
+    if cvlp_site_col not in master_df.columns:
+        # Try alternative column names
+        possible_site_cols = [
+            'CVLP site',
+            'Please choose the CVLP site from the drop down',
+            'Site',
+            'CVLP Site Name'
+        ]
+        for col in possible_site_cols:
+            if col in master_df.columns:
+                cvlp_site_col = col
+                break
+
+    # If CVLP Site not found, try to use Trial Site as fallback for demo data
+    if cvlp_site_col not in master_df.columns:
+        if 'Trial Site' in master_df.columns:
+            return 'Trial Site', True
+        return None, False
+    return cvlp_site_col, False
@@ -0,0 +1,454 @@
+"""
+Offline snapshot builder and reader for the BNT113 dashboard.
+
+Run on a schedule to compute every table the dashboard shows ahead of time:
+
+    python -m dashboard_snapshot --tracker BNT113-01-Master-Tracker-Local.xlsx \
+        --screening-logs "data/BNT113-01 Screening Logs1.xlsx" --out snapshots
+
+Each run writes a new, immutable directory ``<out>/<snapshot id>/`` with one
+Parquet file per table and a ``manifest.json`` describing the inputs and every
+result, then points ``<out>/LATEST`` at it. The directory is built under a
+temporary name and renamed into place, so readers never see a partial snapshot.
+
+With ``BNT113_SNAPSHOT_DIR`` set, the dashboard serves the latest snapshot
+instead of parsing a tracker, so interactive latency no longer depends on the
+tracker's size.
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass, fields, is_dataclass
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import (
+    PRIVACY_LEVELS, FunnelCube, compute_cvlp_site_performance, compute_kpi_snapshot,
+    compute_monthly_projections, compute_site_based_metrics, compute_trial_referral_reporting,
+    prepare_tracker_data, read_master_tracker, resolve_cvlp_site_column,
+    resolve_trial_site_column, valid_site_values,
+)
+from control_charts import ChartMetric, ControlCharts
+from cpgc_turnaround import compute_cpgc_reporting
+from dashboard_content import CPGC_REPORTING, REPORTING_WORKBOOK_PATH, read_reporting_workbook
+from data_context import build_data_context
+from patient_linkage import link_patients
+from recruitment_forecast import RecruitmentForecast, forecast_recruitment, latest_monthly_actual
+from result_store import dataset_fingerprint
+from sample_logistics import LogisticsLatency
+
+SNAPSHOT_FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+LATEST_POINTER = "LATEST"
+
+# Results whose values depend on the day they were computed (future months show "-");
+# the dashboard keys these by date, so they are served under the snapshot's date
+DATED_RESULTS = {"monthly_projections", "cvlp_site_performance", "recruitment_forecast", "control_charts"}
+# Results built from the CPGC reporting workbook; the dashboard keys these by workbook version
+WORKBOOK_RESULTS = {"cpgc_reporting", "sample_logistics"}
+# Result classes a snapshot may hold, rebuilt field by field on load
+RESULT_CLASSES = {cls.__name__: cls for cls in (RecruitmentForecast, ControlCharts, ChartMetric, LogisticsLatency)}
+
+
+# ---------------------------------------------------------------------------
+# Value encoding
+# ---------------------------------------------------------------------------
+
+def to_json_value(value):
+    """Convert a result value to JSON-safe data, tagging types JSON can't express"""
+    if isinstance(value, dict):
+        return {str(k): to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if value is pd.NaT:
+        return {"__nat__": True}
+    if isinstance(value, pd.Timestamp):
+        return {"__timestamp__": value.isoformat()}
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return value
+
+
+def from_json_value(value):
+    """Inverse of to_json_value"""
+    if isinstance(value, dict):
+        if value.keys() == {"__timestamp__"}:
+            return pd.Timestamp(value["__timestamp__"])
+        if value.keys() == {"__nat__"}:
+            return pd.NaT
+        return {k: from_json_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_json_value(v) for v in value]
+    return value
+
+
+def _is_mixed_object_column(series):
+    # Parquet needs one type per column; e.g. monthly actuals mix counts with "-"
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True).startswith("mixed")
+
+
+def _write_frame(df, path):
+    """Write a frame to Parquet, JSON-encoding mixed-type columns cell by cell"""
+    non_string = [c for c in df.columns if not isinstance(c, str)]
+    if non_string:
+        raise TypeError(f"Parquet needs string column names, got {non_string[:3]}")
+    json_columns = [c for c in df.columns if _is_mixed_object_column(df[c])]
+    if json_columns:
+        df = df.assign(**{
+            c: df[c].map(lambda v: json.dumps(to_json_value(v), allow_nan=True)) for c in json_columns
+        })
+    # Parquet has no second resolution; remember units so frames read back unchanged
+    datetime_dtypes = {c: str(df[c].dtype) for c in df.columns if df[c].dtype.kind == "M"}
+    df.to_parquet(path)
+    return {"type": "frame", "file": os.path.basename(path), "rows": len(df),
+            "json_columns": json_columns, "datetime_dtypes": datetime_dtypes}
+
+
+def _read_frame(directory, spec):
+    df = pd.read_parquet(os.path.join(directory, spec["file"]))
+    for c in spec.get("json_columns", []):
+        df[c] = df[c].map(lambda v: from_json_value(json.loads(v))).astype(object)
+    for c, dtype in spec.get("datetime_dtypes", {}).items():
+        if str(df[c].dtype) != dtype:
+            df[c] = df[c].astype(dtype)
+    return df
+
+
+def _write_result(value, directory, name):
+    """Persist one result; frames become Parquet files, arrays .npy files, everything else lives in the manifest"""
+    if isinstance(value, pd.DataFrame):
+        return _write_frame(value, os.path.join(directory, f"{name}.parquet"))
+    if isinstance(value, np.ndarray):
+        np.save(os.path.join(directory, f"{name}.npy"), value, allow_pickle=False)
+        return {"type": "array", "file": f"{name}.npy"}
+    if is_dataclass(value) and not isinstance(value, type):
+        if type(value).__name__ not in RESULT_CLASSES:
+            raise TypeError(f"{name}: {type(value).__name__} results can't be stored in a snapshot")
+        return {"type": "dataclass", "class": type(value).__name__, "fields": {
+            f.name: _write_result(getattr(value, f.name), directory, f"{name}.{f.name}") for f in fields(value)
+        }}
+    if isinstance(value, tuple) and any(is_dataclass(v) for v in value):
+        return {"type": "tuple", "items": [_write_result(v, directory, f"{name}.{i}") for i, v in enumerate(value)]}
+    if isinstance(value, dict) and any(isinstance(v, pd.DataFrame) for v in value.values()):
+        return {"type": "dict", "items": {k: _write_result(v, directory, f"{name}.{k}") for k, v in value.items()}}
+    if isinstance(value, tuple):
+        return {"type": "value", "value": to_json_value(value), "tuple": True}
+    return {"type": "value", "value": to_json_value(value)}
+
+
+def _read_result(directory, spec):
+    if spec["type"] == "frame":
+        return _read_frame(directory, spec)
+    if spec["type"] == "array":
+        return np.load(os.path.join(directory, spec["file"]), allow_pickle=False)
+    if spec["type"] == "dataclass":
+        return RESULT_CLASSES[spec["class"]](
+            **{k: _read_result(directory, v) for k, v in spec["fields"].items()}
+        )
+    if spec["type"] == "tuple":
+        return tuple(_read_result(directory, v) for v in spec["items"])
+    if spec["type"] == "dict":
+        return {k: _read_result(directory, v) for k, v in spec["items"].items()}
+    value = from_json_value(spec["value"])
+    # JSON has no tuples; dataclass fields such as sites and months are tuples
+    return tuple(value) if isinstance(value, list) and spec.get("tuple") else value
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def compute_dashboard_results(raw_tracker, tracker_bytes, context, privacy_level, timings, linkage=None,
+                              cpgc_reporting=CPGC_REPORTING, include_cube=False, as_of=None, previous_charts=None):
+    """Compute every precomputed table for one privacy level, as the dashboard would
+
+    ``cpgc_reporting`` is the CPGC BNT Reporting table of the reporting workbook.
+    With ``include_cube`` the funnel cube is returned too ("funnel_cube"), for
+    warming the result store; snapshots rebuild it instead of storing it.
+    Dated results are as of ``as_of`` (default now); given the previous
+    ``ControlCharts``, only the months they don't hold are counted.
+    """
+    as_of = pd.Timestamp.now() if as_of is None else pd.Timestamp(as_of)
+    results = {}
+
+    def timed(name, compute):
+        start = time.perf_counter()
+        value = compute()
+        timings[f"{privacy_level} / {name}"] = time.perf_counter() - start
+        if value is not None:
+            results[name] = value
+        return value
+
+    prepared = timed("prepared_tracker", lambda: prepare_tracker_data(raw_tracker, privacy_level))
+    # Every table reads the same funnel cube; it is rebuilt from the prepared tracker on load, not stored
+    start = time.perf_counter()
+    cube = FunnelCube.build(prepared)
+    timings[f"{privacy_level} / funnel_cube"] = time.perf_counter() - start
+    if include_cube:
+        results["funnel_cube"] = cube
+    timed("kpi_snapshot", lambda: compute_kpi_snapshot(prepared, cube))
+    timed("monthly_projections", lambda: compute_monthly_projections(prepared, context, cube, linkage))
+
+    trial_site_col, _ = resolve_trial_site_column(prepared)
+    if trial_site_col is not None and valid_site_values(prepared, trial_site_col):
+        timed("trial_referral_reporting", lambda: compute_trial_referral_reporting(
+            prepared, valid_site_values(prepared, trial_site_col), cube))
+
+    cvlp_site_col, _ = resolve_cvlp_site_column(prepared)
+    if cvlp_site_col is not None and valid_site_values(prepared, cvlp_site_col):
+        timed("site_based_metrics", lambda: compute_site_based_metrics(
+            prepared, valid_site_values(prepared, cvlp_site_col), cube))
+
+    timed("cvlp_site_performance", lambda: compute_cvlp_site_performance(prepared, io.BytesIO(tracker_bytes), cube))
+    # Aggregates of the raw milestone dates; identical at every privacy level
+    timed("cpgc_reporting", lambda: compute_cpgc_reporting(raw_tracker, cpgc_reporting))
+    timed("sample_logistics", lambda: LogisticsLatency.build(prepared, cpgc_reporting))
+
+    monthly = results["monthly_projections"]
+    timed("recruitment_forecast", lambda: forecast_recruitment(
+        prepared, context.site_opening_dates, as_of,
+        baseline_referrals=latest_monthly_actual(monthly, 'Referred - Actual'),
+        baseline_randomised=latest_monthly_actual(monthly, 'Randomised BNT113-01 - Actual'),
+    ))
+    timed("control_charts", lambda: (
+        ControlCharts.build(prepared, context.site_opening_dates, as_of) if previous_charts is None
+        else previous_charts.update(prepared, context.site_opening_dates, as_of)
+    ))
+    return results
+
+
+def result_store_name(name, as_of, workbook_version):
+    """Name the dashboard looks a computed result up under: dated results carry their day, workbook results
+    the reporting workbook's version"""
+    if name in WORKBOOK_RESULTS:
+        return f"{name}@{workbook_version}"
+    return f"{name}@{as_of:%Y-%m-%d}" if name in DATED_RESULTS else name
+
+
+def _file_info(path, content):
+    return {"path": os.path.abspath(path), "fingerprint": dataset_fingerprint(content), "bytes": len(content)}
+
+
+def build_snapshot(tracker_path, out_dir, screening_logs_path=None, header_row=0,
+                   privacy_levels=(PRIVACY_LEVELS[0],), keep=10, reporting_workbook_path=REPORTING_WORKBOOK_PATH):
+    """Compute all dashboard tables and write them as a new snapshot; returns (path, timings)"""
+    as_of = pd.Timestamp.now().floor("s")
+    timings = {}
+
+    with open(tracker_path, "rb") as f:
+        tracker_bytes = f.read()
+    logs_bytes = None
+    if screening_logs_path:
+        with open(screening_logs_path, "rb") as f:
+            logs_bytes = f.read()
+    workbook_bytes = None
+    if reporting_workbook_path and os.path.isfile(reporting_workbook_path):
+        with open(reporting_workbook_path, "rb") as f:
+            workbook_bytes = f.read()
+    cpgc_reporting = read_reporting_workbook(workbook_bytes).cpgc_reporting if workbook_bytes is not None else []
+    inputs_key = dataset_fingerprint(tracker_bytes, logs_bytes)
+
+    start = time.perf_counter()
+    raw_tracker = read_master_tracker(io.BytesIO(tracker_bytes), header=header_row)
+    if raw_tracker.empty:
+        raise ValueError(f"{tracker_path}: the 'CVLP - Master Tracker' sheet has no data rows")
+    timings["read tracker"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    context = build_data_context(
+        inputs_key, io.BytesIO(tracker_bytes), io.BytesIO(logs_bytes) if logs_bytes is not None else None
+    )
+    timings["data context"] = time.perf_counter() - start
+
+    # Linked before any pseudonymization, once for every privacy level
+    start = time.perf_counter()
+    linkage = link_patients(raw_tracker, context.screening_logs.patients)
+    timings["patient linkage"] = time.perf_counter() - start
+
+    snapshot_id = f"{as_of:%Y%m%d-%H%M%S}-{inputs_key[:8]}"
+    os.makedirs(out_dir, exist_ok=True)
+    final_dir = os.path.join(out_dir, snapshot_id)
+    tmp_dir = os.path.join(out_dir, f".tmp-{snapshot_id}-{os.getpid()}")
+    os.makedirs(tmp_dir)
+    try:
+        results = {}
+        for level_index, privacy_level in enumerate(privacy_levels):
+            level_dir = os.path.join(tmp_dir, f"level{level_index}")
+            os.makedirs(level_dir)
+            computed = compute_dashboard_results(raw_tracker, tracker_bytes, context, privacy_level, timings, linkage,
+                                                 cpgc_reporting, as_of=as_of)
+            results[privacy_level] = {
+                "directory": os.path.basename(level_dir),
+                "results": {name: _write_result(value, level_dir, name) for name, value in computed.items()},
+            }
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "snapshot_id": snapshot_id,
+            "as_of": as_of.isoformat(),
+            "inputs": {
+                "tracker": _file_info(tracker_path, tracker_bytes),
+                "screening_logs": _file_info(screening_logs_path, logs_bytes) if logs_bytes is not None else None,
+                "reporting_workbook": (_file_info(reporting_workbook_path, workbook_bytes)
+                                       if workbook_bytes is not None else None),
+                "header_row": header_row,
+                "tracker_columns": [str(c) for c in raw_tracker.columns],
+            },
+            "privacy_levels": results,
+            "timings_seconds": {k: round(v, 4) for k, v in timings.items()},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_latest_pointer(out_dir, snapshot_id)
+    if keep:
+        prune_snapshots(out_dir, keep)
+    return final_dir, timings
+
+
+def _write_latest_pointer(out_dir, snapshot_id):
+    tmp_path = os.path.join(out_dir, f".{LATEST_POINTER}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(snapshot_id)
+    os.replace(tmp_path, os.path.join(out_dir, LATEST_POINTER))
+
+
+def list_snapshots(out_dir):
+    """Complete snapshot ids in ``out_dir``, oldest first"""
+    if not os.path.isdir(out_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(out_dir)
+        if not name.startswith(".") and os.path.isfile(os.path.join(out_dir, name, MANIFEST_NAME))
+    )
+
+
+def prune_snapshots(out_dir, keep):
+    """Delete all but the ``keep`` newest snapshots (never the one LATEST points at)"""
+    latest = latest_snapshot_path(out_dir)
+    for snapshot_id in list_snapshots(out_dir)[:-keep]:
+        path = os.path.join(out_dir, snapshot_id)
+        if latest is None or os.path.abspath(path) != os.path.abspath(latest):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Snapshot:
+    """A loaded snapshot: the manifest plus every result, per privacy level"""
+    snapshot_id: str
+    path: str
+    as_of: pd.Timestamp
+    manifest: dict
+    # privacy level -> result name -> value
+    results: dict
+
+    @property
+    def privacy_levels(self):
+        return list(self.results)
+
+    def store_name(self, name):
+        """Name the dashboard uses for a result in the shared result store"""
+        workbook = self.manifest["inputs"].get("reporting_workbook")
+        return result_store_name(name, self.as_of, workbook["fingerprint"] if workbook else "none")
+
+
+def latest_snapshot_path(out_dir):
+    """Path of the snapshot LATEST points at (or the newest complete one), or None"""
+    pointer = os.path.join(out_dir, LATEST_POINTER)
+    if os.path.isfile(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            path = os.path.join(out_dir, f.read().strip())
+        if os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+            return path
+    snapshots = list_snapshots(out_dir)
+    return os.path.join(out_dir, snapshots[-1]) if snapshots else None
+
+
+def load_snapshot(path):
+    """Read a snapshot directory written by build_snapshot"""
+    with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported snapshot format {manifest.get('format_version')!r}")
+    results = {}
+    for privacy_level, level in manifest["privacy_levels"].items():
+        level_dir = os.path.join(path, level["directory"])
+        results[privacy_level] = {
+            name: _read_result(level_dir, spec) for name, spec in level["results"].items()
+        }
+    return Snapshot(
+        snapshot_id=manifest["snapshot_id"],
+        path=path,
+        as_of=pd.Timestamp(manifest["as_of"]),
+        manifest=manifest,
+        results=results,
+    )
+
+
+def seed_result_store(snapshot, store, dataset_key):
+    """Make the snapshot's results available under the names the dashboard looks up"""
+    for privacy_level, results in snapshot.results.items():
+        for name, value in results.items():
+            store.setdefault(dataset_key, privacy_level, snapshot.store_name(name), value)
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m dashboard_snapshot",
+        description="Precompute the BNT113 dashboard tables into a versioned snapshot directory.",
+    )
+    parser.add_argument("--tracker", required=True, help="Master Tracker workbook (.xlsx)")
+    parser.add_argument("--screening-logs", help="Screening Logs workbook (.xlsx), optional")
+    parser.add_argument("--out", default="snapshots", help="Snapshot directory (default: snapshots)")
+    parser.add_argument("--header-row", type=int, default=0,
+                        help="Row holding the tracker's column headers: 0 for local copies (default), "
+                             "2 for the export uploaded in the dashboard")
+    parser.add_argument("--include-full-data", action="store_true",
+                        help="Also store un-pseudonymized results (admin view); off by default")
+    parser.add_argument("--keep", type=int, default=10, help="Number of snapshots to keep (0 keeps all)")
+    parser.add_argument("--reporting-workbook", default=REPORTING_WORKBOOK_PATH,
+                        help=f"CVLP BNT113 reporting workbook with the CPGC sheets (default: {REPORTING_WORKBOOK_PATH})")
+    args = parser.parse_args(argv)
+
+    privacy_levels = PRIVACY_LEVELS if args.include_full_data else PRIVACY_LEVELS[:1]
+    start = time.perf_counter()
+    try:
+        path, timings = build_snapshot(
+            args.tracker, args.out, args.screening_logs, args.header_row, privacy_levels, args.keep,
+            args.reporting_workbook,
+        )
+    except Exception as e:
+        print(f"Snapshot failed: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Snapshot written to {path}")
+    for step, seconds in timings.items():
+        print(f"  {step:<55} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<55} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Typed data context for the BNT113 dashboard.
+
+Several sections read the same derived datasets: the CVLP site opening dates
+and the screening, CVLP consent and referral columns gathered from every sheet
+of the Screening Logs workbook. They are built once per upload and held in two
+explicit scopes:
+
+- process scope: the shared ResultStore, so every browser session working on
+  the same upload reuses one parse (expires after PROCESS_TTL_SECONDS)
+- session scope: st.session_state, so reruns of one session skip the store
+  entirely (expires after SESSION_TTL_SECONDS, or as soon as the upload changes)
+
+The context is immutable and shared between sessions; treat its frames as read-only.
+Screening Logs patients are kept only as salted identifier hashes (patient_linkage).
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from patient_linkage import RECORD_COLUMNS, screening_log_link_records
+
+PROCESS_SCOPE = "process"
+SESSION_SCOPE = "session"
+
+# How long a built context stays valid in each scope (overridable via environment)
+PROCESS_TTL_SECONDS = int(os.environ.get("BNT113_CONTEXT_PROCESS_TTL", "3600"))
+SESSION_TTL_SECONDS = int(os.environ.get("BNT113_CONTEXT_SESSION_TTL", "900"))
+
+# The context holds no patient identifiers, so it is shared across privacy levels
+CONTEXT_PRIVACY_LEVEL = "n/a"
+CONTEXT_RESULT_NAME = "data_context"
+_SESSION_KEY = "_bnt113_data_context"
+
+# Hardcoded Go-Live dates for ALL 19 CVLP sites (ACTUAL DATES FROM CLIENT)
+# These dates are used to compute "Open Sites - Actual" per month
+HARDCODED_OPENING_DATES = {
+    # May 2025 openings
+    "Coventry and Warwickshire": pd.Timestamp("2025-05-13"),
+    "Bath": pd.Timestamp("2025-05-15"),
+    "Gloucestershire": pd.Timestamp("2025-05-15"),
+    "Univeristy Hospitals Dorset": pd.Timestamp("2025-05-15"),
+    "Mid & South Essex - Broomfield": pd.Timestamp("2025-05-21"),
+    "Mid & South Essex - Southend": pd.Timestamp("2025-05-21"),
+    "Bedfordshire": pd.Timestamp("2025-05-22"),
+    "Hull": pd.Timestamp("2025-05-22"),
+    "Royal Surrey": pd.Timestamp("2025-05-29"),
+
+    # June 2025 openings
+    "Royal Berkshire": pd.Timestamp("2025-06-30"),
+
+    # July 2025 openings
+    "United Lincolnshire": pd.Timestamp("2025-07-17"),
+    "York & Scarborough": pd.Timestamp("2025-07-22"),
+
+    # August 2025 openings
+    "Royal Free (North Middlesex)": pd.Timestamp("2025-08-05"),
+    "Barking Havering and Redbridge": pd.Timestamp("2025-08-08"),
+    "East & North Herefordshire (Lister)": pd.Timestamp("2025-08-12"),
+    "North Cumbria": pd.Timestamp("2025-08-27"),
+
+    # September 2025 openings
+    "West Suffolk": pd.Timestamp("2025-09-19"),
+    "Maidstone": pd.Timestamp("2025-09-24"),
+    "Leicester": pd.Timestamp("2025-09-29"),
+}
+
+
+@dataclass(frozen=True)
+class ScreeningLogs:
+    """Columns gathered from every site sheet of the Screening Logs workbook"""
+    # Single 'Date of Screening' column (drives Reviewed - Actual)
+    screening: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Single 'CVLP Consent Date' column; holds either dates or Yes/No answers
+    cvlp_consent: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Single 'Referral Date' column (drives Referred - Actual)
+    referrals: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Patient link records of every sheet with identifier or stage columns (hashed identifiers only, see patient_linkage)
+    patients: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=RECORD_COLUMNS))
+
+
+@dataclass(frozen=True)
+class DataContext:
+    """Derived datasets shared by the dashboard sections for one set of uploads"""
+    dataset_key: str
+    site_opening_dates: dict
+    # 'HARDCODED', 'CVLP Site Data' or 'NONE'
+    site_opening_source: str
+    screening_logs: ScreeningLogs
+    built_at: float = field(default_factory=time.time)
+
+
+def read_site_opening_dates(uploaded_file):
+    """Read site Go-Live dates from the tracker's 'CVLP Site Data' sheet"""
+    site_opening_data = {}
+    try:
+        cvlp_site_data_df = pd.read_excel(uploaded_file, sheet_name='CVLP Site Data', header=0)
+    except Exception:
+        return site_opening_data
+
+    # Look for site column
+    site_col = None
+    for col in cvlp_site_data_df.columns:
+        if 'site' in str(col).lower() or any(site_name in str(col) for site_name in ['Coventry', 'Bath', 'Gloucestershire']):
+            site_col = col
+            break
+
+    # Look for opening date column with priority:
+    # 1) Go-Live / Green light
+    # 2) Site Active Date
+    # 3) Generic Open/Opening Date
+    date_col = None
+    for col in cvlp_site_data_df.columns:
+        col_lower = str(col).strip().lower()
+        if (
+            'go-live date' in col_lower
+            or 'go live date' in col_lower
+            or 'go live' in col_lower
+            or 'go-live' in col_lower
+            or 'green light' in col_lower
+        ):
+            date_col = col
+            break
+
+    if date_col is None:
+        for col in cvlp_site_data_df.columns:
+            col_lower = str(col).strip().lower()
+            if 'site active' in col_lower and 'date' in col_lower:
+                date_col = col
+                break
+
+    if date_col is None:
+        for col in cvlp_site_data_df.columns:
+            col_lower = str(col).strip().lower()
+            if ('open' in col_lower or 'opening' in col_lower) and 'date' in col_lower:
+                date_col = col
+                break
+
+    if site_col is None or date_col is None:
+        return site_opening_data
+
+    for site_name, opening_date in zip(cvlp_site_data_df[site_col], cvlp_site_data_df[date_col]):
+        if pd.notna(site_name) and pd.notna(opening_date):
+            opening_date_parsed = pd.to_datetime(opening_date, errors='coerce')
+            if pd.notna(opening_date_parsed):
+                site_opening_data[str(site_name)] = opening_date_parsed
+    return site_opening_data
+
+
+def resolve_site_opening_dates(uploaded_file=None):
+    """Return (opening dates, source); hardcoded dates take precedence over the sheet"""
+    if HARDCODED_OPENING_DATES:
+        return dict(HARDCODED_OPENING_DATES), 'HARDCODED'
+    site_opening_data = read_site_opening_dates(uploaded_file) if uploaded_file is not None else {}
+    return site_opening_data, ('CVLP Site Data' if site_opening_data else 'NONE')
+
+
+def _first_matching_column(columns, predicate):
+    for col in columns:
+        if predicate(str(col)):
+            return col
+    return None
+
+
+def _is_screening_date_column(col):
+    col_str = col.strip().lower()
+    return 'date of screening' in col_str or 'screening date' in col_str
+
+
+def _is_cvlp_consent_column(col):
+    # Either "Consented to CVLP" (Yes/No column) or a CVLP consent date column
+    col_str = col.strip().lower()
+    return ('consented to cvlp' in col_str or
+            'cvlp consent' in col_str or
+            ('cvlp' in col_str and ('date' in col_str or 'consent' in col_str)))
+
+
+def _is_referral_date_column(col):
+    col_lower = col.lower()
+    return ('referral' in col_lower or 'referred' in col_lower) and 'date' in col_lower
+
+
+def read_screening_logs(screening_logs_file):
+    """Gather screening, CVLP consent and referral columns from every sheet of the Screening Logs"""
+    if screening_logs_file is None:
+        return ScreeningLogs()
+
+    wanted = (
+        ('screening', _is_screening_date_column, 'Date of Screening'),
+        ('cvlp_consent', _is_cvlp_consent_column, 'CVLP Consent Date'),
+        ('referrals', _is_referral_date_column, 'Referral Date'),
+    )
+    collected = {name: [] for name, _, _ in wanted}
+    patients = []
+    try:
+        # Open the workbook once and parse each site/city sheet from it
+        excel_file = pd.ExcelFile(screening_logs_file)
+        for sheet_name in excel_file.sheet_names:
+            try:
+                sheet_df = excel_file.parse(sheet_name, header=0)
+            except Exception:
+                continue  # Silently skip sheets with errors
+            found = {}
+            for name, predicate, label in wanted:
+                col = _first_matching_column(sheet_df.columns, predicate)
+                found[name] = col
+                if col is not None:
+                    collected[name].append(sheet_df[[col]].set_axis([label], axis=1))
+            patients.append(screening_log_link_records(
+                sheet_df, sheet_name, found['screening'], found['cvlp_consent'], found['referrals']
+            ))
+    except Exception:
+        return ScreeningLogs()
+
+    patients = [frame for frame in patients if not frame.empty]
+    return ScreeningLogs(
+        **{name: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame() for name, frames in collected.items()},
+        patients=pd.concat(patients, ignore_index=True) if patients else pd.DataFrame(columns=RECORD_COLUMNS),
+    )
+
+
+def build_data_context(dataset_key, uploaded_file=None, screening_logs_file=None):
+    """Build the derived datasets for one set of uploads"""
+    site_opening_dates, site_opening_source = resolve_site_opening_dates(uploaded_file)
+    return DataContext(
+        dataset_key=dataset_key,
+        site_opening_dates=site_opening_dates,
+        site_opening_source=site_opening_source,
+        screening_logs=read_screening_logs(screening_logs_file),
+    )
+
+
+def get_shared_data_context(dataset_key, uploaded_file, screening_logs_file, store, ttl=PROCESS_TTL_SECONDS):
+    """Return the process-scope data context, building it at most once per TTL across sessions"""
+    return store.get_or_compute(
+        dataset_key, CONTEXT_PRIVACY_LEVEL, CONTEXT_RESULT_NAME,
+        lambda: build_data_context(dataset_key, uploaded_file, screening_logs_file),
+        ttl=ttl,
+    )
+
+
+def get_data_context(dataset_key, uploaded_file, screening_logs_file, session_state, store,
+                     session_ttl=SESSION_TTL_SECONDS, process_ttl=PROCESS_TTL_SECONDS):
+    """Return the data context for the current uploads, building it at most once per TTL.
+
+    Looks in the session scope first, then the process scope (``store``), and
+    only parses the uploads when neither holds a live context for ``dataset_key``.
+    """
+    now = time.time()
+    pinned = session_state.get(_SESSION_KEY)
+    if pinned is not None:
+        context, expires = pinned
+        if context.dataset_key == dataset_key and now < expires:
+            return context
+
+    context = get_shared_data_context(dataset_key, uploaded_file, screening_logs_file, store, process_ttl)
+    session_state[_SESSION_KEY] = (context, now + session_ttl)
+    return context
@@ -0,0 +1,144 @@
+"""
+Background watcher for the BNT113 dashboard's local data files.
+
+The ops flow copies the Master Tracker from OneDrive onto disk, and without an
+upload the dashboard reads that local copy. This watcher polls the candidate
+paths on a daemon thread. When the file changes it reads the new contents,
+runs the supplied ``ingest`` callable (parse, validate, preprocess) and only
+then swaps the finished dataset in, with a single reference assignment.
+Sessions therefore see either the previous dataset or the new one, never a
+half-loaded state. An optional ``warm`` callable then precomputes what sessions
+will read; it is best effort, so a warming failure never keeps a valid file out.
+
+Polling uses os.stat, so it works the same on Windows network drives and local
+disks, and needs no extra dependencies. A file is only ingested once its size
+and modification time have held steady for one poll, so a copy that is still in
+progress is not picked up.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from result_store import dataset_fingerprint
+
+# Seconds between checks of the local data files (overridable via environment)
+POLL_INTERVAL_SECONDS = float(os.environ.get("BNT113_WATCH_INTERVAL", "5"))
+
+
+@dataclass(frozen=True)
+class LocalDataset:
+    """A fully ingested local data file, ready to be served"""
+    path: str
+    # Content fingerprint of the file the dataset was built from
+    version: str
+    loaded_at: float
+    data: object
+    # Raw file bytes, for sections that read further sheets from the workbook
+    content: bytes = field(repr=False, default=b"")
+
+
+class LocalDataWatcher:
+    """Poll local data files and atomically swap in each new, fully ingested version"""
+
+    def __init__(self, candidate_paths, ingest, interval=POLL_INTERVAL_SECONDS, warm=None):
+        # ``ingest(content, version)`` returns the dataset payload, or raises to reject the file
+        self.candidate_paths = list(candidate_paths)
+        self.ingest = ingest
+        # ``warm(dataset)`` runs after each swap; what it raises is kept in last_warm_error
+        self.warm = warm
+        self.interval = interval
+        self._current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # (path, size, mtime) as seen on the previous poll, and of the last file handled
+        self._seen_signature = None
+        self._handled_signature = None
+        self.last_error = None
+        self.last_warm_error = None
+        self.last_checked = None
+        self.swaps = 0
+
+    @property
+    def current(self):
+        """The latest fully ingested dataset, or None if nothing has loaded yet"""
+        return self._current
+
+    def resolve_path(self):
+        """Return the first candidate path that exists, or None"""
+        for path in self.candidate_paths:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (path, stat.st_size, stat.st_mtime_ns)
+
+    def refresh(self, wait_for_stable=True):
+        """Check the files once; ingest and swap in a changed file. Returns True on a swap."""
+        # Serialise polls from the watcher thread and manual refreshes
+        with self._lock:
+            return self._refresh(wait_for_stable)
+
+    def _refresh(self, wait_for_stable):
+        self.last_checked = time.time()
+        path = self.resolve_path()
+        signature = self._signature(path) if path is not None else None
+        previous, self._seen_signature = self._seen_signature, signature
+        if signature is None or signature == self._handled_signature:
+            return False
+        if wait_for_stable and signature != previous:
+            # Changed since the last poll; wait until the copy has settled
+            return False
+
+        self._handled_signature = signature
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            version = dataset_fingerprint(content)
+            current = self._current
+            if current is not None and current.version == version:
+                # Touched but not modified
+                return False
+            dataset = LocalDataset(path, version, time.time(), self.ingest(content, version), content)
+        except Exception as e:
+            # Keep serving the previous dataset; retry once the file changes again
+            self.last_error = f"{os.path.basename(path)}: {e}"
+            return False
+
+        # Readers take a reference to ``current`` once, so this swap is atomic for them
+        self._current = dataset
+        self.swaps += 1
+        self.last_error = None
+        if self.warm is not None:
+            try:
+                self.warm(dataset)
+                self.last_warm_error = None
+            except Exception as e:
+                self.last_warm_error = f"{os.path.basename(path)}: {e}"
+        return True
+
+    def start(self):
+        """Load the current file synchronously, then keep watching on a daemon thread"""
+        if self._thread is not None:
+            return self
+        self.refresh(wait_for_stable=False)
+        self._thread = threading.Thread(target=self._run, name="bnt113-data-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
@@ -0,0 +1,161 @@
+"""
+Time series of the schema-driven KPI values.
+
+Every time the dashboard computes the KPIs for a dataset version it appends
+one row per KPI to a local columnar store: the dataset version, privacy level,
+as-of date, KPI id, a fingerprint of the KPI's calculation and its value.
+Rows are written as small Parquet parts and folded into a single compacted file
+every COMPACT_EVERY parts; nothing is ever rewritten in place.
+
+The whole store is read once per process into one sorted array pair per
+series, so a tile's week-over-week delta and sparkline are array slices; old
+tracker workbooks are never re-read. A series is keyed by the calculation
+fingerprint, so changing how a KPI is calculated starts a new series instead of
+mixing incomparable values.
+"""
+
+import glob
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from kpi_plan import calculation_fingerprint
+from tracker_history import HISTORY_DIR
+
+# Where the KPI series live (overridable via environment)
+KPI_HISTORY_DIR = os.environ.get("BNT113_KPI_HISTORY_DIR", os.path.join(HISTORY_DIR, "kpis"))
+COMPACTED_NAME = "kpi_history.parquet"
+
+# Parts written before they are folded into the compacted file
+COMPACT_EVERY = 20
+
+# Points shown in a tile sparkline
+SPARKLINE_POINTS = 12
+
+HISTORY_COLUMNS = ['dataset_version', 'privacy_level', 'as_of', 'recorded_at', 'kpi_id', 'calculation', 'value']
+
+
+@dataclass(frozen=True)
+class KPITrend:
+    """Recent history of one KPI, as of one date"""
+    # Values at the last SPARKLINE_POINTS recorded dates up to the as-of date, oldest first
+    values: np.ndarray
+    dates: pd.DatetimeIndex
+    # Change since the latest value recorded at least a week before the last point (None without one)
+    week_delta: float = None
+
+
+class KPIHistory:
+    """Append KPI values per dataset version and read their trends"""
+
+    def __init__(self, directory=KPI_HISTORY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # (privacy level, KPI id, calculation) -> (as-of dates as datetime64[ns] int64, values), sorted by date
+        self._series = None
+        # (dataset version, privacy level) already recorded
+        self._recorded = set()
+        # A recording failure noted by a caller for display; cleared by the next successful record
+        self.last_error = None
+
+    # -- storage ------------------------------------------------------------
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.directory, "part-*.parquet")))
+
+    def _read_rows(self):
+        files = [os.path.join(self.directory, COMPACTED_NAME)] if os.path.isfile(os.path.join(self.directory, COMPACTED_NAME)) else []
+        files += self._parts()
+        if not files:
+            return pd.DataFrame({c: pd.Series(dtype='float64' if c == 'value' else 'str') for c in HISTORY_COLUMNS})
+        return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+
+    def _write_parquet(self, frame, file):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{file}.tmp")
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(self.directory, file))
+
+    def _compact(self):
+        """Fold every part into the compacted file, then drop the parts"""
+        parts = self._parts()
+        self._write_parquet(self._read_rows(), COMPACTED_NAME)
+        for path in parts:
+            os.remove(path)
+
+    def _load(self):
+        if self._series is not None:
+            return
+        rows = self._read_rows()
+        self._recorded = set(zip(rows['dataset_version'], rows['privacy_level']))
+        self._series = {}
+        rows = rows.assign(as_of=pd.to_datetime(rows['as_of'])).sort_values(['as_of', 'recorded_at'], kind='stable')
+        for key, series in rows.groupby(['privacy_level', 'kpi_id', 'calculation'], sort=False):
+            # One point per date: the version recorded last wins
+            series = series.drop_duplicates('as_of', keep='last')
+            self._series[key] = (series['as_of'].to_numpy('datetime64[ns]').astype('int64'),
+                                 series['value'].to_numpy('float64'))
+
+    # -- recording ----------------------------------------------------------
+
+    def is_recorded(self, dataset_version, privacy_level):
+        with self._lock:
+            self._load()
+            return (dataset_version, privacy_level) in self._recorded
+
+    def record(self, dataset_version, privacy_level, as_of, kpi_results):
+        """Append one dataset version's KPI results (SchemaKPIEngine.calculate_kpis); returns whether anything was written"""
+        as_of = pd.Timestamp(as_of).normalize()
+        kpis = {kpi_id: result['config'] for kpi_id, result in kpi_results.items()}
+        valid = [kpi_id for kpi_id, result in kpi_results.items() if 'error' not in result]
+        with self._lock:
+            self._load()
+            if (dataset_version, privacy_level) in self._recorded or not valid:
+                return False
+            recorded_at = time.time()
+            rows = pd.DataFrame({
+                'dataset_version': dataset_version,
+                'privacy_level': privacy_level,
+                'as_of': as_of,
+                'recorded_at': recorded_at,
+                'kpi_id': valid,
+                'calculation': [calculation_fingerprint(kpi_id, kpis) for kpi_id in valid],
+                'value': [float(kpi_results[kpi_id]['value']) for kpi_id in valid],
+            }, columns=HISTORY_COLUMNS)
+            self._write_parquet(rows, f"part-{int(recorded_at * 1000):013d}-{dataset_version[:12]}.parquet")
+            if len(self._parts()) >= COMPACT_EVERY:
+                self._compact()
+
+            for kpi_id, calculation, value in zip(rows['kpi_id'], rows['calculation'], rows['value']):
+                dates, values = self._series.get((privacy_level, kpi_id, calculation), (np.empty(0, 'int64'), np.empty(0)))
+                at = np.searchsorted(dates, as_of.value)
+                if at < len(dates) and dates[at] == as_of.value:
+                    values = values.copy()
+                    values[at] = value
+                else:
+                    dates, values = np.insert(dates, at, as_of.value), np.insert(values, at, value)
+                self._series[(privacy_level, kpi_id, calculation)] = (dates, values)
+            self._recorded.add((dataset_version, privacy_level))
+            self.last_error = None
+            return True
+
+    # -- reading ------------------------------------------------------------
+
+    def trend(self, privacy_level, kpi_id, calculation, as_of=None, points=SPARKLINE_POINTS):
+        """KPITrend of one KPI up to ``as_of`` (default: the latest point), or None if nothing is recorded"""
+        with self._lock:
+            self._load()
+            dates, values = self._series.get((privacy_level, kpi_id, calculation), (None, None))
+        if dates is None:
+            return None
+        end = len(dates) if as_of is None else np.searchsorted(dates, pd.Timestamp(as_of).normalize().value, side='right')
+        if end == 0:
+            return None
+        week_ago = np.searchsorted(dates, dates[end - 1] - pd.Timedelta(days=7).value, side='right')
+        week_delta = float(values[end - 1] - values[week_ago - 1]) if week_ago else None
+        start = max(end - points, 0)
+        return KPITrend(values[start:end], pd.DatetimeIndex(dates[start:end]), week_delta)
@@ -0,0 +1,337 @@
+"""
+Compiled evaluation plans for the schema-driven KPI engine.
+
+A KPI config is compiled once into a KPIPlan: every column the KPIs sum is
+gathered into one value matrix and every row filter (all rows, each time
+window) into one mask matrix, so all sums and windowed sums come out of a
+single matrix product. Per-site breakdowns add one grouped reduction per site
+column, distinct counts one nunique call, and ratios are worked out from the
+other KPIs' values afterwards.
+
+Calculation types:
+
+- derived_column_sum: sum of ``column``
+- ratio: ``numerator`` / ``denominator`` (other KPI ids), times ``scale`` (default 100)
+- distinct_count: distinct non-blank values of ``column``, only rows where ``where`` is true if given
+- time_windowed_sum: sum of ``column`` over rows whose ``date_column`` (a column or a
+  list, earliest date wins) falls in the ``window_days`` up to the as-of date
+- per_site_breakdown: sum of ``column`` per site of ``site_column`` ('cvlp', 'trial'
+  or a column name); the value is the total, the per-site sums are returned as 'breakdown'
+
+Plans are cached by the KPIs' calculations alone, so a config is compiled once
+however many times the KPIs are evaluated, and edits to targets or display
+settings reuse it. evaluate_kpis() goes further and keeps each KPI's value
+under its own calculation fingerprint: after an edit only the KPIs whose
+calculation changed are evaluated again. A KPI whose definition is invalid
+compiles to its fallback value with the reason as 'error'.
+"""
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import resolve_cvlp_site_column, resolve_trial_site_column, valid_site_values
+
+CALCULATION_TYPES = ('derived_column_sum', 'ratio', 'distinct_count', 'time_windowed_sum', 'per_site_breakdown')
+
+# Keys each calculation type needs
+REQUIRED_KEYS = {
+    'derived_column_sum': ('column',),
+    'ratio': ('numerator', 'denominator'),
+    'distinct_count': ('column',),
+    'time_windowed_sum': ('column', 'date_column', 'window_days'),
+    'per_site_breakdown': ('column', 'site_column'),
+}
+
+SITE_COLUMN_RESOLVERS = {'cvlp': resolve_cvlp_site_column, 'trial': resolve_trial_site_column}
+
+# Compiled plans kept, most recently compiled last
+PLAN_CACHE_SIZE = 32
+
+_PLAN_CACHE = {}
+_PLAN_CACHE_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class KPIStep:
+    kpi_id: str
+    kind: str
+    fallback: float
+    # Index into the value columns, mask rows, site columns or distinct columns, by kind
+    column: int = -1
+    mask: int = 0
+    site: int = -1
+    # Ratio operands (KPI ids) and scale
+    numerator: str = None
+    denominator: str = None
+    scale: float = 100.0
+    error: str = None
+
+
+@dataclass(frozen=True)
+class KPIPlan:
+    version: str
+    fingerprint: str
+    steps: tuple
+    # Columns summed by any KPI, in value-matrix order
+    value_columns: tuple
+    # Value columns also needed row by row (time windows, per-site breakdowns)
+    scanned_columns: frozenset
+    # Row filters: None for all rows, else (date columns, window days)
+    masks: tuple
+    # Site columns of per-site breakdowns ('cvlp', 'trial' or a column name)
+    site_columns: tuple
+    # (column, where column or None) of distinct counts
+    distinct_columns: tuple
+
+    def evaluate(self, df, as_of=None, column_totals=None):
+        """Value of every KPI (plus 'breakdown' for per-site KPIs and 'error' for invalid ones), by KPI id.
+
+        ``column_totals`` holds sums already computed elsewhere (e.g. the KPI
+        snapshot), by column; plain column sums over those columns take them
+        as they are, and columns needed for nothing else are not read.
+        """
+        as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+        column_totals = column_totals or {}
+        present = np.array([col in df.columns for col in self.value_columns], dtype=bool)
+        # Columns read from the frame: present, and not fully answered by the given totals
+        needed = present & np.array([col not in column_totals or col in self.scanned_columns
+                                     for col in self.value_columns], dtype=bool)
+
+        # One (rows x columns) value matrix; missing columns stay zero and fall back below
+        values = np.zeros((len(df), len(self.value_columns)), order='F')
+        for i, col in enumerate(self.value_columns):
+            if needed[i]:
+                values[:, i] = _value_column(df[col])
+
+        # One (filters x rows) mask matrix, then every sum at once
+        masks = np.ones((len(self.masks), len(df)))
+        for m, spec in enumerate(self.masks):
+            if spec is not None:
+                masks[m] = _window_mask(df, spec[0], spec[1], as_of)
+        sums = masks @ values
+
+        breakdowns = [self._site_sums(df, site, values) for site in self.site_columns]
+        distinct = [_distinct_count(df, col, where) for col, where in self.distinct_columns]
+
+        results = {}
+        for step in self.steps:
+            result = {'value': step.fallback}
+            if step.error:
+                result['error'] = step.error
+            elif step.kind == 'derived_column_sum' and self.value_columns[step.column] in column_totals:
+                result['value'] = column_totals[self.value_columns[step.column]]
+            elif step.kind in ('derived_column_sum', 'time_windowed_sum'):
+                if present[step.column]:
+                    result['value'] = _number(sums[step.mask, step.column])
+            elif step.kind == 'per_site_breakdown':
+                breakdown = breakdowns[step.site]
+                if present[step.column] and breakdown is not None:
+                    sites, site_sums = breakdown
+                    result['breakdown'] = {site: _number(v) for site, v in zip(sites, site_sums[:, step.column])}
+                    result['value'] = _number(sums[0, step.column])
+            elif step.kind == 'distinct_count':
+                if distinct[step.column] is not None:
+                    result['value'] = distinct[step.column]
+            results[step.kpi_id] = result
+
+        # Ratios last, from the values above
+        for step in self.steps:
+            if step.kind == 'ratio' and not step.error:
+                numerator = results[step.numerator]['value']
+                denominator = results[step.denominator]['value']
+                results[step.kpi_id]['value'] = numerator / denominator * step.scale if denominator else step.fallback
+        return results
+
+    def _site_sums(self, df, site_column, values):
+        """(sites, per-site sums of every value column), or None without a site column"""
+        resolver = SITE_COLUMN_RESOLVERS.get(site_column)
+        col = resolver(df)[0] if resolver else (site_column if site_column in df.columns else None)
+        if col is None:
+            return None
+        sites = valid_site_values(df, col)
+        codes = pd.Categorical(df[col], categories=sites).codes
+        in_site = codes >= 0
+        sums = np.zeros((len(sites), values.shape[1]))
+        np.add.at(sums, codes[in_site], values[in_site])
+        return [str(site) for site in sites], sums
+
+
+def _value_column(values):
+    """A summed column as floats; blanks and text that isn't a number count as zero"""
+    # NumPy booleans and integers can't be missing
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biu':
+        return values.to_numpy()
+    return np.nan_to_num(pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan))
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _window_mask(df, date_columns, window_days, as_of):
+    """1.0 for rows whose earliest date falls in the window ending on ``as_of``"""
+    dates = [pd.to_datetime(df[col], errors='coerce') for col in date_columns if col in df.columns]
+    if not dates:
+        return np.zeros(len(df))
+    earliest = dates[0] if len(dates) == 1 else pd.concat(dates, axis=1).min(axis=1)
+    end = as_of + pd.Timedelta(days=1)
+    return ((earliest >= end - pd.Timedelta(days=window_days)) & (earliest < end)).to_numpy(dtype=float)
+
+
+def _distinct_count(df, column, where):
+    if column not in df.columns:
+        return None
+    values = df[column]
+    if where is not None:
+        if where not in df.columns:
+            return None
+        values = values[df[where].fillna(False).astype(bool)]
+    values = values.dropna().astype(str).str.strip()
+    return int(values[values != ''].nunique())
+
+
+def _hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def config_fingerprint(config):
+    """Hash of the KPIs' calculations; targets, display settings and metadata don't change it"""
+    return _hash({kpi_id: kpi.get('calculation', {}) for kpi_id, kpi in config.get('kpis', {}).items()})
+
+
+def calculation_fingerprint(kpi_id, kpis):
+    """Hash of one KPI's calculation, including the calculations of a ratio's operands"""
+    calculation = kpis[kpi_id].get('calculation', {})
+    parts = [calculation]
+    if calculation.get('type') == 'ratio':
+        parts += [kpis.get(calculation.get(key), {}).get('calculation') for key in ('numerator', 'denominator')]
+    return _hash(parts)
+
+
+def check_calculation(calculation, kpis):
+    """Reason the calculation can't be compiled, or None"""
+    kind = calculation.get('type')
+    if kind not in CALCULATION_TYPES:
+        return f"Unknown calculation type {kind!r}"
+    missing = [key for key in REQUIRED_KEYS[kind] if calculation.get(key) in (None, '', [])]
+    if missing:
+        return f"{kind} needs {', '.join(missing)}"
+    if kind == 'ratio':
+        for key in ('numerator', 'denominator'):
+            operand = calculation[key]
+            if operand not in kpis:
+                return f"{key} {operand!r} is not a KPI"
+            if kpis[operand].get('calculation', {}).get('type') == 'ratio':
+                return f"{key} {operand!r} is itself a ratio"
+    if kind == 'time_windowed_sum':
+        try:
+            window_days = float(calculation['window_days'])
+        except (TypeError, ValueError):
+            window_days = 0
+        if not window_days > 0:
+            return "window_days must be a positive number"
+    return None
+
+
+def compile_plan(config):
+    """Compile a KPI config ({'metadata': ..., 'kpis': {id: {'calculation': ...}}}) into a KPIPlan"""
+    kpis = config.get('kpis', {})
+    value_columns, masks, site_columns, distinct_columns = [], [None], [], []
+
+    def index(items, item):
+        if item not in items:
+            items.append(item)
+        return items.index(item)
+
+    steps = []
+    for kpi_id, kpi_config in kpis.items():
+        calculation = kpi_config.get('calculation', {})
+        fallback = calculation.get('fallback_value', 0)
+        kind = calculation.get('type')
+        error = check_calculation(calculation, kpis)
+        if error:
+            steps.append(KPIStep(kpi_id, kind, fallback, error=error))
+            continue
+
+        if kind == 'ratio':
+            steps.append(KPIStep(kpi_id, kind, fallback, numerator=calculation['numerator'],
+                                 denominator=calculation['denominator'], scale=float(calculation.get('scale', 100))))
+        elif kind == 'distinct_count':
+            column = index(distinct_columns, (calculation['column'], calculation.get('where')))
+            steps.append(KPIStep(kpi_id, kind, fallback, column=column))
+        else:
+            column = index(value_columns, calculation['column'])
+            mask = site = 0
+            if kind == 'time_windowed_sum':
+                date_columns = calculation['date_column']
+                date_columns = tuple(date_columns) if isinstance(date_columns, (list, tuple)) else (date_columns,)
+                mask = index(masks, (date_columns, float(calculation['window_days'])))
+            elif kind == 'per_site_breakdown':
+                site = index(site_columns, calculation['site_column'])
+            steps.append(KPIStep(kpi_id, kind, fallback, column=column, mask=mask, site=site))
+
+    return KPIPlan(
+        version=str(config.get('metadata', {}).get('version', '')),
+        fingerprint=config_fingerprint(config),
+        steps=tuple(steps),
+        value_columns=tuple(value_columns),
+        scanned_columns=frozenset(
+            value_columns[step.column] for step in steps
+            if step.kind in ('time_windowed_sum', 'per_site_breakdown') and not step.error
+        ),
+        masks=tuple(masks),
+        site_columns=tuple(site_columns),
+        distinct_columns=tuple(distinct_columns),
+    )
+
+
+def get_plan(config):
+    """Compiled plan for a config, compiled once per set of calculations"""
+    key = config_fingerprint(config)
+    with _PLAN_CACHE_LOCK:
+        plan = _PLAN_CACHE.get(key)
+    if plan is None:
+        # Compiled outside the lock; a plan compiled twice by racing sessions is identical
+        plan = compile_plan(config)
+        with _PLAN_CACHE_LOCK:
+            plan = _PLAN_CACHE.setdefault(key, plan)
+            while len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+                _PLAN_CACHE.pop(next(iter(_PLAN_CACHE)))
+    return plan
+
+
+def evaluate_kpis(config, df, as_of=None, cache=None, column_totals=None):
+    """Value of every KPI, evaluating only the KPIs whose calculation has no entry in ``cache``.
+
+    ``cache`` is looked up with ``get(fingerprint)`` and filled with
+    ``setdefault(fingerprint, result)`` per calculation fingerprint (a dict or a
+    result_store.ResultStoreView), and must belong to one dataset, privacy level
+    and as-of date. Cached results are shared and never modified. Without a
+    cache every KPI is evaluated. ``column_totals`` is passed on to
+    KPIPlan.evaluate.
+    """
+    if cache is None:
+        return get_plan(config).evaluate(df, as_of, column_totals)
+    kpis = config.get('kpis', {})
+    fingerprints = {kpi_id: calculation_fingerprint(kpi_id, kpis) for kpi_id in kpis}
+    results = {kpi_id: cache.get(fingerprints[kpi_id]) for kpi_id in kpis}
+    stale = [kpi_id for kpi_id, result in results.items() if result is None]
+    if stale:
+        # A stale ratio needs its operands in the same plan
+        needed = set(stale)
+        for kpi_id in stale:
+            calculation = kpis[kpi_id].get('calculation', {})
+            if calculation.get('type') == 'ratio':
+                needed.update(calculation.get(key) for key in ('numerator', 'denominator') if calculation.get(key) in kpis)
+        partial = {'metadata': config.get('metadata', {}), 'kpis': {k: v for k, v in kpis.items() if k in needed}}
+        values = get_plan(partial).evaluate(df, as_of, column_totals)
+        for kpi_id in stale:
+            # Another session may have stored the same calculation meanwhile; keep the first
+            results[kpi_id] = cache.setdefault(fingerprints[kpi_id], values[kpi_id])
+    return results
@@ -0,0 +1,132 @@
+"""
+YAML KPI schemas for the schema-driven KPI engine.
+
+KPI definitions and the tile layout live in config/kpi_schema.yaml
+(BNT113_KPI_SCHEMA to use another file). A file is parsed and validated as a
+whole; a file with any error is rejected with every problem listed, so a bad
+edit never reaches the dashboard.
+
+Hot reload reuses LocalDataWatcher: the file is polled on a daemon thread and
+each new, valid version is swapped in with its KPI plan already compiled. An
+invalid edit keeps the previous schema live and records the error on the
+watcher. Plans are cached by the KPIs' calculations (see kpi_plan), so edits to
+targets, names or layout reuse the compiled plan and the computed KPI values.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+import yaml
+
+from data_watcher import POLL_INTERVAL_SECONDS, LocalDataWatcher
+from kpi_plan import check_calculation, config_fingerprint, get_plan
+
+KPI_SCHEMA_PATH = os.environ.get("BNT113_KPI_SCHEMA", os.path.join("config", "kpi_schema.yaml"))
+
+LAYOUT_TYPES = ('4_columns', '3_columns_centered', 'equal_columns')
+
+
+class KPISchemaError(ValueError):
+    """A KPI schema file that can't be used; ``problems`` lists every reason"""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("; ".join(self.problems))
+
+
+@dataclass(frozen=True)
+class KPISchema:
+    # {'metadata': ..., 'kpis': ..., 'dashboard_layout': ...}, as read from the file
+    config: dict
+    # Content fingerprint of the file
+    version: str
+    # Fingerprint of the KPIs' calculations; unchanged by target, display and layout edits
+    plan_fingerprint: str
+    loaded_at: float
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_kpi_config(config):
+    """Every problem with a KPI config, as messages naming the KPI or section (empty if valid)"""
+    if not isinstance(config, dict):
+        return ["the file must hold a mapping with 'metadata', 'kpis' and 'dashboard_layout'"]
+    problems = []
+    metadata = config.get('metadata', {})
+    if not isinstance(metadata, dict) or not metadata.get('version'):
+        problems.append("metadata.version is required")
+
+    kpis = config.get('kpis')
+    if not isinstance(kpis, dict) or not kpis:
+        return problems + ["'kpis' must map KPI ids to definitions"]
+    for kpi_id, kpi in kpis.items():
+        if not isinstance(kpi, dict):
+            problems.append(f"{kpi_id}: definition must be a mapping")
+            continue
+        if not kpi.get('name'):
+            problems.append(f"{kpi_id}: name is required")
+        calculation = kpi.get('calculation')
+        if not isinstance(calculation, dict):
+            problems.append(f"{kpi_id}: calculation must be a mapping")
+        else:
+            error = check_calculation(calculation, kpis)
+            if error:
+                problems.append(f"{kpi_id}: {error}")
+            if not _is_number(calculation.get('fallback_value', 0)):
+                problems.append(f"{kpi_id}: fallback_value must be a number")
+        display = kpi.get('display', {})
+        if not isinstance(display, dict):
+            problems.append(f"{kpi_id}: display must be a mapping")
+        elif 'format' in display:
+            try:
+                str(display['format']).format(1.5)
+            except (ValueError, IndexError, KeyError):
+                problems.append(f"{kpi_id}: display.format {display['format']!r} is not a number format")
+        target = kpi.get('targets', {}).get('default', 0) if isinstance(kpi.get('targets', {}), dict) else None
+        if not _is_number(target) or target < 0:
+            problems.append(f"{kpi_id}: targets.default must be a number of at least 0")
+
+    layout = config.get('dashboard_layout', {})
+    sections = layout.get('sections', {}) if isinstance(layout, dict) else None
+    if not isinstance(sections, dict):
+        problems.append("dashboard_layout.sections must map section ids to sections")
+        return problems
+    for section_id, section in sections.items():
+        if not isinstance(section, dict) or not isinstance(section.get('kpis'), list):
+            problems.append(f"{section_id}: section needs a list of kpis")
+            continue
+        unknown = [kpi_id for kpi_id in section['kpis'] if kpi_id not in kpis]
+        if unknown:
+            problems.append(f"{section_id}: unknown KPIs {', '.join(map(str, unknown))}")
+        if section.get('layout', '4_columns') not in LAYOUT_TYPES:
+            problems.append(f"{section_id}: layout must be one of {', '.join(LAYOUT_TYPES)}")
+    return problems
+
+
+def parse_kpi_schema(content, version):
+    """Parse and validate schema file contents; raises KPISchemaError listing every problem"""
+    try:
+        config = yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise KPISchemaError([f"not valid YAML: {e}"]) from e
+    problems = validate_kpi_config(config)
+    if problems:
+        raise KPISchemaError(problems)
+    # Compile now, so the first render after a reload finds the plan ready
+    get_plan(config)
+    return KPISchema(config, version, config_fingerprint(config), time.time())
+
+
+def load_kpi_schema(path=KPI_SCHEMA_PATH):
+    """Read one schema file synchronously"""
+    with open(path, "rb") as f:
+        content = f.read()
+    return parse_kpi_schema(content, None)
+
+
+def kpi_schema_watcher(path=KPI_SCHEMA_PATH, interval=POLL_INTERVAL_SECONDS):
+    """Started watcher whose ``current.data`` is the latest valid KPISchema (None until one loads)"""
+    return LocalDataWatcher([path], parse_kpi_schema, interval=interval).start()
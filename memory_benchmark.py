@@ -0,0 +1,134 @@
+"""
+Peak memory of the dashboard's analytics path on a large synthetic tracker.
+
+    python -m memory_benchmark --tracker "data/BNT113-01 Master Tracker v1 15-Apr-2025.xlsx" --rows 100000
+
+The tracker's rows are repeated up to the requested size, with identifiers made
+unique. Then every table the dashboard computes for a privacy level is
+recomputed from scratch once per rerun, as on a cache miss (see
+dashboard_snapshot.compute_dashboard_results). Each rerun reports its peak
+resident set size where the OS lets it be reset (Linux), and its peak traced
+allocation. Run it on two trees to compare them. With --budget-mb the command
+fails when a rerun's peak traced allocation exceeds the budget
+(tests/test_memory_budget.py holds the recorded budget).
+"""
+
+import argparse
+import gc
+import io
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from dashboard_metrics import PRIVACY_LEVELS, SENSITIVE_COLUMNS, read_master_tracker
+from dashboard_snapshot import compute_dashboard_results
+from data_context import build_data_context
+from patient_linkage import link_patients
+
+# Identifier columns suffixed per repetition so the synthetic patients stay distinct
+SYNTHETIC_ID_COLUMNS = [*SENSITIVE_COLUMNS, 'Screening Number']
+
+
+def synthetic_tracker(raw_tracker, rows):
+    """The tracker's rows repeated to ``rows`` rows, identifiers suffixed with the repetition"""
+    repeats = -(-rows // len(raw_tracker))
+    df = pd.concat([raw_tracker] * repeats, ignore_index=True).iloc[:rows]
+    repetition = pd.Series(df.index // len(raw_tracker), index=df.index).astype('str')
+    for col in SYNTHETIC_ID_COLUMNS:
+        if col in df.columns:
+            df[col] = (df[col].astype('str') + '-' + repetition).where(df[col].notna())
+    return df
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter; False where that isn't possible"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss(field="VmHWM"):
+    """Peak RSS since the last reset (or the current RSS with field="VmRSS"), in bytes"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def measure_rerun(raw_tracker, tracker_bytes, context, privacy_level, linkage, trace=True):
+    """(seconds, RSS before, peak RSS, peak traced bytes) of one uncached rerun; None where not measured"""
+    gc.collect()
+    rss = _reset_peak_rss()
+    rss_before = _rss("VmRSS") if rss else None
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    compute_dashboard_results(raw_tracker, tracker_bytes, context, privacy_level, {}, linkage)
+    elapsed = time.perf_counter() - start
+    traced = None
+    if trace:
+        traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, rss_before, _rss() if rss else None, traced
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m memory_benchmark",
+        description="Peak memory per rerun of the dashboard tables on a large synthetic tracker.",
+    )
+    parser.add_argument("--tracker", required=True, help="Master Tracker workbook (.xlsx) to enlarge")
+    parser.add_argument("--screening-logs", help="Screening Logs workbook (.xlsx), optional")
+    parser.add_argument("--header-row", type=int, default=0, help="Row holding the tracker's column headers (default 0)")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in the synthetic tracker (default 100000)")
+    parser.add_argument("--reruns", type=int, default=3, help="Reruns to measure (default 3)")
+    parser.add_argument("--privacy-level", default=PRIVACY_LEVELS[0], choices=PRIVACY_LEVELS)
+    parser.add_argument("--no-trace", action="store_true", help="Skip tracemalloc (faster; RSS only)")
+    parser.add_argument("--budget-mb", type=float,
+                        help="Fail when a rerun's peak traced allocation exceeds this many MB")
+    args = parser.parse_args(argv)
+    if args.budget_mb is not None and args.no_trace:
+        parser.error("--budget-mb needs tracemalloc; drop --no-trace")
+
+    try:
+        with open(args.tracker, "rb") as f:
+            tracker_bytes = f.read()
+        logs = None
+        if args.screening_logs:
+            with open(args.screening_logs, "rb") as f:
+                logs = io.BytesIO(f.read())
+        raw = read_master_tracker(io.BytesIO(tracker_bytes), header=args.header_row)
+        if raw.empty:
+            raise ValueError(f"{args.tracker}: the 'CVLP - Master Tracker' sheet has no data rows")
+    except (OSError, ValueError) as e:
+        print(f"Memory benchmark failed: {e}", file=sys.stderr)
+        return 1
+
+    tracker = synthetic_tracker(raw, args.rows)
+    context = build_data_context("memory-benchmark", io.BytesIO(tracker_bytes), logs)
+    linkage = link_patients(tracker, context.screening_logs.patients)
+    size = tracker.memory_usage(deep=True).sum() / 2**20
+    print(f"Synthetic tracker: {len(tracker)} rows x {len(tracker.columns)} columns, {size:.1f} MB")
+    over_budget = False
+    for rerun in range(1, args.reruns + 1):
+        elapsed, rss_before, rss, traced = measure_rerun(tracker, tracker_bytes, context, args.privacy_level, linkage,
+                                                         trace=not args.no_trace)
+        rss_text = (f"{rss / 2**20:8.1f} MB (+{(rss - rss_before) / 2**20:.1f})" if rss is not None
+                    else "     n/a")
+        traced_text = f"{traced / 2**20:8.1f} MB" if traced is not None else "     n/a"
+        print(f"Rerun {rerun}: peak RSS {rss_text}   peak allocated {traced_text}   {elapsed:6.2f} s")
+        over_budget = over_budget or (args.budget_mb is not None and traced > args.budget_mb * 2**20)
+    if over_budget:
+        print(f"Peak allocation over the {args.budget_mb:.1f} MB budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Patient record linkage between the Screening Logs and the Master Tracker.
+
+Both sources record the same CVLP patients, so counting a stage in each and
+adding (or taking the larger) either double-counts or under-counts. Every
+record is reduced to salted hashes of its identifiers, and records are linked
+through a blocking index of composite keys (LINK_KEYS):
+
+- the NHS number, on its own
+- CVLP site and screening number (screening numbers are issued per site)
+- CVLP site, year of birth and CVLP Participant ID
+
+The two sources spell sites differently ('Royal Surrey' / 'Royal Surrey County',
+'BHRUT' / 'Barking Havering and Redbridge', typos), so site names from both
+are first mapped onto one canonical site table (canonical_sites): abbreviations
+are expanded (SITE_ALIASES), words match despite small typos, and a name whose
+words appear in order within exactly one longer name ('Southend' ~ 'Mid & South
+Essex - Southend') is that site.
+
+Records sharing any key are the same patient; the links are closed
+transitively with a union-find, so the whole linkage is a few hash joins and
+runs in near-linear time. Raw identifiers are hashed as they are read and
+never kept. The salt is generated per process, so keys can't be compared
+across processes or persisted. Records without identifiers (for example log
+sheets that only record dates) can't be linked and stay patients of their own.
+
+The linked patient set holds, per patient, the earliest screening, referral
+and CVLP consent date from either source; cumulative counts over it count each
+patient once.
+"""
+
+import difflib
+import hashlib
+import re
+import secrets
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import funnel_stage_events, parse_day_first_dates, resolve_cvlp_site_column
+
+LINK_SALT = secrets.token_hex(16)
+
+# Identifier columns hashed into link keys, by key field
+IDENTIFIER_COLUMNS = {
+    'nhs': ('NHS Number', 'NHS number'),
+    'participant': ('CVLP Participant ID',),
+    'screening': ('Screening Number', 'Screening number'),
+}
+BIRTH_YEAR_COLUMNS = ('Participant Year of Birth', 'Year of Birth', 'Date of Birth')
+
+# Composite blocking keys; records agreeing on every field of one key are linked
+LINK_KEYS = (
+    ('nhs',),
+    ('site', 'screening'),
+    ('site', 'birth_year', 'participant'),
+)
+
+# Site abbreviations, by normalized site name
+SITE_ALIASES = {
+    'bhrut': 'barking havering and redbridge',
+}
+# Site name words this similar (difflib ratio) are the same word, when both are at least SITE_TYPO_MIN_LENGTH long
+SITE_TYPO_RATIO = 0.8
+SITE_TYPO_MIN_LENGTH = 5
+
+LINK_STAGES = ('screened', 'referred', 'cvlp_consented')
+RECORD_COLUMNS = ['source', 'site', 'birth_year', *IDENTIFIER_COLUMNS, *LINK_STAGES]
+
+
+def _hash_values(values, salt=LINK_SALT):
+    """Salted hash per value (None for blanks); whitespace and case are ignored"""
+    def one(value):
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        text = re.sub(r'\s+', '', str(value)).upper()
+        return hashlib.sha256(f"{salt}:{text}".encode()).hexdigest()[:16] if text else None
+    return pd.Series([one(v) for v in values], index=values.index, dtype=object)
+
+
+def normalize_site(values):
+    """Site names compared case- and punctuation-insensitively, with abbreviations expanded"""
+    normalized = (
+        values.astype('str').str.lower().str.replace('&', ' and ', regex=False)
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+    )
+    return normalized.replace(SITE_ALIASES).where(values.notna())
+
+
+def _same_word(a, b):
+    if a == b:
+        return True
+    return (min(len(a), len(b)) >= SITE_TYPO_MIN_LENGTH
+            and difflib.SequenceMatcher(None, a, b).ratio() >= SITE_TYPO_RATIO)
+
+
+def _words_within(short, long):
+    """Whether the words of ``short`` appear in order, next to each other, within ``long``"""
+    return bool(short) and any(
+        all(_same_word(a, b) for a, b in zip(short, long[i:i + len(short)]))
+        for i in range(len(long) - len(short) + 1)
+    )
+
+
+def canonical_sites(names):
+    """Canonical site name per normalized site name, shared by every source
+
+    Names are taken longest first; a name matching exactly one site already in the
+    table is that site, otherwise it starts a site of its own (so 'Mid and South
+    Essex' matching both of its hospitals stays apart from either).
+    """
+    table = []
+    canonical = {}
+    for name in sorted(set(names), key=lambda name: (-len(name.split()), name)):
+        words = name.split()
+        matches = [site for site in table if _words_within(words, site.split())]
+        if len(matches) == 1:
+            canonical[name] = matches[0]
+        else:
+            table.append(name)
+            canonical[name] = name
+    return canonical
+
+
+def _birth_years(df):
+    col = next((c for c in BIRTH_YEAR_COLUMNS if c in df.columns), None)
+    if col is None:
+        return pd.Series(np.nan, index=df.index)
+    values = df[col]
+    years = pd.to_numeric(values, errors='coerce')
+    # Full dates of birth give their year
+    dates = parse_day_first_dates(values.where(years.isna()))
+    return years.where(years.notna(), dates.dt.year)
+
+
+def _identifier_keys(df):
+    keys = {}
+    for field, columns in IDENTIFIER_COLUMNS.items():
+        col = next((c for c in columns if c in df.columns), None)
+        keys[field] = _hash_values(df[col]) if col is not None else pd.Series(None, index=df.index, dtype=object)
+    return keys
+
+
+def tracker_link_records(raw_tracker):
+    """Link records of the raw (not pseudonymized) Master Tracker"""
+    site_col, _ = resolve_cvlp_site_column(raw_tracker)
+    events = funnel_stage_events(raw_tracker)
+    return pd.DataFrame({
+        'source': 'tracker',
+        'site': normalize_site(raw_tracker[site_col]) if site_col is not None else None,
+        'birth_year': _birth_years(raw_tracker),
+        **_identifier_keys(raw_tracker),
+        'screened': pd.NaT,
+        'referred': events['referred'][1],
+        'cvlp_consented': events['cvlp_consented'][1],
+    }, index=raw_tracker.index, columns=RECORD_COLUMNS).reset_index(drop=True)
+
+
+def screening_log_link_records(sheet_df, sheet_name, screening_col=None, consent_col=None, referral_col=None):
+    """Link records of one Screening Logs sheet; empty if the sheet has neither identifier nor stage columns.
+
+    A 'Consented to CVLP' answer of Yes dates the consent at the screening date.
+    Rows with no identifier and no stage date are dropped.
+    """
+    has_identifiers = any(col in sheet_df.columns for columns in IDENTIFIER_COLUMNS.values() for col in columns)
+    if not has_identifiers and screening_col is None and consent_col is None and referral_col is None:
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+
+    def dates(col):
+        if col is None:
+            return pd.Series(pd.NaT, index=sheet_df.index)
+        return parse_day_first_dates(sheet_df[col])
+
+    screened = dates(screening_col)
+    consented = dates(None)
+    if consent_col is not None:
+        # Either Yes/No answers or consent dates
+        answered_yes = sheet_df[consent_col].astype('str').str.strip().str.lower() == 'yes'
+        consented = screened.where(answered_yes, parse_day_first_dates(sheet_df[consent_col].where(~answered_yes)))
+    site = sheet_df['Site'].where(sheet_df['Site'].notna(), sheet_name) if 'Site' in sheet_df.columns else pd.Series(sheet_name, index=sheet_df.index)
+    records = pd.DataFrame({
+        'source': 'logs',
+        'site': normalize_site(site),
+        'birth_year': _birth_years(sheet_df),
+        **_identifier_keys(sheet_df),
+        'screened': screened,
+        'referred': dates(referral_col),
+        'cvlp_consented': consented,
+    }, index=sheet_df.index, columns=RECORD_COLUMNS)
+    return records[records[[*IDENTIFIER_COLUMNS, *LINK_STAGES]].notna().any(axis=1)].reset_index(drop=True)
+
+
+def _link_components(records):
+    """Patient number per record: connected components of the records sharing any link key"""
+    parent = np.arange(len(records))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for fields in LINK_KEYS:
+        parts = records[list(fields)]
+        complete = parts.notna().all(axis=1).to_numpy()
+        if not complete.any():
+            continue
+        parts = parts[complete].astype('str')
+        key = parts.iloc[:, 0]
+        for field in fields[1:]:
+            key = key + '|' + parts[field]
+        positions = np.flatnonzero(complete)
+        # Link every record to the first record with the same key
+        codes, _ = pd.factorize(key)
+        _, first = np.unique(codes, return_index=True)
+        for i, j in zip(positions, positions[first[codes]]):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(i) for i in range(len(records))], dtype=np.int64)
+    return pd.factorize(roots)[0]
+
+
+@dataclass(frozen=True)
+class PatientLinkage:
+    """Screening Logs and Master Tracker records linked into one patient set"""
+    # One row per source record: source, site, birth year, hashed identifiers, stage dates and 'patient'
+    records: pd.DataFrame
+    # One row per patient: in_logs, in_tracker and the earliest date of each stage from either source
+    patients: pd.DataFrame
+
+    @classmethod
+    def build(cls, tracker_records, log_records):
+        records = pd.concat([tracker_records, log_records], ignore_index=True)
+        records['site'] = records['site'].map(canonical_sites(records['site'].dropna()))
+        for stage in LINK_STAGES:
+            records[stage] = pd.to_datetime(records[stage], errors='coerce')
+        records['patient'] = _link_components(records) if len(records) else np.empty(0, dtype=np.int64)
+        by_patient = records.assign(
+            in_logs=records['source'] == 'logs', in_tracker=records['source'] == 'tracker'
+        ).groupby('patient', sort=True)
+        patients = pd.concat([
+            by_patient[['in_logs', 'in_tracker']].any(),
+            by_patient[list(LINK_STAGES)].min(),
+        ], axis=1)
+        return cls(records, patients)
+
+    @property
+    def has_logs(self):
+        return bool(self.patients['in_logs'].any())
+
+    @property
+    def linked(self):
+        """Patients found in both sources"""
+        return int((self.patients['in_logs'] & self.patients['in_tracker']).sum())
+
+    def cumulative(self, stage, end_dates):
+        """Patients with a ``stage`` date on or before each end date"""
+        dates = np.sort(self.patients[stage].dropna().to_numpy('datetime64[ns]'))
+        return np.searchsorted(dates, pd.DatetimeIndex(end_dates).to_numpy('datetime64[ns]'), side='right')
+
+
+def link_patients(raw_tracker, log_records):
+    """Link the raw Master Tracker with the Screening Logs records (ScreeningLogs.patients)"""
+    tracker_records = tracker_link_records(raw_tracker) if not raw_tracker.empty else pd.DataFrame(columns=RECORD_COLUMNS)
+    if log_records is None or log_records.empty:
+        log_records = pd.DataFrame(columns=RECORD_COLUMNS)
+    return PatientLinkage.build(tracker_records, log_records)
@@ -0,0 +1,184 @@
+"""
+Monte Carlo recruitment forecast for the BNT113 CVLP sites.
+
+Each CVLP site's monthly referral rate is fitted from the tracker as a Gamma
+posterior (referrals over months open), shrunk towards the network rate so that
+sites with little history borrow strength from the rest. Each site's
+referral-to-randomisation conversion is fitted the same way, as a Beta
+posterior around the network conversion rate.
+
+The simulation is one NumPy pass: every trajectory draws a rate and a
+conversion per site, then monthly randomised and other referral counts for each
+remaining month. Poisson thinning makes those two counts independent Poisson
+draws whose rates add up across sites, so the sampling is (simulations x months)
+rather than (simulations x sites x months). Only sites already in the tracker
+are simulated; sites still to open add nothing until they refer.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import (
+    MAIN_TRIAL_REFERRAL_COLUMN, PRESCREEN_REFERRAL_COLUMN, PROJECTED_REFERRAL_TARGETS, PROJECTION_MONTHS,
+    resolve_cvlp_site_column, valid_site_values,
+)
+
+SIMULATIONS = 5000
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Weight of the network-wide prior: site-months for referral rates, referrals for conversion
+PRIOR_SITE_MONTHS = 3.0
+PRIOR_REFERRALS = 5.0
+
+AVERAGE_MONTH_DAYS = 365.25 / 12
+
+# A referral is the earlier of the pre-screening and main trial referral form dates
+REFERRAL_DATE_COLUMNS = [PRESCREEN_REFERRAL_COLUMN, MAIN_TRIAL_REFERRAL_COLUMN]
+
+
+@dataclass(frozen=True)
+class RecruitmentForecast:
+    as_of: pd.Timestamp
+    simulations: int
+    # Month, then one cumulative count column per percentile ('P10', 'P50', ...)
+    referrals: pd.DataFrame
+    randomised: pd.DataFrame
+    # Fitted rates per site (posterior means)
+    site_rates: pd.DataFrame
+    baseline_referrals: int
+    target: int
+    target_month: str
+    # Share of simulations reaching the target by the target month
+    target_probability: float
+    # Median month in which the simulations reach the target; None if most don't by the target month
+    target_reached_month: str = None
+
+
+def month_bounds(month):
+    """First and last day of a 'Mon-YY' month"""
+    start = pd.to_datetime(f"01-{month}", format='%d-%b-%y')
+    return start, start + pd.offsets.MonthEnd(0)
+
+
+def referral_dates(df):
+    """Earliest referral date per patient (NaT if not referred)"""
+    dates = [pd.to_datetime(df[col], errors='coerce') for col in REFERRAL_DATE_COLUMNS if col in df.columns]
+    if not dates:
+        return pd.Series(pd.NaT, index=df.index)
+    return pd.concat(dates, axis=1).min(axis=1)
+
+
+def fit_site_rates(df, site_opening_dates, as_of):
+    """Per-site Gamma (referrals per month) and Beta (conversion) posteriors from referrals up to ``as_of``"""
+    site_col, _ = resolve_cvlp_site_column(df)
+    if site_col is None or df.empty:
+        return pd.DataFrame()
+    dates = referral_dates(df)
+    referred = dates.notna() & (dates <= as_of)
+    randomised = referred & df['is_randomised'].astype(bool) if 'is_randomised' in df.columns else referred & False
+
+    rows = []
+    for site in valid_site_values(df, site_col):
+        at_site = df[site_col] == site
+        first_referral = dates[at_site & referred].min()
+        opened = min(d for d in (site_opening_dates.get(site), first_referral, as_of) if pd.notna(d))
+        rows.append({
+            'Site': str(site),
+            'Opened': opened,
+            'Months Open': max((as_of - opened).days, 0) / AVERAGE_MONTH_DAYS,
+            'Referrals': int((at_site & referred).sum()),
+            'Randomised': int((at_site & randomised).sum()),
+        })
+    rates = pd.DataFrame(rows)
+    if rates.empty:
+        return rates
+
+    # Network-wide rates, used as the prior every site is shrunk towards
+    exposure = rates['Months Open'].sum()
+    network_rate = rates['Referrals'].sum() / exposure if exposure > 0 else 0.0
+    network_conversion = rates['Randomised'].sum() / rates['Referrals'].sum() if rates['Referrals'].sum() else 0.0
+
+    rates['rate_shape'] = PRIOR_SITE_MONTHS * network_rate + rates['Referrals']
+    rates['rate_months'] = PRIOR_SITE_MONTHS + rates['Months Open']
+    # Half a pseudo-count each way keeps both Beta parameters positive at 0% and 100%
+    rates['conversion_a'] = PRIOR_REFERRALS * network_conversion + 0.5 + rates['Randomised']
+    rates['conversion_b'] = PRIOR_REFERRALS * (1 - network_conversion) + 0.5 + rates['Referrals'] - rates['Randomised']
+    rates['Referrals / Month'] = rates['rate_shape'] / rates['rate_months']
+    rates['Conversion (%)'] = 100 * rates['conversion_a'] / (rates['conversion_a'] + rates['conversion_b'])
+    return rates
+
+
+def simulate_recruitment(site_rates, months, simulations=SIMULATIONS, seed=113):
+    """Monthly (referrals, randomised) counts, each of shape (simulations, months)"""
+    rng = np.random.default_rng(seed)
+    shape = (simulations, len(site_rates))
+    rates = rng.gamma(site_rates['rate_shape'].to_numpy(), 1 / site_rates['rate_months'].to_numpy(), size=shape)
+    conversion = rng.beta(site_rates['conversion_a'].to_numpy(), site_rates['conversion_b'].to_numpy(), size=shape)
+    # Every site refers for the whole of each remaining month
+    exposure = np.ones((len(site_rates), len(months)))
+    randomised = rng.poisson((rates * conversion) @ exposure)
+    others = rng.poisson((rates * (1 - conversion)) @ exposure)
+    return randomised + others, randomised
+
+
+def _bands(months, cumulative):
+    percentiles = np.percentile(cumulative, PERCENTILES, axis=0)
+    bands = pd.DataFrame({f"P{p}": np.round(values).astype(int) for p, values in zip(PERCENTILES, percentiles)})
+    bands.insert(0, 'Month', months)
+    return bands
+
+
+def latest_monthly_actual(df_monthly, column):
+    """Latest month's actual value of a monthly projections column, or None before the first actual"""
+    actuals = [value for value in df_monthly[column] if not (isinstance(value, str) and value == '-')]
+    return int(actuals[-1]) if actuals else None
+
+
+def forecast_recruitment(df, site_opening_dates, as_of, baseline_referrals=None, baseline_randomised=None,
+                         simulations=SIMULATIONS, seed=113):
+    """Percentile bands of cumulative referrals and randomisations for the months still to come.
+
+    The bands start from the cumulative counts before the first forecast month;
+    pass the monthly table's latest actuals as the baselines to line up with
+    it, otherwise they are counted from the tracker. Returns None once the
+    projection period has ended or there is nothing to fit.
+    """
+    as_of = pd.Timestamp(as_of)
+    # Months without actuals yet, as in the monthly projections table
+    months = [m for m in PROJECTION_MONTHS if month_bounds(m)[1] > as_of]
+    site_rates = fit_site_rates(df, site_opening_dates or {}, as_of)
+    if not months or site_rates.empty:
+        return None
+
+    first_month_start = month_bounds(months[0])[0]
+    dates = referral_dates(df)
+    before = dates.notna() & (dates < first_month_start)
+    if baseline_referrals is None:
+        baseline_referrals = int(before.sum())
+    if baseline_randomised is None:
+        baseline_randomised = int((before & df['is_randomised'].astype(bool)).sum()) if 'is_randomised' in df.columns else 0
+
+    referrals, randomised = simulate_recruitment(site_rates, months, simulations, seed)
+    cumulative_referrals = baseline_referrals + referrals.cumsum(axis=1)
+    cumulative_randomised = baseline_randomised + randomised.cumsum(axis=1)
+
+    target, target_month = PROJECTED_REFERRAL_TARGETS[-1], PROJECTION_MONTHS[-1]
+    reached = cumulative_referrals >= target
+    # Index of the first month at or over target, or past the end if never
+    first_reached = np.where(reached.any(axis=1), reached.argmax(axis=1), len(months))
+    median_reached = int(np.median(first_reached))
+    return RecruitmentForecast(
+        as_of=as_of,
+        simulations=simulations,
+        referrals=_bands(months, cumulative_referrals),
+        randomised=_bands(months, cumulative_randomised),
+        site_rates=site_rates[['Site', 'Opened', 'Months Open', 'Referrals', 'Randomised',
+                               'Referrals / Month', 'Conversion (%)']],
+        baseline_referrals=int(baseline_referrals),
+        target=target,
+        target_month=target_month,
+        target_probability=float(reached[:, -1].mean()),
+        target_reached_month=months[median_reached] if median_reached < len(months) else None,
+    )
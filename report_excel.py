@@ -0,0 +1,158 @@
+"""
+Excel export of the BNT113 dashboard tables.
+
+Writes each table to its own sheet of one workbook using openpyxl's write-only
+mode: rows are streamed to the file as they are appended and never held as cell
+objects, so memory stays flat however long the tables grow. The tables come
+from frames the dashboard has already computed; nothing is recalculated here.
+
+RAG colouring is written as Excel conditional formatting rather than as fixed
+cell fills, so the colours follow the values if the workbook is edited.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+HEADER_FILL = PatternFill("solid", fgColor="4472C4")
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_ALIGNMENT = Alignment(wrap_text=True, vertical="top")
+
+# (background, text) per RAG status, as in the dashboard tables
+RAG_STYLES = {
+    "GREEN": ("D4EDDA", "155724"),
+    "AMBER": ("FFF3CD", "856404"),
+    "RED": ("F8D7DA", "721C24"),
+}
+
+# Rows sampled to size the columns; the rest are streamed without being inspected
+WIDTH_SAMPLE_ROWS = 200
+MAX_COLUMN_WIDTH = 50
+
+# Excel limits sheet names to 31 characters
+MAX_SHEET_TITLE = 31
+
+
+@dataclass(frozen=True)
+class ThresholdRag:
+    """Numeric RAG: GREEN at or above ``green``, AMBER at or above ``amber``, RED above zero"""
+    column: str
+    green: float
+    amber: float
+
+
+@dataclass(frozen=True)
+class StatusRag:
+    """Text RAG: cells reading GREEN, AMBER or RED"""
+    column: str
+
+
+@dataclass(frozen=True)
+class ExportSheet:
+    title: str
+    frame: pd.DataFrame
+    rag: tuple = ()
+    # Columns to freeze left of the data (e.g. the site name)
+    frozen_columns: int = 1
+
+
+def site_metrics_rag():
+    # Matches the CVLP→Referral Rate highlighting in the Site-Based Metrics table
+    return (ThresholdRag('CVLP→Referral Rate (%)', green=75, amber=50),)
+
+
+def status_rag(frame):
+    """A StatusRag for every '(Status)' column of a frame"""
+    return tuple(StatusRag(col) for col in frame.columns if str(col).endswith('(Status)'))
+
+
+def _excel_value(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.to_pydatetime()
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and np.isnan(value) else value
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+def _column_widths(frame):
+    sample = frame.head(WIDTH_SAMPLE_ROWS)
+    widths = []
+    for i, col in enumerate(frame.columns):
+        longest_word = max((len(word) for word in str(col).split()), default=0)
+        values = sample.iloc[:, i].map(lambda v: len(str(v)) if pd.notna(v) else 0)
+        widths.append(min(MAX_COLUMN_WIDTH, max(10, longest_word + 2, (values.max() if len(values) else 0) + 2)))
+    return widths
+
+
+def _rag_rules(rag):
+    """Conditional formatting rules for one RAG definition, most severe last"""
+    def style(status):
+        background, text = RAG_STYLES[status]
+        return dict(fill=PatternFill("solid", bgColor=background), font=Font(color=text, bold=True))
+
+    if isinstance(rag, ThresholdRag):
+        return [
+            CellIsRule(operator='greaterThanOrEqual', formula=[str(rag.green)], stopIfTrue=True, **style("GREEN")),
+            CellIsRule(operator='greaterThanOrEqual', formula=[str(rag.amber)], stopIfTrue=True, **style("AMBER")),
+            CellIsRule(operator='greaterThan', formula=['0'], stopIfTrue=True, **style("RED")),
+        ]
+    return [
+        CellIsRule(operator='equal', formula=[f'"{status}"'], stopIfTrue=True, **style(status))
+        for status in RAG_STYLES
+    ]
+
+
+def _write_sheet(workbook, sheet):
+    ws = workbook.create_sheet(title=sheet.title[:MAX_SHEET_TITLE])
+    frame = sheet.frame
+    columns = [str(col) for col in frame.columns]
+
+    # Layout must be set before the first row is streamed
+    ws.freeze_panes = f"{get_column_letter(sheet.frozen_columns + 1)}2"
+    for i, width in enumerate(_column_widths(frame), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(ws, value=col)
+        cell.fill, cell.font, cell.alignment = HEADER_FILL, HEADER_FONT, HEADER_ALIGNMENT
+        header.append(cell)
+    ws.append(header)
+    for row in frame.itertuples(index=False, name=None):
+        ws.append([_excel_value(value) for value in row])
+
+    last_row = len(frame) + 1
+    if columns:
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{last_row}"
+    if len(frame):
+        for rag in sheet.rag:
+            if rag.column not in columns:
+                continue
+            letter = get_column_letter(columns.index(rag.column) + 1)
+            for rule in _rag_rules(rag):
+                ws.conditional_formatting.add(f"{letter}2:{letter}{last_row}", rule)
+
+
+def write_tables_xlsx(sheets, target):
+    """Stream every sheet into one workbook written to ``target`` (a path or binary file object)"""
+    workbook = Workbook(write_only=True)
+    for sheet in sheets:
+        _write_sheet(workbook, sheet)
+    workbook.save(target)
@@ -0,0 +1,608 @@
+"""
+PDF export of the BNT113 dashboard for steering meetings.
+
+Assembles one document from the results the dashboard already shows: the
+headline KPI tiles, the monthly projections, CVLP site performance, the
+Achievements & Barriers log and the CPGC tables. Everything is laid out with
+reportlab and rendered locally, so exports work without network access.
+
+Charts are plotly figures. When kaleido is installed they are rendered to PNG
+on a pool of worker processes; otherwise (or if kaleido fails) they are drawn
+as reportlab vector charts from the figures' bar traces. Rendered charts are
+cached by a hash of the figure, so exporting unchanged data skips rendering.
+"""
+
+import hashlib
+import importlib.util
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import (
+    Image, KeepTogether, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle,
+)
+
+from dashboard_content import (
+    ACHIEVEMENTS, CPGC_REPORTING, CPGC_STATUS, ISSUES_AND_BARRIERS, MONTH_AHEAD_AIMS, TRIAL_SITE_STATUS,
+)
+from result_store import ResultStore
+
+# plotly's static image engine; only the render workers import it
+KALEIDO_AVAILABLE = importlib.util.find_spec("kaleido") is not None
+
+PAGE_SIZE = landscape(A4)
+MARGIN = 0.5 * inch
+CONTENT_WIDTH = PAGE_SIZE[0] - 2 * MARGIN
+
+# Chart size in the document (points) and the PNG resolution factor for kaleido
+CHART_WIDTH = CONTENT_WIDTH
+CHART_HEIGHT = 3.2 * inch
+CHART_SCALE = 2
+
+# Worker processes for chart rendering (overridable via environment)
+RENDER_WORKERS = int(os.environ.get("BNT113_PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Rendered charts live in a ResultStore under this key, whatever the dataset
+CHART_CACHE_FINGERPRINT = "pdf-charts"
+CHART_CACHE_PRIVACY_LEVEL = "n/a"
+_default_chart_cache = ResultStore(max_bytes=64 * 1024 * 1024)
+
+# Colours shared with the dashboard theme
+BRAND = colors.HexColor('#667eea')
+TEXT_PRIMARY = colors.HexColor('#2c3e50')
+TEXT_MUTED = colors.HexColor('#95a5a6')
+ZEBRA = colors.HexColor('#f8f9fa')
+GRID = colors.HexColor('#dee2e6')
+RAG_COLOURS = {
+    'GREEN': (colors.HexColor('#d4edda'), colors.HexColor('#155724')),
+    'AMBER': (colors.HexColor('#fff3cd'), colors.HexColor('#856404')),
+    'RED': (colors.HexColor('#f8d7da'), colors.HexColor('#721c24')),
+}
+
+# Headline tiles in dashboard order: (kpi_snapshot key, label, accent colour)
+KPI_TILES = [
+    ('referred', 'Total Referred', '#2196F3'),
+    ('referred_to_prescreen', 'Pre-screen Referrals', '#9C27B0'),
+    ('referred_to_main_trial', 'Main Trial Referrals', '#FF9800'),
+    ('recruited_to_cvlp', 'CVLP Recruited', '#4CAF50'),
+    ('consented_prescreen', 'BNT113-01 Consented', '#00BCD4'),
+    ('randomised', 'Randomised', '#4facfe'),
+    ('screen_failures', 'Screen Failures', '#F44336'),
+]
+
+# Monthly totals per site, summed from the performance table's '<metric>_<Mon-YY>' columns
+SITE_MONTHLY_METRICS = [
+    'Consented to CVLP', 'Referred to pre-screen', 'Referred to main trial', 'Consented to pre-screen',
+]
+
+# Day-count columns of the performance table (each with a '(Status)' RAG column) and their short labels
+SITE_TIMING_COLUMNS = [
+    ('Days from site open to first referral', 'Days to first referral'),
+    ('Total days since last patient referred / site opened', 'Days since last referral'),
+]
+
+# CPGC BNT Reporting columns by category, as colour-coded in the dashboard (1-based, inclusive)
+CPGC_REPORTING_CATEGORIES = [
+    ('CPGC Report', (1, 7), '#2E8B57'),
+    ('Deviations', (8, 13), '#FF6B35'),
+    ('LabCorp', (14, 17), '#4169E1'),
+]
+
+
+@dataclass(frozen=True)
+class ReportContent:
+    """Everything one PDF report shows; empty frames and lists are left out of the document"""
+    title: str
+    as_of: pd.Timestamp
+    privacy_level: str
+    kpis: dict
+    monthly: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # performance_df from compute_cvlp_site_performance
+    site_performance: pd.DataFrame = field(default_factory=pd.DataFrame)
+    subtitle: str = ""
+    achievements: list = field(default_factory=lambda: list(ACHIEVEMENTS))
+    month_ahead_aims: list = field(default_factory=lambda: list(MONTH_AHEAD_AIMS))
+    issues: list = field(default_factory=lambda: list(ISSUES_AND_BARRIERS))
+    cpgc_status: list = field(default_factory=lambda: list(CPGC_STATUS))
+    trial_site_status: list = field(default_factory=lambda: list(TRIAL_SITE_STATUS))
+    cpgc_reporting: list = field(default_factory=lambda: list(CPGC_REPORTING))
+
+
+# =============================================================================
+# CHARTS
+# =============================================================================
+
+def _numeric(values):
+    # '-' (future months) and blanks plot as 0
+    return pd.to_numeric(pd.Series(list(values), dtype=object), errors='coerce').fillna(0).astype(float).tolist()
+
+
+def kpi_figure(kpis):
+    """Bar chart of the headline KPI counts"""
+    return go.Figure(
+        go.Bar(
+            x=[label for _, label, _ in KPI_TILES],
+            y=[kpis.get(key, 0) for key, _, _ in KPI_TILES],
+            marker_color=[colour for _, _, colour in KPI_TILES],
+            name='Patients',
+        ),
+        layout=dict(title=dict(text='Trial Progress Overview'), showlegend=False),
+    )
+
+
+def monthly_referrals_figure(monthly):
+    """Actual against target referrals per month, up to the latest month with actuals"""
+    if monthly.empty or 'Referred - Actual' not in monthly.columns:
+        return None
+    reported = monthly[monthly['Referred - Actual'].map(lambda v: not (isinstance(v, str) and v == '-'))]
+    if reported.empty:
+        return None
+    months = reported['Month'].astype(str).tolist()
+    fig = go.Figure(layout=dict(title=dict(text='Monthly Referrals - Actual vs Target'), barmode='group'))
+    fig.add_bar(x=months, y=_numeric(reported['Referred - Actual']), name='Referred - Actual', marker_color='#667eea')
+    for col, colour in (('Referred - Target (0.25/site)', '#FF9800'), ('Referred - Target (projected)', '#4CAF50')):
+        if col in reported.columns:
+            fig.add_bar(x=months, y=_numeric(reported[col]), name=col, marker_color=colour)
+    return fig
+
+
+def site_referrals_figure(site_summary):
+    """Stacked pre-screen and main trial referrals per CVLP site"""
+    if site_summary.empty:
+        return None
+    sites = site_summary['Site'].astype(str).tolist()
+    fig = go.Figure(layout=dict(title=dict(text='Referrals by CVLP Site'), barmode='stack'))
+    fig.add_bar(x=sites, y=_numeric(site_summary['Referred to pre-screen']), name='Referred to pre-screen', marker_color='#667eea')
+    fig.add_bar(x=sites, y=_numeric(site_summary['Referred to main trial']), name='Referred to main trial', marker_color='#FF9800')
+    return fig
+
+
+def figure_hash(fig, renderer):
+    """Content hash of a figure as rendered at the report's chart size"""
+    digest = hashlib.sha256(fig.to_json().encode("utf-8"))
+    digest.update(f"{renderer}:{CHART_WIDTH:.0f}x{CHART_HEIGHT:.0f}@{CHART_SCALE}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _render_png(fig_json, width, height, scale):
+    """Worker: render one figure to PNG with kaleido"""
+    return pio.to_image(pio.from_json(fig_json), format="png", width=width, height=height, scale=scale)
+
+
+def figure_drawing(fig, width=CHART_WIDTH, height=CHART_HEIGHT):
+    """Draw a figure's bar traces as a reportlab vector chart; None if it has no bars"""
+    bars = [trace for trace in fig.data if trace.type == 'bar']
+    if not bars:
+        return None
+    categories = [str(x) for x in bars[0].x]
+
+    drawing = Drawing(width, height)
+    title = fig.layout.title.text or ''
+    drawing.add(String(0, height - 14, title, fontName='Helvetica-Bold', fontSize=12, fillColor=TEXT_PRIMARY))
+
+    chart = VerticalBarChart()
+    rotate = len(categories) > 8
+    chart.x, chart.y = 40, 70 if rotate else 30
+    chart.width, chart.height = width - 60 - (150 if len(bars) > 1 else 0), height - chart.y - 30
+    chart.data = [_numeric(trace.y) for trace in bars]
+    chart.categoryAxis.categoryNames = categories
+    chart.categoryAxis.labels.fontSize = 7
+    if rotate:
+        chart.categoryAxis.labels.angle = 30
+        chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.gridStrokeColor = GRID
+    chart.valueAxis.visibleGrid = True
+    if fig.layout.barmode == 'stack':
+        chart.categoryAxis.style = 'stacked'
+    chart.barSpacing = 1
+    chart.groupSpacing = 6
+    for i, trace in enumerate(bars):
+        marker_colour = trace.marker.color
+        if isinstance(marker_colour, str):
+            chart.bars[i].fillColor = colors.HexColor(marker_colour)
+        elif marker_colour is not None:
+            # One colour per bar (single-series charts)
+            for j, colour in enumerate(marker_colour):
+                chart.bars[(i, j)].fillColor = colors.HexColor(colour)
+        chart.bars[i].strokeColor = None
+    drawing.add(chart)
+
+    if len(bars) > 1:
+        legend = Legend()
+        legend.x, legend.y = width - 140, height - 40
+        legend.fontSize = 7
+        legend.alignment = 'right'
+        legend.colorNamePairs = [(chart.bars[i].fillColor, trace.name or '') for i, trace in enumerate(bars)]
+        drawing.add(legend)
+    return drawing
+
+
+def render_charts(figures, cache=None, max_workers=RENDER_WORKERS):
+    """Render figures to PNG bytes (kaleido) or vector drawings, reusing cached renders.
+
+    Returns one entry per figure, in order: PNG bytes, a reportlab Drawing, or
+    None for a figure that could not be rendered.
+    """
+    cache = cache if cache is not None else _default_chart_cache
+    renderer = "kaleido" if KALEIDO_AVAILABLE else "reportlab"
+    keys = [figure_hash(fig, renderer) for fig in figures]
+    charts = [cache.get(CHART_CACHE_FINGERPRINT, CHART_CACHE_PRIVACY_LEVEL, key) for key in keys]
+
+    missing = {key: fig for key, fig, chart in zip(keys, figures, charts) if chart is None}
+    rendered = {}
+    if missing and KALEIDO_AVAILABLE:
+        args = {key: (fig.to_json(), int(CHART_WIDTH), int(CHART_HEIGHT), CHART_SCALE) for key, fig in missing.items()}
+        try:
+            if max_workers <= 1:
+                # e.g. already inside a worker of a report pack
+                rendered = {key: _render_png(*fig_args) for key, fig_args in args.items()}
+            else:
+                with ProcessPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+                    futures = {key: pool.submit(_render_png, *fig_args) for key, fig_args in args.items()}
+                    rendered = {key: future.result() for key, future in futures.items()}
+        except Exception:
+            # e.g. no browser for kaleido to drive; draw vector charts instead
+            rendered = {}
+    if missing and not rendered:
+        rendered = {key: figure_drawing(fig) for key, fig in missing.items()}
+
+    for key, chart in rendered.items():
+        if chart is not None:
+            cache.put(CHART_CACHE_FINGERPRINT, CHART_CACHE_PRIVACY_LEVEL, key, chart)
+    return [chart if chart is not None else rendered.get(key) for key, chart in zip(keys, charts)]
+
+
+def _chart_flowable(chart):
+    if isinstance(chart, bytes):
+        return Image(io.BytesIO(chart), width=CHART_WIDTH, height=CHART_HEIGHT)
+    return chart
+
+
+# =============================================================================
+# TABLES
+# =============================================================================
+
+def summarise_site_performance(performance_df):
+    """One row per CVLP site: monthly metrics summed over all months, plus the timing columns"""
+    if performance_df.empty:
+        return pd.DataFrame()
+    summary = pd.DataFrame({
+        'Site': performance_df['Site name'],
+        'Site opened': performance_df['Site opened'],
+    })
+    for metric in SITE_MONTHLY_METRICS:
+        month_cols = [col for col in performance_df.columns if str(col).startswith(f"{metric}_")]
+        summary[metric] = performance_df[month_cols].apply(pd.to_numeric, errors='coerce').sum(axis=1).astype(int)
+    for col, label in SITE_TIMING_COLUMNS:
+        summary[label] = performance_df[col]
+        summary[f"{label} (Status)"] = performance_df[f"{col} (Status)"].fillna('')
+    for col in performance_df.columns:
+        if str(col).startswith(('Average monthly recruitment', 'Average monthly referrals')):
+            summary[col] = performance_df[col]
+    return summary
+
+
+def _format_cell(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, float):
+        return f"{value:.0f}" if value.is_integer() else f"{value:.1f}"
+    return str(value)
+
+
+def _column_widths(rows, total_width, font_size):
+    """Give each column its longest word, then share the rest in proportion to its (capped) text"""
+    # Table cells default to 6pt padding either side
+    padding = 14
+    minimum = [
+        max(stringWidth(word, 'Helvetica-Bold', font_size) for row in rows for word in (row[i].split() or ['']))
+        + padding for i in range(len(rows[0]))
+    ]
+    natural = [
+        max(stringWidth(row[i][:80], 'Helvetica', font_size) for row in rows) + padding
+        for i in range(len(rows[0]))
+    ]
+    if sum(natural) <= total_width:
+        return [width * total_width / sum(natural) for width in natural]
+    spare = total_width - sum(minimum)
+    if spare <= 0:
+        return [width * total_width / sum(minimum) for width in minimum]
+    extra = [n - m for n, m in zip(natural, minimum)]
+    return [m + spare * e / sum(extra) for m, e in zip(minimum, extra)]
+
+
+def data_table(df, header_colour=BRAND, font_size=7, rag_columns=()):
+    """A zebra-striped table with wrapped cells; status columns in ``rag_columns`` are RAG shaded"""
+    cell_style = ParagraphStyle('cell', fontName='Helvetica', fontSize=font_size, leading=font_size + 2)
+    header_style = ParagraphStyle('header', parent=cell_style, fontName='Helvetica-Bold', textColor=colors.white)
+
+    columns = [str(col) for col in df.columns]
+    text_rows = [columns] + [[_format_cell(value) for value in row] for row in df.itertuples(index=False)]
+    rows = [[Paragraph(escape(text), header_style) for text in text_rows[0]]]
+    rows += [[Paragraph(escape(text), cell_style) for text in row] for row in text_rows[1:]]
+
+    table = Table(rows, colWidths=_column_widths(text_rows, CONTENT_WIDTH, font_size), repeatRows=1)
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), header_colour),
+        ('GRID', (0, 0), (-1, -1), 0.25, GRID),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, ZEBRA]),
+    ]
+    for col in rag_columns:
+        if col not in columns:
+            continue
+        j = columns.index(col)
+        for i, text in enumerate(text_rows[1:], start=1):
+            if text[j].upper() in RAG_COLOURS:
+                background, foreground = RAG_COLOURS[text[j].upper()]
+                style.append(('BACKGROUND', (j, i), (j, i), background))
+                rows[i][j].style = ParagraphStyle('rag', parent=cell_style, textColor=foreground, fontName='Helvetica-Bold')
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def tiles_table(tiles):
+    """A row of coloured cards from (value, label, accent colour) tuples"""
+    value_style = ParagraphStyle('kpi_value', fontName='Helvetica-Bold', fontSize=20, leading=24, alignment=1)
+    label_style = ParagraphStyle('kpi_label', fontName='Helvetica', fontSize=8, leading=10, alignment=1,
+                                 textColor=TEXT_PRIMARY)
+    cells = [[
+        [Paragraph(f'<font color="{colour}">{escape(_format_cell(value))}</font>', value_style),
+         Paragraph(escape(label), label_style)]
+        for value, label, colour in tiles
+    ]]
+    table = Table(cells, colWidths=[CONTENT_WIDTH / len(tiles)] * len(tiles))
+    table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, GRID),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, GRID),
+        ('BACKGROUND', (0, 0), (-1, -1), ZEBRA),
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    return table
+
+
+def kpi_tiles_table(kpis):
+    """The headline KPI tiles, as in the dashboard overview"""
+    return tiles_table([(kpis.get(key, 0), label, colour) for key, label, colour in KPI_TILES])
+
+
+# =============================================================================
+# DOCUMENT
+# =============================================================================
+
+def _styles():
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('report_title', parent=styles['Title'], textColor=BRAND, alignment=0),
+        'subtitle': ParagraphStyle('report_subtitle', parent=styles['Normal'], textColor=TEXT_MUTED, fontSize=10),
+        'h2': ParagraphStyle('report_h2', parent=styles['Heading2'], textColor=TEXT_PRIMARY, spaceBefore=6),
+        'h3': ParagraphStyle('report_h3', parent=styles['Heading3'], textColor=TEXT_PRIMARY),
+        'bullet': ParagraphStyle('report_bullet', parent=styles['Normal'], fontSize=9, leading=12, leftIndent=12,
+                                 bulletIndent=2),
+    }
+
+
+def _bullets(items, style):
+    # The dashboard marks emphasis with <strong>; reportlab paragraphs use <b>
+    return [Paragraph(re.sub(r'<(/?)strong>', r'<\1b>', item), style, bulletText='•') for item in items]
+
+
+def _cpgc_reporting_tables(records, styles):
+    df = pd.DataFrame(records)
+    flowables = []
+    for name, (first, last), colour in CPGC_REPORTING_CATEGORIES:
+        # Every category keeps GLH and CPGC so rows can be matched across the tables
+        positions = sorted({0, 1} | set(range(first - 1, min(last, len(df.columns)))))
+        flowables += [Paragraph(name, styles['h3']),
+                      data_table(df.iloc[:, positions], header_colour=colors.HexColor(colour), font_size=6.5),
+                      Spacer(1, 8)]
+    return flowables
+
+
+def build_report_story(content, charts):
+    """The flowables for one report; ``charts`` holds the rendered KPI, monthly and site charts"""
+    styles = _styles()
+    kpi_chart, monthly_chart, site_chart = charts
+    site_summary = summarise_site_performance(content.site_performance)
+
+    subtitle = f"Data as of {content.as_of:%d %b %Y %H:%M} · {content.privacy_level}"
+    if content.subtitle:
+        subtitle = f"{content.subtitle} · {subtitle}"
+    story = [
+        Paragraph(escape(content.title), styles['title']),
+        Paragraph(escape(subtitle), styles['subtitle']),
+        Spacer(1, 12),
+        Paragraph("Trial Progress Overview - Key Metrics", styles['h2']),
+        kpi_tiles_table(content.kpis),
+        Spacer(1, 12),
+    ]
+    if kpi_chart is not None:
+        story.append(_chart_flowable(kpi_chart))
+
+    if not content.monthly.empty:
+        story += [PageBreak(), Paragraph("Monthly Trial Metrics", styles['h2']), data_table(content.monthly)]
+        if monthly_chart is not None:
+            story += [Spacer(1, 10), KeepTogether(_chart_flowable(monthly_chart))]
+
+    if not site_summary.empty:
+        story += [
+            PageBreak(), Paragraph("CVLP Site Performance", styles['h2']),
+            data_table(site_summary, rag_columns=[col for col in site_summary.columns if col.endswith('(Status)')]),
+        ]
+        if site_chart is not None:
+            story += [Spacer(1, 10), KeepTogether(_chart_flowable(site_chart))]
+
+    if content.achievements or content.month_ahead_aims or content.issues:
+        story += [PageBreak(), Paragraph("Achievements & Barriers", styles['h2'])]
+        if content.achievements:
+            story += [Paragraph("Achievements", styles['h3'])] + _bullets(content.achievements, styles['bullet'])
+        if content.month_ahead_aims:
+            story += [Paragraph("Aims for Month Ahead", styles['h3'])] + _bullets(content.month_ahead_aims, styles['bullet'])
+        if content.issues:
+            story += [Paragraph("Issues & Barriers", styles['h3']),
+                      data_table(pd.DataFrame(content.issues), header_colour=colors.HexColor('#dc3545'))]
+
+    if content.cpgc_status or content.trial_site_status:
+        story += [PageBreak(), Paragraph("CPGC and Trial Site Set Up", styles['h2'])]
+        if content.cpgc_status:
+            story += [Paragraph("CPGC Status", styles['h3']),
+                      data_table(pd.DataFrame(content.cpgc_status), header_colour=colors.HexColor('#2E8B57')),
+                      Spacer(1, 8)]
+        if content.trial_site_status:
+            story += [Paragraph("Trial Site Status", styles['h3']),
+                      data_table(pd.DataFrame(content.trial_site_status), header_colour=colors.HexColor('#4169E1'))]
+
+    if content.cpgc_reporting:
+        story += [PageBreak(), Paragraph("CPGC BNT Reporting", styles['h2'])]
+        story += _cpgc_reporting_tables(content.cpgc_reporting, styles)
+    return story
+
+
+def report_figures(content):
+    """The KPI, monthly and site charts for a report (None where there is no data)"""
+    return [
+        kpi_figure(content.kpis),
+        monthly_referrals_figure(content.monthly),
+        site_referrals_figure(summarise_site_performance(content.site_performance)),
+    ]
+
+
+def build_report_pdf(content, chart_cache=None, max_workers=RENDER_WORKERS, charts=None):
+    """Render a report to PDF bytes; pass ``charts`` to reuse renders from render_charts"""
+    if charts is None:
+        figures = report_figures(content)
+        present = [fig for fig in figures if fig is not None]
+        rendered = iter(render_charts(present, chart_cache, max_workers))
+        charts = [next(rendered) if fig is not None else None for fig in figures]
+
+    return _write_pdf(build_report_story(content, charts), content.title)
+
+
+def _write_pdf(story, title):
+    """Lay out a story on landscape A4 pages with a title/page-number footer"""
+    generated = datetime.now()
+
+    def draw_footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 7)
+        canvas.setFillColor(TEXT_MUTED)
+        canvas.drawString(MARGIN, MARGIN / 2, f"{title} · generated {generated:%d %b %Y %H:%M}")
+        canvas.drawRightString(PAGE_SIZE[0] - MARGIN, MARGIN / 2, f"Page {doc.page}")
+        canvas.restoreState()
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=PAGE_SIZE, leftMargin=MARGIN, rightMargin=MARGIN, topMargin=MARGIN, bottomMargin=MARGIN,
+        title=title, author="BNT113 Dashboard",
+    )
+    doc.build(story, onFirstPage=draw_footer, onLaterPages=draw_footer)
+    return buffer.getvalue()
+
+
+# =============================================================================
+# PER-SITE REPORTS
+# =============================================================================
+
+@dataclass(frozen=True)
+class SiteReportContent:
+    """One CVLP site's performance summary, as sent to the site each month"""
+    site: str
+    as_of: pd.Timestamp
+    # The site's row of summarise_site_performance, and the mean of its numeric columns over all sites
+    summary: pd.Series
+    network_average: pd.Series
+    # Month-by-month counts from site_monthly_breakdown
+    monthly: pd.DataFrame
+    # The site's row of the site metrics table, when the tracker names the site the same way
+    site_metrics: object = None
+    title: str = "CVLP Site Performance Summary"
+
+
+def site_monthly_breakdown(performance_row, months):
+    """The monthly metric columns of one performance_df row, as one row per month"""
+    rows = []
+    for month in months:
+        row = {'Month': month}
+        for metric in SITE_MONTHLY_METRICS:
+            value = pd.to_numeric(performance_row.get(f"{metric}_{month}"), errors='coerce')
+            row[metric] = 0 if pd.isna(value) else int(value)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['Month'] + SITE_MONTHLY_METRICS)
+
+
+def site_monthly_figure(site, monthly):
+    """Stacked pre-screen and main trial referrals per month for one site"""
+    if monthly.empty:
+        return None
+    fig = go.Figure(layout=dict(title=dict(text=f'{site} - Monthly Referrals'), barmode='stack'))
+    months = monthly['Month'].tolist()
+    fig.add_bar(x=months, y=_numeric(monthly['Referred to pre-screen']), name='Referred to pre-screen', marker_color='#667eea')
+    fig.add_bar(x=months, y=_numeric(monthly['Referred to main trial']), name='Referred to main trial', marker_color='#FF9800')
+    return fig
+
+
+def _site_comparison(content):
+    """Site against all-site average for every numeric summary column, with RAG status where there is one"""
+    rows = []
+    for col, value in content.summary.items():
+        if col not in content.network_average.index:
+            continue
+        rows.append({
+            'Metric': col,
+            'This site': value,
+            'All-site average': content.network_average[col],
+            'Status': content.summary.get(f"{col} (Status)", ''),
+        })
+    return pd.DataFrame(rows)
+
+
+def build_site_report_story(content, chart):
+    styles = _styles()
+    summary = content.summary
+    story = [
+        Paragraph(escape(content.site), styles['title']),
+        Paragraph(escape(f"{content.title} · Data as of {content.as_of:%d %b %Y}"), styles['subtitle']),
+        Spacer(1, 12),
+        tiles_table(
+            [(summary.get(metric, 0), metric, colour) for metric, colour in zip(
+                SITE_MONTHLY_METRICS, ('#4CAF50', '#667eea', '#FF9800', '#00BCD4'))]
+            + [(summary.get('Days since last referral'), 'Days since last referral', '#F44336')]
+        ),
+        Spacer(1, 12),
+        Paragraph("Compared with all CVLP sites", styles['h2']),
+        data_table(_site_comparison(content), rag_columns=['Status']),
+    ]
+    if not content.monthly.empty:
+        story += [PageBreak(), Paragraph("Monthly Breakdown", styles['h2']), data_table(content.monthly)]
+        if chart is not None:
+            story += [Spacer(1, 10), KeepTogether(_chart_flowable(chart))]
+    if content.site_metrics is not None:
+        site_metrics = content.site_metrics.drop(labels=['Site'], errors='ignore')
+        story += [Paragraph("Site Metrics", styles['h2']),
+                  data_table(pd.DataFrame({'Metric': site_metrics.index, 'Value': site_metrics.values}))]
+    return story
+
+
+def build_site_report_pdf(content, chart_cache=None, max_workers=1):
+    """Render one site's report to PDF bytes"""
+    fig = site_monthly_figure(content.site, content.monthly)
+    chart = render_charts([fig], chart_cache, max_workers)[0] if fig is not None else None
+    return _write_pdf(build_site_report_story(content, chart), f"{content.site} - {content.title}")
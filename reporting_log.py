@@ -0,0 +1,165 @@
+"""
+Search index over the Achievements & Barriers log.
+
+Every achievement, aim and issue becomes one entry, numbered in log order. The
+index is built once per log (and per set of site names) and holds:
+
+- an inverted index: each word -> sorted array of the entries containing it,
+  with the words kept sorted so the word being typed matches as a prefix
+- facet indexes: kind, category, status and site -> value -> entry numbers
+- the entries' dates (Date Identified), sorted, for date ranges
+
+A search intersects the posting arrays of its words and facet values, so a
+keystroke costs a few binary searches and array intersections however long
+the log grows; entries are never rescanned. Sites are the site names an entry
+mentions, matched as whole words.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+ENTRY_KINDS = ('Achievement', 'Aim', 'Issue')
+ISSUE_STATUSES = ('Open', 'Resolved')
+
+# Issue fields searched as text
+ISSUE_TEXT_FIELDS = ('Issue', 'Category', 'Detail', 'Action Taken', 'Actions Outstanding', 'Resolution')
+
+ENTRY_COLUMNS = ['kind', 'text', 'category', 'status', 'date', 'sites', 'position']
+
+
+def tokenize(text):
+    """Lower-case words of a text, HTML tags dropped"""
+    return re.findall(r'[a-z0-9]+', re.sub(r'<[^>]+>', ' ', str(text)).lower())
+
+
+def parse_log_dates(values):
+    """Log dates (DD-Mon-YY or DD/MM/YYYY) as datetimes, NaT where blank or unreadable"""
+    text = pd.Series(values, dtype=object).fillna('').astype('str').str.strip()
+    dates = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in ('%d-%b-%y', '%d/%m/%Y', '%d-%b-%Y'):
+        dates = dates.fillna(pd.to_datetime(text, format=fmt, errors='coerce'))
+    return dates
+
+
+def _mentioned_sites(words, sites):
+    """Site names whose words appear in order among ``words``"""
+    found = []
+    present = set(words)
+    for site, site_words in sites:
+        n = len(site_words)
+        if not n or not present.issuperset(site_words):
+            continue
+        if any(words[i:i + n] == site_words for i in range(len(words) - n + 1)):
+            found.append(site)
+    return found
+
+
+def _postings(entries_by_value):
+    return {value: np.array(sorted(ids), dtype=np.int32) for value, ids in entries_by_value.items()}
+
+
+@dataclass(frozen=True)
+class ReportingLogIndex:
+    """Inverted word index and facet indexes over the Achievements & Barriers log"""
+    # One row per entry: kind, text (search text), category, status, date, sites, position (within its kind)
+    entries: pd.DataFrame
+    # Sorted vocabulary and each word's entry numbers
+    words: np.ndarray
+    postings: tuple
+    # facet -> value -> entry numbers
+    facets: dict
+    # Entry numbers sorted by date (undated left out) and their dates as datetime64[ns]
+    dated_entries: np.ndarray
+    dates: np.ndarray
+
+    @classmethod
+    def build(cls, achievements, aims, issues, sites=()):
+        rows = [('Achievement', text, '', '', '', i) for i, text in enumerate(achievements)]
+        rows += [('Aim', text, '', '', '', i) for i, text in enumerate(aims)]
+        rows += [
+            ('Issue', ' '.join(str(issue.get(field, '')) for field in ISSUE_TEXT_FIELDS),
+             str(issue.get('Category', '')).strip(),
+             'Resolved' if str(issue.get('Date Resolved', '')).strip() else 'Open',
+             issue.get('Date Identified'), i)
+            for i, issue in enumerate(issues)
+        ]
+        site_words = sorted({(str(site).strip(), tuple(tokenize(site))) for site in sites if str(site).strip()})
+        site_words = [(site, list(words)) for site, words in site_words]
+
+        by_word, by_facet = {}, {'kind': {}, 'category': {}, 'status': {}, 'site': {}}
+        entry_sites = []
+        for n, (kind, text, category, status, _, _) in enumerate(rows):
+            words = tokenize(text)
+            for word in set(words):
+                by_word.setdefault(word, []).append(n)
+            mentioned = _mentioned_sites(words, site_words)
+            entry_sites.append(mentioned)
+            for facet, values in (('kind', [kind]), ('category', [category]), ('status', [status]), ('site', mentioned)):
+                for value in values:
+                    if value:
+                        by_facet[facet].setdefault(value, []).append(n)
+
+        entries = pd.DataFrame(rows, columns=[c for c in ENTRY_COLUMNS if c != 'sites'])
+        entries.insert(ENTRY_COLUMNS.index('sites'), 'sites', entry_sites)
+        entries['date'] = parse_log_dates(entries['date'])
+        words = np.array(sorted(by_word), dtype=object)
+        dates = pd.DatetimeIndex(entries['date']).as_unit('ns').asi8
+        dated = np.flatnonzero(entries['date'].notna().to_numpy())
+        order = dated[np.argsort(dates[dated], kind='stable')]
+        return cls(
+            entries, words, tuple(np.array(by_word[w], dtype=np.int32) for w in words),
+            {facet: _postings(values) for facet, values in by_facet.items()},
+            order.astype(np.int32), dates[order].astype('datetime64[ns]'),
+        )
+
+    def facet_values(self, facet):
+        """Values of a facet, with how many entries have each"""
+        return {value: len(ids) for value, ids in sorted(self.facets[facet].items())}
+
+    def _word_entries(self, word, prefix=False):
+        if not prefix:
+            at = np.searchsorted(self.words, word)
+            found = at < len(self.words) and self.words[at] == word
+            return self.postings[at] if found else np.empty(0, dtype=np.int32)
+        # Every word starting with ``word``: a contiguous run of the sorted vocabulary
+        start = np.searchsorted(self.words, word)
+        stop = np.searchsorted(self.words, word[:-1] + chr(ord(word[-1]) + 1))
+        if start == stop:
+            return np.empty(0, dtype=np.int32)
+        return reduce(np.union1d, self.postings[start:stop])
+
+    def search(self, query='', date_from=None, date_to=None, **facets):
+        """Entry numbers matching every word of ``query`` (the last one as a prefix) and every facet filter
+
+        Facet filters are given by facet name (kind, category, status, site) as a
+        value or a list of values, any of which matches; None or an empty list
+        doesn't filter. A date range keeps only dated entries inside it.
+        """
+        matches = []
+        words = tokenize(query)
+        for i, word in enumerate(words):
+            # The last word is still being typed unless the query ends with a space
+            prefix = i == len(words) - 1 and not query.endswith(' ')
+            matches.append(self._word_entries(word, prefix))
+        for facet, values in facets.items():
+            if values is None or (not isinstance(values, str) and not len(values)):
+                continue
+            values = [values] if isinstance(values, str) else values
+            postings = [self.facets[facet].get(value, np.empty(0, dtype=np.int32)) for value in values]
+            matches.append(reduce(np.union1d, postings))
+        if date_from is not None or date_to is not None:
+            start = 0 if date_from is None else np.searchsorted(self.dates, pd.Timestamp(date_from).to_datetime64(), side='left')
+            stop = len(self.dates) if date_to is None else np.searchsorted(self.dates, pd.Timestamp(date_to).to_datetime64(), side='right')
+            matches.append(np.sort(self.dated_entries[start:stop]))
+        if not matches:
+            return np.arange(len(self.entries), dtype=np.int32)
+        return reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), sorted(matches, key=len))
+
+    def positions(self, ids, kind):
+        """Positions within their own list (achievements, aims or issues) of the matching entries of one kind"""
+        entries = self.entries.iloc[ids]
+        return entries.loc[entries['kind'] == kind, 'position'].tolist()
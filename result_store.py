@@ -0,0 +1,228 @@
+"""
+Process-wide result store for the BNT113 dashboard.
+
+Streamlit runs every browser session's script in its own thread of one server
+process. Results placed here are shared by all of those sessions, so when a
+dozen users open the dashboard on the same tracker, the first session pays for
+the computation and the rest reuse it.
+
+Entries are keyed by (dataset fingerprint, privacy level, result name) and
+evicted least-recently-used once the store grows past its memory budget, or
+dropped on lookup once their optional time-to-live has passed.
+Cached values are shared between sessions and must be treated as read-only.
+"""
+
+import dataclasses
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Default memory budget for all cached results (overridable via environment)
+DEFAULT_MAX_BYTES = int(os.environ.get("BNT113_RESULT_STORE_MB", "512")) * 1024 * 1024
+
+
+def dataset_fingerprint(*sources):
+    """Return a short content hash identifying a set of input files.
+
+    Each source may be a Streamlit UploadedFile (or any object with
+    ``getvalue()``), raw bytes, a filesystem path, or None for a missing input.
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        if source is None:
+            digest.update(b"<none>")
+        elif isinstance(source, (bytes, bytearray)):
+            digest.update(source)
+        elif hasattr(source, "getvalue"):
+            digest.update(source.getvalue())
+        elif isinstance(source, (str, os.PathLike)) and os.path.exists(source):
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(repr(source).encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+def estimate_nbytes(value):
+    """Estimate the in-memory size of a cached result in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(
+            estimate_nbytes(getattr(value, f.name)) for f in dataclasses.fields(value)
+        )
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "created", "expires", "hits")
+
+    def __init__(self, value, nbytes, ttl=None):
+        self.value = value
+        self.nbytes = nbytes
+        self.created = time.time()
+        self.expires = None if ttl is None else self.created + ttl
+        self.hits = 0
+
+    def expired(self, now):
+        return self.expires is not None and now >= self.expires
+
+
+class ResultStore:
+    """Thread-safe, memory-bounded LRU store of computed results"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        # One lock per key being computed, so concurrent sessions asking for
+        # the same result wait for the first one instead of recomputing it
+        self._compute_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        # Caller holds self._lock. Returns the live entry (marked used) or None.
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expired(time.time()):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        return entry
+
+    def get(self, fingerprint, privacy_level, name, default=None):
+        """Return a cached result (marking it recently used) or ``default``"""
+        with self._lock:
+            entry = self._lookup((fingerprint, privacy_level, name))
+            return default if entry is None else entry.value
+
+    def put(self, fingerprint, privacy_level, name, value, ttl=None):
+        """Store a result, evicting least recently used entries to stay within budget.
+
+        With ``ttl`` (seconds) the entry is treated as missing once it has expired.
+        """
+        key = (fingerprint, privacy_level, name)
+        entry = _Entry(value, estimate_nbytes(value), ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            self._evict()
+        return value
+
+    def setdefault(self, fingerprint, privacy_level, name, value, ttl=None):
+        """Store ``value`` unless a live entry exists; returns the entry's value"""
+        key = (fingerprint, privacy_level, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.expired(time.time()):
+                return entry.value
+            return self.put(fingerprint, privacy_level, name, value, ttl)
+
+    def get_or_compute(self, fingerprint, privacy_level, name, compute, ttl=None):
+        """Return the cached result for the key, computing it at most once across sessions"""
+        key = (fingerprint, privacy_level, name)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry.value
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+
+        with compute_lock:
+            # Another session may have finished the computation while we waited
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry.value
+                self.misses += 1
+            try:
+                value = compute()
+                self.put(fingerprint, privacy_level, name, value, ttl)
+            finally:
+                with self._lock:
+                    self._compute_locks.pop(key, None)
+        return value
+
+    def invalidate(self, fingerprint=None):
+        """Drop every entry, or only those belonging to one dataset fingerprint"""
+        with self._lock:
+            if fingerprint is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == fingerprint]:
+                    del self._entries[key]
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def memory_report(self):
+        """Per-key memory use, most recently used first"""
+        now = time.time()
+        with self._lock:
+            rows = [
+                {
+                    'Dataset': fingerprint,
+                    'Privacy': privacy_level,
+                    'Result': name,
+                    'Size (KB)': round(entry.nbytes / 1024, 1),
+                    'Hits': entry.hits,
+                    'Age (s)': int(now - entry.created),
+                    'Expires in (s)': None if entry.expires is None else max(0, int(entry.expires - now)),
+                }
+                for (fingerprint, privacy_level, name), entry in reversed(self._entries.items())
+            ]
+        return pd.DataFrame(rows, columns=['Dataset', 'Privacy', 'Result', 'Size (KB)', 'Hits', 'Age (s)', 'Expires in (s)'])
+
+    def _evict(self):
+        # Caller holds self._lock. Always keep the newest entry, even if it alone
+        # exceeds the budget, so the session that computed it can still use it.
+        total = sum(entry.nbytes for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+            self.evictions += 1
+
+
+class ResultStoreView:
+    """One dataset's results under a name prefix, read and written by the caller's own keys.
+
+    For callers that cache many small results by key (e.g. KPI values by
+    calculation fingerprint): every key is a separate store entry, written once
+    with ``setdefault`` and shared read-only like any other result.
+    """
+
+    def __init__(self, store, fingerprint, privacy_level, prefix):
+        self.store = store
+        self.fingerprint = fingerprint
+        self.privacy_level = privacy_level
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        return self.store.get(self.fingerprint, self.privacy_level, f"{self.prefix}{key}", default)
+
+    def setdefault(self, key, value):
+        return self.store.setdefault(self.fingerprint, self.privacy_level, f"{self.prefix}{key}", value)
@@ -0,0 +1,120 @@
+"""
+Latency distributions of the tissue sample logistics.
+
+Each sample's journey (``cpgc_turnaround.tissue_samples``) is split into legs:
+CVLP dispatch to CPGC receipt, receipt to shipment, shipment to result, and
+dispatch to result end to end. Every leg is measured in working days for all
+samples at once and held as one long table of intervals. From that table,
+percentiles and service-level breaches per CVLP site or per CPGC take one
+groupby, and a histogram is a bincount of whole working days.
+
+A leg is measured only where the tracker holds both of its dates, so a tracker
+with just the dispatch date has no legs.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cpgc_turnaround import (
+    NON_URGENT_RESULT_DAYS, URGENT_RESULT_DAYS, cpgc_of_sites, tissue_samples, working_days_between,
+)
+from dashboard_content import CPGC_REPORTING
+
+# Percentiles reported per leg and group
+LATENCY_PERCENTILES = (50, 75, 90, 95)
+
+# Group-by choices: label -> intervals column
+LATENCY_GROUPINGS = {'CVLP site': 'cvlp_site', 'CPGC': 'cpgc'}
+
+INTERVAL_COLUMNS = ['leg', 'cvlp_site', 'cpgc', 'working_days', 'breached']
+
+
+@dataclass(frozen=True)
+class LogisticsLeg:
+    name: str
+    start: str
+    end: str
+    # Working days allowed; urgent results may have a tighter limit
+    sla_days: int
+    urgent_sla_days: int = None
+
+
+LOGISTICS_LEGS = (
+    LogisticsLeg('Dispatch → CPGC receipt', 'dispatched', 'received', 2),
+    LogisticsLeg('CPGC receipt → shipment', 'received', 'shipped', 3),
+    LogisticsLeg('Shipment → result', 'shipped', 'result', NON_URGENT_RESULT_DAYS, URGENT_RESULT_DAYS),
+    LogisticsLeg('Dispatch → result', 'dispatched', 'result', 5 + NON_URGENT_RESULT_DAYS, 5 + URGENT_RESULT_DAYS),
+)
+
+
+@dataclass(frozen=True)
+class LogisticsLatency:
+    """Working-day intervals of every measured logistics leg"""
+    # One row per sample and measured leg: leg, cvlp_site, cpgc, working_days, breached
+    intervals: pd.DataFrame
+    # Names of the legs with at least one measured interval, in LOGISTICS_LEGS order
+    legs: tuple
+
+    @classmethod
+    def build(cls, df, reporting=CPGC_REPORTING):
+        """Intervals of every sample, CPGCs mapped through ``reporting``'s recruiting sites"""
+        samples = tissue_samples(df) if not df.empty else pd.DataFrame()
+        if samples.empty:
+            return cls(pd.DataFrame(columns=INTERVAL_COLUMNS), ())
+        sites = samples['site'].astype('str').str.strip().where(samples['site'].notna())
+        cpgc = sites.map(cpgc_of_sites(sites.dropna().unique(), reporting))
+        urgent = samples['urgent'].to_numpy(dtype=bool)
+
+        frames, legs = [], []
+        for leg in LOGISTICS_LEGS:
+            days = working_days_between(samples[leg.start], samples[leg.end])
+            measured = ~np.isnan(days)
+            if not measured.any():
+                continue
+            sla = np.where(urgent, leg.urgent_sla_days, leg.sla_days) if leg.urgent_sla_days is not None else leg.sla_days
+            frames.append(pd.DataFrame({
+                'leg': leg.name,
+                'cvlp_site': sites[measured].to_numpy(),
+                'cpgc': cpgc[measured].to_numpy(),
+                'working_days': days[measured].astype(np.int64),
+                'breached': days[measured] > (sla[measured] if np.ndim(sla) else sla),
+            }))
+            legs.append(leg.name)
+        if not frames:
+            return cls(pd.DataFrame(columns=INTERVAL_COLUMNS), ())
+        intervals = pd.concat(frames, ignore_index=True)
+        intervals['leg'] = pd.Categorical(intervals['leg'], categories=legs)
+        return cls(intervals, tuple(legs))
+
+    def summary(self, by='CVLP site'):
+        """Samples, percentiles, maximum and SLA breaches per group and leg (blank groups left out)"""
+        column = LATENCY_GROUPINGS[by]
+        intervals = self.intervals.dropna(subset=[column])
+        if intervals.empty:
+            return pd.DataFrame()
+        grouped = intervals.groupby([column, 'leg'], observed=True, sort=True)
+        days = grouped['working_days']
+        table = pd.concat([
+            days.size().rename('Samples'),
+            days.quantile([p / 100 for p in LATENCY_PERCENTILES]).unstack().round(1).set_axis(
+                [f"P{p}" for p in LATENCY_PERCENTILES], axis=1),
+            days.max().rename('Max'),
+            grouped['breached'].sum().rename('SLA Breaches'),
+        ], axis=1)
+        table['Breach %'] = (table['SLA Breaches'] / table['Samples'] * 100).round(1)
+        return table.reset_index().rename(columns={column: by, 'leg': 'Leg'})
+
+    def histogram(self, leg, by=None, group=None):
+        """Samples per whole working day (index 0 to the longest interval) of one leg, for one group if given"""
+        intervals = self.intervals[self.intervals['leg'] == leg]
+        if by is not None and group is not None:
+            intervals = intervals[intervals[LATENCY_GROUPINGS[by]] == group]
+        counts = np.bincount(intervals['working_days'].to_numpy(dtype=np.int64))
+        return pd.Series(counts, index=pd.RangeIndex(len(counts), name='Working days'), name='Samples')
+
+    def sla_days(self, leg):
+        """(non-urgent, urgent) working-day limit of a leg"""
+        spec = next(l for l in LOGISTICS_LEGS if l.name == leg)
+        return spec.sla_days, spec.urgent_sla_days if spec.urgent_sla_days is not None else spec.sla_days
@@ -0,0 +1,202 @@
+"""
+Monthly per-site PDF report packs for the BNT113 CVLP sites.
+
+    python -m site_report_pack --tracker BNT113-01-Master-Tracker-Local.xlsx --out site_reports
+    python -m site_report_pack --snapshot snapshots --out site_reports
+
+The site aggregates (CVLP site performance and site metrics) are computed once,
+from the tracker or taken from a precomputed snapshot, and split into one small
+report per site. Rendering the PDFs is then fanned out across a process pool,
+where each worker only receives its own site's rows. A timing summary is
+printed at the end.
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from dashboard_metrics import (
+    PRIVACY_LEVELS, FunnelCube, compute_cvlp_site_performance, compute_site_based_metrics, prepare_tracker_data,
+    read_master_tracker, resolve_cvlp_site_column, valid_site_values,
+)
+from dashboard_snapshot import MANIFEST_NAME, latest_snapshot_path, load_snapshot
+from report_pdf import SiteReportContent, build_site_report_pdf, site_monthly_breakdown, summarise_site_performance
+
+# Site reports only ever hold site-level aggregates, taken from the pseudonymized view
+PACK_PRIVACY_LEVEL = PRIVACY_LEVELS[0]
+
+
+def compute_site_aggregates(tracker_bytes, header_row=0, timings=None):
+    """Compute the CVLP site performance and site metrics once, for every site"""
+    timings = timings if timings is not None else {}
+
+    start = time.perf_counter()
+    raw = read_master_tracker(io.BytesIO(tracker_bytes), header=header_row)
+    prepared = prepare_tracker_data(raw, PACK_PRIVACY_LEVEL)
+    timings["read and prepare tracker"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cube = FunnelCube.build(prepared)
+    timings["funnel_cube"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    performance = compute_cvlp_site_performance(prepared, io.BytesIO(tracker_bytes), cube)
+    timings["cvlp_site_performance"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    site_metrics = pd.DataFrame()
+    cvlp_site_col, _ = resolve_cvlp_site_column(prepared)
+    if cvlp_site_col is not None and valid_site_values(prepared, cvlp_site_col):
+        site_metrics = compute_site_based_metrics(prepared, valid_site_values(prepared, cvlp_site_col), cube)
+    timings["site_based_metrics"] = time.perf_counter() - start
+    return pd.Timestamp.now().floor("s"), performance, site_metrics
+
+
+def snapshot_site_aggregates(path):
+    """Read the site aggregates from a snapshot directory (or the latest one under it)"""
+    if not os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+        latest = latest_snapshot_path(path)
+        if latest is None:
+            raise FileNotFoundError(f"No snapshot found in {path}")
+        path = latest
+    snapshot = load_snapshot(path)
+    results = snapshot.results.get(PACK_PRIVACY_LEVEL, {})
+    if "cvlp_site_performance" not in results:
+        raise ValueError(f"{path}: snapshot has no CVLP site performance results")
+    return snapshot.as_of, results["cvlp_site_performance"], results.get("site_based_metrics", pd.DataFrame())
+
+
+def site_report_contents(as_of, performance, site_metrics, sites=None):
+    """Split the shared aggregates into one SiteReportContent per site"""
+    performance_df = performance['performance_df']
+    summary = summarise_site_performance(performance_df)
+    if summary.empty:
+        return []
+    network_average = summary.mean(numeric_only=True)
+    months = [month['name'] for month in performance['months']]
+    metrics_by_site = {} if site_metrics.empty else {row['Site']: row for _, row in site_metrics.iterrows()}
+
+    contents = []
+    for i, site_summary in summary.iterrows():
+        site = str(site_summary['Site'])
+        if sites and site not in sites:
+            continue
+        contents.append(SiteReportContent(
+            site=site,
+            as_of=as_of,
+            summary=site_summary,
+            network_average=network_average,
+            monthly=site_monthly_breakdown(performance_df.loc[i], months),
+            site_metrics=metrics_by_site.get(site),
+        ))
+    return contents
+
+
+def site_report_filename(site, as_of):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', site).strip('-')
+    return f"BNT113-01_{slug}_{as_of:%Y-%m}.pdf"
+
+
+def _render_site_report(content, path):
+    """Worker: write one site's PDF; returns (site, path, seconds, bytes)"""
+    start = time.perf_counter()
+    pdf = build_site_report_pdf(content)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    return content.site, path, time.perf_counter() - start, len(pdf)
+
+
+def build_site_report_pack(contents, out_dir, workers=None, progress=None):
+    """Render every site's PDF across a process pool; returns (written, failed)"""
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(contents) or 1))
+    written, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_render_site_report, content, os.path.join(out_dir, site_report_filename(content.site, content.as_of))):
+                content.site
+            for content in contents
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            site = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append((site, str(e)))
+                if progress:
+                    progress(f"[{done:>3}/{len(contents)}] {site:<40} FAILED: {e}")
+                continue
+            written.append(result)
+            if progress:
+                _, _, seconds, size = result
+                progress(f"[{done:>3}/{len(contents)}] {site:<40} {seconds * 1000:8.1f} ms {size / 1024:8.1f} KB")
+    return written, failed
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m site_report_pack",
+        description="Generate one CVLP site performance PDF per site.",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tracker", help="Master Tracker workbook (.xlsx)")
+    source.add_argument("--snapshot", help="Snapshot directory, or a directory of snapshots (uses the latest)")
+    parser.add_argument("--out", default="site_reports", help="Output directory (default: site_reports)")
+    parser.add_argument("--header-row", type=int, default=0,
+                        help="Row holding the tracker's column headers: 0 for local copies (default), "
+                             "2 for the export uploaded in the dashboard")
+    parser.add_argument("--site", action="append", dest="sites", help="Only this site (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    timings = {}
+    try:
+        if args.tracker:
+            with open(args.tracker, "rb") as f:
+                tracker_bytes = f.read()
+            as_of, performance, site_metrics = compute_site_aggregates(tracker_bytes, args.header_row, timings)
+        else:
+            load_start = time.perf_counter()
+            as_of, performance, site_metrics = snapshot_site_aggregates(args.snapshot)
+            timings["load snapshot"] = time.perf_counter() - load_start
+        contents = site_report_contents(as_of, performance, site_metrics, args.sites)
+    except Exception as e:
+        print(f"Site report pack failed: {e}", file=sys.stderr)
+        return 1
+    if not contents:
+        print("Site report pack failed: no matching CVLP sites", file=sys.stderr)
+        return 1
+    shared_seconds = time.perf_counter() - start
+
+    render_start = time.perf_counter()
+    written, failed = build_site_report_pack(contents, args.out, args.workers, progress=print)
+    render_seconds = time.perf_counter() - render_start
+
+    print(f"Site report pack: {len(written)} of {len(contents)} PDFs written to {os.path.abspath(args.out)}")
+    for step, seconds in timings.items():
+        print(f"  {step:<40} {seconds * 1000:10.1f} ms")
+    print(f"  {'shared computation':<40} {shared_seconds * 1000:10.1f} ms")
+    print(f"  {'rendering (wall)':<40} {render_seconds * 1000:10.1f} ms")
+    print(f"  {'rendering (sum over sites)':<40} {sum(r[2] for r in written) * 1000:10.1f} ms")
+    print(f"  {'total':<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    print(f"  {'pack size':<40} {sum(r[3] for r in written) / 1024:10.1f} KB")
+    for site, error in failed:
+        print(f"  failed: {site}: {error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,47 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
 import plotly.graph_objects as go
 import os
-import hashlib
-import re
-import base64
 import io
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+import threading
+from collections import OrderedDict
 import plotly.io as pio
-import tempfile
-import yaml
-from pathlib import Path
+from result_store import ResultStore, ResultStoreView, dataset_fingerprint
+from data_context import CONTEXT_PRIVACY_LEVEL, get_data_context, get_shared_data_context
+from data_watcher import LocalDataWatcher
+from dashboard_snapshot import (
+    compute_dashboard_results, latest_snapshot_path, load_snapshot, result_store_name, seed_result_store,
+)
+from dashboard_metrics import (
+    TRIAL_REFERRAL_MONTHS, FunnelCube, compute_cvlp_site_performance,
+    compute_kpi_snapshot, compute_monthly_projections, compute_site_based_metrics,
+    compute_trial_referral_reporting, kpi_snapshot_column_totals, kpi_snapshot_mismatches,
+    prepare_tracker_data, read_master_tracker, resolve_cvlp_site_column, resolve_trial_site_column,
+    valid_site_values,
+)
+from dashboard_content import (
+    ACHIEVEMENTS, ISSUES_AND_BARRIERS, MONTH_AHEAD_AIMS, REPORTING_WORKBOOK_PATH, CpgcReportingContent,
+    read_reporting_workbook,
+)
+from report_pdf import ReportContent, build_report_pdf
+from report_excel import XLSX_MIME, ExportSheet, site_metrics_rag, status_rag, write_tables_xlsx
+from tracker_history import TrackerHistory, version_as_of
+from recruitment_forecast import forecast_recruitment, latest_monthly_actual
+from control_charts import ControlCharts
+from kpi_plan import calculation_fingerprint, evaluate_kpis
+from kpi_history import KPIHistory
+from patient_linkage import link_patients
+from cpgc_turnaround import available_turnaround_metrics, compute_cpgc_reporting
+from sample_logistics import LATENCY_GROUPINGS, LogisticsLatency
+from reporting_log import ISSUE_STATUSES, ReportingLogIndex
+from kpi_schema import KPI_SCHEMA_PATH, kpi_schema_watcher
+from tracker_query import (
+    DUCKDB_AVAILABLE, EXAMPLE_QUERIES, MAX_RESULT_ROWS, TABLE_DESCRIPTIONS, describe_tables, query_tables,
+    run_query, section_query,
+)
 
 # =============================================================================
 # UNIFIED COLOR PALETTE - Brand Consistency
@@ -96,6 +120,48 @@ CHART_COLORS = [
 # MODERN UI/UX CONFIGURATION
 # =============================================================================
 
+class RerunByteMeter:
+    """Count the serialized bytes of every message one script run sends to the browser.
+
+    Wraps the run context's (private) outgoing message queue, only while
+    Advanced Options > Show Debug Information is ticked; uninstall() puts the
+    original queue back at the end of the run.
+    """
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._enqueue = ctx._enqueue
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+    def __call__(self, msg):
+        self.bytes_sent += msg.ByteSize()
+        self.messages_sent += 1
+        self._enqueue(msg)
+
+    def uninstall(self):
+        if self._ctx._enqueue is self:
+            self._ctx._enqueue = self._enqueue
+
+def install_rerun_byte_meter():
+    """Meter the current script run's outgoing messages so its payload can be measured"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return None
+        # A run that stopped early (st.stop, an exception) never uninstalled its meter;
+        # unwrap it so meters never stack on a reused context
+        while isinstance(ctx._enqueue, RerunByteMeter):
+            ctx._enqueue.uninstall()
+        meter = ctx._enqueue = RerunByteMeter(ctx)
+        return meter
+    except Exception:
+        # Measurement only - never let Streamlit internals break the dashboard
+        return None
+
+rerun_byte_meter = install_rerun_byte_meter() if st.session_state.get('show_debug_information') else None
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="BNT113 Clinical Trial Dashboard",
@@ -109,348 +175,38 @@ st.set_page_config(
     }
 )
 
-# Modern CSS Styling
-st.markdown("""
-<style>
-    /* Import Google Fonts */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-    
-    /* Global Styling */
-    .stApp {
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Modern Header */
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem 2rem 1.5rem 2rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        color: white;
-        text-align: center;
-    }
-    
-    .main-title {
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin-bottom: 0.5rem;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .main-subtitle {
-        font-size: 1.1rem;
-        font-weight: 400;
-        opacity: 0.9;
-        margin-bottom: 1rem;
-    }
-    
-    .header-stats {
-        display: flex;
-        justify-content: center;
-        gap: 2rem;
-        margin-top: 1rem;
-    }
-    
-    .header-stat {
-        text-align: center;
-        background: rgba(255,255,255,0.1);
-        padding: 0.8rem 1.2rem;
-        border-radius: 10px;
-        backdrop-filter: blur(10px);
-    }
-    
-    .header-stat-value {
-        font-size: 1.5rem;
-        font-weight: 600;
-        display: block;
-    }
-    
-    .header-stat-label {
-        font-size: 0.9rem;
-        opacity: 0.8;
-    }
-    
-    /* Modern Metric Cards - Enhanced */
-    .metric-card {
-        background: linear-gradient(145deg, #ffffff 0%, #f8f9fa 100%);
-        padding: 2rem 1.8rem;
-        border-radius: 20px;
-        box-shadow: 
-            0 10px 30px rgba(102, 126, 234, 0.12),
-            0 1px 3px rgba(0, 0, 0, 0.08),
-            inset 0 1px 0 rgba(255, 255, 255, 0.9);
-        border: 1px solid rgba(102, 126, 234, 0.08);
-        transition: all 0.4s cubic-bezier(0.175, 0.885, 0.32, 1.275);
-        margin-bottom: 1.5rem;
-        position: relative;
-        overflow: hidden;
-        backdrop-filter: blur(10px);
-    }
-    
-    .metric-card::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        opacity: 0;
-        transition: opacity 0.4s ease;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-8px) scale(1.02);
-        box-shadow: 
-            0 20px 45px rgba(102, 126, 234, 0.25),
-            0 5px 15px rgba(0, 0, 0, 0.12),
-            inset 0 1px 0 rgba(255, 255, 255, 1);
-        border-color: rgba(102, 126, 234, 0.2);
-    }
-    
-    .metric-card:hover::before {
-        opacity: 1;
-    }
-    
-    .metric-icon {
-        font-size: 3rem;
-        margin-bottom: 1rem;
-        display: block;
-        filter: drop-shadow(0 2px 4px rgba(0,0,0,0.1));
-        transition: transform 0.3s ease;
-    }
-    
-    .metric-card:hover .metric-icon {
-        transform: scale(1.1) rotateZ(5deg);
-    }
-    
-    .metric-value {
-        font-size: 2.5rem;
-        font-weight: 800;
-        color: #2c3e50;
-        margin-bottom: 0.5rem;
-        letter-spacing: -0.5px;
-        line-height: 1.2;
-        transition: color 0.3s ease;
-    }
-    
-    .metric-card:hover .metric-value {
-        color: #667eea;
-    }
-    
-    .metric-label {
-        font-size: 1.05rem;
-        color: #5a6c7d;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-bottom: 0.3rem;
-    }
-    
-    /* Animated entrance for metric cards */
-    @keyframes slideInUp {
-        from {
-            opacity: 0;
-            transform: translateY(30px) scale(0.95);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0) scale(1);
-        }
-    }
-    
-    .metric-card.fade-in {
-        animation: slideInUp 0.6s cubic-bezier(0.175, 0.885, 0.32, 1.275) forwards;
-    }
-    
-    /* Sidebar Styling */
-    .css-1d391kg {
-        background: linear-gradient(180deg, #f8f9fa 0%, #e9ecef 100%);
-    }
-    
-    .sidebar-header {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        margin-bottom: 1rem;
-        text-align: center;
-        color: white;
-    }
-    
-    /* Admin Panel Styling */
-    .admin-section {
-        background: #f8f9fa;
-        padding: 1.5rem;
-        border-radius: 12px;
-        border-left: 4px solid #007bff;
-        margin-bottom: 1rem;
-    }
-    
-    .admin-title {
-        color: #007bff;
-        font-weight: 600;
-        font-size: 1.1rem;
-        margin-bottom: 1rem;
-    }
-    
-    /* Chart Container */
-    .chart-container {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 15px;
-        box-shadow: 0 5px 20px rgba(0,0,0,0.08);
-        margin-bottom: 2rem;
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Table Styling */
-    .dataframe {
-        border-radius: 10px;
-        overflow: hidden;
-        box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-    }
-    
-    /* Modern Section Headers */
-    .section-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        margin: 3rem 0 2rem 0;
-        font-weight: 700;
-        font-size: 1.5rem;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-        border: 2px solid rgba(255, 255, 255, 0.2);
-        text-align: center;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Modern Section Dividers */
-    .section-divider {
-        margin: 60px 0;
-        text-align: center;
-        position: relative;
-    }
-    
-    .section-divider::before {
-        content: '';
-        display: block;
-        height: 2px;
-        background: linear-gradient(90deg, transparent, #e0e0e0, transparent);
-        margin-bottom: 20px;
-    }
-    
-    .section-divider-icon {
-        display: inline-block;
-        background: white;
-        padding: 15px;
-        border-radius: 50%;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-        color: #667eea;
-        font-size: 1.5rem;
-    }
-    
-    .section-divider::after {
-        content: '';
-        display: block;
-        height: 2px;
-        background: linear-gradient(90deg, transparent, #e0e0e0, transparent);
-        margin-top: 20px;
-    }
-    
-    /* Status Indicators */
-    .status-green {
-        background: #d4edda;
-        color: #155724;
-        padding: 0.3rem 0.8rem;
-        border-radius: 20px;
-        font-weight: 500;
-        font-size: 0.9rem;
-    }
-    
-    .status-amber {
-        background: #fff3cd;
-        color: #856404;
-        padding: 0.3rem 0.8rem;
-        border-radius: 20px;
-        font-weight: 500;
-        font-size: 0.9rem;
-    }
-    
-    .status-red {
-        background: #f8d7da;
-        color: #721c24;
-        padding: 0.3rem 0.8rem;
-        border-radius: 20px;
-        font-weight: 500;
-        font-size: 0.9rem;
-    }
-    
-    /* Animation */
-    @keyframes fadeInUp {
-        from {
-            opacity: 0;
-            transform: translateY(30px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    .fade-in {
-        animation: fadeInUp 0.6s ease-out;
-    }
-    
-    /* Responsive Design */
-    @media (max-width: 768px) {
-        .main-title {
-            font-size: 2rem;
-        }
-        
-        .header-stats {
-            flex-direction: column;
-            gap: 1rem;
-        }
-        
-        .metric-card {
-            padding: 1.2rem;
-            margin-bottom: 1rem;
-            border-radius: 15px;
-        }
-        
-        .metric-icon {
-            font-size: 2.2rem;
-        }
-        
-        .metric-value {
-            font-size: 1.8rem;
-        }
-        
-        .metric-label {
-            font-size: 0.9rem;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+# Modern CSS Styling - served from ./static (enableStaticServing in .streamlit/config.toml)
+# so the browser fetches and caches it once instead of receiving it on every rerun
+STATIC_URL = "app/static"
+st.markdown(f'<link rel="stylesheet" href="{STATIC_URL}/dashboard.css">', unsafe_allow_html=True)
 
 # =============================================================================
 # MODERN CHART THEMES & UTILITIES
 # =============================================================================
 
-def apply_modern_chart_theme(fig, title=None, height=500):
-    """Apply modern, professional styling to plotly charts with enhanced interactivity"""
-    
-    fig.update_layout(
+CHART_TEMPLATE_NAME = 'bnt113_modern'
+
+_CHART_AXIS_STYLE = dict(
+    showgrid=True,
+    gridcolor='rgba(102, 126, 234, 0.08)',
+    showline=True,
+    linewidth=2,
+    linecolor=COLOR_PALETTE['shadow_dark'],
+    tickfont=dict(color=COLOR_PALETTE['text_secondary'], size=12),
+    title_font=dict(size=14, color=COLOR_PALETTE['text_primary'])
+)
+
+# Register the dashboard theme once as a named Plotly template, so every figure picks
+# up the styling at construction time instead of each chart repeating it in
+# update_layout(). The template holds only the keys the theme changes: every figure
+# carries its template in the JSON sent to the browser, and Streamlit's own
+# template (mostly colorscales these charts never use) would triple that.
+_modern_chart_template = go.layout.Template(
+    layout=go.Layout(
         # Modern transparent background
-        plot_bgcolor=f'rgba(248, 251, 255, 0.5)',
+        plot_bgcolor='rgba(248, 251, 255, 0.5)',
         paper_bgcolor='rgba(0,0,0,0)',
+        colorway=CHART_COLORS,
         
         # Enhanced typography
         font=dict(
@@ -458,44 +214,15 @@ def apply_modern_chart_theme(fig, title=None, height=500):
             size=13,
             color=COLOR_PALETTE['text_primary']
         ),
-        
-        # Professional title styling
         title=dict(
-            text=title,
-            font=dict(
-                size=20, 
-                color=COLOR_PALETTE['text_primary'], 
-                family="Inter",
-                weight=600
-            ),
+            font=dict(size=20, weight=600),
             x=0.5,
-            xanchor='center',
-            y=0.98,
-            yanchor='top',
-            pad=dict(b=20)
-        ) if title else None,
+            xanchor='center'
+        ),
         
         # Modern grid and axes
-        xaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(102, 126, 234, 0.1)',
-            showline=True,
-            linewidth=2,
-            linecolor=COLOR_PALETTE['shadow_dark'],
-            tickfont=dict(color=COLOR_PALETTE['text_secondary'], size=12),
-            title_font=dict(size=14, color=COLOR_PALETTE['text_primary'])
-        ),
-        yaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(102, 126, 234, 0.1)',
-            showline=True,
-            linewidth=2,
-            linecolor=COLOR_PALETTE['shadow_dark'],
-            tickfont=dict(color=COLOR_PALETTE['text_secondary'], size=12),
-            title_font=dict(size=14, color=COLOR_PALETTE['text_primary'])
-        ),
+        xaxis=_CHART_AXIS_STYLE,
+        yaxis=_CHART_AXIS_STYLE,
         
         # Enhanced legend
         legend=dict(
@@ -512,13 +239,10 @@ def apply_modern_chart_theme(fig, title=None, height=500):
         
         # Margins and sizing
         margin=dict(l=70, r=70, t=100, b=70),
-        height=height,
         
         # Enhanced hover effects
         hoverlabel=dict(
             bgcolor="white",
-            font_size=13,
-            font_family="Inter",
             bordercolor="rgba(102, 126, 234, 0.3)",
             font=dict(color=COLOR_PALETTE['text_primary'])
         ),
@@ -528,30 +252,20 @@ def apply_modern_chart_theme(fig, title=None, height=500):
         
         # Modern animation
         transition={'duration': 500, 'easing': 'cubic-in-out'}
+    ),
+    data=dict(
+        bar=[go.Bar(marker=dict(line=dict(width=0.5, color='white')))],
+        scatter=[go.Scatter(line=dict(width=3))]
     )
-    
-    # Update traces with modern colors and effects
-    if hasattr(fig, 'data'):
-        for i, trace in enumerate(fig.data):
-            # Apply colors from unified palette
-            color = CHART_COLORS[i % len(CHART_COLORS)]
-            
-            if hasattr(trace, 'marker'):
-                trace.marker.update(
-                    color=color,
-                    line=dict(width=0.5, color='white')
-                )
-            
-            if hasattr(trace, 'line'):
-                trace.line.update(
-                    color=color,
-                    width=3
-                )
-    
-    # Add subtle shadow effect via shapes
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(102, 126, 234, 0.08)')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(102, 126, 234, 0.08)')
-    
+)
+pio.templates[CHART_TEMPLATE_NAME] = _modern_chart_template
+pio.templates.default = CHART_TEMPLATE_NAME
+
+def apply_modern_chart_theme(fig, title=None, height=500):
+    """Apply the registered dashboard template plus per-chart title and height"""
+    fig.update_layout(template=CHART_TEMPLATE_NAME, height=height)
+    if title:
+        fig.update_layout(title_text=title)
     return fig
 
 def create_chart_container(chart_fig, title=None):
@@ -598,84 +312,27 @@ def create_enhanced_metric_card(icon, label, value, subtitle="", color=None):
 # P0 PRIORITY: SCHEMA-DRIVEN KPI ENGINE
 # =============================================================================
 
-# KPI Configuration (Embedded for P0 Implementation)
-KPI_CONFIG = {
-    'metadata': {
-        'version': '1.0.0',
-        'description': 'BNT113 Clinical Trial KPI Definitions',
-        'last_updated': '2025-06-09'
-    },
-    'kpis': {
-        'total_referred': {
-            'name': 'Total Referred',
-            'description': 'Individual patients referred',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_referred', 'fallback_value': 0},
-            'display': {'icon': '👥', 'color': COLOR_PALETTE['info'], 'subtitle': 'Individual patients referred'},
-            'targets': {'default': 50}
-        },
-        'referred_to_prescreen': {
-            'name': 'Referred to Pre-screen',
-            'description': 'Patients referred to pre-screening',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_referred_to_prescreen', 'fallback_value': 0},
-            'display': {'icon': '🔍', 'color': COLOR_PALETTE['chart_6'], 'subtitle': 'Patients referred to pre-screening'},
-            'targets': {'default': 40}
-        },
-        'referred_to_main_trial': {
-            'name': 'Referred to Main Trial',
-            'description': 'Patients referred to main trial screening',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_referred_to_main_trial', 'fallback_value': 0},
-            'display': {'icon': '🎯', 'color': COLOR_PALETTE['warning'], 'subtitle': 'Patients referred to main trial screening'},
-            'targets': {'default': 30}
-        },
-        'recruited_to_cvlp': {
-            'name': 'Recruited to CVLP',
-            'description': 'CVLP consented patients',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_recruited_to_cvlp', 'fallback_value': 0},
-            'display': {'icon': '✅', 'color': COLOR_PALETTE['success'], 'subtitle': 'CVLP consented patients'},
-            'targets': {'default': 25}
-        },
-        'consented_prescreen': {
-            'name': 'Consented BNT113-01',
-            'description': 'Pre-screening consented patients',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_consented_prescreen', 'fallback_value': 0},
-            'display': {'icon': '📝', 'color': COLOR_PALETTE['chart_8'], 'subtitle': 'Pre-screening consented'},
-            'targets': {'default': 20}
-        },
-        'randomised': {
-            'name': 'Randomised BNT113-01',
-            'description': 'Patients randomised to BNT113-01 trial',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_randomised', 'fallback_value': 0},
-            'display': {'icon': '🎲', 'color': COLOR_PALETTE['chart_9'], 'subtitle': 'Randomised to BNT113-01'},
-            'targets': {'default': 15}
-        },
-        'screen_failures': {
-            'name': 'Screen Failures',
-            'description': 'BNT113-01 screen failures',
-            'calculation': {'type': 'derived_column_sum', 'column': 'is_screen_failure', 'fallback_value': 0},
-            'display': {'icon': '⚠️', 'color': COLOR_PALETTE['danger'], 'subtitle': 'BNT113-01 screen failures', 'border_color': COLOR_PALETTE['danger']},
-            'targets': {'default': 8}
-        }
-    },
-    'dashboard_layout': {
-        'title': '📊 BNT113 Trial Metrics Overview (Schema-Driven)',
-        'sections': {
-            'primary_metrics': {
-                'kpis': ['total_referred', 'referred_to_prescreen', 'referred_to_main_trial', 'recruited_to_cvlp'],
-                'layout': '4_columns'
-            },
-            'secondary_metrics': {
-                'kpis': ['consented_prescreen', 'randomised', 'screen_failures'],
-                'layout': '3_columns_centered'
-            }
-        }
-    }
-}
+@st.cache_resource
+def get_kpi_schema_watcher():
+    """One KPI schema watcher per server process; reloads the YAML definitions when the file changes"""
+    return kpi_schema_watcher()
+
+@st.cache_resource
+def get_kpi_history():
+    """One KPI time series store per server process"""
+    return KPIHistory()
 
 class SchemaKPIEngine:
     """P0 Priority: Schema-driven KPI Engine for clinical trial dashboards"""
     
-    def __init__(self):
-        self.config = KPI_CONFIG
+    def __init__(self, schema_watcher, kpi_history=None):
+        self.schema_watcher = schema_watcher
+        # Recorded KPI values per dataset version, for tile trends (None: no trends)
+        self.kpi_history = kpi_history
+        # Read the live schema once, so a reload mid-render can't mix two versions
+        loaded = schema_watcher.current
+        self.schema = loaded.data if loaded is not None else None
+        self.config = self.schema.config if self.schema is not None else {}
         self.kpis = self.config.get('kpis', {})
         self.targets = {}
         
@@ -683,36 +340,23 @@ class SchemaKPIEngine:
         for kpi_id, kpi_config in self.kpis.items():
             self.targets[kpi_id] = kpi_config.get('targets', {}).get('default', 0)
     
-    def calculate_kpis(self, df):
-        """Calculate all KPIs from DataFrame using schema configuration"""
+    def calculate_kpis(self, df, as_of=None, cache=None, kpi_snapshot=None):
+        """Calculate all KPIs from DataFrame using the compiled plan for this configuration"""
+        # Compiled once per set of calculations; with a cache only changed KPIs are evaluated again.
+        # Plain sums of the headline flags come from the shared KPI snapshot, so they match the tiles.
+        column_totals = kpi_snapshot_column_totals(kpi_snapshot) if kpi_snapshot is not None else None
+        values = evaluate_kpis(self.config, df, as_of, cache, column_totals)
         results = {}
         
         for kpi_id, kpi_config in self.kpis.items():
-            try:
-                calculation = kpi_config.get('calculation', {})
-                column = calculation.get('column')
-                fallback = calculation.get('fallback_value', 0)
-                
-                if column in df.columns:
-                    value = int(df[column].sum())
-                else:
-                    value = fallback
-                
-                results[kpi_id] = {
-                    'value': value,
-                    'config': kpi_config,
-                    'target': self.targets.get(kpi_id, 0),
-                    'achievement': self._calculate_achievement(value, self.targets.get(kpi_id, 0))
-                }
-                
-            except Exception as e:
-                results[kpi_id] = {
-                    'value': 0,
-                    'config': kpi_config,
-                    'target': 0,
-                    'achievement': 0,
-                    'error': str(e)
-                }
+            result = values[kpi_id]
+            target = self.targets.get(kpi_id, 0)
+            results[kpi_id] = {
+                **result,
+                'config': kpi_config,
+                'target': target,
+                'achievement': 0 if 'error' in result else self._calculate_achievement(result['value'], target)
+            }
         
         return results
     
@@ -722,36 +366,31 @@ class SchemaKPIEngine:
             return 100.0 if actual > 0 else 0.0
         return min((actual / target) * 100, 200.0)
     
-    def render_schema_driven_metrics_tiles(self, df):
-        """Render KPI metrics tiles using schema configuration"""
-        if df.empty:
-            st.warning("No data available to create metrics")
-            return
-        
-        # Calculate KPIs using schema
-        kpi_results = self.calculate_kpis(df)
-        
-        # Get layout configuration
+    def kpi_trend(self, kpi_id, privacy_level, as_of=None):
+        """Recorded trend of a KPI's current calculation, or None"""
+        if self.kpi_history is None or privacy_level is None:
+            return None
+        return self.kpi_history.trend(privacy_level, kpi_id, calculation_fingerprint(kpi_id, self.kpis), as_of)
+    
+    def render_overview_tiles(self, kpi_results, as_of=None, privacy_level=None):
+        """Render the overview's KPI tiles from already calculated KPIs, laid out by the schema"""
         layout_config = self.config.get('dashboard_layout', {})
         title = layout_config.get('title', '📊 KPI Dashboard')
         
-        st.markdown(f"<h2 style='text-align: center; margin-bottom: 30px;'>{title}</h2>", 
-                   unsafe_allow_html=True)
-        
-        # Add schema-driven badge
-        st.markdown("""
-        <div style='text-align: center; margin-bottom: 20px;'>
-            <span style='background: linear-gradient(90deg, #4CAF50, #2196F3); color: white; padding: 8px 16px; border-radius: 20px; font-size: 12px; font-weight: 600;'>
-                ✨ SCHEMA-DRIVEN BI ✨ No Code Changes Required for KPI Updates
-            </span>
+        st.markdown(f"""
+        <div class="section-header fade-in">
+            {title}
         </div>
         """, unsafe_allow_html=True)
         
         # Render sections
         sections = layout_config.get('sections', {})
+        tile_index = 0
         
         for section_id, section_config in sections.items():
-            section_kpis = section_config.get('kpis', [])
+            section_kpis = [kpi_id for kpi_id in section_config.get('kpis', []) if kpi_id in kpi_results]
+            if not section_kpis:
+                continue
             layout_type = section_config.get('layout', '4_columns')
             
             if layout_type == '4_columns':
@@ -762,15 +401,25 @@ class SchemaKPIEngine:
             else:
                 cols = st.columns(len(section_kpis))
             
-            for i, kpi_id in enumerate(section_kpis):
-                if i < len(cols) and kpi_id in kpi_results:
-                    with cols[i]:
-                        self._render_kpi_tile(kpi_id, kpi_results[kpi_id])
+            for i, kpi_id in enumerate(section_kpis[:len(cols)]):
+                with cols[i]:
+                    self._render_kpi_tile(kpi_id, kpi_results[kpi_id], self.kpi_trend(kpi_id, privacy_level, as_of), tile_index * 0.1)
+                tile_index += 1
             
             st.markdown("<br>", unsafe_allow_html=True)
     
-    def _render_kpi_tile(self, kpi_id, kpi_data):
-        """Render a single KPI tile using schema configuration"""
+    @staticmethod
+    def _sparkline_svg(values, color, width=120, height=28):
+        """Inline SVG line of a KPI's recent values"""
+        low, high = float(np.min(values)), float(np.max(values))
+        span = (high - low) or 1.0
+        step = width / (len(values) - 1)
+        points = " ".join(f"{i * step:.1f},{height - 2 - (v - low) / span * (height - 4):.1f}" for i, v in enumerate(values))
+        return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" style="margin-top: 4px;">'
+                f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2" stroke-linejoin="round"/></svg>')
+    
+    def _render_kpi_tile(self, kpi_id, kpi_data, trend=None, animation_delay=0.0):
+        """Render a single KPI tile using schema configuration, with its recorded trend if any"""
         config = kpi_data['config']
         display_config = config.get('display', {})
         
@@ -780,74 +429,67 @@ class SchemaKPIEngine:
         achievement = kpi_data['achievement']
         subtitle = display_config.get('subtitle', '')
         icon = display_config.get('icon', '📊')
-        color = display_config.get('color', '#3949AB')
-        border_color = display_config.get('border_color', '')
-        
-        formatted_value = f"{int(value):,}"
-        border_style = f"border-left: 4px solid {border_color};" if border_color else ""
+        # Colours are palette names or hex values; the value fades from color to color_to
+        color = COLOR_PALETTE.get(display_config.get('color'), display_config.get('color', '#3949AB'))
+        color_to = COLOR_PALETTE.get(display_config.get('color_to'), display_config.get('color_to', color))
+        border_color = COLOR_PALETTE.get(display_config.get('border_color'), display_config.get('border_color', ''))
+        
+        value_format = display_config.get('format', '{:,.0f}')
+        formatted_value = value_format.format(value)
+        if kpi_data.get('breakdown'):
+            top_site, top_value = max(kpi_data['breakdown'].items(), key=lambda item: item[1])
+            subtitle = f"{subtitle}: {top_site} ({top_value:,.0f})" if subtitle else f"{top_site} ({top_value:,.0f})"
+        border_style = f" border-left: 4px solid {border_color};" if border_color else ""
         
         # Add achievement indicator using unified colors
         achievement_color = COLOR_PALETTE['success'] if achievement >= 80 else COLOR_PALETTE['warning'] if achievement >= 50 else COLOR_PALETTE['danger']
         achievement_text = f"🎯 {achievement:.0f}% of target" if target > 0 else ""
         
+        # Week-over-week change and sparkline from the KPI history
+        trend_html = ""
+        if trend is not None and trend.week_delta is not None:
+            delta_color = COLOR_PALETTE['success'] if trend.week_delta > 0 else COLOR_PALETTE['danger'] if trend.week_delta < 0 else COLOR_PALETTE['text_muted']
+            arrow = "▲" if trend.week_delta > 0 else "▼" if trend.week_delta < 0 else "▶"
+            delta_text = value_format.format(abs(trend.week_delta))
+            trend_html += f'<div style="font-size: 0.75rem; color: {delta_color}; margin-top: 0.25rem;">{arrow} {delta_text} vs last week</div>'
+        if trend is not None and len(trend.values) > 1:
+            trend_html += self._sparkline_svg(trend.values, color)
+        
         tile_html = f"""
-        <div class="metric-card" style="{border_style}">
-            <div class="metric-label">{icon} {name}</div>
-            <div class="big-metric" style="color: {color} !important;">{formatted_value}</div>
-            <div style="font-size: 12px; color: #666; margin-top: 5px;">{subtitle}</div>
-            {f'<div style="font-size: 11px; color: {achievement_color}; margin-top: 3px; font-weight: 600;">{achievement_text}</div>' if achievement_text else ''}
+        <div class="metric-card fade-in" style="animation-delay: {animation_delay:.1f}s;{border_style}">
+            <div style="text-align: center;">
+                <div class="metric-icon" style="color: {color};">{icon}</div>
+                <div class="metric-value" style="background: linear-gradient(135deg, {color} 0%, {color_to} 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text;">{formatted_value}</div>
+                <div class="metric-label">{name}</div>
+                <div style="font-size: 0.85rem; color: {COLOR_PALETTE['text_muted']}; margin-top: 0.5rem;">{subtitle}</div>
+                {f'<div style="font-size: 0.75rem; color: {achievement_color}; margin-top: 0.25rem; font-weight: 600;">{achievement_text}</div>' if achievement_text else ''}
+                {trend_html}
+            </div>
         </div>
         """
         
         st.markdown(tile_html, unsafe_allow_html=True)
     
-    def render_target_configuration_ui(self):
-        """Render schema-driven target configuration UI in sidebar"""
-        with st.sidebar.expander("🎯 Schema-Driven KPI Targets"):
-            st.markdown("### Configure KPI Targets")
-            st.markdown("*✨ Business users can modify targets without code changes*")
-            
-            new_targets = {}
-            
-            for kpi_id, kpi_config in self.kpis.items():
-                kpi_name = kpi_config.get('name', kpi_id)
-                current_target = self.targets.get(kpi_id, 0)
-                
-                new_target = st.number_input(
-                    f"{kpi_name}",
-                    min_value=0,
-                    value=int(current_target),
-                    step=1,
-                    key=f"schema_target_{kpi_id}",
-                    help=f"Default: {kpi_config.get('targets', {}).get('default', 0)}"
-                )
-                
-                new_targets[kpi_id] = new_target
-            
-            if st.button("💾 Update Schema Targets", key="update_schema_targets"):
-                # Update targets in memory (schema-driven approach)
-                for kpi_id, target_value in new_targets.items():
-                    self.targets[kpi_id] = float(target_value)
-                
-                st.success("✅ Schema targets updated successfully!")
-                st.info("💡 Changes applied immediately - No code deployment needed")
-    
     def render_schema_info(self):
         """Render schema-driven BI information panel"""
         with st.sidebar.expander("⚙️ Schema-Driven BI Features"):
             metadata = self.config.get('metadata', {})
             
             st.markdown("**Configuration Details:**")
+            st.text(f"Schema File: {KPI_SCHEMA_PATH}")
             st.text(f"Version: {metadata.get('version', '1.0.0')}")
             st.text(f"KPIs Defined: {len(self.kpis)}")
             st.text(f"Last Updated: {metadata.get('last_updated', 'Unknown')}")
+            if self.schema is not None:
+                st.text(f"Loaded: {datetime.fromtimestamp(self.schema.loaded_at):%d/%m/%Y %H:%M:%S}")
+                st.text(f"Plan: {self.schema.plan_fingerprint}")
+            if self.schema_watcher.last_error:
+                st.error(f"Last edit rejected, previous schema still live: {self.schema_watcher.last_error}")
             
             st.markdown("**✨ Schema-Driven Benefits:**")
             st.markdown("• ✅ **Zero Code Changes** for KPI updates")
-            st.markdown("• ✅ **Business User Configurable** targets")
             st.markdown("• ✅ **Version Controlled** schemas")
             st.markdown("• ✅ **Dynamic Layout** management")
-            st.markdown("• ✅ **Real-time Target** adjustments")
             st.markdown("• ✅ **Consistent Styling** across metrics")
             
             st.markdown("**🚀 P0 Implementation:**")
@@ -856,7 +498,8 @@ class SchemaKPIEngine:
             st.markdown("• Maintainable and scalable architecture")
 
 # Initialize Schema-Driven KPI Engine
-schema_kpi_engine = SchemaKPIEngine()
+kpi_history = get_kpi_history()
+schema_kpi_engine = SchemaKPIEngine(get_kpi_schema_watcher(), kpi_history)
 
 # =============================================================================
 # END OF SCHEMA-DRIVEN KPI ENGINE
@@ -864,162 +507,12 @@ schema_kpi_engine = SchemaKPIEngine()
 
 # P0 PRIORITY: Import schema validation module
 try:
-    from schema_validation import (
-        validate_master_tracker_data, 
-        generate_data_quality_report, 
-        display_quality_metrics
-    )
+    from schema_validation import validate_master_tracker_data
     SCHEMA_VALIDATION_AVAILABLE = True
 except ImportError:
     # Schema validation is optional - silently disable if not available
     SCHEMA_VALIDATION_AVAILABLE = False
 
-# Add logo integration functions
-def get_base64_encoded_image(image_path):
-    """Convert image to base64 string for CSS embedding"""
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except:
-        return None
-
-# Get base64 encoded logo
-logo_base64 = get_base64_encoded_image("assets/SCTU Logo (mediabin resized).jpg")
-
-# Custom CSS for enhanced visual design with logo integration
-st.markdown(f"""
-<style>
-    /* Modern Typography */
-    html, body, [class*="css"] {{
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-    }}
-    
-    /* Logo watermark background */
-    .main .block-container {{
-        background-image: url("data:image/jpeg;base64,{logo_base64}");
-        background-repeat: no-repeat;
-        background-position: center center;
-        background-size: 400px;
-        background-attachment: fixed;
-        background-opacity: 0.03;
-        position: relative;
-    }}
-    
-    .main .block-container::before {{
-        content: "";
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        background-color: rgba(255, 255, 255, 0.97);
-        z-index: -1;
-    }}
-    
-    /* Sidebar logo styling */
-    .sidebar-logo {{
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        padding: 20px 10px;
-        margin-bottom: 20px;
-        background: linear-gradient(135deg, #f8f9ff 0%, #e8eaf6 100%);
-        border-radius: 12px;
-        border: 2px solid #e1e5fe;
-    }}
-    
-    /* Better Headers */
-    h1 {{
-        font-weight: 700 !important;
-        color: #1A237E !important;
-        padding-bottom: 10px;
-        border-bottom: 2px solid #E8EAF6;
-    }}
-    h2 {{
-        font-weight: 600 !important;
-        color: #283593 !important;
-    }}
-    h3 {{
-        font-weight: 500 !important;
-        color: #3949AB !important;
-    }}
-    
-    /* Enhanced Metric Display for Schema-Driven Tiles */
-    .big-metric {{
-        font-size: 2.8rem !important;
-        font-weight: 800 !important;
-        color: #2c3e50 !important;
-        letter-spacing: -0.5px !important;
-        line-height: 1.2 !important;
-        transition: all 0.3s ease !important;
-        display: block !important;
-        margin: 0.5rem 0 !important;
-    }}
-    
-    .metric-card:hover .big-metric {{
-        color: #667eea !important;
-        transform: scale(1.05);
-    }}
-    
-    .metric-label {{
-        font-size: 0.95rem;
-        color: #5a6c7d;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-bottom: 0.5rem;
-    }}
-    
-    /* Mobile Optimization */
-    @media (max-width: 768px) {{
-        .big-metric {{
-            font-size: 2rem !important;
-        }}
-        .metric-card {{
-            padding: 1.2rem;
-            margin-bottom: 1rem;
-        }}
-        .metric-icon {{
-            font-size: 2.2rem;
-        }}
-        .metric-value {{
-            font-size: 1.8rem;
-        }}
-    }}
-    
-    /* Table styling */
-    .styled-table {{
-        width: 100%;
-        border-collapse: collapse;
-        margin: 25px 0;
-        font-size: 0.9em;
-        font-family: 'Inter', sans-serif;
-        min-width: 400px;
-        box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);
-        border-radius: 8px;
-        overflow: hidden;
-    }}
-    .styled-table thead tr {{
-        background-color: #3949AB;
-        color: #ffffff;
-        text-align: left;
-    }}
-    .styled-table th,
-    .styled-table td {{
-        padding: 12px 15px;
-    }}
-    .styled-table tbody tr {{
-        border-bottom: 1px solid #dddddd;
-    }}
-    .styled-table tbody tr:nth-of-type(even) {{
-        background-color: #f3f3f3;
-    }}
-    .styled-table tbody tr:last-of-type {{
-        border-bottom: 2px solid #3949AB;
-    }}
-</style>
-""", unsafe_allow_html=True)
-
 # Define a professional, clinical color palette
 clinical_colors = {
     'primary': ['#E8EAF6', '#C5CAE9', '#9FA8DA', '#7986CB', '#5C6BC0', '#3F51B5', '#3949AB', '#303F9F', '#283593', '#1A237E'],
@@ -1131,6 +624,7 @@ if 'admin_settings' not in st.session_state:
         'show_monthly_table': True,
         'show_monthly_charts': True,
         'show_monthly_trends': True,
+        'show_version_comparison': True,
         
         # Site Analysis
         'show_site_performance': True,
@@ -1147,11 +641,13 @@ if 'admin_settings' not in st.session_state:
         'show_statistical_control': True,
         'show_performance_radar': True,
         'show_combined_analysis': True,
+        'show_sample_logistics': True,
         
         # Technical & Debug
         'show_debug_info': True,
         'show_data_quality': True,
-        'show_column_detection': True
+        'show_column_detection': True,
+        'show_query_console': True
     }
 
 # Initialize session state for achievements tab
@@ -1210,6 +706,11 @@ with admin_col1:
 with admin_col2:
     st.markdown("Monthly Trends Visualization")
 
+with admin_col1:
+    st.session_state.admin_settings['show_version_comparison'] = st.checkbox("Version Comparison", value=st.session_state.admin_settings.get('show_version_comparison', True), key="toggle_version_comparison", label_visibility="collapsed")
+with admin_col2:
+    st.markdown("Tracker Version Comparison")
+
 st.sidebar.markdown("**🏥 Site Analysis:**")
 with admin_col1:
     st.session_state.admin_settings['show_site_performance'] = st.checkbox("Site Performance", value=st.session_state.admin_settings['show_site_performance'], key="toggle_site", label_visibility="collapsed")
@@ -1263,6 +764,11 @@ with admin_col1:
 with admin_col2:
     st.markdown("Combined Analysis")
 
+with admin_col1:
+    st.session_state.admin_settings['show_sample_logistics'] = st.checkbox("Sample Logistics", value=st.session_state.admin_settings.get('show_sample_logistics', True), key="toggle_sample_logistics", label_visibility="collapsed")
+with admin_col2:
+    st.markdown("Sample Logistics Latency")
+
 st.sidebar.markdown("**🔧 Technical:**")
 with admin_col1:
     st.session_state.admin_settings['show_debug_info'] = st.checkbox("Debug Info", value=st.session_state.admin_settings['show_debug_info'], key="toggle_debug", label_visibility="collapsed")
@@ -1279,6 +785,11 @@ with admin_col1:
 with admin_col2:
     st.markdown("Column Detection Debug")
 
+with admin_col1:
+    st.session_state.admin_settings['show_query_console'] = st.checkbox("Tracker Query", value=st.session_state.admin_settings.get('show_query_console', True), key="toggle_query_console", label_visibility="collapsed")
+with admin_col2:
+    st.markdown("Tracker Query (SQL)")
+
 # Quick preset buttons
 st.sidebar.markdown("**Quick Presets:**")
 preset_col1, preset_col2 = st.sidebar.columns(2)
@@ -1294,6 +805,7 @@ with preset_col1:
             'show_monthly_table': True,
             'show_monthly_charts': False,
             'show_monthly_trends': False,  # HIDDEN for external
+            'show_version_comparison': False,  # HIDDEN for external
             
             # Site Analysis - Hide performance and visualizations
             'show_site_performance': True,
@@ -1310,11 +822,13 @@ with preset_col1:
             'show_statistical_control': False,
             'show_performance_radar': False,
             'show_combined_analysis': False,  # HIDDEN for external
+            'show_sample_logistics': False,
             
             # Technical - Hide all
             'show_debug_info': False,
             'show_data_quality': False,
-            'show_column_detection': False
+            'show_column_detection': False,
+            'show_query_console': False
         })
         st.rerun()
 
@@ -1329,6 +843,7 @@ with preset_col2:
             'show_monthly_table': True,
             'show_monthly_charts': True,
             'show_monthly_trends': True,
+            'show_version_comparison': True,
             
             # Site Analysis
             'show_site_performance': True,
@@ -1345,11 +860,13 @@ with preset_col2:
             'show_statistical_control': True,
             'show_performance_radar': True,
             'show_combined_analysis': True,
+            'show_sample_logistics': True,
             
             # Technical
             'show_debug_info': True,
             'show_data_quality': True,
-            'show_column_detection': True
+            'show_column_detection': True,
+            'show_query_console': True
         })
         st.rerun()
 
@@ -1379,6 +896,7 @@ with settings_col2:
             'show_monthly_table': True,
             'show_monthly_charts': True,
             'show_monthly_trends': True,
+            'show_version_comparison': True,
             
             # Site Analysis
             'show_site_performance': True,
@@ -1395,22 +913,176 @@ with settings_col2:
             'show_statistical_control': True,
             'show_performance_radar': True,
             'show_combined_analysis': True,
+            'show_sample_logistics': True,
             
             # Technical & Debug
             'show_debug_info': True,
             'show_data_quality': True,
-            'show_column_detection': True
+            'show_column_detection': True,
+            'show_query_console': True
         }
         st.rerun()
 
-# Require file upload before rendering the dashboard
-if uploaded_master_file is None:
+@st.cache_resource
+def get_result_store():
+    """One result store per server process, shared by every browser session"""
+    return ResultStore()
+
+result_store = get_result_store()
+
+@st.cache_resource
+def get_tracker_history():
+    """One tracker version history per server process"""
+    return TrackerHistory()
+
+tracker_history = get_tracker_history()
+
+# === CPGC REPORTING WORKBOOK ===
+def ingest_reporting_workbook(content, version):
+    """Parse the CPGC tables of a new reporting workbook; one missing a sheet is rejected"""
+    return read_reporting_workbook(content)
+
+@st.cache_resource
+def get_reporting_workbook_watcher():
+    """One watcher per server process; re-reads the CPGC reporting workbook when it changes"""
+    return LocalDataWatcher([REPORTING_WORKBOOK_PATH], ingest_reporting_workbook).start()
+
+reporting_workbook_watcher = get_reporting_workbook_watcher()
+# Parsed once per workbook version and shared by every session, so never modified here
+reporting_workbook = reporting_workbook_watcher.current
+cpgc_content = reporting_workbook.data if reporting_workbook is not None else CpgcReportingContent()
+# Results built from the workbook's tables are cached per workbook version
+reporting_workbook_version = reporting_workbook.version if reporting_workbook is not None else "none"
+
+# === LOCAL TRACKER WATCHER ===
+# Local copies of the Master Tracker (written by COPY_DATA_FROM_ONEDRIVE.bat), in order of preference
+LOCAL_TRACKER_PATHS = [
+    "BNT113-01-Master-Tracker-Local.xlsx",
+    os.path.join("..", "BNT113 real data", "BNT113-01 Master Tracker v1 15-Apr-2025.xlsx"),
+]
+# Screening Logs uploads remembered for warming new local tracker versions
+RECENT_SCREENING_LOGS = 4
+
+@st.cache_resource
+def get_recent_screening_logs():
+    """Fingerprint -> bytes of the Screening Logs last uploaded alongside the local tracker, shared by every session"""
+    return OrderedDict(), threading.Lock()
+
+def remember_screening_logs(screening_logs_file):
+    """Warm future local tracker versions for this Screening Logs upload too"""
+    uploads, lock = get_recent_screening_logs()
+    fingerprint = dataset_fingerprint(screening_logs_file)
+    with lock:
+        uploads[fingerprint] = screening_logs_file.getvalue()
+        uploads.move_to_end(fingerprint)
+        while len(uploads) > RECENT_SCREENING_LOGS:
+            uploads.popitem(last=False)
+
+def local_dataset_key(version, screening_logs_file=None):
+    """Result store key for a local tracker version, distinct from an upload of the same file"""
+    return dataset_fingerprint(f"local-tracker:{version}", screening_logs_file)
+
+@st.cache_resource
+def get_latest_control_charts():
+    """Latest control charts per privacy level, shared by every session so a new tracker only counts its new months"""
+    return {}
+
+def warm_local_dataset(df, content, version, screening_logs=None):
+    """Compute the tables a default (pseudonymized) session reads, under the keys and names it looks them up by"""
+    key = local_dataset_key(version, screening_logs)
+    context = get_shared_data_context(
+        key, io.BytesIO(content), io.BytesIO(screening_logs) if screening_logs is not None else None, result_store
+    )
+    linkage = result_store.get_or_compute(
+        key, CONTEXT_PRIVACY_LEVEL, "patient_linkage", lambda: link_patients(df, context.screening_logs.patients)
+    )
+    workbook = reporting_workbook_watcher.current
+    as_of = pd.Timestamp.now()
+    latest_charts = get_latest_control_charts()
+    results = compute_dashboard_results(
+        df, content, context, "Pseudonymized (Safe)", {}, linkage,
+        workbook.data.cpgc_reporting if workbook is not None else [], include_cube=True,
+        as_of=as_of, previous_charts=latest_charts.get("Pseudonymized (Safe)"),
+    )
+    latest_charts["Pseudonymized (Safe)"] = results["control_charts"]
+    if DUCKDB_AVAILABLE:
+        results["query_tables"] = query_tables(results["prepared_tracker"], context)
+    for name, value in results.items():
+        if value is None:
+            continue
+        result_store.setdefault(
+            key, "Pseudonymized (Safe)",
+            result_store_name(name, as_of, workbook.version if workbook is not None else "none"), value
+        )
+
+def ingest_local_tracker(content, version):
+    """Parse, validate and preprocess a new local tracker; raising keeps the previous one live"""
+    # Local copies have their headers on the first row
+    df = read_master_tracker(io.BytesIO(content), header=0)
+    if df.empty:
+        raise ValueError("the 'CVLP - Master Tracker' sheet has no data rows")
+    if SCHEMA_VALIDATION_AVAILABLE:
+        validate_master_tracker_data(df)
+    # Keep each local version for comparison; a history failure must not hold back the new data
+    local_path = next((path for path in LOCAL_TRACKER_PATHS if os.path.exists(path)), "local tracker")
+    try:
+        tracker_history.record(df, version, os.path.basename(local_path), "local")
+    except Exception as e:
+        tracker_history.last_error = f"{os.path.basename(local_path)}: {e}"
+    return df
+
+def warm_local_tracker(dataset):
+    """Warm what sessions without Screening Logs read, and sessions with a recent upload, once a new
+    local tracker is live, so the first viewer doesn't pay for it. Every failure is reported."""
+    failures = []
+    try:
+        warm_local_dataset(dataset.data, dataset.content, dataset.version)
+    except Exception as e:
+        failures.append(f"without Screening Logs: {e}")
+    uploads, lock = get_recent_screening_logs()
+    with lock:
+        recent = list(uploads.values())
+    for screening_logs in recent:
+        try:
+            warm_local_dataset(dataset.data, dataset.content, dataset.version, screening_logs)
+        except Exception as e:
+            failures.append(f"with a recent Screening Logs upload: {e}")
+    if failures:
+        raise RuntimeError("; ".join(failures))
+
+@st.cache_resource
+def get_local_data_watcher():
+    """One watcher per server process; re-ingests the local tracker in the background when it changes"""
+    return LocalDataWatcher(LOCAL_TRACKER_PATHS, ingest_local_tracker, warm=warm_local_tracker).start()
+
+local_data_watcher = get_local_data_watcher()
+
+# === SNAPSHOT MODE ===
+# With BNT113_SNAPSHOT_DIR set, serve the tables precomputed by `python -m dashboard_snapshot`
+SNAPSHOT_DIR = os.environ.get("BNT113_SNAPSHOT_DIR")
+
+@st.cache_resource(max_entries=2)
+def load_dashboard_snapshot(snapshot_path):
+    """Snapshot directories are immutable, so each one is read once per server process"""
+    return load_snapshot(snapshot_path)
+
+snapshot = None
+if SNAPSHOT_DIR and uploaded_master_file is None:
+    snapshot_path = latest_snapshot_path(SNAPSHOT_DIR)
+    if snapshot_path is not None:
+        snapshot = load_dashboard_snapshot(snapshot_path)
+
+# Without an upload or snapshot, serve the latest fully ingested local tracker (if there is one)
+local_dataset = local_data_watcher.current if uploaded_master_file is None and snapshot is None else None
+
+# Require file upload (or a snapshot / local tracker copy) before rendering the dashboard
+if uploaded_master_file is None and snapshot is None and local_dataset is None:
     # Splash screen with centered logo and informative cancer messages
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown(
         f"""
         <div style='display:flex; align-items:center; justify-content:center; margin: 10px 0 20px 0;'>
-            <img src="data:image/jpeg;base64,{logo_base64}" alt="SCTU Logo" style="max-width: 480px; width: 40vw; height: auto; opacity: 0.95;"/>
+            <img src="{STATIC_URL}/sctu-logo.jpg" alt="SCTU Logo" style="max-width: 480px; width: 40vw; height: auto; opacity: 0.95;"/>
         </div>
         <div style='text-align:center; max-width: 900px; margin: 0 auto; font-family: Inter, -apple-system, BlinkMacSystemFont, sans-serif;'>
             <h2 style='color:#1A237E; margin-bottom: 8px;'>BNT113 Clinical Trial Dashboard</h2>
@@ -1431,6 +1103,13 @@ if uploaded_master_file is None:
     st.info("To begin, upload your BNT113-01 Master Tracker Excel file using the sidebar.")
     st.stop()
 
+# The workbook every section reads from: the upload, or the local copy being served
+# (none in snapshot mode, where the tables come precomputed)
+if local_dataset is not None:
+    master_source = io.BytesIO(local_dataset.content)
+else:
+    master_source = uploaded_master_file
+
 # Admin authentication for full data
 if privacy_mode == "Full Data (Admin)":
     admin_password = st.sidebar.text_input("🔑 Admin Password:", type="password")
@@ -1460,77 +1139,12 @@ with st.sidebar.expander("🛡️ Privacy Information"):
     - Full data requires admin access
     """)
 
-# Add pseudonymization function
-def pseudonymize_data(df):
-    """
-    Pseudonymize sensitive patient data for dashboard display
-    """
-    if df.empty:
-        return df
-    
-    df_pseudo = df.copy()
-    
-    # Define sensitive columns that need pseudonymization
-    sensitive_columns = [
-        'Patient full name',
-        'NHS Number',
-        'CVLP Participant ID',
-        'Main trial participant ID',
-        'Pre-screening ID',
-        'Sample tracking ID',
-        'Tissue Block ID',
-        'Accession number',
-        'Airway bill number',
-        'Shipping tracking ID for curls & slides'
-    ]
-    
-    for col in sensitive_columns:
-        if col in df_pseudo.columns:
-            # Create pseudonymized versions
-            if col == 'Patient full name':
-                # Replace with Patient-XXX format
-                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
-                    f"Patient-{hash(str(x)) % 9999:04d}" if pd.notna(x) and str(x).strip() != '' else x)
-            
-            elif col == 'NHS Number':
-                # Replace with NHS-XXX format, keeping length
-                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
-                    f"NHS-{'X' * (len(str(x)) - 4)}" if pd.notna(x) and str(x).strip() != '' else x)
-            
-            elif 'ID' in col or 'Number' in col:
-                # Replace with masked format keeping prefix
-                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
-                    f"{str(x)[:4]}***{str(x)[-3:]}" if pd.notna(x) and len(str(x)) > 7 
-                    else f"{str(x)[:2]}***" if pd.notna(x) and str(x).strip() != '' else x)
-            
-            else:
-                # Generic masking for other sensitive fields
-                df_pseudo[col] = df_pseudo[col].apply(lambda x: 
-                    f"***{hash(str(x)) % 999:03d}" if pd.notna(x) and str(x).strip() != '' else x)
-    
-    # Optionally mask dates to just show month/year for additional privacy
-    date_columns = [
-        'Date of Birth',
-        'Date patient consented into CVLP',
-        'Date pre-screening referral form sent to trial site',
-        'Date main trial screening referral form sent to trial site'
-    ]
-    
-    for col in date_columns:
-        if col in df_pseudo.columns:
-            if col == 'Date of Birth':
-                # Show only year for DOB
-                df_pseudo[col] = pd.to_datetime(df_pseudo[col], errors='coerce').dt.year
-            # Other dates keep as-is for analytics but could be further masked if needed
-    
-    return df_pseudo
-
 # App title and description with SCTU branding
 col1, col2 = st.columns([1, 4])
 
 with col1:
-    if os.path.exists("assets/SCTU Logo (mediabin resized).jpg"):
-        st.image("assets/SCTU Logo (mediabin resized).jpg", width=120)
+    if os.path.exists("static/sctu-logo.jpg"):
+        st.image("static/sctu-logo.jpg", width=120)
 
 with col2:
     st.markdown("""
@@ -1601,8 +1215,84 @@ def load_master_data_real(uploaded_file=None):
             st.error(f"Alternative loading also failed: {str(e2)}")
         return pd.DataFrame()
 
+# Identifies the inputs; cached results are keyed by this and the privacy level
+if snapshot is not None:
+    dataset_key = dataset_fingerprint(f"snapshot:{snapshot.snapshot_id}")
+    seed_result_store(snapshot, result_store, dataset_key)
+elif local_dataset is not None:
+    dataset_key = local_dataset_key(local_dataset.version, uploaded_screening_logs_file)
+    if uploaded_screening_logs_file is not None:
+        remember_screening_logs(uploaded_screening_logs_file)
+else:
+    dataset_key = dataset_fingerprint(uploaded_master_file, uploaded_screening_logs_file)
+
+# Derived datasets (site opening dates, Screening Logs columns), built once per upload
+# and reused across reruns (session scope) and sessions (process scope)
+data_context = get_data_context(
+    dataset_key, master_source, uploaded_screening_logs_file if snapshot is None else None,
+    st.session_state, result_store
+)
+
+# Date-dependent results ("-" for future months) are as of today, or as of the snapshot
+results_as_of = snapshot.as_of if snapshot is not None else pd.Timestamp.now()
+
 # Load the master data
-master_df = load_master_data_real(uploaded_master_file)
+if snapshot is not None:
+    if privacy_mode not in snapshot.privacy_levels:
+        st.sidebar.warning(f"⚠️ This snapshot has no '{privacy_mode}' view, showing pseudonymized data")
+        privacy_mode = "Pseudonymized (Safe)"
+    # Already prepared for this privacy level (and seeded into the result store above);
+    # until then sections see the tracker's own columns, as with an upload
+    prepared_tracker = snapshot.results[privacy_mode]['prepared_tracker']
+    master_df = prepared_tracker[[c for c in snapshot.manifest['inputs']['tracker_columns'] if c in prepared_tracker.columns]]
+    st.sidebar.success(f"✅ Loaded snapshot: {len(master_df)} records, {len(master_df.columns)} columns")
+    st.sidebar.caption(f"🗂️ {snapshot.snapshot_id} · computed {snapshot.as_of:%d %b %Y %H:%M}")
+elif local_dataset is not None:
+    # Already parsed and validated by the watcher; shared by every session, so never modified here
+    master_df = local_dataset.data
+    st.sidebar.success(f"✅ Loaded local tracker: {len(master_df)} records, {len(master_df.columns)} columns")
+    st.sidebar.caption(
+        f"📂 {os.path.basename(local_dataset.path)} · updated {datetime.fromtimestamp(local_dataset.loaded_at):%d %b %H:%M}"
+    )
+else:
+    master_df = load_master_data_real(uploaded_master_file)
+    tracker_version = dataset_fingerprint(uploaded_master_file)
+    if not master_df.empty and not tracker_history.is_recorded(tracker_version):
+        try:
+            tracker_history.record(master_df, tracker_version, uploaded_master_file.name, "upload")
+        except Exception as e:
+            tracker_history.last_error = f"{uploaded_master_file.name}: {e}"
+if tracker_history.last_error:
+    st.sidebar.warning(f"⚠️ Tracker version could not be added to the history: {tracker_history.last_error}")
+
+# Screening Logs and Master Tracker patients linked into one de-duplicated set. Built from the raw
+# tracker before pseudonymization; it keeps hashed identifiers only, so every privacy level shares it.
+# Snapshots carry their monthly table already computed.
+patient_linkage = None
+if snapshot is None and not master_df.empty:
+    patient_linkage = result_store.get_or_compute(
+        dataset_key, CONTEXT_PRIVACY_LEVEL, "patient_linkage",
+        lambda: link_patients(master_df, data_context.screening_logs.patients)
+    )
+
+
+def cpgc_reporting_table():
+    """CPGC BNT Reporting with the turnaround metrics the tracker answers computed, once per dataset and workbook"""
+    return result_store.get_or_compute(
+        dataset_key, privacy_mode, f"cpgc_reporting@{reporting_workbook_version}",
+        lambda: compute_cpgc_reporting(master_df, cpgc_content.cpgc_reporting)
+    )
+
+
+if local_data_watcher.last_error and local_dataset is not None:
+    st.sidebar.warning(f"⚠️ Newer local tracker could not be loaded, showing the previous version: {local_data_watcher.last_error}")
+if reporting_workbook_watcher.last_error:
+    shown = ", showing the previous version" if reporting_workbook is not None else ""
+    st.sidebar.warning(f"⚠️ CPGC reporting workbook could not be loaded{shown}: {reporting_workbook_watcher.last_error}")
+if schema_kpi_engine.schema is None:
+    st.sidebar.warning(f"⚠️ KPI schema not loaded ({KPI_SCHEMA_PATH}), showing the fixed tiles: {schema_kpi_engine.schema_watcher.last_error or 'file not found'}")
+elif schema_kpi_engine.schema_watcher.last_error:
+    st.sidebar.warning(f"⚠️ KPI schema edit rejected, the previous definitions are still live: {schema_kpi_engine.schema_watcher.last_error}")
 
 # === DATA STATUS ===
 if master_df.empty:
@@ -1632,7 +1322,7 @@ with st.sidebar.expander("🎯 Configure Targets"):
 # === ADVANCED OPTIONS ===
 with st.sidebar.expander("🔧 Advanced Options"):
     st.markdown("**Developer Tools:**")
-    show_debug = st.checkbox("Show Debug Information", value=False)
+    show_debug = st.checkbox("Show Debug Information", value=False, key="show_debug_information")
     show_column_info = st.checkbox("Show Column Details", value=False)
     
     if show_column_info and not master_df.empty:
@@ -1677,165 +1367,62 @@ st.sidebar.markdown("**Updated:** January 2025")
 
 # Apply pseudonymization before processing
 if privacy_mode == "Pseudonymized (Safe)":
-    # Apply pseudonymization to master data
+    # Pseudonymization itself runs once per dataset, inside the shared prepare step below
     if not master_df.empty:
-        master_df = pseudonymize_data(master_df)
         st.sidebar.info("🔒 Data pseudonymized for privacy")
 
-# Data preprocessing function adapted for real data
-def preprocess_real_data(df):
-    if df.empty:
-        return df, datetime.now(), datetime(2024, 12, 31)
-    
-    # Map your column names to what the dashboard expects (define at top of function)
-    prescreen_referral_col = 'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)'
-    main_trial_referral_col = 'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)'
-    cvlp_consent_col = 'Please input the date the patient signed the consent form (dd/mm/yyyy)'
-    cvlp_status_col = 'Please select the CVLP consent status'
-    
-    # Map additional columns from your file
-    prescreen_consent_col = 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail)'
-    main_trial_consent_col = 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail).1'
-    enrolled_col = 'To be confirmed by trial site (enrolled = Yes, screen fail = No)'
-    
-    # Map screen failure columns from your file
-    prescreen_fail_col = 'Clinical Liaison to confirm screen fail with CVLP site'
-    main_trial_fail_col = 'Email the CVLP site to confirm that patient has not consented to the main trial'
-    enrolment_fail_col = 'Email the CVLP site to confirm that patient has not enrolled to the trial'
-    
-    # DEBUG: Show which key columns we're looking for vs what we found
-    key_columns_to_check = {
-        'CVLP Site': 'CVLP Site',
-        'Trial Site': 'Trial Site', 
-        'CVLP Consent': cvlp_consent_col,
-        'Prescreen Referral': prescreen_referral_col,
-        'Main Trial Referral': main_trial_referral_col,
-        'CVLP Status': cvlp_status_col
-    }
-    
-    # Check which columns exist
-    found_columns = {}
-    missing_columns = []
-    
-    for label, col_name in key_columns_to_check.items():
-        if col_name in df.columns:
-            found_columns[label] = col_name
-        else:
-            missing_columns.append(label)
-    
-    # Convert date columns to datetime using the actual column names from your file
-    date_columns = [
-        cvlp_consent_col,
-        prescreen_referral_col,
-        main_trial_referral_col,
-        'Please input the date  tissue block sent to CPGC\n(dd/mm/yyyy)',
-        'Please confirm date of next surveillance visit for patients referred to pre-screening. The Clinical Liaison will use this to check for updates on main trial eligibility',
-        'Date of advanced diagnosis (confirmed by CVLP site by email or on referral form)'
-    ]
-    
-    for col in date_columns:
-        if col in df.columns:
-            try:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-            except:
-                pass
-    
-    # Calculate today's date and intervals
-    today = datetime.now()
-    dec_2024 = pd.Timestamp('2024-12-31')
-    
-    # Create calculated fields using the actual column names from your file
-    
-    # Referred (Count of SINGLE patients referral - either pre-screening OR main trial)
-    df['is_referred'] = False
-    if prescreen_referral_col in df.columns:
-        df['is_referred'] = df['is_referred'] | (~df[prescreen_referral_col].isna())
-    if main_trial_referral_col in df.columns:
-        df['is_referred'] = df['is_referred'] | (~df[main_trial_referral_col].isna())
-    
-    # Referred to pre-screen
-    df['is_referred_to_prescreen'] = False
-    if prescreen_referral_col in df.columns:
-        df['is_referred_to_prescreen'] = ~df[prescreen_referral_col].isna()
-    
-    # Referred to main trial
-    df['is_referred_to_main_trial'] = False
-    if main_trial_referral_col in df.columns:
-        df['is_referred_to_main_trial'] = ~df[main_trial_referral_col].isna()
-    
-    # Recruited to CVLP (CVLP consented patients)
-    df['is_recruited_to_cvlp'] = False
-    if cvlp_status_col in df.columns:
-        df['is_recruited_to_cvlp'] = df[cvlp_status_col].astype(str).str.strip().str.lower() == 'obtained'
-    elif cvlp_consent_col in df.columns:
-        df['is_recruited_to_cvlp'] = ~df[cvlp_consent_col].isna()
-    
-    # Consented BNT113-01 (pre-screen)
-    df['is_consented_prescreen'] = False
-    if prescreen_consent_col in df.columns:
-        df['is_consented_prescreen'] = df[prescreen_consent_col].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
-    
-    # Randomised BNT113-01 (enrolled participants)
-    df['is_randomised'] = False
-    if enrolled_col in df.columns:
-        df['is_randomised'] = df[enrolled_col].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
-    
-    # BNT113-01 Screen Failures
-    df['is_screen_failure'] = False
-    
-    # Screen failures could be derived from various columns
-    if prescreen_fail_col in df.columns:
-        df['is_screen_failure'] = df['is_screen_failure'] | (~df[prescreen_fail_col].isna())
-    if main_trial_fail_col in df.columns:
-        df['is_screen_failure'] = df['is_screen_failure'] | (~df[main_trial_fail_col].isna())
-    if enrolment_fail_col in df.columns:
-        df['is_screen_failure'] = df['is_screen_failure'] | (~df[enrolment_fail_col].isna())
-    
-    return df, today, dec_2024
-
-processed_df, today, dec_2024 = preprocess_real_data(master_df)
-
-# Create the metrics tiles dashboard component instead of table
+# The prepared tracker is shared by every session viewing this dataset at this privacy level
+processed_df = result_store.get_or_compute(
+    dataset_key, privacy_mode, "prepared_tracker",
+    lambda: prepare_tracker_data(master_df, privacy_mode)
+)
+master_df = processed_df
+
+# Funnel stage counts by CVLP site x trial site x month; the tables below read slices of it
+funnel_cube = result_store.get_or_compute(
+    dataset_key, privacy_mode, "funnel_cube", lambda: FunnelCube.build(processed_df)
+)
+# Headline counts, shared by every session viewing this dataset at this privacy level; the tiles,
+# the referral chart, the schema KPI engine and the PDF report all read this one snapshot
+kpi_snapshot = result_store.get_or_compute(
+    dataset_key, privacy_mode, "kpi_snapshot", lambda: compute_kpi_snapshot(processed_df, funnel_cube)
+)
+today, dec_2024 = datetime.now(), pd.Timestamp('2024-12-31')
+
+# Schema KPIs are as of the tracker's own date when its file name gives one, so older versions
+# land in their place on the KPI trends; each dataset version is appended to the history once
+if snapshot is not None:
+    kpis_as_of = results_as_of
+else:
+    tracker_label = os.path.basename(local_dataset.path) if local_dataset is not None else getattr(uploaded_master_file, 'name', '')
+    kpis_as_of = version_as_of(tracker_label, results_as_of)
+# Each KPI's result is its own shared entry, keyed by its calculation, so editing one KPI recomputes only that one
+schema_kpi_results = schema_kpi_engine.calculate_kpis(
+    processed_df, kpis_as_of, ResultStoreView(result_store, dataset_key, privacy_mode, f"kpi@{kpis_as_of:%Y-%m-%d}:"), kpi_snapshot
+) if not processed_df.empty else {}
+if schema_kpi_results and not kpi_history.is_recorded(dataset_key, privacy_mode):
+    # A history failure must not hold back the dashboard
+    try:
+        kpi_history.record(dataset_key, privacy_mode, kpis_as_of, schema_kpi_results)
+    except Exception as e:
+        kpi_history.last_error = str(e)
+if kpi_history.last_error:
+    st.sidebar.warning(f"⚠️ KPI values could not be added to the history: {kpi_history.last_error}")
+
+# Fixed headline tiles, for when the KPI schema is not loaded
 def create_metrics_tiles(df):
     if df.empty:
         st.warning("No data available to create metrics")
         return
     
-    # Safely get the counts, defaulting to 0 if columns don't exist
-    try:
-        referred_count = int(df['is_referred'].sum())
-    except:
-        referred_count = 0
-        
-    try:
-        referred_to_prescreen_count = int(df['is_referred_to_prescreen'].sum())
-    except:
-        referred_to_prescreen_count = 0
-        
-    try:
-        referred_to_main_trial_count = int(df['is_referred_to_main_trial'].sum()) 
-    except:
-        referred_to_main_trial_count = 0
-        
-    try:
-        recruited_to_cvlp_count = int(df['is_recruited_to_cvlp'].sum())
-    except:
-        recruited_to_cvlp_count = 0
-        
-    try:
-        consented_prescreen_count = int(df['is_consented_prescreen'].sum())
-    except:
-        consented_prescreen_count = 0
-        
-    try:
-        randomised_count = int(df['is_randomised'].sum())
-    except:
-        randomised_count = 0
-        
-    try:
-        screen_failures_count = int(df['is_screen_failure'].sum())
-    except:
-        screen_failures_count = 0
+    kpis = kpi_snapshot
+    referred_count = kpis['referred']
+    referred_to_prescreen_count = kpis['referred_to_prescreen']
+    referred_to_main_trial_count = kpis['referred_to_main_trial']
+    recruited_to_cvlp_count = kpis['recruited_to_cvlp']
+    consented_prescreen_count = kpis['consented_prescreen']
+    randomised_count = kpis['randomised']
+    screen_failures_count = kpis['screen_failures']
     
     # Create modern section header
     st.markdown("""
@@ -1968,7 +1555,19 @@ if st.session_state.admin_settings['show_key_metrics']:
 
 # Create the metrics overview
 with st.container():
-    create_metrics_tiles(processed_df)
+    if schema_kpi_results:
+        # Each tile shows its change over the last week and a sparkline from the KPI history
+        schema_kpi_engine.render_overview_tiles(schema_kpi_results, kpis_as_of, privacy_mode)
+    else:
+        create_metrics_tiles(processed_df)
+    if st.session_state.admin_settings['show_debug_info']:
+        # The snapshot must show the same numbers as the tracker's flag columns
+        # (tests/test_kpi_snapshot.py checks it against the schema KPI plan too)
+        snapshot_mismatches = kpi_snapshot_mismatches(processed_df, kpi_snapshot)
+        if snapshot_mismatches:
+            st.warning("⚠️ KPI snapshot disagrees with: " + "; ".join(
+                f"{source} {name} ({found} vs {expected})" for source, name, expected, found in snapshot_mismatches
+            ))
 
 # Data Quality Dashboard disabled to avoid user disruption
 
@@ -1987,31 +1586,8 @@ if st.session_state.admin_settings['show_referral_performance'] and not processe
     </div>
     """, unsafe_allow_html=True)
     
-    # Get actual metrics
-    try:
-        referred_actual = int(processed_df['is_referred'].sum())
-    except:
-        referred_actual = 0
-        
-    try:
-        prescreen_actual = int(processed_df['is_referred_to_prescreen'].sum())
-    except:
-        prescreen_actual = 0
-        
-    try:
-        main_trial_actual = int(processed_df['is_referred_to_main_trial'].sum())
-    except:
-        main_trial_actual = 0
-        
-    try:
-        cvlp_actual = int(processed_df['is_recruited_to_cvlp'].sum())
-    except:
-        cvlp_actual = 0
-        
-    try:
-        randomised_actual = int(processed_df['is_randomised'].sum())
-    except:
-        randomised_actual = 0
+    # Same counts as the overview tiles
+    referred_actual = kpi_snapshot['referred']
     
     # Use the target from the sidebar Settings section
     referred_target = st.session_state.get('referred_target', 50)
@@ -2046,7 +1622,6 @@ if st.session_state.admin_settings['show_referral_performance'] and not processe
     fig.update_layout(
         xaxis_title='',
         yaxis_title='Number of Patients',
-        plot_bgcolor='rgba(0,0,0,0)',
         height=500,
         showlegend=True,
         legend=dict(
@@ -2131,551 +1706,43 @@ if st.session_state.admin_settings['show_monthly_table']:
     </div>
     """, unsafe_allow_html=True)
 
-# Function to create the monthly breakdown table matching the Excel structure
+def get_recruitment_forecast(master_df, df_monthly):
+    """Monte Carlo referral forecast continuing the monthly table's actuals, shared per dataset and day"""
+    return result_store.get_or_compute(
+        dataset_key, privacy_mode, f"recruitment_forecast@{results_as_of:%Y-%m-%d}",
+        lambda: forecast_recruitment(
+            master_df, data_context.site_opening_dates, results_as_of,
+            baseline_referrals=latest_monthly_actual(df_monthly, 'Referred - Actual'),
+            baseline_randomised=latest_monthly_actual(df_monthly, 'Randomised BNT113-01 - Actual'),
+        )
+    )
+
+def add_forecast_bands(fig, bands, rgb):
+    """Shade the P10-P90 and P25-P75 forecast bands and draw the median on a month-axis figure"""
+    for low, high, opacity, name in (('P10', 'P90', 0.12, 'Forecast (P10-P90)'), ('P25', 'P75', 0.22, 'Forecast (P25-P75)')):
+        fig.add_trace(go.Scatter(
+            x=bands['Month'], y=bands[high], mode='lines', line=dict(width=0),
+            showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands['Month'], y=bands[low], mode='lines', line=dict(width=0),
+            fill='tonexty', fillcolor=f'rgba({rgb}, {opacity})', name=name,
+            customdata=bands[high], hovertemplate=f'{low}-{high}: %{{y}}-%{{customdata}}<extra></extra>'
+        ))
+    fig.add_trace(go.Scatter(
+        x=bands['Month'], y=bands['P50'], mode='lines', line=dict(color=f'rgb({rgb})', width=2, dash='dot'),
+        name='Forecast (median)'
+    ))
+
 def create_monthly_projections_table(master_df, uploaded_file=None):
     st.markdown("### Monthly Trial Metrics Table")
     
-    # Define the month range and site opening schedule (Contract ends Nov-26)
-    months = [
-        'Apr-25', 'May-25', 'Jun-25', 'Jul-25', 'Aug-25', 'Sep-25', 'Oct-25', 'Nov-25', 'Dec-25',
-        'Jan-26', 'Feb-26', 'Mar-26', 'Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26', 'Sep-26', 
-        'Oct-26', 'Nov-26'
-    ]
-    
-    # Site opening targets (updated from colleague's data) - ends at Nov-26
-    site_targets = [7, 12, 18, 22, 26, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30]
-    
-    # Projected cumulative targets (updated from colleague's data) - ends at Nov-26
-    projected_targets = [1, 2, 4, 7, 11, 17, 24, 31, 35, 40, 50, 60, 66, 73, 81, 90, 100, 111, 123, 136]
-    
-    # Create the DataFrame structure with actual calculations
-    table_data = []
-    
-    # Hardcoded Go-Live dates for ALL 19 CVLP sites (ACTUAL DATES FROM CLIENT)
-    # These dates are used to compute "Open Sites - Actual" per month
-    HARDCODED_OPENING_DATES = {
-        # May 2025 openings
-        "Coventry and Warwickshire": pd.Timestamp("2025-05-13"),
-        "Bath": pd.Timestamp("2025-05-15"),
-        "Gloucestershire": pd.Timestamp("2025-05-15"),
-        "Univeristy Hospitals Dorset": pd.Timestamp("2025-05-15"),
-        "Mid & South Essex - Broomfield": pd.Timestamp("2025-05-21"),
-        "Mid & South Essex - Southend": pd.Timestamp("2025-05-21"),
-        "Bedfordshire": pd.Timestamp("2025-05-22"),
-        "Hull": pd.Timestamp("2025-05-22"),
-        "Royal Surrey": pd.Timestamp("2025-05-29"),
-        
-        # June 2025 openings
-        "Royal Berkshire": pd.Timestamp("2025-06-30"),
-        
-        # July 2025 openings
-        "United Lincolnshire": pd.Timestamp("2025-07-17"),
-        "York & Scarborough": pd.Timestamp("2025-07-22"),
-        
-        # August 2025 openings
-        "Royal Free (North Middlesex)": pd.Timestamp("2025-08-05"),
-        "Barking Havering and Redbridge": pd.Timestamp("2025-08-08"),
-        "East & North Herefordshire (Lister)": pd.Timestamp("2025-08-12"),
-        "North Cumbria": pd.Timestamp("2025-08-27"),
-        
-        # September 2025 openings
-        "West Suffolk": pd.Timestamp("2025-09-19"),
-        "Maidstone": pd.Timestamp("2025-09-24"),
-        "Leicester": pd.Timestamp("2025-09-29"),
-    }
-    # Make available globally so later code paths can reuse without re-reading
-    globals()['site_opening_data'] = HARDCODED_OPENING_DATES
-    globals()['site_opening_data_source'] = 'HARDCODED'
-    
-    # Check if CVLP Site column exists
-    cvlp_site_col = 'CVLP Site'
-    if cvlp_site_col not in master_df.columns:
-        # Try alternative column names
-        possible_site_cols = [
-            'CVLP site', 
-            'Please choose the CVLP site from the drop down',
-            'Site',
-            'CVLP Site Name',
-            'Site Name'
-        ]
-        for col in possible_site_cols:
-            if col in master_df.columns:
-                cvlp_site_col = col
-                break
-        
-        # If still not found, try fuzzy matching
-        if cvlp_site_col not in master_df.columns:
-            for col in master_df.columns:
-                col_str = str(col).lower()
-                if 'site' in col_str and ('cvlp' in col_str or 'drop' in col_str):
-                    cvlp_site_col = col
-                    break
-    
-    # Get current date for determining future months
-    current_date = pd.Timestamp.now()
-    
-    for i, month in enumerate(months):
-        # Parse month and year for date calculations
-        month_parts = month.split('-')
-        year = int('20' + month_parts[1])
-        month_name = month_parts[0]
-        
-        # Map month name to number
-        month_map = {
-            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-        }
-        
-        if month_name in month_map:
-            month_num = month_map[month_name]
-            
-            # Define start and end dates for this month
-            start_date = pd.Timestamp(year, month_num, 1)
-            
-            # Define end date for this month (last day of month)
-            if month_num == 12:
-                end_date = pd.Timestamp(year + 1, 1, 1) - pd.Timedelta(days=1)
-            else:
-                end_date = pd.Timestamp(year, month_num + 1, 1) - pd.Timedelta(days=1)
-            
-            # Check if this month is in the future
-            is_future_month = end_date > current_date
-            
-            # Calculate actual values from data
-            
-            # 1. Open Sites - Actual: Get from CVLP Site Data sheet
-            open_sites_actual = 0
-            
-            # Try to read site opening data from CVLP Site Data sheet
-            # Skip reading if hardcoded opening dates have been provided
-            if i == 0 and not (
-                'site_opening_data' in globals() and isinstance(globals()['site_opening_data'], dict) and len(globals()['site_opening_data']) > 0
-            ):  # Only do this once and store the result
-                try:
-                    # Read the CVLP Site Data sheet
-                    cvlp_site_data_df = pd.read_excel(uploaded_file, sheet_name='CVLP Site Data', header=0)
-                    
-                    # Debug: Show what we found
-                    # Look for site opening date columns
-                    site_opening_data = {}
-                    
-                    # Try to find site names and opening dates
-                    site_col = None
-                    date_col = None
-                    
-                    # Look for site column
-                    for col in cvlp_site_data_df.columns:
-                        if 'site' in str(col).lower() or any(site_name in str(col) for site_name in ['Coventry', 'Bath', 'Gloucestershire']):
-                            site_col = col
-                            break
-                    
-                    # Look for opening date column with priority:
-                    # 1) Go-Live / Green light
-                    # 2) Site Active Date
-                    # 3) Generic Open/Opening Date
-                    for col in cvlp_site_data_df.columns:
-                        col_lower = str(col).strip().lower()
-                        if (
-                            'go-live date' in col_lower
-                            or 'go live date' in col_lower
-                            or 'go live' in col_lower
-                            or 'go-live' in col_lower
-                            or 'green light' in col_lower
-                        ):
-                            date_col = col
-                            break
-
-                    if date_col is None:
-                        for col in cvlp_site_data_df.columns:
-                            col_lower = str(col).strip().lower()
-                            if 'site active' in col_lower and 'date' in col_lower:
-                                date_col = col
-                                break
-
-                    if date_col is None:
-                        for col in cvlp_site_data_df.columns:
-                            col_lower = str(col).strip().lower()
-                            if (('open' in col_lower or 'opening' in col_lower) and 'date' in col_lower):
-                                date_col = col
-                                break
-                    
-                    # If we found both columns, extract the data
-                    if site_col is not None and date_col is not None:
-                        for _, row in cvlp_site_data_df.iterrows():
-                            site_name = row[site_col]
-                            opening_date = row[date_col]
-                            if pd.notna(site_name) and pd.notna(opening_date):
-                                try:
-                                    opening_date_parsed = pd.to_datetime(opening_date, errors='coerce')
-                                    if pd.notna(opening_date_parsed):
-                                        site_opening_data[str(site_name)] = opening_date_parsed
-                                except:
-                                    pass
-                
-                    # Store this globally so we don't re-read every month
-                    globals()['site_opening_data'] = site_opening_data
-                except Exception as e:
-                    pass  # Silently handle errors
-                    # Fallback to all 9 sites open
-                    globals()['site_opening_data'] = {}
-            else:
-                # Using hardcoded opening dates
-                pass
-            
-            # Try to read screening logs data for multiple columns
-            if i == 0:  # Only do this once
-                try:
-                    if uploaded_screening_logs_file is not None:
-                        # Read all sheets from the screening logs file
-                        excel_file = pd.ExcelFile(uploaded_screening_logs_file)
-                        all_screening_data = []
-                        all_cvlp_consent_data = []
-                        all_referral_data = []
-                        
-                        # Loop through all sheets (site/city sheets)
-                        for sheet_name in excel_file.sheet_names:
-                            try:
-                                sheet_df = pd.read_excel(uploaded_screening_logs_file, sheet_name=sheet_name, header=0)
-                                
-                                # Look for "Date of Screening" column (for Reviewed - Actual)
-                                date_of_screening_col = None
-                                for col in sheet_df.columns:
-                                    col_str = str(col).strip().lower()
-                                    if 'date of screening' in col_str or 'screening date' in col_str:
-                                        date_of_screening_col = col
-                                        break
-                                
-                                if date_of_screening_col and date_of_screening_col in sheet_df.columns:
-                                    screening_dates = sheet_df[[date_of_screening_col]].copy()
-                                    screening_dates.columns = ['Date of Screening']
-                                    all_screening_data.append(screening_dates)
-                                
-                                # Look for CVLP consent column (for Recruited to CVLP - Actual)
-                                # This can be either "Consented to CVLP" (Yes/No) or a date column
-                                cvlp_consent_col = None
-                                for col in sheet_df.columns:
-                                    col_str = str(col).strip().lower()
-                                    # Look for "Consented to CVLP" (Yes/No column) or date columns
-                                    if ('consented to cvlp' in col_str or 
-                                        'cvlp consent' in col_str or 
-                                        ('cvlp' in col_str and ('date' in col_str or 'consent' in col_str))):
-                                        cvlp_consent_col = col
-                                        break
-                                
-                                if cvlp_consent_col and cvlp_consent_col in sheet_df.columns:
-                                    cvlp_dates = sheet_df[[cvlp_consent_col]].copy()
-                                    cvlp_dates.columns = ['CVLP Consent Date']
-                                    all_cvlp_consent_data.append(cvlp_dates)
-                                
-                                # Look for referral date column (for Referred - Actual)
-                                referral_date_col = None
-                                for col in sheet_df.columns:
-                                    col_lower = str(col).lower()
-                                    if ('referral' in col_lower or 'referred' in col_lower) and 'date' in col_lower:
-                                        referral_date_col = col
-                                        break
-                                
-                                if referral_date_col and referral_date_col in sheet_df.columns:
-                                    referral_dates = sheet_df[[referral_date_col]].copy()
-                                    referral_dates.columns = ['Referral Date']
-                                    all_referral_data.append(referral_dates)
-                            except Exception as sheet_error:
-                                pass  # Silently skip sheets with errors
-                        
-                        # Combine all data from all sheets
-                        if all_screening_data:
-                            combined_screening_df = pd.concat(all_screening_data, ignore_index=True)
-                            globals()['screening_logs_data'] = combined_screening_df
-                        else:
-                            globals()['screening_logs_data'] = pd.DataFrame()
-                        
-                        if all_cvlp_consent_data:
-                            combined_cvlp_df = pd.concat(all_cvlp_consent_data, ignore_index=True)
-                            globals()['screening_logs_cvlp_data'] = combined_cvlp_df
-                        else:
-                            globals()['screening_logs_cvlp_data'] = pd.DataFrame()
-                        
-                        if all_referral_data:
-                            combined_referral_df = pd.concat(all_referral_data, ignore_index=True)
-                            globals()['screening_logs_referral_data'] = combined_referral_df
-                        else:
-                            globals()['screening_logs_referral_data'] = pd.DataFrame()
-                    else:
-                        globals()['screening_logs_data'] = pd.DataFrame()
-                        globals()['screening_logs_cvlp_data'] = pd.DataFrame()
-                        globals()['screening_logs_referral_data'] = pd.DataFrame()
-                except Exception as e:
-                    globals()['screening_logs_data'] = pd.DataFrame()
-                    globals()['screening_logs_cvlp_data'] = pd.DataFrame()
-                    globals()['screening_logs_referral_data'] = pd.DataFrame()
-            
-            # Calculate open sites for this month using the site opening data
-            if 'site_opening_data' in globals():
-                site_data = globals()['site_opening_data']
-                if site_data:
-                    # Count sites that opened by the end of this month
-                    open_sites_actual = sum(1 for opening_date in site_data.values() 
-                                          if opening_date <= end_date)
-                else:
-                    # Fallback: assume all 9 sites are open
-                    open_sites_actual = 9
-            else:
-                # Fallback: assume all 9 sites are open
-                open_sites_actual = 9
-            
-            # Debug for first few months
-            
-            # 2. Referred - Actual: CUMULATIVE count of unique patients referred UP TO this month
-            referred_actual = 0
-            
-            # First, check screening logs data (if available)
-            if 'screening_logs_referral_data' in globals() and not globals()['screening_logs_referral_data'].empty:
-                referral_df = globals()['screening_logs_referral_data']
-                if 'Referral Date' in referral_df.columns:
-                    try:
-                        referral_dates = pd.to_datetime(referral_df['Referral Date'], errors='coerce')
-                        valid_dates = referral_dates.dropna()
-                        # CUMULATIVE: count all referrals up to end of this month
-                        referred_actual = (valid_dates <= end_date).sum()
-                    except:
-                        pass
-            
-            # If no screening logs data, fall back to master tracker
-            if referred_actual == 0 and not master_df.empty:
-                referred_mask = pd.Series(False, index=master_df.index)
-                
-                # Check pre-screening referral dates
-                prescreen_col = 'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)'
-                if prescreen_col in master_df.columns:
-                    try:
-                        prescreen_dates = pd.to_datetime(master_df[prescreen_col], errors='coerce')
-                        # CUMULATIVE: count all referrals up to end of this month
-                        referred_mask = referred_mask | (prescreen_dates <= end_date)
-                    except:
-                        pass
-                
-                # Check main trial referral dates
-                main_trial_col = 'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)'
-                if main_trial_col in master_df.columns:
-                    try:
-                        main_trial_dates = pd.to_datetime(master_df[main_trial_col], errors='coerce')
-                        # CUMULATIVE: count all referrals up to end of this month
-                        referred_mask = referred_mask | (main_trial_dates <= end_date)
-                    except:
-                        pass
-                
-                referred_actual = referred_mask.sum()
-            
-            # 3. Referred to pre-screen - Actual (CUMULATIVE)
-            referred_prescreen_actual = 0
-            if not master_df.empty and prescreen_col in master_df.columns:
-                try:
-                    prescreen_dates = pd.to_datetime(master_df[prescreen_col], errors='coerce')
-                    # CUMULATIVE: count all pre-screen referrals up to end of this month
-                    referred_prescreen_actual = (prescreen_dates <= end_date).sum()
-                except:
-                    pass
-            
-            # 4. Referred to main trial - Actual (CUMULATIVE)
-            referred_main_trial_actual = 0
-            if not master_df.empty and main_trial_col in master_df.columns:
-                try:
-                    main_trial_dates = pd.to_datetime(master_df[main_trial_col], errors='coerce')
-                    # CUMULATIVE: count all main trial referrals up to end of this month
-                    referred_main_trial_actual = (main_trial_dates <= end_date).sum()
-                except:
-                    pass
-            
-            # 5. Recruited to CVLP - Actual (CUMULATIVE count from BOTH Screening Logs AND Master Tracker)
-            recruited_cvlp_actual_from_logs = 0
-            recruited_cvlp_actual_from_master = 0
-            
-            # First, check screening logs data (if available)
-            # The "Consented to CVLP" column contains "Yes"/"No" values, not dates
-            if 'screening_logs_cvlp_data' in globals() and not globals()['screening_logs_cvlp_data'].empty:
-                cvlp_df = globals()['screening_logs_cvlp_data']
-                if 'CVLP Consent Date' in cvlp_df.columns:
-                    try:
-                        # Check if the column contains Yes/No values or dates
-                        sample_value = cvlp_df['CVLP Consent Date'].dropna().iloc[0] if len(cvlp_df['CVLP Consent Date'].dropna()) > 0 else None
-                        
-                        if sample_value and isinstance(sample_value, str):
-                            # It's a Yes/No column - count "Yes" values (cumulative)
-                            # We need to match this with screening dates to make it cumulative
-                            if 'screening_logs_data' in globals() and not globals()['screening_logs_data'].empty:
-                                screening_df = globals()['screening_logs_data']
-                                if 'Date of Screening' in screening_df.columns and len(cvlp_df) == len(screening_df):
-                                    # Combine the data
-                                    combined = pd.DataFrame({
-                                        'consent': cvlp_df['CVLP Consent Date'],
-                                        'date': pd.to_datetime(screening_df['Date of Screening'], errors='coerce')
-                                    })
-                                    # Count "Yes" values where date is up to end of this month
-                                    recruited_cvlp_actual_from_logs = ((combined['consent'].astype(str).str.strip().str.lower() == 'yes') & 
-                                                            (combined['date'] <= end_date)).sum()
-                        else:
-                            # It's a date column
-                            cvlp_consent_dates = pd.to_datetime(cvlp_df['CVLP Consent Date'], errors='coerce')
-                            valid_dates = cvlp_consent_dates.dropna()
-                            recruited_cvlp_actual_from_logs = (valid_dates <= end_date).sum()
-                    except:
-                        pass
-            
-            # Also check master tracker (to capture any additional patients not in screening logs)
-            if not master_df.empty:
-                cvlp_consent_col = 'Please input the date the patient signed the consent form (dd/mm/yyyy)'
-                if cvlp_consent_col in master_df.columns:
-                    try:
-                        cvlp_dates = pd.to_datetime(master_df[cvlp_consent_col], errors='coerce')
-                        # CUMULATIVE: count all CVLP consents up to end of this month
-                        recruited_cvlp_actual_from_master = (cvlp_dates <= end_date).sum()
-                    except:
-                        pass
-            
-            # Use the MAXIMUM of the two sources (to avoid double counting, use the higher value)
-            # This assumes that one source is more complete than the other
-            recruited_cvlp_actual = max(recruited_cvlp_actual_from_logs, recruited_cvlp_actual_from_master)
-            
-            # 5a. Reviewed - Actual (from Screening Logs - all sheets combined) - CUMULATIVE
-            reviewed_actual = 0
-            if 'screening_logs_data' in globals() and not globals()['screening_logs_data'].empty:
-                screening_df = globals()['screening_logs_data']
-                
-                # The combined data has "Date of Screening" column
-                if 'Date of Screening' in screening_df.columns:
-                    try:
-                        # Convert to datetime and filter - CUMULATIVE (up to end of this month)
-                        screening_dates = pd.to_datetime(screening_df['Date of Screening'], errors='coerce')
-                        # Count all non-null dates UP TO the end of this month (cumulative)
-                        valid_dates = screening_dates.dropna()
-                        reviewed_actual = (valid_dates <= end_date).sum()
-                        
-                        # Debug for first few months
-                    except Exception as e:
-                        pass  # Silently handle errors
-            
-            # 6. Consented BNT113-01 (pre-screen) - Actual (cumulative up to this month)
-            # Use actual consent date from column AD (index 29)
-            consented_prescreen_actual = 0
-            if not master_df.empty and len(master_df.columns) > 29:
-                try:
-                    # Column AD contains pre-screening consent date
-                    prescreen_consent_date_col = master_df.columns[29]
-                    consent_dates = pd.to_datetime(master_df[prescreen_consent_date_col], errors='coerce')
-                    # Count all consents up to end of this month (cumulative)
-                    consented_prescreen_actual = (consent_dates <= end_date).sum()
-                    
-                    # Debug for first month
-                except Exception as e:
-                    pass  # Silently handle errors
-            
-            # 7. Consented BNT113-01 (main trial) - Actual (cumulative up to this month)
-            # Use actual consent date from column AM (index 38)
-            consented_main_trial_actual = 0
-            if not master_df.empty and len(master_df.columns) > 38:
-                try:
-                    # Column AM contains main trial consent date
-                    main_trial_consent_date_col = master_df.columns[38]
-                    consent_dates = pd.to_datetime(master_df[main_trial_consent_date_col], errors='coerce')
-                    # Count all consents up to end of this month (cumulative)
-                    consented_main_trial_actual = (consent_dates <= end_date).sum()
-                    
-                    # Debug for first month
-                except Exception as e:
-                    pass  # Silently handle errors
-            
-            # 8. Randomised BNT113-01 - Actual (cumulative up to this month)
-            # Use actual randomisation date from column BN (index 65)
-            randomised_actual = 0
-            if not master_df.empty and len(master_df.columns) > 65:
-                try:
-                    # Column BN contains randomisation date
-                    randomisation_date_col = master_df.columns[65]
-                    randomisation_dates = pd.to_datetime(master_df[randomisation_date_col], errors='coerce')
-                    # Count all randomisations up to end of this month (cumulative)
-                    randomised_actual = (randomisation_dates <= end_date).sum()
-                except Exception as e:
-                    pass  # Silently handle errors
-            
-            # 9. BNT113-01 Screen Failures - Actual (cumulative up to this month)
-            # Use actual screen fail dates from columns AC (28), AK (36), BL (63)
-            screen_failures_actual = 0
-            if not master_df.empty:
-                try:
-                    failure_mask = pd.Series(False, index=master_df.index)
-                    
-                    # Column AC (index 28) - screen fail date 1
-                    if len(master_df.columns) > 28:
-                        fail_date_col1 = master_df.columns[28]
-                        fail_dates1 = pd.to_datetime(master_df[fail_date_col1], errors='coerce')
-                        # Count all failures up to end of this month (cumulative)
-                        failure_mask = failure_mask | ((fail_dates1 <= end_date) & fail_dates1.notna())
-                    
-                    # Column AK (index 36) - screen fail date 2
-                    if len(master_df.columns) > 36:
-                        fail_date_col2 = master_df.columns[36]
-                        fail_dates2 = pd.to_datetime(master_df[fail_date_col2], errors='coerce')
-                        # Count all failures up to end of this month (cumulative)
-                        failure_mask = failure_mask | ((fail_dates2 <= end_date) & fail_dates2.notna())
-                    
-                    # Column BL (index 63) - screen fail date 3
-                    if len(master_df.columns) > 63:
-                        fail_date_col3 = master_df.columns[63]
-                        fail_dates3 = pd.to_datetime(master_df[fail_date_col3], errors='coerce')
-                        # Count all failures up to end of this month (cumulative)
-                        failure_mask = failure_mask | ((fail_dates3 <= end_date) & fail_dates3.notna())
-                    
-                    screen_failures_actual = failure_mask.sum()
-                except Exception as e:
-                    pass  # Silently handle errors
-            
-            # Calculate targets
-            sites_target = site_targets[i] if i < len(site_targets) else 30
-            projected_target = projected_targets[i] if i < len(projected_targets) else 216
-            
-            # Calculate Referred - Target (0.25/site) as ACCUMULATIVE target
-            if i == 0:
-                # For first month (Apr-25), there are no previous open sites, so target = 0
-                referred_target_per_site = 0
-            else:
-                # Calculate accumulative target: sum of all monthly targets up to current month
-                accumulative_target = 0
-                for j in range(1, i + 1):  # Start from month 1 (skip first month)
-                    if j <= len(table_data):
-                        # Use previous month's actual sites for each month's contribution
-                        prev_month_data = table_data[j-1] if j > 0 else None
-                        if prev_month_data:
-                            prev_actual_sites = prev_month_data['Open Sites - Actual']
-                            # Handle "-" string for future months - skip calculation
-                            if isinstance(prev_actual_sites, str) and prev_actual_sites == '-':
-                                continue  # Skip future months in accumulative calculation
-                            monthly_contribution = prev_actual_sites * 0.25
-                            accumulative_target += monthly_contribution
-                
-                referred_target_per_site = round(accumulative_target)
-            
-            # Add row to monthly data
-            # For future months, use "-" for actual values but keep target values
-            row = {
-                'Month': month,
-                'Open Sites - Actual': '-' if is_future_month else open_sites_actual,
-                'Open Sites - Target': sites_target,
-                'Referred - Actual': '-' if is_future_month else referred_actual,
-                'Referred - Target (0.25/site)': referred_target_per_site,
-                'Referred - Target (projected)': projected_target,
-                'Referred to pre-screen - Actual': '-' if is_future_month else referred_prescreen_actual,
-                'Referred to main trial - Actual': '-' if is_future_month else referred_main_trial_actual,
-                'Reviewed - Actual': '-' if is_future_month else reviewed_actual,
-                'Recruited to CVLP - Actual': '-' if is_future_month else recruited_cvlp_actual,
-                'Consented BNT113-01 (pre-screen) - Actual': '-' if is_future_month else consented_prescreen_actual,
-                'Consented BNT113-01 (main trial) - Actual': '-' if is_future_month else consented_main_trial_actual,
-                'Randomised BNT113-01 - Actual': '-' if is_future_month else randomised_actual,
-                'BNT113-01 Screen Failures - Actual': '-' if is_future_month else screen_failures_actual
-            }
-            table_data.append(row)
-    
-    # Create DataFrame
-    df_monthly = pd.DataFrame(table_data)
+    # Shared across sessions; "-" for future months depends on today's date
+    df_monthly = result_store.get_or_compute(
+        dataset_key, privacy_mode, f"monthly_projections@{results_as_of:%Y-%m-%d}",
+        lambda: compute_monthly_projections(master_df, data_context, funnel_cube, patient_linkage)
+    )
+    months = df_monthly['Month'].tolist()
     
     # Custom formatter function that handles both numbers and "-"
     def format_actual_values(val):
@@ -2769,6 +1836,11 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
     st.write(styled_table.to_html(escape=False, table_uuid="monthly_projections"), unsafe_allow_html=True)
     
     st.markdown("</div>", unsafe_allow_html=True)
+    if patient_linkage is not None and patient_linkage.has_logs:
+        st.caption(
+            f"🔗 Referred and Recruited to CVLP count each patient once across the Screening Logs and the Master Tracker "
+            f"({len(patient_linkage.patients)} patients, {patient_linkage.linked} found in both)."
+        )
     
     # Add data extraction info (only show for internal users)
     if st.session_state.admin_settings['show_debug_info']:
@@ -2788,7 +1860,7 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_target_sites = site_targets[-1]
+        total_target_sites = int(df_monthly['Open Sites - Target'].iloc[-1])
         create_enhanced_metric_card(
             icon="🏥",
             label="Target Sites (End)",
@@ -2798,7 +1870,7 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
         )
     
     with col2:
-        total_referred_target = projected_targets[-1]
+        total_referred_target = int(df_monthly['Referred - Target (projected)'].iloc[-1])
         create_enhanced_metric_card(
             icon="📊",
             label="Cumulative Referred Target",
@@ -2923,26 +1995,42 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
             xaxis_title='Month',
             yaxis_title='Number of Referrals',
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
             xaxis={'tickangle': 45},
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="center",
-                x=0.5,
-                title="CVLP - Referrals & Projections"
-            ),
+            legend_title_text="CVLP - Referrals & Projections",
             hovermode='x unified'
         )
         
-        # Add grid lines
-        fig_referrals.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
-        fig_referrals.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+        # Forecast bands for the months without actuals, continuing from the latest actual
+        forecast = get_recruitment_forecast(master_df, df_monthly)
+        if forecast is not None:
+            add_forecast_bands(fig_referrals, forecast.referrals, '211, 47, 47')
         
         # Display the chart
         st.plotly_chart(fig_referrals, use_container_width=True)
         
+        # Target likelihood is a target comparison, so hidden in privacy mode like the metrics below
+        if forecast is not None and not st.session_state.privacy_mode:
+            final_band = forecast.referrals.iloc[-1]
+            if forecast.baseline_referrals >= forecast.target:
+                reached_note = f"the {forecast.target} referral target has already been reached"
+            else:
+                reached_note = f"the {forecast.target} referral target is reached by {forecast.target_month} in {forecast.target_probability:.0%} of simulations"
+                if forecast.target_reached_month:
+                    reached_note += f", typically in {forecast.target_reached_month}"
+            st.caption(
+                f"🔮 Forecast from {forecast.simulations:,} simulations of the fitted site referral rates "
+                f"(sites already referring only): median {final_band['P50']} referrals by {final_band['Month']} "
+                f"(80% interval {final_band['P10']}-{final_band['P90']}); {reached_note}."
+            )
+            with st.expander("🔮 Forecast Site Rates"):
+                st.dataframe(
+                    forecast.site_rates.style.format({
+                        'Opened': '{:%d %b %Y}', 'Months Open': '{:.1f}',
+                        'Referrals / Month': '{:.2f}', 'Conversion (%)': '{:.1f}'
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+        
         # Add chart interpretation
         # Get the latest actual data (up to current month)
         current_date = pd.Timestamp.now()
@@ -3045,7 +2133,8 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
         if selected_metrics:
             # Filter data for visualization - actual metrics only show up to current month
             current_date = pd.Timestamp.now()
-            df_for_viz = df_monthly.copy()
+            # df_monthly is the shared cached result; the shallow copy copies only the columns changed below
+            df_for_viz = df_monthly.copy(deep=False)
             
             # Get current month in the format used in the data (e.g., 'Dec-25')
             current_month_str = current_date.strftime('%b-%y')
@@ -3088,16 +2177,8 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
                 xaxis_title='Month',
                 yaxis_title='Value',
                 height=500,
-                plot_bgcolor='rgba(0,0,0,0)',
                 xaxis={'tickangle': 45},
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="center",
-                    x=0.5,
-                    title="Metrics"
-                ),
+                legend_title_text="Metrics",
                 hovermode='x unified'
             )
             st.plotly_chart(fig_metrics, use_container_width=True)
@@ -3115,7 +2196,7 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
     if not df_monthly.empty:
         # Prepare data for visualization - convert "-" to None for proper plotting
         current_date = pd.Timestamp.now()
-        df_combo_viz = df_monthly.copy()
+        df_combo_viz = df_monthly.copy(deep=False)
         
         # Convert "-" strings to None for proper plotting, but preserve numeric values
         for col in ['Open Sites - Actual', 'Recruited to CVLP - Actual', 'Referred - Actual']:
@@ -3217,15 +2298,7 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
             title='CVLP Recruitment/Referrals Against Sites',
             xaxis_title='Month',
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
             xaxis={'tickangle': 45},
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="center",
-                x=0.5
-            ),
             hovermode='x unified'
         )
         
@@ -3250,14 +2323,73 @@ def create_monthly_projections_table(master_df, uploaded_file=None):
 
 # Call the functions to display the tables (only if we have data)
 if st.session_state.admin_settings['show_monthly_table']:
-    if not master_df.empty and uploaded_master_file is not None:
-        df_monthly = create_monthly_projections_table(processed_df, uploaded_master_file)
+    if not master_df.empty:
+        df_monthly = create_monthly_projections_table(processed_df, master_source)
     else:
         df_monthly = pd.DataFrame()  # Empty DataFrame if no data
         st.info("📁 Please upload your Excel file using the sidebar to view the Monthly Trial Metrics Table.")
 else:
     df_monthly = pd.DataFrame()  # Empty DataFrame if section is hidden
 
+# Tracker Version Comparison Section (needs at least two recorded tracker versions)
+history_versions = tracker_history.versions if st.session_state.admin_settings.get('show_version_comparison', True) else []
+if len(history_versions) >= 2:
+    st.markdown("""
+    <div class="section-divider">
+        <div class="section-divider-icon">🗂️</div>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("""
+    <div class="section-header">
+        🗂️ Tracker Version Comparison
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Newest tracker date first; compares the two latest versions by default
+    version_names = {v.version: v.display_name for v in history_versions}
+    version_options = [v.version for v in sorted(history_versions, key=lambda v: (v.as_of, v.seq), reverse=True)]
+    version_col_a, version_col_b = st.columns(2)
+    with version_col_a:
+        version_a = st.selectbox("Version A", version_options, index=1, format_func=version_names.get, key="history_version_a")
+    with version_col_b:
+        version_b = st.selectbox("Version B", version_options, index=0, format_func=version_names.get, key="history_version_b")
+
+    if version_a == version_b:
+        st.info("Choose two different tracker versions to compare.")
+    else:
+        # Answered from the recorded KPI counts and row deltas; old workbooks are not re-read
+        comparison = tracker_history.compare(version_a, version_b)
+        kpi_changes = comparison.kpi_deltas.set_index('KPI')['Change']
+        st.caption(f"From **{comparison.a.display_name}** to **{comparison.b.display_name}**")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Rows Added", comparison.rows_added)
+        with col2:
+            st.metric("Rows Removed", comparison.rows_removed)
+        with col3:
+            st.metric("Newly Randomised", len(comparison.newly_randomised))
+        with col4:
+            st.metric("Total Referred", comparison.b.kpis.get('referred', 0), delta=int(kpi_changes.get('Total Referred', 0)))
+
+        st.markdown("**KPI Changes**")
+        st.dataframe(comparison.kpi_deltas, use_container_width=True, hide_index=True)
+
+        with st.expander(f"🏥 Per-Site Changes ({comparison.site_changes['Site'].nunique()} sites)"):
+            if comparison.site_changes.empty:
+                st.info("No site-level changes between these versions.")
+            else:
+                st.dataframe(comparison.site_changes, use_container_width=True, hide_index=True)
+
+        with st.expander(f"🎯 Newly Randomised Patients ({len(comparison.newly_randomised)})"):
+            if comparison.newly_randomised.empty:
+                st.info("No newly randomised patients between these versions.")
+            else:
+                st.caption("Participants are identified by a hashed key; identifiers are not kept in the history.")
+                st.dataframe(comparison.newly_randomised, use_container_width=True, hide_index=True)
+
+        with st.expander("📝 Changed Columns"):
+            st.dataframe(comparison.column_changes, use_container_width=True, hide_index=True)
+
 # Trial Referral Reporting Section
 if st.session_state.admin_settings['show_trial_referral_reporting']:
     st.markdown("""
@@ -3280,202 +2412,36 @@ def create_trial_referral_reporting_table(master_df):
         return
     
     # Get trial site column
-    trial_site_col = 'Trial Site'
-    if trial_site_col not in master_df.columns:
-        # Try alternative column names
-        possible_trial_site_cols = [
-            'Please choose the Trial site from the drop down',
-            'trial site',
-            'Trial site',
-            'Referring Site',
-            'Site',
-            'Hospital',
-            'Hospital Site'
-        ]
-        for col in possible_trial_site_cols:
-            if col in master_df.columns:
-                trial_site_col = col
-                break
-
-    # If still not found, try to use CVLP Site as fallback for demo data
-    if trial_site_col not in master_df.columns:
-        if 'CVLP Site' in master_df.columns:
-            trial_site_col = 'CVLP Site'
-            st.info("ℹ️ Using 'CVLP Site' as Trial Site column (demo data fallback)")
+    trial_site_col, used_fallback = resolve_trial_site_column(master_df)
+    if used_fallback:
+        st.info("ℹ️ Using 'CVLP Site' as Trial Site column (demo data fallback)")
+    if trial_site_col is None:
+        st.error(f"**Debug**: Trial Site column not found. Total columns: {len(master_df.columns)}")
+        st.error(f"Available columns containing 'site' or 'trial':")
+        site_related_cols = [col for col in master_df.columns if 'site' in str(col).lower() or 'trial' in str(col).lower()]
+        if site_related_cols:
+            for col in site_related_cols[:10]:
+                st.text(f"  - {col}")
         else:
-            st.error(f"**Debug**: Trial Site column not found. Total columns: {len(master_df.columns)}")
-            st.error(f"Available columns containing 'site' or 'trial':")
-            site_related_cols = [col for col in master_df.columns if 'site' in str(col).lower() or 'trial' in str(col).lower()]
-            if site_related_cols:
-                for col in site_related_cols[:10]:
-                    st.text(f"  - {col}")
-            else:
-                st.text("  - No columns containing 'site' or 'trial' found")
-                st.text("All columns:")
-                for col in list(master_df.columns)[:20]:  # Show first 20 columns
-                    st.text(f"  - {col}")
-            return
+            st.text("  - No columns containing 'site' or 'trial' found")
+            st.text("All columns:")
+            for col in list(master_df.columns)[:20]:  # Show first 20 columns
+                st.text(f"  - {col}")
+        return
     
     # Get unique trial sites, filtering out placeholders
-    trial_sites = master_df[trial_site_col].dropna().unique()
-    trial_sites = [site for site in trial_sites if str(site).strip() != '' and 
-                  'enter' not in str(site).lower() and 
-                  'placeholder' not in str(site).lower()]
+    trial_sites = valid_site_values(master_df, trial_site_col)
     
     if len(trial_sites) == 0:
         st.warning("No valid trial sites found in the data")
         return
     
-    # Define months for the reporting period (Contract ends Nov-26)
-    months = ['May-25', 'Jun-25', 'Jul-25', 'Aug-25', 'Sep-25', 'Oct-25', 'Nov-25', 'Dec-25', 
-              'Jan-26', 'Feb-26', 'Mar-26', 'Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26', 
-              'Sep-26', 'Oct-26', 'Nov-26']
-    
-    # Define date columns mapping
-    date_columns = {
-        'prescreen_referral': None,
-        'main_trial_referral': None,
-        'cvlp_consent': None,
-        'prescreen_consent': None,
-        'main_trial_consent': None,
-        'randomisation': None
-    }
-    
-    # Auto-detect date columns based on your actual column names
-    for col in master_df.columns:
-        col_lower = str(col).lower()
-        if 'pre-screening referral form was sent' in col_lower:
-            date_columns['prescreen_referral'] = col
-        elif 'main trial screening referral form was sent' in col_lower:
-            date_columns['main_trial_referral'] = col
-        elif 'cvlp' in col_lower and ('consent' in col_lower or 'recruited' in col_lower):
-            date_columns['cvlp_consent'] = col
-        elif 'pre' in col_lower and 'screen' in col_lower and 'consent' in col_lower:
-            date_columns['prescreen_consent'] = col
-        elif 'main' in col_lower and 'trial' in col_lower and 'consent' in col_lower:
-            date_columns['main_trial_consent'] = col
-        elif ('enrolled = yes' in col_lower or 'enrolled = Yes' in col_lower or 'enrolled' in col_lower) and ('screen fail' in col_lower):
-            date_columns['randomisation'] = col
-        elif 'trial site acknowledged pre-screening referral' in col_lower:
-            date_columns['prescreen_acknowledgment'] = col
-        elif 'consent confirmed' in col_lower or 'screen fail' in col_lower:
-            date_columns['consent_confirmation'] = col
-    
-
-    
-    # Create table data
-    table_data = []
-    
-    for site in sorted(trial_sites):
-        # Filter data for this trial site
-        site_df = master_df[master_df[trial_site_col] == site].copy()
-        
-        if site_df.empty:
-            continue
-        
-        # Calculate total metrics for this site
-        total_referrals = 0
-        total_pre_screening = 0
-        total_main_trial = 0
-        total_patients = 0
-        total_pre_screening_consents = 0
-        total_main_trial_consents = 0
-        awaiting_consent = 0
-        total_randomised = 0
-        drop_out = 0
-        
-        # Calculate totals using unique patient logic (OR logic, not additive)
-        
-        # Initialize boolean masks for referrals
-        prescreen_referral_mask = pd.Series(False, index=site_df.index)
-        main_trial_referral_mask = pd.Series(False, index=site_df.index)
-        
-        if date_columns['prescreen_referral'] and date_columns['prescreen_referral'] in master_df.columns:
-            prescreen_referral_mask = pd.to_datetime(site_df[date_columns['prescreen_referral']], errors='coerce').notna()
-            total_pre_screening = prescreen_referral_mask.sum()
-        
-        if date_columns['main_trial_referral'] and date_columns['main_trial_referral'] in master_df.columns:
-            main_trial_referral_mask = pd.to_datetime(site_df[date_columns['main_trial_referral']], errors='coerce').notna()
-            total_main_trial = main_trial_referral_mask.sum()
-        
-        # Total referrals = unique patients with EITHER pre-screening OR main trial referral (or both)
-        total_referrals = (prescreen_referral_mask | main_trial_referral_mask).sum()
-        
-        # Initialize boolean masks for consents
-        prescreen_consent_mask = pd.Series(False, index=site_df.index)
-        main_trial_consent_mask = pd.Series(False, index=site_df.index)
-        
-        if date_columns['prescreen_consent'] and date_columns['prescreen_consent'] in master_df.columns:
-            prescreen_consent_mask = site_df[date_columns['prescreen_consent']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
-            total_pre_screening_consents = prescreen_consent_mask.sum()
-        
-        if date_columns['main_trial_consent'] and date_columns['main_trial_consent'] in master_df.columns:
-            main_trial_consent_mask = site_df[date_columns['main_trial_consent']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true'])
-            total_main_trial_consents = main_trial_consent_mask.sum()
-        
-        # Total patients = unique patients with EITHER pre-screening OR main trial consent (or both)
-        total_patients = (prescreen_consent_mask | main_trial_consent_mask).sum()
-        
-        if date_columns['randomisation'] and date_columns['randomisation'] in master_df.columns:
-            total_randomised = site_df[date_columns['randomisation']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true']).sum()
-        
-        total_patients = total_pre_screening_consents + total_main_trial_consents
-        awaiting_consent = total_referrals - total_patients
-        
-        # Create row with totals
-        row = {
-            'Trial Site': site,
-            'Total Referrals': total_referrals,
-            'Total Pre-Screening Referrals': total_pre_screening,
-            'Total Main Trial Referrals': total_main_trial,
-            'Total Patients': total_patients,
-            'Total Pre-Screening Consents': total_pre_screening_consents,
-            'Total Main Trial Consents': total_main_trial_consents,
-            'Awaiting Consent': awaiting_consent,
-            'Total Randomised': total_randomised,
-            'Drop Out': drop_out  # This would need specific logic based on your data
-        }
-        
-        # Add monthly breakdown
-        for month in months:
-            # Parse month to get start and end dates
-            try:
-                month_parts = month.split('-')
-                month_num = {
-                    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-                }[month_parts[0]]
-                year = int('20' + month_parts[1])
-                
-                # Get start and end of month
-                from datetime import datetime
-                import calendar
-                start_date = datetime(year, month_num, 1)
-                last_day = calendar.monthrange(year, month_num)[1]
-                end_date = datetime(year, month_num, last_day, 23, 59, 59)
-                
-                # Count referrals for this month
-                monthly_referrals = 0
-                
-                # Count pre-screen referrals for this month
-                if date_columns['prescreen_referral'] and date_columns['prescreen_referral'] in master_df.columns:
-                    prescreen_dates = pd.to_datetime(site_df[date_columns['prescreen_referral']], errors='coerce')
-                    monthly_referrals += len(prescreen_dates[(prescreen_dates >= start_date) & (prescreen_dates <= end_date)])
-                
-                # Count main trial referrals for this month
-                if date_columns['main_trial_referral'] and date_columns['main_trial_referral'] in master_df.columns:
-                    main_trial_dates = pd.to_datetime(site_df[date_columns['main_trial_referral']], errors='coerce')
-                    monthly_referrals += len(main_trial_dates[(main_trial_dates >= start_date) & (main_trial_dates <= end_date)])
-                
-                row[month] = monthly_referrals
-                
-            except:
-                row[month] = 0
-        
-        table_data.append(row)
+    months = TRIAL_REFERRAL_MONTHS
     
-    # Create DataFrame
-    df_trial_referral = pd.DataFrame(table_data)
+    df_trial_referral = result_store.get_or_compute(
+        dataset_key, privacy_mode, "trial_referral_reporting",
+        lambda: compute_trial_referral_reporting(master_df, trial_sites, funnel_cube)
+    )
     
     if df_trial_referral.empty:
         st.warning("No trial referral data available")
@@ -3490,7 +2456,7 @@ def create_trial_referral_reporting_table(master_df):
     
     display_columns = summary_columns + months
     available_columns = [col for col in display_columns if col in df_trial_referral.columns]
-    display_df = df_trial_referral[available_columns].copy()
+    display_df = df_trial_referral[available_columns]
     
     # Create much shorter column names for better display
     column_mapping = {
@@ -3617,7 +2583,6 @@ def create_trial_referral_reporting_table(master_df):
         )
         fig_horizontal.update_layout(
             height=400,
-            plot_bgcolor='rgba(0,0,0,0)',
             showlegend=False,
             margin=dict(l=150, r=50, t=50, b=50)
         )
@@ -3655,7 +2620,6 @@ def create_trial_referral_reporting_table(master_df):
             )
             fig_monthly.update_layout(
                 height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
                 xaxis={'tickangle': 45},
                 legend=dict(
                     orientation="v",
@@ -3702,15 +2666,7 @@ def create_trial_referral_reporting_table(master_df):
         )
         fig_comparison.update_layout(
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
-            xaxis={'tickangle': 45},
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="center",
-                x=0.5
-            )
+            xaxis={'tickangle': 45}
         )
         fig_comparison.update_traces(texttemplate='%{text}', textposition='outside')
         st.plotly_chart(fig_comparison, use_container_width=True)
@@ -3719,34 +2675,20 @@ def create_trial_referral_reporting_table(master_df):
     st.markdown("### 🏥 CVLP Site Breakdown by Trial Site")
     st.markdown("Click on a trial site below to see which CVLP sites the patients come from:")
     
-    # Get CVLP site column
-    cvlp_site_col = 'CVLP Site'
-    if cvlp_site_col not in master_df.columns:
-        # Try alternative column names
-        possible_cvlp_site_cols = [
-            'Please choose the CVLP site from the drop down',
-            'CVLP site',
-            'CVLP Site Name'
-        ]
-        for col in possible_cvlp_site_cols:
-            if col in master_df.columns:
-                cvlp_site_col = col
-                break
-    
-    if cvlp_site_col in master_df.columns:
+    # Patients per CVLP site are a slice of the funnel cube
+    if funnel_cube.cvlp_site_col is not None:
         for _, row in df_trial_referral.iterrows():
             trial_site_name = row['Trial Site']
             total_referrals = row['Total Referrals']
             
             if total_referrals > 0:
                 with st.expander(f"🏥 {trial_site_name} ({total_referrals} referrals)", expanded=False):
-                    # Filter data for this trial site
-                    trial_site_data = master_df[master_df[trial_site_col] == trial_site_name].copy()
+                    trial_site_patients = funnel_cube.total('patients', trial_site=trial_site_name)
                     
-                    if not trial_site_data.empty:
+                    if trial_site_patients > 0:
                         # Count patients by CVLP site
-                        cvlp_breakdown = trial_site_data[cvlp_site_col].value_counts()
-                        cvlp_breakdown = cvlp_breakdown[cvlp_breakdown > 0]  # Only show sites with patients
+                        cvlp_breakdown = funnel_cube.by_cvlp_site('patients', trial_site=trial_site_name)
+                        cvlp_breakdown = cvlp_breakdown[cvlp_breakdown > 0].sort_values(ascending=False, kind='stable')  # Only show sites with patients
                         
                         if not cvlp_breakdown.empty:
                             # Create two columns for display
@@ -3810,25 +2752,13 @@ def create_trial_referral_reporting_table(master_df):
                             
                             # Create a summary table with referral details
                             detailed_breakdown = []
-                            for cvlp_site in cvlp_breakdown.index:
-                                cvlp_site_patients = trial_site_data[trial_site_data[cvlp_site_col] == cvlp_site]
-                                
-                                # Count different types of referrals
-                                prescreen_referrals = 0
-                                main_trial_referrals = 0
-                                
-                                if date_columns['prescreen_referral'] and date_columns['prescreen_referral'] in master_df.columns:
-                                    prescreen_referrals = pd.to_datetime(cvlp_site_patients[date_columns['prescreen_referral']], errors='coerce').notna().sum()
-                                
-                                if date_columns['main_trial_referral'] and date_columns['main_trial_referral'] in master_df.columns:
-                                    main_trial_referrals = pd.to_datetime(cvlp_site_patients[date_columns['main_trial_referral']], errors='coerce').notna().sum()
-                                
+                            for cvlp_site, cvlp_site_patients in cvlp_breakdown.items():
                                 detailed_breakdown.append({
                                     'CVLP Site': cvlp_site,
-                                    'Total Patients': len(cvlp_site_patients),
-                                    'Pre-Screen Referrals': prescreen_referrals,
-                                    'Main Trial Referrals': main_trial_referrals,
-                                    'Percentage of Trial Site': f"{(len(cvlp_site_patients) / len(trial_site_data) * 100):.1f}%"
+                                    'Total Patients': cvlp_site_patients,
+                                    'Pre-Screen Referrals': funnel_cube.total('referred_to_prescreen', cvlp_site=cvlp_site, trial_site=trial_site_name),
+                                    'Main Trial Referrals': funnel_cube.total('referred_to_main_trial', cvlp_site=cvlp_site, trial_site=trial_site_name),
+                                    'Percentage of Trial Site': f"{(cvlp_site_patients / trial_site_patients * 100):.1f}%"
                                 })
                             
                             detailed_df = pd.DataFrame(detailed_breakdown)
@@ -3866,7 +2796,7 @@ def create_trial_referral_reporting_table(master_df):
     return df_trial_referral
 
 # Call the trial referral reporting function
-if not master_df.empty and uploaded_master_file is not None:
+if not master_df.empty:
     df_trial_referral = create_trial_referral_reporting_table(master_df)
 else:
     st.info("📁 Please upload your Excel file to view the Trial Referral Reporting.")
@@ -3876,171 +2806,38 @@ def create_site_based_metrics_table(master_df):
     st.markdown("### Trial Metrics by Site")
     
     # Get all sites from the data
-    cvlp_site_col = 'CVLP Site'
-    if cvlp_site_col not in master_df.columns:
-        # Try alternative column names
-        possible_site_cols = [
-            'CVLP site', 
-            'Please choose the CVLP site from the drop down',
-            'Site',
-            'CVLP Site Name'
-        ]
-        for col in possible_site_cols:
-            if col in master_df.columns:
-                cvlp_site_col = col
-                break
-    
-    # If CVLP Site not found, try to use Trial Site as fallback for demo data
-    if cvlp_site_col not in master_df.columns:
-        if 'Trial Site' in master_df.columns:
-            cvlp_site_col = 'Trial Site'
-            st.info("ℹ️ Using 'Trial Site' as CVLP Site column (demo data fallback)")
+    cvlp_site_col, used_fallback = resolve_cvlp_site_column(master_df)
+    if used_fallback:
+        st.info("ℹ️ Using 'Trial Site' as CVLP Site column (demo data fallback)")
+    if cvlp_site_col is None:
+        st.error(f"**Debug**: CVLP Site column not found. Available columns containing 'site' or 'CVLP':")
+        site_related_cols = [col for col in master_df.columns if 'site' in str(col).lower() or 'cvlp' in str(col).lower()]
+        if site_related_cols:
+            for col in site_related_cols[:10]:  # Show first 10 matches
+                st.text(f"  - {col}")
         else:
-            st.error(f"**Debug**: CVLP Site column not found. Available columns containing 'site' or 'CVLP':")
-            site_related_cols = [col for col in master_df.columns if 'site' in str(col).lower() or 'cvlp' in str(col).lower()]
-            if site_related_cols:
-                for col in site_related_cols[:10]:  # Show first 10 matches
-                    st.text(f"  - {col}")
-            else:
-                st.text("  - No columns containing 'site' or 'cvlp' found")
-                st.text("All columns:")
-                for col in list(master_df.columns)[:20]:  # Show first 20 columns
-                    st.text(f"  - {col}")
-            st.text(f"Total columns in data: {len(master_df.columns)}")
-            return
+            st.text("  - No columns containing 'site' or 'cvlp' found")
+            st.text("All columns:")
+            for col in list(master_df.columns)[:20]:  # Show first 20 columns
+                st.text(f"  - {col}")
+        st.text(f"Total columns in data: {len(master_df.columns)}")
+        return
     
     if cvlp_site_col not in master_df.columns or master_df.empty:
         st.warning("No site data available for metrics calculation")
         return
     
     # Get unique sites from the data, filtering out placeholders
-    sites = master_df[cvlp_site_col].dropna().unique()
-    sites = [site for site in sites if str(site).strip() != '' and 
-             'enter' not in str(site).lower() and 
-             'placeholder' not in str(site).lower()]
+    sites = valid_site_values(master_df, cvlp_site_col)
     
     if len(sites) == 0:
         st.warning("No valid sites found in the data")
         return
     
-    # Create the DataFrame structure with actual calculations
-    site_data = []
-    
-    # Define column mappings for easier access
-    date_columns = {
-        'cvlp_consent': 'Please input the date the patient signed the consent form (dd/mm/yyyy)',
-        'prescreen_referral': 'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)',
-        'main_trial_referral': 'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)',
-        'prescreen_consent': 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail)',
-        'main_trial_consent': 'To be confirmed by trial site (Yes = consent confirmed, No = screen fail).1',
-        'enrollment': 'To be confirmed by trial site (enrolled = Yes, screen fail = No)'
-    }
-    
-    # Screen failure columns
-    failure_columns = [
-        'Clinical Liaison to confirm screen fail with CVLP site',
-        'Email the CVLP site to confirm that patient has not consented to the main trial',
-        'Email the CVLP site to confirm that patient has not enrolled to the trial'
-    ]
-    
-    for site in sorted(sites):
-        # Filter data for this site
-        site_df = master_df[master_df[cvlp_site_col] == site].copy()
-        
-        if site_df.empty:
-            continue
-        
-        # Calculate metrics for this site
-        
-        # 1. Site Opening Date (first patient consent to CVLP)
-        site_opening_date = "N/A"
-        if date_columns['cvlp_consent'] in master_df.columns:
-            consent_dates = pd.to_datetime(site_df[date_columns['cvlp_consent']], errors='coerce')
-            valid_dates = consent_dates.dropna()
-            if not valid_dates.empty:
-                site_opening_date = valid_dates.min().strftime('%d-%b-%y')
-        
-        # 2. Total Referred (unique patients referred to either pre-screen or main trial)
-        total_referred = 0
-        referred_mask = pd.Series(False, index=site_df.index)
-        
-        if date_columns['prescreen_referral'] in master_df.columns:
-            prescreen_dates = pd.to_datetime(site_df[date_columns['prescreen_referral']], errors='coerce')
-            referred_mask = referred_mask | prescreen_dates.notna()
-        
-        if date_columns['main_trial_referral'] in master_df.columns:
-            main_trial_dates = pd.to_datetime(site_df[date_columns['main_trial_referral']], errors='coerce')
-            referred_mask = referred_mask | main_trial_dates.notna()
-        
-        total_referred = referred_mask.sum()
-        
-        # 3. Referred to pre-screen
-        referred_prescreen = 0
-        if date_columns['prescreen_referral'] in master_df.columns:
-            prescreen_dates = pd.to_datetime(site_df[date_columns['prescreen_referral']], errors='coerce')
-            referred_prescreen = prescreen_dates.notna().sum()
-        
-        # 4. Referred to main trial
-        referred_main_trial = 0
-        if date_columns['main_trial_referral'] in master_df.columns:
-            main_trial_dates = pd.to_datetime(site_df[date_columns['main_trial_referral']], errors='coerce')
-            referred_main_trial = main_trial_dates.notna().sum()
-        
-        # 5. Recruited to CVLP (consented to CVLP)
-        recruited_cvlp = 0
-        if date_columns['cvlp_consent'] in master_df.columns:
-            cvlp_dates = pd.to_datetime(site_df[date_columns['cvlp_consent']], errors='coerce')
-            recruited_cvlp = cvlp_dates.notna().sum()
-        
-        # 6. Consented BNT113-01 (pre-screen)
-        consented_prescreen = 0
-        if date_columns['prescreen_consent'] in master_df.columns:
-            consented_prescreen = site_df[date_columns['prescreen_consent']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true']).sum()
-        
-        # 7. Consented BNT113-01 (main trial)
-        consented_main_trial = 0
-        if date_columns['main_trial_consent'] in master_df.columns:
-            consented_main_trial = site_df[date_columns['main_trial_consent']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true']).sum()
-        
-        # 8. Randomised BNT113-01
-        randomised = 0
-        if date_columns['enrollment'] in master_df.columns:
-            randomised = site_df[date_columns['enrollment']].astype(str).str.strip().str.lower().isin(['yes', 'y', 'true']).sum()
-        
-        # 9. Screen Failures
-        screen_failures = 0
-        failure_mask = pd.Series(False, index=site_df.index)
-        for fail_col in failure_columns:
-            if fail_col in master_df.columns:
-                failure_mask = failure_mask | (~site_df[fail_col].isna())
-        screen_failures = failure_mask.sum()
-        
-        # 10. Calculate key conversion rates
-        # CVLP→Referral Rate: How many referred vs recruited to CVLP
-        cvlp_to_referral_rate = (total_referred / recruited_cvlp * 100) if recruited_cvlp > 0 else 0
-        
-        # Referral→Randomisation Rate: Conversion from referral to randomisation
-        referral_to_randomisation_rate = (randomised / total_referred * 100) if total_referred > 0 else 0
-        
-        # Add row to site data (Recruited to CVLP before Total Referred)
-        row = {
-            'Site': site,
-            'Site Opening Date': site_opening_date,
-            'Recruited to CVLP': recruited_cvlp,
-            'Total Referred': total_referred,
-            'Referred to Pre-screen': referred_prescreen,
-            'Referred to Main Trial': referred_main_trial,
-            'Consented BNT113-01 (Pre-screen)': consented_prescreen,
-            'Consented BNT113-01 (Main Trial)': consented_main_trial,
-            'Randomised BNT113-01': randomised,
-            'Screen Failures': screen_failures,
-            'CVLP→Referral Rate (%)': round(cvlp_to_referral_rate, 1),
-            'Referral→Randomisation Rate (%)': round(referral_to_randomisation_rate, 1)
-        }
-        site_data.append(row)
-    
-    # Create DataFrame
-    df_sites = pd.DataFrame(site_data)
+    df_sites = result_store.get_or_compute(
+        dataset_key, privacy_mode, "site_based_metrics",
+        lambda: compute_site_based_metrics(master_df, sites, funnel_cube)
+    )
     
     if df_sites.empty:
         st.warning("No site metrics data available")
@@ -4230,15 +3027,7 @@ def create_site_based_metrics_table(master_df):
             xaxis_title='Site',
             yaxis_title='Number of Patients',
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
-            xaxis={'tickangle': 45},
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="center",
-                x=0.5
-            )
+            xaxis={'tickangle': 45}
         )
         st.plotly_chart(fig_site_performance, use_container_width=True)
         
@@ -4258,16 +3047,8 @@ def create_site_based_metrics_table(master_df):
             xaxis_title='Site',
             yaxis_title='Conversion Rate (%)',
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
             xaxis={'tickangle': 45},
-            legend=dict(
-                title='Metric',
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="center",
-                x=0.5
-            ),
+            legend_title_text='Metric',
             font=dict(size=12)
         )
         fig_conversion.update_traces(
@@ -4307,7 +3088,7 @@ if st.session_state.admin_settings['show_site_metrics_table']:
     """, unsafe_allow_html=True)
 
 # Call the site-based table function (only if we have data)
-if not master_df.empty and uploaded_master_file is not None:
+if not master_df.empty:
     site_metrics_df = create_site_based_metrics_table(master_df)
 else:
     site_metrics_df = pd.DataFrame()  # Initialize empty DataFrame
@@ -4349,7 +3130,6 @@ if site_metrics_df is not None and not site_metrics_df.empty and not st.session_
                         xaxis_title='Site',
                         yaxis_title=metric,
                         height=400,
-                        plot_bgcolor='rgba(0,0,0,0)',
                         xaxis={'tickangle': 45},
                         showlegend=False
                     )
@@ -4381,15 +3161,7 @@ if site_metrics_df is not None and not site_metrics_df.empty and not st.session_
                     xaxis_title='Site',
                     yaxis_title='Value',
                     height=500,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    xaxis={'tickangle': 45},
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=1.02,
-                        xanchor="center",
-                        x=0.5
-                    )
+                    xaxis={'tickangle': 45}
                 )
                 st.plotly_chart(fig_grouped, use_container_width=True)
                 
@@ -4431,7 +3203,7 @@ if site_metrics_df is not None and not site_metrics_df.empty and not st.session_
             # Create a heatmap of all numeric metrics
             if len(numeric_cols) >= 2:
                 # Normalize data for heatmap (0-100 scale)
-                heatmap_data = site_metrics_df[['Site'] + numeric_cols].copy()
+                heatmap_data = site_metrics_df[['Site'] + numeric_cols]
                 
                 # Normalize each metric to 0-100 scale for better comparison
                 for col in numeric_cols:
@@ -4483,7 +3255,7 @@ if 'df_monthly' in locals() and df_monthly is not None and not df_monthly.empty
         if selected_monthly_trend:
             # Filter data for visualization - actual metrics only show up to current month
             current_date = pd.Timestamp.now()
-            df_trend_viz = df_monthly.copy()
+            df_trend_viz = df_monthly.copy(deep=False)
             
             # Convert selected metric to numeric, handling "-" strings
             if selected_monthly_trend in df_trend_viz.columns:
@@ -4519,7 +3291,6 @@ if 'df_monthly' in locals() and df_monthly is not None and not df_monthly.empty
             )
             fig_monthly_trend.update_layout(
                 height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
                 xaxis={'tickangle': 45}
             )
             st.plotly_chart(fig_monthly_trend, use_container_width=True)
@@ -4551,12 +3322,164 @@ if 'df_monthly' in locals() and df_monthly is not None and not df_monthly.empty
             )
             fig_site_comparison.update_layout(
                 height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
                 xaxis={'tickangle': 45},
                 showlegend=False
             )
             st.plotly_chart(fig_site_comparison, use_container_width=True)
 
+# Statistical Process Control Section (site-level, hidden in privacy mode)
+def get_control_charts(df):
+    """p/u control charts for every site and metric, updated from the latest charts where their history still holds"""
+    latest = get_latest_control_charts()
+
+    def compute():
+        previous = latest.get(privacy_mode)
+        if previous is None:
+            return ControlCharts.build(df, data_context.site_opening_dates, results_as_of)
+        return previous.update(df, data_context.site_opening_dates, results_as_of)
+
+    charts = result_store.get_or_compute(dataset_key, privacy_mode, f"control_charts@{results_as_of:%Y-%m-%d}", compute)
+    latest[privacy_mode] = charts
+    return charts
+
+if st.session_state.admin_settings['show_statistical_control'] and not processed_df.empty and not st.session_state.privacy_mode:
+    st.markdown("""
+    <div class="section-divider">
+        <div class="section-divider-icon">📉</div>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("""
+    <div class="section-header">
+        📉 Statistical Process Control
+    </div>
+    """, unsafe_allow_html=True)
+
+    control_charts = get_control_charts(processed_df)
+    if not control_charts.months or not control_charts.sites:
+        st.info("Control charts start once a full month of referrals has closed.")
+    else:
+        control_summary = control_charts.summary()
+        signals_col = control_summary.columns[-2]
+        flagged = control_summary[control_summary[signals_col] > 0]
+        st.caption(
+            f"p-charts (rates, by referral month) and u-charts (referrals per site-month open) for "
+            f"{control_charts.months[0]} to {control_charts.months[-1]}; centre lines from each site's first "
+            f"months of data, limits at 3σ. Recent referral cohorts are still maturing."
+        )
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Charts", len(control_summary))
+        with col2:
+            st.metric("Charts with Recent Signals", len(flagged))
+        with col3:
+            st.metric("Sites with Recent Signals", flagged['Site'].nunique())
+
+        spc_col1, spc_col2 = st.columns(2)
+        with spc_col1:
+            spc_metric = st.selectbox("Control chart metric:", [m.name for m in control_charts.metrics], key="spc_metric")
+        with spc_col2:
+            spc_site = st.selectbox("CVLP site:", list(control_charts.sites), key="spc_site")
+
+        chart_df = control_charts.chart(spc_metric, spc_site)
+        unit = " (%)" if {m.name: m.kind for m in control_charts.metrics}[spc_metric] == 'p' else " per site-month"
+        signals = chart_df[chart_df['Rules'] != '']
+        fig_control = go.Figure()
+        fig_control.add_trace(go.Scatter(
+            x=chart_df['Month'], y=chart_df['UCL'], mode='lines', name='UCL',
+            line=dict(color=COLOR_PALETTE['danger'], width=1, dash='dash', shape='hv')
+        ))
+        fig_control.add_trace(go.Scatter(
+            x=chart_df['Month'], y=chart_df['LCL'], mode='lines', name='LCL',
+            line=dict(color=COLOR_PALETTE['danger'], width=1, dash='dash', shape='hv')
+        ))
+        fig_control.add_trace(go.Scatter(
+            x=chart_df['Month'], y=chart_df['Centre'], mode='lines', name='Centre',
+            line=dict(color=COLOR_PALETTE['success'], width=2)
+        ))
+        fig_control.add_trace(go.Scatter(
+            x=chart_df['Month'], y=chart_df['Value'], mode='lines+markers', name=spc_metric,
+            line=dict(color=COLOR_PALETTE['primary'], width=3), customdata=chart_df['n'],
+            hovertemplate='%{x}: %{y:.1f} (n=%{customdata:.1f})<extra></extra>'
+        ))
+        fig_control.add_trace(go.Scatter(
+            x=signals['Month'], y=signals['Value'], mode='markers', name='Rule violation',
+            marker=dict(color=COLOR_PALETTE['danger'], size=12, symbol='x'),
+            customdata=signals['Rules'], hovertemplate='%{x}: %{customdata}<extra></extra>'
+        ))
+        fig_control.update_layout(
+            title=f'{spc_metric} Control Chart: {spc_site}',
+            height=420,
+            xaxis={'tickangle': 45},
+            yaxis_title=f'{spc_metric}{unit}',
+            hovermode='x unified'
+        )
+        st.plotly_chart(fig_control, use_container_width=True)
+
+        with st.expander(f"🚨 Control Chart Signals, last 3 months ({len(flagged)} charts)"):
+            if flagged.empty:
+                st.info("No Western Electric rule violations in the last 3 months.")
+            else:
+                st.dataframe(flagged.round(2), use_container_width=True, hide_index=True)
+
+if st.session_state.admin_settings.get('show_sample_logistics', True) and not master_df.empty and not st.session_state.privacy_mode:
+    st.markdown("""
+    <div class="section-divider">
+        <div class="section-divider-icon">🚚</div>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("""
+    <div class="section-header">
+        🚚 Sample Logistics Latency
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Working-day intervals of every sample, computed once per dataset and reporting workbook
+    logistics = result_store.get_or_compute(
+        dataset_key, privacy_mode, f"sample_logistics@{reporting_workbook_version}",
+        lambda: LogisticsLatency.build(master_df, cpgc_content.cpgc_reporting)
+    )
+    if not logistics.legs:
+        st.info(
+            "Latency needs at least two milestone dates per sample (tissue block dispatch, CPGC receipt, "
+            "shipment to LabCorp, result), and this tracker doesn't hold them."
+        )
+    else:
+        logistics_col1, logistics_col2, logistics_col3 = st.columns(3)
+        with logistics_col1:
+            logistics_leg = st.selectbox("Leg:", list(logistics.legs), key="logistics_leg")
+        with logistics_col2:
+            logistics_by = st.radio("Group by:", list(LATENCY_GROUPINGS), horizontal=True, key="logistics_by")
+        logistics_summary = logistics.summary(logistics_by)
+        leg_summary = logistics_summary[logistics_summary['Leg'] == logistics_leg]
+        with logistics_col3:
+            logistics_group = st.selectbox(
+                f"{logistics_by}:", ["All"] + leg_summary[logistics_by].tolist(), key="logistics_group"
+            )
+
+        histogram = logistics.histogram(
+            logistics_leg, logistics_by, None if logistics_group == "All" else logistics_group
+        )
+        sla_days, urgent_sla_days = logistics.sla_days(logistics_leg)
+        fig_latency = go.Figure(go.Bar(
+            x=histogram.index, y=histogram.values, marker_color=COLOR_PALETTE['primary'],
+            hovertemplate='%{x} working days: %{y} samples<extra></extra>'
+        ))
+        fig_latency.add_vline(x=sla_days + 0.5, line_dash='dash', line_color=COLOR_PALETTE['danger'],
+                              annotation_text=f"SLA {sla_days} days")
+        if urgent_sla_days != sla_days:
+            fig_latency.add_vline(x=urgent_sla_days + 0.5, line_dash='dot', line_color=COLOR_PALETTE['warning'],
+                                  annotation_text=f"Urgent SLA {urgent_sla_days} days", annotation_position='bottom right')
+        fig_latency.update_layout(
+            title=f"{logistics_leg}: {logistics_group}",
+            height=380,
+            xaxis_title="Working days",
+            yaxis_title="Samples",
+            bargap=0.1
+        )
+        st.plotly_chart(fig_latency, use_container_width=True)
+        st.caption("Working days exclude weekends and England & Wales bank holidays. Blank sites and unmapped CPGCs are left out of the table.")
+        st.dataframe(leg_summary, use_container_width=True, hide_index=True)
+
 # Add CVLP Site Performance section
 st.markdown("""
 <div class="section-divider">
@@ -4577,645 +3500,25 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
         st.warning("No data available for CVLP Site Performance")
         return
     
-    # First, try to get the official site list and pre-calculated data from "CVLP Site Data" sheet
-    official_sites = []
-    site_data_dict = {}  # Store pre-calculated data from CVLP Site Data sheet
+    # Shared across sessions; day counts and the month list depend on today's date
+    performance = result_store.get_or_compute(
+        dataset_key, privacy_mode, f"cvlp_site_performance@{results_as_of:%Y-%m-%d}",
+        lambda: compute_cvlp_site_performance(df, uploaded_file, funnel_cube)
+    )
+    performance_df = performance['performance_df']
+    official_sites = performance['official_sites']
+    months = performance['months']
+    month_names = [month['name'] for month in months]
     
-    if uploaded_file is not None:
-        try:
-            # Try different possible sheet names
-            excel_file = pd.ExcelFile(uploaded_file)
-            available_sheets = excel_file.sheet_names
-            possible_sheet_names = ["CVLP Site Data", "CVLP Site Data ", "Site Data", "CVLP Sites", "Sites"]
-            sheet_found = None
-            
-            for sheet_name in possible_sheet_names:
-                if sheet_name in available_sheets:
-                    sheet_found = sheet_name
-                    break
-            
-            if sheet_found:
-                # Try different header rows in case data doesn't start at row 0
-                site_col_found = False
-                for header_row in [0, 1, 2, 3]:
-                    try:
-                        cvlp_site_data = pd.read_excel(uploaded_file, sheet_name=sheet_found, header=header_row)
-                        
-                        # Look for the CVLP Site column
-                        site_col = None
-                        possible_site_cols = ['CVLP Site', 'CVLP site', 'Site name', 'Site Name', 'Site']
-                        for col in cvlp_site_data.columns:
-                            if str(col) in possible_site_cols:
-                                site_col = col
-                                break
-                        
-                        if site_col:
-                            # Extract official site names, filtering out empty/NaN values and placeholder text
-                            official_sites = cvlp_site_data[site_col].dropna().unique().tolist()
-                            official_sites = [site for site in official_sites if str(site).strip() != '' and 
-                                            'enter' not in str(site).lower() and 
-                                            'placeholder' not in str(site).lower() and
-                                            'cvlp site' not in str(site).lower()]
-                            
-                            if len(official_sites) > 0:
-                                site_col_found = True
-                                
-                                # Remove any sites that are actually column headers
-                                official_sites = [s for s in official_sites if not any(
-                                    header_word in str(s).lower() 
-                                    for header_word in ['site name', 'green light', 'date', 'screened']
-                                )]
-                                
-                                # Now read additional columns from CVLP Site Data
-                                # Look for "Days Since Site Active" (Total days since last patient referred / site opened)
-                                days_since_col = None
-                                possible_days_cols = [
-                                    'Days Since Site Active',
-                                    'Days since site active',
-                                    'Total days since last patient referred / site opened',
-                                    'Total days since last patient referred/site opened',
-                                    'Days since last referral',
-                                    'Days since last patient referred'
-                                ]
-                                for col in cvlp_site_data.columns:
-                                    col_str = str(col).strip()
-                                    if any(possible.lower() in col_str.lower() for possible in possible_days_cols):
-                                        days_since_col = col
-                                        break
-                                
-                                # Look for "Days Between Site Open & Referral" (days from site open to first referral)
-                                days_to_referral_col = None
-                                possible_days_to_ref_cols = [
-                                    'Days Between Site Open & Referral',
-                                    'Days between site open & referral',
-                                    'Days to first referral'
-                                ]
-                                for col in cvlp_site_data.columns:
-                                    col_str = str(col).strip()
-                                    if any(possible.lower() in col_str.lower() for possible in possible_days_to_ref_cols):
-                                        days_to_referral_col = col
-                                        break
-                                
-                                # Look for green light date column (site opened date) - keeping for potential future use
-                                green_light_col = None
-                                possible_green_light_cols = [
-                                    'Go-Live Date',
-                                    'Go live date',
-                                    'Enter green light date',
-                                    'Green light date',
-                                    'Site opened date',
-                                    'Site open date'
-                                ]
-                                for col in cvlp_site_data.columns:
-                                    col_str = str(col).strip()
-                                    if any(possible.lower() in col_str.lower() for possible in possible_green_light_cols):
-                                        green_light_col = col
-                                        break
-                                
-                                # Look for first referral date column - keeping for potential future use
-                                first_pt_col = None
-                                possible_first_pt_cols = [
-                                    'Date of first referral',
-                                    'Date of First Referral',
-                                    'Enter date first pt screened at site',
-                                    'Date first pt screened at site',
-                                    'First patient screened',
-                                    'First screening date'
-                                ]
-                                for col in cvlp_site_data.columns:
-                                    col_str = str(col).strip()
-                                    if any(possible.lower() in col_str.lower() for possible in possible_first_pt_cols):
-                                        first_pt_col = col
-                                        break
-                                
-                                # Debug: Show what columns were found (temporary)
-                                if 'show_debug' not in st.session_state:
-                                    st.session_state.show_debug = {}
-                                st.session_state.show_debug['green_light_col'] = green_light_col
-                                st.session_state.show_debug['first_pt_col'] = first_pt_col
-                                st.session_state.show_debug['days_since_col'] = days_since_col
-                                st.session_state.show_debug['days_to_referral_col'] = days_to_referral_col
-                                st.session_state.show_debug['all_columns'] = list(cvlp_site_data.columns)
-                                
-                                # Store the data in a dictionary for quick lookup
-                                for idx, row in cvlp_site_data.iterrows():
-                                    if pd.notna(row[site_col]):
-                                        site_name = row[site_col]
-                                        site_data_dict[site_name] = {}
-                                        
-                                        # Read "Days Since Site Active" (total days since last patient referred / site opened)
-                                        if days_since_col and days_since_col in row.index:
-                                            days_since_value = row[days_since_col]
-                                            if pd.notna(days_since_value):
-                                                try:
-                                                    site_data_dict[site_name]['days_since_last_referral'] = float(days_since_value)
-                                                except:
-                                                    pass
-                                        
-                                        # Read "Days Between Site Open & Referral" (days from site open to first referral)
-                                        if days_to_referral_col and days_to_referral_col in row.index:
-                                            days_to_ref_value = row[days_to_referral_col]
-                                            if pd.notna(days_to_ref_value):
-                                                try:
-                                                    site_data_dict[site_name]['days_to_first_referral'] = float(days_to_ref_value)
-                                                except:
-                                                    pass
-                                        
-                                        # Read green light date and first referral date for potential future use
-                                        if green_light_col and green_light_col in row.index:
-                                            green_light_date = pd.to_datetime(row[green_light_col], errors='coerce')
-                                            site_data_dict[site_name]['green_light_date'] = green_light_date
-                                        
-                                        if first_pt_col and first_pt_col in row.index:
-                                            first_pt_date = pd.to_datetime(row[first_pt_col], errors='coerce')
-                                            site_data_dict[site_name]['first_pt_screened_date'] = first_pt_date
-                                
-                                break
-                    except:
-                        continue
-                
-                if not site_col_found:
-                    # If we can't read the sheet properly, use all 19 CVLP sites (exact names)
-                    official_sites = [
-                        "Coventry and Warwickshire",
-                        "Bath",
-                        "Gloucestershire",
-                        "Univeristy Hospitals Dorset",
-                        "Mid & South Essex - Broomfield",
-                        "Mid & South Essex - Southend",
-                        "Bedfordshire",
-                        "Hull",
-                        "Royal Surrey",
-                        "Royal Berkshire",
-                        "United Lincolnshire",
-                        "York & Scarborough",
-                        "Royal Free (North Middlesex)",
-                        "Barking Havering and Redbridge",
-                        "East & North Herefordshire (Lister)",
-                        "North Cumbria",
-                        "West Suffolk",
-                        "Maidstone",
-                        "Leicester"
-                    ]
-
-            else:
-                # Use all 19 CVLP sites as fallback (exact names)
-                official_sites = [
-                    "Coventry and Warwickshire",
-                    "Bath",
-                    "Gloucestershire",
-                    "Univeristy Hospitals Dorset",
-                    "Mid & South Essex - Broomfield",
-                    "Mid & South Essex - Southend",
-                    "Bedfordshire",
-                    "Hull",
-                    "Royal Surrey",
-                    "Royal Berkshire",
-                    "United Lincolnshire",
-                    "York & Scarborough",
-                    "Royal Free (North Middlesex)",
-                    "Barking Havering and Redbridge",
-                    "East & North Herefordshire (Lister)",
-                    "North Cumbria",
-                    "West Suffolk",
-                    "Maidstone",
-                    "Leicester"
-                ]
-
-                    
-        except Exception as e:
-            # Use all 19 CVLP sites as fallback on any error (exact names)
-            official_sites = [
-                "Coventry and Warwickshire",
-                "Bath",
-                "Gloucestershire",
-                "Univeristy Hospitals Dorset",
-                "Mid & South Essex - Broomfield",
-                "Mid & South Essex - Southend",
-                "Bedfordshire",
-                "Hull",
-                "Royal Surrey",
-                "Royal Berkshire",
-                "United Lincolnshire",
-                "York & Scarborough",
-                "Royal Free (North Middlesex)",
-                "Barking Havering and Redbridge",
-                "East & North Herefordshire (Lister)",
-                "North Cumbria",
-                "West Suffolk",
-                "Maidstone",
-                "Leicester"
-            ]
-
-    
-    # If we couldn't get official sites, use comprehensive list of all 19 CVLP sites as final fallback (exact names)
-    if not official_sites:
-        official_sites = [
-            "Coventry and Warwickshire",
-            "Bath",
-            "Gloucestershire",
-            "Univeristy Hospitals Dorset",
-            "Mid & South Essex - Broomfield",
-            "Mid & South Essex - Southend",
-            "Bedfordshire",
-            "Hull",
-            "Royal Surrey",
-            "Royal Berkshire",
-            "United Lincolnshire",
-            "York & Scarborough",
-            "Royal Free (North Middlesex)",
-            "Barking Havering and Redbridge",
-            "East & North Herefordshire (Lister)",
-            "North Cumbria",
-            "West Suffolk",
-            "Maidstone",
-            "Leicester"
-        ]
-
+    if performance['site_data_columns'] is not None:
+        if 'show_debug' not in st.session_state:
+            st.session_state.show_debug = {}
+        st.session_state.show_debug.update(performance['site_data_columns'])
     
     if len(official_sites) == 0:
         st.warning("No CVLP sites found in the data")
         return
     
-    # Find CVLP Site column in main data for filtering
-    cvlp_site_col = None
-    possible_site_cols = ['CVLP Site', 'CVLP site', 'Please choose the CVLP site from the drop down']
-    
-    for col in possible_site_cols:
-        if col in df.columns:
-            cvlp_site_col = col
-            break
-    
-    # Date columns for analysis - checking multiple possible column names
-    date_columns = {}
-    
-    # CVLP Consent - find the correct column
-    cvlp_consent_options = [
-        'Date patient consented into CVLP',
-        'Please input the date the patient signed the consent form (dd/mm/yyyy)',
-        'CVLP consent date',
-        'Date of CVLP consent',
-        'Date patient consented into CVLP ',  # with trailing space
-        'Please input the date the patient signed the consent form',
-        'Patient consent date',
-        'CVLP Site consent date'
-    ]
-    for col in cvlp_consent_options:
-        if col in df.columns:
-            date_columns['cvlp_consent'] = col
-            break
-    
-    # Pre-screen referral - find the correct column
-    prescreen_referral_options = [
-        'Please input the date the pre-screening referral form was sent to the trial site\n(dd/mm/yyyy)',
-        'Please input the date the pre-screening referral form was sent to the trial site (dd/mm/yyyy)',
-        'Date pre-screening referral sent',
-        'Pre-screening referral date'
-    ]
-    for col in prescreen_referral_options:
-        if col in df.columns:
-            date_columns['prescreen_referral'] = col
-            break
-    
-    # Main trial referral - find the correct column
-    main_trial_referral_options = [
-        'Please input the date the main trial screening referral form was sent to the trial site\n(dd/mm/yyyy)',
-        'Please input the date the main trial screening referral form was sent to the trial site (dd/mm/yyyy)',
-        'Date main trial referral sent',
-        'Main trial referral date'
-    ]
-    for col in main_trial_referral_options:
-        if col in df.columns:
-            date_columns['main_trial_referral'] = col
-            break
-    
-    # Randomised/Enrolled - find the correct column
-    randomised_options = [
-        'Date participant enrolled',
-        'Participant enrolled to BNT113-01?',
-        'Date of enrollment',
-        'Enrollment date',
-        'Randomisation date'
-    ]
-    for col in randomised_options:
-        if col in df.columns:
-            date_columns['randomised'] = col
-            break
-    
-    
-    # Convert date columns to datetime
-    for key, col in date_columns.items():
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-    
-    # Define months for analysis (Apr-25 to current)
-    months = []
-    current_date = datetime.now()
-    start_date = pd.Timestamp('2025-04-01')
-    
-    # Generate month list
-    temp_date = start_date
-    while temp_date <= current_date:
-        months.append({
-            'name': temp_date.strftime('%b-%y'),
-            'start': temp_date,
-            'end': temp_date + pd.DateOffset(months=1) - pd.Timedelta(days=1)
-        })
-        temp_date = temp_date + pd.DateOffset(months=1)
-    
-    # Create performance data structure
-    performance_data = []
-    
-    for site in official_sites:
-        # Filter data for this site (only if we have the CVLP site column)
-        if cvlp_site_col:
-            site_data = df[df[cvlp_site_col] == site]
-        else:
-            site_data = pd.DataFrame()  # Empty DataFrame if no site column found
-        
-        # Initialize site row - all official sites are considered open and active
-        site_row = {
-            'Site name': site,
-            'Site opened': 'Yes'  # All official CVLP sites are open
-        }
-        
-        # Calculate metrics for each month
-        for month in months:
-            month_name = month['name']
-            
-            # Filter data for this month
-            month_data = site_data.copy()
-            
-            # Consented to CVLP
-            cvlp_consented = 0
-            if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-                cvlp_consented = len(month_data[
-                    (month_data[date_columns['cvlp_consent']] >= month['start']) &
-                    (month_data[date_columns['cvlp_consent']] <= month['end'])
-                ])
-            site_row[f'Consented to CVLP_{month_name}'] = cvlp_consented
-            
-            # Referred to pre-screen
-            prescreen_referred = 0
-            if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-                prescreen_referred = len(month_data[
-                    (month_data[date_columns['prescreen_referral']] >= month['start']) &
-                    (month_data[date_columns['prescreen_referral']] <= month['end'])
-                ])
-            site_row[f'Referred to pre-screen_{month_name}'] = prescreen_referred
-            
-            # Referred to main trial
-            main_trial_referred = 0
-            if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-                main_trial_referred = len(month_data[
-                    (month_data[date_columns['main_trial_referral']] >= month['start']) &
-                    (month_data[date_columns['main_trial_referral']] <= month['end'])
-                ])
-            site_row[f'Referred to main trial_{month_name}'] = main_trial_referred
-            
-            # Consented to pre-screen
-            prescreen_consented = 0
-            if 'prescreen_consent' in date_columns and date_columns['prescreen_consent'] in df.columns:
-                prescreen_consented = len(month_data[
-                    (month_data[date_columns['prescreen_consent']] >= month['start']) &
-                    (month_data[date_columns['prescreen_consent']] <= month['end'])
-                ])
-            site_row[f'Consented to pre-screen_{month_name}'] = prescreen_consented
-            
-        
-        # Calculate overall metrics for the site
-        total_consented = 0
-        total_referred_prescreen = 0
-        total_referred_main = 0
-        
-        if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-            total_consented = len(site_data[site_data[date_columns['cvlp_consent']].notna()])
-        
-        if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-            total_referred_prescreen = len(site_data[site_data[date_columns['prescreen_referral']].notna()])
-        
-        if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-            total_referred_main = len(site_data[site_data[date_columns['main_trial_referral']].notna()])
-        
-        # Calculate site opened date (earliest CVLP consent date for this site)
-        site_opened_date = None
-        if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-            site_dates = site_data[site_data[date_columns['cvlp_consent']].notna()][date_columns['cvlp_consent']]
-            if len(site_dates) > 0:
-                site_opened_date = site_dates.min()
-        
-        # Get days from site open to first referral - prioritize CVLP Site Data sheet
-        days_to_first_referral = None
-        days_to_first_referral_status = None
-        
-        # First try to get from the CVLP Site Data sheet
-        if site in site_data_dict and 'days_to_first_referral' in site_data_dict[site]:
-            days_to_first_referral = site_data_dict[site]['days_to_first_referral']
-        
-        # If not found in CVLP Site Data, calculate it from main tracker data
-        if days_to_first_referral is None:
-            first_referral_date = None
-            
-            # Find first referral date (either pre-screen or main trial)
-            referral_dates = []
-            if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-                prescreen_dates = site_data[site_data[date_columns['prescreen_referral']].notna()][date_columns['prescreen_referral']]
-                if len(prescreen_dates) > 0:
-                    referral_dates.append(prescreen_dates.min())
-            
-            if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-                main_dates = site_data[site_data[date_columns['main_trial_referral']].notna()][date_columns['main_trial_referral']]
-                if len(main_dates) > 0:
-                    referral_dates.append(main_dates.min())
-            
-            if referral_dates:
-                first_referral_date = min(referral_dates)
-            
-            if site_opened_date and first_referral_date:
-                days_to_first_referral = (first_referral_date - site_opened_date).days
-        
-        # Apply color coding
-        if days_to_first_referral is not None:
-            # Color coding: Green <60, Orange 60-90, Red >90
-            if days_to_first_referral > 90:
-                days_to_first_referral_status = 'RED'
-            elif days_to_first_referral >= 60:
-                days_to_first_referral_status = 'ORANGE'
-        else:
-                days_to_first_referral_status = 'GREEN'
-        
-        site_row['Days from site open to first referral'] = days_to_first_referral
-        site_row['Days from site open to first referral (Status)'] = days_to_first_referral_status
-        
-        # Calculate total days since last patient referred / site opened
-        # Formula: Today - date of last referral (or site opened if no referrals)
-        # Use the most recent date from either pre-screening or main trial referral
-        days_since_last_referral = None
-        days_since_last_referral_status = None
-        last_referral_date = None
-        
-        # Find last (most recent) referral date (either pre-screen or main trial)
-        last_referral_dates = []
-        if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-            prescreen_dates = site_data[site_data[date_columns['prescreen_referral']].notna()][date_columns['prescreen_referral']]
-            if len(prescreen_dates) > 0:
-                last_referral_dates.append(prescreen_dates.max())
-        
-        if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-            main_dates = site_data[site_data[date_columns['main_trial_referral']].notna()][date_columns['main_trial_referral']]
-            if len(main_dates) > 0:
-                last_referral_dates.append(main_dates.max())
-        
-        if last_referral_dates:
-            # Has referrals - use the most recent referral date
-            last_referral_date = max(last_referral_dates)
-            days_since_last_referral = (current_date - last_referral_date).days
-        else:
-            # No referrals yet - use site opened date (first CVLP consent date)
-            if site_opened_date:
-                days_since_last_referral = (current_date - site_opened_date).days
-            else:
-                # If no site opened date either, try to get from CVLP Site Data
-                if site in site_data_dict and 'green_light_date' in site_data_dict[site]:
-                    green_light = site_data_dict[site]['green_light_date']
-                    if pd.notna(green_light):
-                        days_since_last_referral = (current_date - green_light).days
-        
-        # Apply color coding
-        if days_since_last_referral is not None:
-            # Color coding: Green <30, Orange 30-60, Red >60
-            if days_since_last_referral > 60:
-                days_since_last_referral_status = 'RED'
-            elif days_since_last_referral >= 30:
-                days_since_last_referral_status = 'ORANGE'
-            else:
-                days_since_last_referral_status = 'GREEN'
-        
-        site_row['Total days since last patient referred / site opened'] = days_since_last_referral
-        site_row['Total days since last patient referred / site opened (Status)'] = days_since_last_referral_status
-        
-        # Calculate average monthly recruitment up to Sep-25
-        # Formula: Total CVLP consented / (Days site active / 30.44)
-        # Days site active = End of Sep-25 - Date of first patient screened at site
-        sep_2025_end = pd.Timestamp('2025-09-30')
-        
-        # Find the date of first patient screened at this site (earliest CVLP consent date)
-        first_screening_date = None
-        if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-            site_consent_dates = site_data[site_data[date_columns['cvlp_consent']].notna()][date_columns['cvlp_consent']]
-            if len(site_consent_dates) > 0:
-                first_screening_date = site_consent_dates.min()
-        
-        # Calculate average monthly recruitment
-        avg_monthly_recruitment = 0
-        if first_screening_date and first_screening_date <= sep_2025_end:
-            # Calculate days site has been active
-            days_active = (sep_2025_end - first_screening_date).days
-            
-            # Count total consents up to Sep 2025
-            consents_to_sep = 0
-            if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-                consents_to_sep = len(site_data[
-                    (site_data[date_columns['cvlp_consent']].notna()) &
-                    (site_data[date_columns['cvlp_consent']] <= sep_2025_end)
-                ])
-            
-            # Calculate average: Total consented / (Days active / 30.44 days per month)
-            if days_active > 0:
-                months_active = days_active / 30.44
-                avg_monthly_recruitment = consents_to_sep / months_active
-        
-        site_row['Average monthly recruitment up to Sep-25'] = avg_monthly_recruitment
-        
-        # Calculate average monthly referrals up to Sep-25
-        # Using the same logic as recruitment
-        avg_monthly_referrals = 0
-        if first_screening_date and first_screening_date <= sep_2025_end:
-            days_active = (sep_2025_end - first_screening_date).days
-            
-            # Count referrals up to Sep 2025
-            referrals_to_sep_prescreen = 0
-            referrals_to_sep_main = 0
-            
-            if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-                referrals_to_sep_prescreen = len(site_data[
-                    (site_data[date_columns['prescreen_referral']].notna()) &
-                    (site_data[date_columns['prescreen_referral']] <= sep_2025_end)
-                ])
-            
-            if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-                referrals_to_sep_main = len(site_data[
-                    (site_data[date_columns['main_trial_referral']].notna()) &
-                    (site_data[date_columns['main_trial_referral']] <= sep_2025_end)
-                ])
-            
-            # Calculate average: Total referrals / (Days active / 30.44 days per month)
-            if days_active > 0:
-                months_active = days_active / 30.44
-                avg_monthly_referrals = (referrals_to_sep_prescreen + referrals_to_sep_main) / months_active
-        
-        site_row['Average monthly referrals up to Sep-25'] = avg_monthly_referrals
-        
-        # Calculate change in average monthly recruitment (comparing current month to previous month)
-        # Get last two complete months (August and September 2025)
-        sep_2025_start = pd.Timestamp('2025-09-01')
-        sep_2025_end = pd.Timestamp('2025-09-30')
-        aug_2025_start = pd.Timestamp('2025-08-01')
-        aug_2025_end = pd.Timestamp('2025-08-31')
-        
-        # Calculate August's average monthly rate (up to end of Aug)
-        aug_2025_end_ts = pd.Timestamp('2025-08-31')
-        aug_avg_recruitment = 0
-        aug_avg_referrals = 0
-        
-        if first_screening_date and first_screening_date <= aug_2025_end_ts:
-            days_active_aug = (aug_2025_end_ts - first_screening_date).days
-            if days_active_aug > 0:
-                # Count consents up to August
-                consents_to_aug = 0
-                if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-                    consents_to_aug = len(site_data[
-                        (site_data[date_columns['cvlp_consent']].notna()) &
-                        (site_data[date_columns['cvlp_consent']] <= aug_2025_end_ts)
-                    ])
-                
-                months_active_aug = days_active_aug / 30.44
-                aug_avg_recruitment = consents_to_aug / months_active_aug if months_active_aug > 0 else 0
-                
-                # Count referrals up to August
-                referrals_to_aug_prescreen = 0
-                referrals_to_aug_main = 0
-                if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-                    referrals_to_aug_prescreen = len(site_data[
-                        (site_data[date_columns['prescreen_referral']].notna()) &
-                        (site_data[date_columns['prescreen_referral']] <= aug_2025_end_ts)
-                    ])
-                if 'main_trial_referral' in date_columns and date_columns['main_trial_referral'] in df.columns:
-                    referrals_to_aug_main = len(site_data[
-                        (site_data[date_columns['main_trial_referral']].notna()) &
-                        (site_data[date_columns['main_trial_referral']] <= aug_2025_end_ts)
-                    ])
-                
-                total_referrals_to_aug = referrals_to_aug_prescreen + referrals_to_aug_main
-                aug_avg_referrals = total_referrals_to_aug / months_active_aug if months_active_aug > 0 else 0
-        
-        # Calculate change from August to September
-        change_in_recruitment = None
-        change_in_referrals = None
-        
-        if aug_avg_recruitment > 0 and avg_monthly_recruitment > 0:
-            change_in_recruitment = ((avg_monthly_recruitment - aug_avg_recruitment) / aug_avg_recruitment) * 100
-        
-        if aug_avg_referrals > 0 and avg_monthly_referrals > 0:
-            change_in_referrals = ((avg_monthly_referrals - aug_avg_referrals) / aug_avg_referrals) * 100
-        
-        site_row['Change in average monthly recruitment'] = change_in_recruitment
-        site_row['Change in average monthly referrals'] = change_in_referrals
-        
-        performance_data.append(site_row)
-    
-    # Create DataFrame
-    performance_df = pd.DataFrame(performance_data)
     
     if performance_df.empty:
         st.warning("No performance data to display")
@@ -5247,7 +3550,7 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
     
     # Filter to available columns
     available_display_columns = [col for col in display_columns if col in performance_df.columns]
-    display_df = performance_df[available_display_columns].copy()
+    display_df = performance_df[available_display_columns]
     
     # Function to color cells based on status and values
     def highlight_performance(row):
@@ -5337,9 +3640,6 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
         # Create a modified highlight function that works with limited columns
         def highlight_performance_display(row):
             colors = []
-            # Get the corresponding row from performance_df to access status columns
-            full_row = performance_df.loc[row.name]
-            
             for col in row.index:
                 # Days from site open to first referral - Gradient RAG coloring
                 if col == 'Days from site open to first referral':
@@ -5529,26 +3829,24 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
     
     if selected_site and selected_site != 'All Sites':
         # Show detailed monthly breakdown for selected site
-        if cvlp_site_col:
-            site_data = df[df[cvlp_site_col] == selected_site]
-        else:
-            site_data = pd.DataFrame()
-        
-        if len(site_data) > 0:
+        if funnel_cube.total('patients', cvlp_site=selected_site) > 0:
             # Find first screening date for this site
-            first_screening_date = None
-            if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-                site_consent_dates = site_data[site_data[date_columns['cvlp_consent']].notna()][date_columns['cvlp_consent']]
-                if len(site_consent_dates) > 0:
-                    first_screening_date = site_consent_dates.min()
+            first_screening_date = funnel_cube.first_date('cvlp_consented', selected_site)
             
-            if first_screening_date:
+            if pd.notna(first_screening_date):
+                # Consents and referrals up to the end of each month
+                consents_to_date = funnel_cube.monthly('cvlp_consented', month_names, selected_site, cumulative=True)
+                referrals_to_date = (
+                    funnel_cube.monthly('referred_to_prescreen', month_names, selected_site, cumulative=True)
+                    + funnel_cube.monthly('referred_to_main_trial', month_names, selected_site, cumulative=True)
+                )
+                
                 # Build monthly data
                 monthly_data = []
                 prev_recruitment_rate = None
                 prev_referral_rate = None
                 
-                for month in months:
+                for i, month in enumerate(months):
                     month_end = month['end']
                     if month_end < first_screening_date:
                         continue  # Skip months before site started
@@ -5558,26 +3856,8 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
                     if days_active <= 0:
                         continue
                     
-                    # Count consents up to this month
-                    consents = len(site_data[
-                        (site_data[date_columns['cvlp_consent']].notna()) &
-                        (site_data[date_columns['cvlp_consent']] <= month_end)
-                    ])
-                    
-                    # Count referrals up to this month
-                    referrals_prescreen = 0
-                    referrals_main = 0
-                    if 'prescreen_referral' in date_columns:
-                        referrals_prescreen = len(site_data[
-                            (site_data[date_columns['prescreen_referral']].notna()) &
-                            (site_data[date_columns['prescreen_referral']] <= month_end)
-                        ])
-                    if 'main_trial_referral' in date_columns:
-                        referrals_main = len(site_data[
-                            (site_data[date_columns['main_trial_referral']].notna()) &
-                            (site_data[date_columns['main_trial_referral']] <= month_end)
-                        ])
-                    total_referrals = referrals_prescreen + referrals_main
+                    consents = int(consents_to_date[i])
+                    total_referrals = int(referrals_to_date[i])
                     
                     # Calculate rates
                     months_active = days_active / 30.44
@@ -5703,52 +3983,23 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
         st.markdown("**Detailed breakdown of calculations by site and month:**")
         
         for site in official_sites:
-            # Filter data for this site (only if we have the CVLP site column)
-            if cvlp_site_col:
-                site_data = df[df[cvlp_site_col] == site]
-            else:
-                site_data = pd.DataFrame()  # Empty DataFrame if no site column found
-            
-            if len(site_data) > 0:
+            if funnel_cube.total('patients', cvlp_site=site) > 0:
                 st.markdown(f"### {site}")
                 
                 # Show monthly breakdown
-                monthly_breakdown = []
-                for month in months:
-                    month_name = month['name']
-                    
-                    # Calculate monthly values
-                    cvlp_consented = 0
-                    prescreen_referred = 0
-                    randomised = 0
-                    
-                    if 'cvlp_consent' in date_columns and date_columns['cvlp_consent'] in df.columns:
-                        cvlp_consented = len(site_data[
-                            (site_data[date_columns['cvlp_consent']] >= month['start']) &
-                            (site_data[date_columns['cvlp_consent']] <= month['end'])
-                        ])
-                    
-                    if 'prescreen_referral' in date_columns and date_columns['prescreen_referral'] in df.columns:
-                        prescreen_referred = len(site_data[
-                            (site_data[date_columns['prescreen_referral']] >= month['start']) &
-                            (site_data[date_columns['prescreen_referral']] <= month['end'])
-                        ])
-                    
-                    monthly_breakdown.append({
-                        'Month': month_name,
-                        'Consented to CVLP': cvlp_consented,
-                        'Referred to pre-screen': prescreen_referred
-                    })
-                
-                breakdown_df = pd.DataFrame(monthly_breakdown)
+                breakdown_df = pd.DataFrame({
+                    'Month': month_names,
+                    'Consented to CVLP': funnel_cube.monthly('cvlp_consented', month_names, site),
+                    'Referred to pre-screen': funnel_cube.monthly('referred_to_prescreen', month_names, site),
+                })
                 if not breakdown_df.empty:
                     # Split into separate consent and referral tables
                     st.markdown("**📝 Monthly Consent Breakdown:**")
-                    consent_breakdown = breakdown_df[['Month', 'Consented to CVLP']].copy()
+                    consent_breakdown = breakdown_df[['Month', 'Consented to CVLP']]
                     st.dataframe(consent_breakdown, use_container_width=True)
                     
                     st.markdown("**📋 Monthly Referral Breakdown:**")
-                    referral_breakdown = breakdown_df[['Month', 'Referred to pre-screen']].copy()
+                    referral_breakdown = breakdown_df[['Month', 'Referred to pre-screen']]
                     st.dataframe(referral_breakdown, use_container_width=True)
                 
                 # Show totals and averages
@@ -5862,7 +4113,7 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
     with col2:
         # Average recruitment rate by site
         if 'Average monthly recruitment up to Sep-25' in performance_df.columns:
-            chart_data = performance_df[['Site name', 'Average monthly recruitment up to Sep-25']].copy()
+            chart_data = performance_df[['Site name', 'Average monthly recruitment up to Sep-25']]
             chart_data = chart_data.sort_values('Average monthly recruitment up to Sep-25', ascending=True)
             
             fig_recruitment = px.bar(
@@ -5889,14 +4140,79 @@ def create_cvlp_site_performance_table(df, uploaded_file=None):
 # Call the function to display CVLP Site Performance
 if st.session_state.admin_settings['show_site_performance']:
     if not processed_df.empty:
-        create_cvlp_site_performance_table(processed_df, uploaded_master_file)
+        create_cvlp_site_performance_table(processed_df, master_source)
 else:
     st.warning("No data available to show CVLP Site Performance")
 
 
+# === TRACKER QUERY ===
+def get_query_tables():
+    """Frames registered as DuckDB views, built once per dataset and privacy level"""
+    return result_store.get_or_compute(
+        dataset_key, privacy_mode, "query_tables", lambda: query_tables(processed_df, data_context)
+    )
+
+if (st.session_state.admin_settings.get('show_query_console', True) and not DUCKDB_AVAILABLE
+        and not processed_df.empty and not st.session_state.privacy_mode):
+    st.info("🦆 Tracker Query needs DuckDB, which isn't installed here. Run `pip install -r requirements.txt` "
+            "(or `pip install duckdb`) and restart the dashboard to enable it.")
+
+if (st.session_state.admin_settings.get('show_query_console', True) and DUCKDB_AVAILABLE
+        and not processed_df.empty and not st.session_state.privacy_mode):
+    st.markdown("""
+    <div class="section-divider">
+        <div class="section-divider-icon">🦆</div>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("""
+    <div class="section-header">
+        🦆 Tracker Query
+    </div>
+    """, unsafe_allow_html=True)
+    st.caption("SQL over the loaded tracker, run in-process by DuckDB at the current privacy level. Read-only; nothing leaves this machine.")
+
+    query_views = get_query_tables()
+    funnel_trial_sites = sorted(query_views['funnel']['trial_site'].dropna().unique())
+
+    st.markdown("**Referrals by CVLP site**")
+    query_col1, query_col2 = st.columns(2)
+    with query_col1:
+        query_trial_site = st.selectbox("Trial site:", funnel_trial_sites, key="query_trial_site")
+    with query_col2:
+        query_since = st.date_input("Referred since:", value=pd.Timestamp('2025-06-01'), key="query_since")
+    if query_trial_site:
+        st.dataframe(
+            section_query('referrals_by_cvlp_site', query_views, trial_site=query_trial_site, since=pd.Timestamp(query_since)),
+            use_container_width=True, hide_index=True
+        )
+
+    with st.expander("Days from site opening to first referral"):
+        st.dataframe(section_query('days_open_to_first_referral', query_views), use_container_width=True, hide_index=True)
+
+    st.markdown("**Ask a one-off question**")
+    query_example = st.selectbox("Start from:", list(EXAMPLE_QUERIES), key="query_example")
+    query_sql = st.text_area("SQL (one SELECT statement):", value=EXAMPLE_QUERIES[query_example].strip(),
+                             height=180, key=f"query_sql_{query_example}")
+    if st.button("▶️ Run query", key="run_query"):
+        try:
+            query_result = run_query(query_views, query_sql)
+        except Exception as e:
+            st.error(f"Query failed: {e}")
+        else:
+            st.dataframe(query_result, use_container_width=True, hide_index=True)
+            st.caption(f"{len(query_result)} rows" + (f" (capped at {MAX_RESULT_ROWS})" if len(query_result) >= MAX_RESULT_ROWS else ""))
+
+    with st.expander("Views and columns"):
+        for view, description in TABLE_DESCRIPTIONS.items():
+            if view in query_views:
+                st.markdown(f"- `{view}`: {description}")
+        st.dataframe(describe_tables(query_views), use_container_width=True, hide_index=True)
 
 
 # === ACHIEVEMENTS & BARRIERS SECTION ===
+def achievement_items_html(items):
+    return "\n".join(f"            <li>{item}</li>" for item in items)
+
 if st.session_state.show_achievements:
     st.markdown("""
     <div class="section-divider">
@@ -5910,9 +4226,52 @@ if st.session_state.show_achievements:
     </div>
     """, unsafe_allow_html=True)
     
+    # Word and facet indexes over the log, built once per log and site list (trial and CVLP sites are site facets)
+    log_site_names = [row.get('Trial Site', '') for row in cpgc_content.trial_site_status]
+    log_site_col, _ = resolve_cvlp_site_column(master_df) if not master_df.empty else (None, None)
+    if log_site_col is not None:
+        log_site_names += valid_site_values(master_df, log_site_col)
+    log_version = dataset_fingerprint((ACHIEVEMENTS, MONTH_AHEAD_AIMS, ISSUES_AND_BARRIERS), [str(s) for s in log_site_names])
+    log_index = result_store.get_or_compute(
+        dataset_key, CONTEXT_PRIVACY_LEVEL, f"reporting_log_index@{log_version}",
+        lambda: ReportingLogIndex.build(ACHIEVEMENTS, MONTH_AHEAD_AIMS, ISSUES_AND_BARRIERS, log_site_names)
+    )
+    
+    log_col1, log_col2, log_col3, log_col4 = st.columns([3, 1, 2, 2])
+    with log_col1:
+        log_query = st.text_input("🔎 Search the log", key="log_query", placeholder="e.g. courier delay, Mount Vernon")
+    with log_col2:
+        log_status = st.selectbox("Status", ["All", *ISSUE_STATUSES], key="log_status")
+    with log_col3:
+        log_categories = st.multiselect("Category", list(log_index.facet_values('category')), key="log_categories")
+    with log_col4:
+        log_sites = st.multiselect("Site", list(log_index.facet_values('site')), key="log_sites")
+    log_dates = ()
+    if len(log_index.dates):
+        first_logged, last_logged = pd.Timestamp(log_index.dates[0]).date(), pd.Timestamp(log_index.dates[-1]).date()
+        log_dates = st.date_input("Date identified", value=(first_logged, last_logged),
+                                  min_value=first_logged, max_value=last_logged, key="log_dates")
+    log_filtered_dates = len(log_dates) == 2 and (log_dates[0], log_dates[1]) != (first_logged, last_logged)
+    log_matches = log_index.search(
+        log_query,
+        date_from=log_dates[0] if log_filtered_dates else None,
+        date_to=log_dates[1] if log_filtered_dates else None,
+        status=None if log_status == "All" else log_status,
+        category=log_categories,
+        site=log_sites,
+    )
+    matching_achievements = [ACHIEVEMENTS[i] for i in log_index.positions(log_matches, 'Achievement')]
+    matching_aims = [MONTH_AHEAD_AIMS[i] for i in log_index.positions(log_matches, 'Aim')]
+    matching_issues = log_index.positions(log_matches, 'Issue')
+    if len(log_matches) < len(log_index.entries):
+        st.caption(f"Showing {len(log_matches)} of {len(log_index.entries)} log entries")
+    
     # Achievements Section
     st.markdown("### 🎯 Achievements")
-    st.markdown("""
+    if not matching_achievements:
+        st.caption("No matching achievements")
+    else:
+        st.markdown(f"""
     <div style="
         background: linear-gradient(135deg, #d4edda 0%, #c3e6cb 100%);
         padding: 25px;
@@ -5922,17 +4281,17 @@ if st.session_state.show_achievements:
         box-shadow: 0 4px 15px rgba(40, 167, 69, 0.1);
     ">
         <ul style="margin: 0; padding-left: 20px; font-size: 1.1rem; line-height: 1.8;">
-            <li><strong>7 patients referred</strong> to the trial</li>
-            <li><strong>81% of sites opened</strong> within 5 weeks of their SIV</li>
-            <li><strong>Royal Surrey</strong> have referred their first patient (4 CVLP sites have consented a patient)</li>
-            <li><strong>Held focus calls</strong> with 7 sites to check progress and promote pre-screening, feedback led to discussion on expanding referral criteria and increase pre-screening referrals</li>
+{achievement_items_html(matching_achievements)}
         </ul>
     </div>
     """, unsafe_allow_html=True)
     
     # Aims for Month Ahead Section
     st.markdown("### 🎯 Aims for Month Ahead")
-    st.markdown("""
+    if not matching_aims:
+        st.caption("No matching aims")
+    else:
+        st.markdown(f"""
     <div style="
         background: linear-gradient(135deg, #fff3cd 0%, #ffeaa7 100%);
         padding: 25px;
@@ -5942,13 +4301,7 @@ if st.session_state.show_achievements:
         box-shadow: 0 4px 15px rgba(255, 193, 7, 0.1);
     ">
         <ul style="margin: 0; padding-left: 20px; font-size: 1.1rem; line-height: 1.8;">
-            <li>Continue to improve understanding of trial site processes/timelines following referral, particularly for new sites</li>
-            <li>Continue with site opening, focusing on those that are engaging well during set up</li>
-            <li>Escalation of sites that are less engaged/slow to set-up to NIHR VIP and Cancer Alliances</li>
-            <li>Continue with screening log reviews for all sites open</li>
-            <li>Increase promotion of pre-screening at CVLP sites</li>
-            <li>Focus calls with sites regarding recruitment barriers and any successes</li>
-            <li>To explore expanding CVLP referral criteria to include high risk patients</li>
+{achievement_items_html(matching_aims)}
         </ul>
     </div>
     """, unsafe_allow_html=True)
@@ -5956,254 +4309,9 @@ if st.session_state.show_achievements:
     # Issues Table Section
     st.markdown("### 🚨 Issues & Barriers")
     
-    # Create the issues data - All 24 records
-    issues_data = [
-        {
-            "Issue": "Nottingham only accepting referrals from limited number of CVLP sites",
-            "Category": "Trial site",
-            "Date Identified": "14-Mar-25",
-            "Detail": "Only accepting CVLP referrals from Lincoln and Derby & Burton. Leicester in set up with a travel time of only 45mins to Nottingham. Leicester have agreed to refer to Oxford or Cambridge as alternatives but the travel time to these sites are 1hr 45mins.",
-            "Action Taken": "1. Escalated to BNT",
-            "Actions Outstanding": "1. Derby & Burton to confirm participation. 2. Identify alternative CVLP sites for if they decline. 3. To monitor capacity with trial site on CVLP site opening.",
-            "Resolution": "Site will likely increase cap once they have an understanding of the number of CVLP referrals they will see each month.",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Marsden only accepting referrals from limited number of CVLP site",
-            "Category": "Trial site",
-            "Date Identified": "13-Feb-25",
-            "Detail": "Only accepting CVLP referrals from Maidstone and Imperial",
-            "Action Taken": "1. Escalated to BNT",
-            "Actions Outstanding": "1. Imperial to confirm participation. 2. Identify alternative CVLP site if they decline. 3. To monitor capacity with trial site on CVLP site opening.",
-            "Resolution": "Site will likely increase cap once they have an understanding of the number of CVLP referrals they will see each month. Imperial confirmed participation on 08/08/2025",
-            "Date Resolved": "06/08/2025"
-        },
-        {
-            "Issue": "CPGC missing refrigerant packs and styrofoam containers",
-            "Category": "LabCorp",
-            "Date Identified": "07-May-25",
-            "Detail": "LabCorp did not send refrigerant packs or styrofoam containers to all CPGCs with initial shipment, risk of delays to sample shipments.",
-            "Action Taken": "1. Requested LabCorp send out supplies to all CPGCs. 2. Marken to collect first patient sample (Coventry & Warwickshire/Oxford patient) and provide shipping materials. 3. Followed up with all CPGCs to confirm received supplies.",
-            "Actions Outstanding": "None",
-            "Resolution": "BNT confirmed error in initial shipment details on LabCorp end has been resolved, future CPGCs receiving initial shipments will receive required supplies. Refridgerant packs/containers sent out to all CPGCs missing them.",
-            "Date Resolved": "20-May-25"
-        },
-        {
-            "Issue": "Delays in consenting participants at Oxford trial site",
-            "Category": "Trial site",
-            "Date Identified": "14-May-25",
-            "Detail": "Referral from Coventry & Warwickshire submitted on 14-May, planned with Oxford to consent pt on 15-May. PI wants to discuss pt in MDT prior to consenting. Oxford trial team did not provide details to MDT team in time for MDT and pt missed slot at MDT on 15-May, resulting in delay to consent to 22-May and delayed tissue pathway. Site staff at the Oxford trial site was not delegated on the logs to take pre-screening consent which also delayed the pathway.",
-            "Action Taken": "1. BNT emailed PI to escalate 2. SCTU suggested pre-consenting the participant to begin tissue pathway sooner 3. Clarified referral pathway with Oxford trial team",
-            "Actions Outstanding": "None",
-            "Resolution": "PI confirmed process for discussing all potential patients at MDT on Thursdays, clinic takes place later that day and patient can be consented then. CVLP sites need to send complete referrals to the trial site by Tuesday pm at latest to be seen on Thursday in same week.",
-            "Date Resolved": "22-May-25"
-        },
-        {
-            "Issue": "LabCorp portal not permitting SCTU to register samples",
-            "Category": "LabCorp",
-            "Date Identified": "23-May-25",
-            "Detail": "Unable to register first BNT113-01 sample, error message states that user must be assigned to the correct protocol.",
-            "Action Taken": "1. Escalated to LabCorp, currently with IT team 2. Confirmed that sample has arrived at LabCorp",
-            "Actions Outstanding": "1. LabCorp to resolve issue (CTU not be able to register the sample in the Labcorp portal as they only have access to the CPGC sites. The samples are assigned to the trial sites so only trial sites can register the sample) 2. SCTU to register samples when possible",
-            "Resolution": "LabCorp to send SCTU Clinical Liasion reconcilations via email within 24 hours. Clinical Liason to monitor this is happening and feedback issues to BNT. Miguel to continue liasion with Labcorp to confirm receipt of sample with the SCTU for oversight. BNT/Labcorp unable to find a sustainable workaround for sample tracking",
-            "Date Resolved": "01-Jul-25"
-        },
-        {
-            "Issue": "BNT113 consent at Mount Vernon trial",
-            "Category": "Trial site",
-            "Date Identified": "24-Jun-25",
-            "Detail": "Bedfordshire have referred 3 main trial patients to Mount Vernon. Mount Vernon have reported to SCTU that they were unaware that consent to BNT113 was required for central testing of PD-L1, mistakenly believing CVLP consent covered central testing. Patients were also of the understanding that CVLP consent covered testing of their samples. Mount Vernon report this consent step as causing a delay the SOC patient pathway whilst waiting for consent to BNT113 consent with CPGCs holding the block during this time rather than being able to proceed with SOC PD-L1 testing.",
-            "Action Taken": "1. Escalated to BNT and discussion at Monthly Reporting Meeting (09-Jul-2025) 2. Meeting with Mount Vernon and BioNTech to find resolution (02-Jul-2025) 3. Have calls with trial sites when they receive their first referrals to check understanding of the pathway 4. SCTU to arrange meeting with Luton to discuss pathway",
-            "Actions Outstanding": "Meeting held with Mount Vernon team on 02-Jul-2025. BNT representative unable to attend. In line with GCP, SCTU have agreed with Mount Vernon that they should offer patients referred all trials that they would be suitable for. SCTU to collect reasons why patients choose other studies where possible.",
-            "Resolution": "The following has been sent to Luton and Lister CVLP sites: 1) Main trial patients must be PD-L1 positive before CVLP referral. 2) Patients with primary tumours of the larynx, hypopharynx, or oral cavity should not be referred to Mount Vernon for pre-screening or for the main trial. 3) CVLP site to hold the transfer of tissue to the CPGC until the SCTU Clinical Liaison team notifies them that the patient has provided consent for BNT113-01. 4) To focus on the pre-screening pathway where possible. 5) High risk patients should only be approached for CVLP consent and BNT113-01 pre-screening at least 12 weeks after the end of their radical initial treatment (surgery + radiotherapy/chemoradiotherapy).",
-            "Date Resolved": "11/09/2025"
-        },
-        {
-            "Issue": "Mid and South Essex stopping recruitment",
-            "Category": "CVLP",
-            "Date Identified": "25-Jun-25",
-            "Detail": "Mid & South Essex are no longer willing to refer patients to UCLH for BNT113-01 as they believe it is too far to travel and too often for this patient population.",
-            "Action Taken": "1. SCTU to offer Cambridge once open as another potential trial site.",
-            "Actions Outstanding": "1. Wait for PI to return from emergency leave to discuss Cambridge further",
-            "Resolution": "Site confirmed that they were now happy to refer patients to UCLH and Cambridge when they are activated.",
-            "Date Resolved": "15/07/2025"
-        },
-        {
-            "Issue": "Feedback from Leicester CPGC",
-            "Category": "CPGC",
-            "Date Identified": "30-Jun-25",
-            "Detail": "Leicester have written the full DOB on the requisition forms when sending samples to LabCorp and therefore, LabCorp have received full DOB for two CVLP patients. LabCorp have not raised reconciliations for these issues so SCTU not immediately aware. Leicester report transport booking only offered 'ambient' or 'frozen' options. No refrigerated option was available. Leicester also report freezer packs not fitting well within the packaging provided.",
-            "Action Taken": "1. Retrain Leicester on completion of the requisition form 2. Escalate to BNT during Monthly Reporting Meeting (09-Jul-2025) and Labcorp 3. Clarified process for LabCorp raising reconciliations relating to incorrect completion of the reconciliation form.",
-            "Actions Outstanding": "1. Awaiting clarification from BNT on courier transport options. 2. Awaiting feedback from BNT/LabCorp on number of samples that should fit within packaging provided",
-            "Resolution": "Retraining of Leicester CPGC on completion of requisition forms completed 07/08/2025",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Bath Screening",
-            "Category": "CVLP",
-            "Date Identified": "01-Jul-25",
-            "Detail": "No screening activity - SCTU unsure if screening log completion process is being followed.",
-            "Action Taken": "1. SCTU to contact site to understand the reasons for no screening activity. 2. Encourage better engagement via e.g. attendance at drop in sessions.",
-            "Actions Outstanding": "1. Continue monitoring their activity 2. Schedule calls based on activity levels",
-            "Resolution": "Bath have started screening patients in the month of July. All non-modifiable, call to be held with site to discuss.",
-            "Date Resolved": "02-Jul-25"
-        },
-        {
-            "Issue": "Hull Screening",
-            "Category": "CVLP",
-            "Date Identified": "01-Jul-25",
-            "Detail": "No screening activity - SCTU unsure if screening log completion process is being followed.",
-            "Action Taken": "1. SCTU to contact site to understand the reasons for no screening activity. 2. Encourage better engagement via e.g. attendance at drop in sessions. 3. Meeting with site requested to discuss low screening activity and promote pre-screening.",
-            "Actions Outstanding": "1. Continue monitoring their activity 2. Hold call to discuss performance",
-            "Resolution": "CL held a focus call with Hull on 27th August to discuss performance and any barriers to recruitment. They mentioned that the CVLP pre-screening eligibility should expand to include high risk patients. Hull consented a main trial patient to the CVLP on the 02/09/2025",
-            "Date Resolved": "02-Sep-25"
-        },
-        {
-            "Issue": "Royal Surrey competing trial",
-            "Category": "CVLP",
-            "Date Identified": "01-Jul-25",
-            "Detail": "Royal Surrey have shown limited activity with competing trials given as the reason. Royal Surrey have ORIGAMI open which includes 3 cohorts, one of which they believe competes with BNT113 (p16 +ve patients who have had 2 lines of treatment). RSH updated that Origami-4, cohort 5 is still open with 30% of its target left to recruitment, as so it is still competing with CVLP.",
-            "Action Taken": "1. Escalated to BioNTech to review ORIGAMI 2. LU advised cohort 5, that was directly competing with BNT113-01, has now closed. 3. Royal Surrey contacted to clarify",
-            "Actions Outstanding": "1. Monitoring impact of competing trials on recruitment",
-            "Resolution": "CL held a focus call with R.Surrey, who mentioned that Origami is closed to recruitment soon. The patient is likely to choose the Origami trial, as it is not randomised and therefore patient is guaranteed of receiving the investigational drug. Ultimately, it's dependent on patient choice on which trial they choose.",
-            "Date Resolved": "11-Sep-25"
-        },
-        {
-            "Issue": "Labcorp",
-            "Category": "Central Lab",
-            "Date Identified": "30-Jun-25",
-            "Detail": "Received a reconciliation query from Labcorp asking whether genomic testing was required. SCTU is unclear why this question was raised.",
-            "Action Taken": "1. Escalate to BNT during Monthly reporting meeting (09-Jul-2025)",
-            "Actions Outstanding": "1. To escalate to BNT in the monthly meeting",
-            "Resolution": "SCTU has not received any reconciliation regarding genomic testing since this was raised",
-            "Date Resolved": "10-Jul-25"
-        },
-        {
-            "Issue": "SCTU email containing PID",
-            "Category": "SCTU",
-            "Date Identified": "30-Jun-25",
-            "Detail": "SCTU forwarded email containing patient name and NHS to BNT and Labcorp",
-            "Action Taken": "1. Retraining for SCTU on redacting/ensuring any PID is removed when sending information to the Sponsor/LabCorp 2. SCTU recorded this internally as a deviation",
-            "Actions Outstanding": "1. To confirm whether the email chain has been deleted from BNT and Labcorp's inbox",
-            "Resolution": "1. New email chain started without PID",
-            "Date Resolved": "09-Jul-25"
-        },
-        {
-            "Issue": "Patient declined CVLP due to travel costs to trial site",
-            "Category": "CVLP",
-            "Date Identified": "17-Jul-25",
-            "Detail": "Gloucestershire patient declined participation in the CVLP trial due to reluctance to travel to the Oxford trial site. They expressed concerns about using public transport and were also unwilling to travel by taxi, due to the high out-of-pocket cost (£120 one way).",
-            "Action Taken": "1. Escalated to BioNTech and NHSE",
-            "Actions Outstanding": "1. SCTU to explore travel arrangement for patients who are not able to pay the costs upfront. SCTU exploring trials connect - easy patient payment system.",
-            "Resolution": "ASK NK",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Delays at trial sites following referrals for main trial consents",
-            "Category": "CVLP",
-            "Date Identified": "31-Jul-25",
-            "Detail": "Delays at trial sites following referrals for main trial consents. Shortest referral to consent time is 6 days, average is 18 days. This, combined with LabCorp timelines, means replacing SoC testing is not viable. Delays are partly due to limited clinic availability (e.g., Oxford only holding clinics on Thursdays) and the need for two separate consents (CVLP and BNT consent) for tissue preparation.",
-            "Action Taken": "",
-            "Actions Outstanding": "1. To escalate to BNT in the monthly meeting on 17-Sept-2025. 2. BNT/SCTU to explore ways to reduce main trial consent timeframe. 3. Implement e-consent to accelerate pre-screening timeframes",
-            "Resolution": "",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Delays at trial sites following referrals for main trial consents",
-            "Category": "CVLP",
-            "Date Identified": "31-Jul-25",
-            "Detail": "Delays at trial sites following referrals for main trial consents. Shortest referral to consent time is 6 days, average is 18 days. This, combined with LabCorp timelines, means replacing SoC testing is not viable. Delays are partly due to limited clinic availability (e.g., Oxford only holding clinics on Thursdays) and the need for two separate consents (CVLP and BNT consent) for tissue preparation.",
-            "Action Taken": "",
-            "Actions Outstanding": "1. To escalate to BNT in the monthly meeting on 17-Sept-2025. 2. BNT/SCTU to explore ways to reduce main trial consent timeframe. 3. Implement e-consent to accelerate pre-screening timeframes",
-            "Resolution": "",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Expedited testing missing on pre-screening requisition form",
-            "Category": "CPGC",
-            "Date Identified": "23-Jul-25",
-            "Detail": "The prescreening requisition forms for the CPGC are missing a checkbox to indicate that the sample must be tested within 10–12 calendar days",
-            "Action Taken": "1. Escalated to BioNTech",
-            "Actions Outstanding": "1. BioNTech to update the pre-screening requisition form to include this 2. Labcorp are emailing SCTU Clinical Liaison to confirm when samples require expedited testing.",
-            "Resolution": "LabCorp have updated the pre-screening requisition form to include this. CL have shared the new pre-screening requisition form with CPGC sites",
-            "Date Resolved": "10-Sep-25"
-        },
-        {
-            "Issue": "CPGC reporting affected by inability to access LabCorp investigator portal",
-            "Category": "CPGC",
-            "Date Identified": "06-Aug-25",
-            "Detail": "SCTU cannot reliably report on timeframes for LabCorp delivering results within the agreed window as we cannot access the following information: - Date sample received at LabCorp (to confirm when clock begins for providing results) - Date result available (SCTU rely on trial sites to provide data)",
-            "Action Taken": "1. MP looking into ways to share LabCorp information with SCTU team 2. MP shared report with SCTU team, does not include central testing result or date result was available",
-            "Actions Outstanding": "1. SCTU to be notified when sample received at LabCorp for a CVLP patient 2. SCTU to be notified of results directly by LabCorp to prevent delays in trial sites sending results",
-            "Resolution": "",
-            "Date Resolved": ""
-        },
-        {
-            "Issue": "Issues with sample collection",
-            "Category": "CPGC",
-            "Date Identified": "12-Aug-25",
-            "Detail": "DHL failed to collect a sample from North Bristol on 12th and 13th August. Although DHL claimed the driver had arrived, the package was not collected - possibly due to going to the wrong location. Driver failed to call CPGC. The sample was finally collected on 14 August.",
-            "Action Taken": "1. CL to provide LabCorp with correct addresses and contact details for all BNT113 CPGCs.",
-            "Actions Outstanding": "N/A",
-            "Resolution": "CL provided correct addresses and contact details to avoid issues with future collections",
-            "Date Resolved": "11-Sep-25"
-        },
-        {
-            "Issue": "Southampton Trial site capacity for accepting referrals",
-            "Category": "Trial site",
-            "Date Identified": "13-Aug-25",
-            "Detail": "Surge in referrals and enquiries from cancer patients outside of the CVLP pathway following media coverage, adding to the team's workload. Notably, six referrals to Southampton were received within 24 hours, none were eligible",
-            "Action Taken": "1. Escalated to BioNTech 2. SCTU held call with Southampton trial site on 29th August to discuss capacity.",
-            "Actions Outstanding": "N/A",
-            "Resolution": "Southampton trial site is limited to a maximum of four patients receiving the drug at the same time. Referrals will be turned off when treatment cap is reached. Advised team to send patient queries on CVLP directly to SCTU team to triage and support with capacity at site.",
-            "Date Resolved": "29-Aug-25"
-        },
-        {
-            "Issue": "Sample collected outside of collection window",
-            "Category": "CPGC",
-            "Date Identified": "29-Aug-25",
-            "Detail": "DHL collected the sample outside the collection window and driver failed to wait 10 mins while the sample was being packaged. This led to driver collecting the sample much later in the day.",
-            "Action Taken": "",
-            "Actions Outstanding": "1. Escalated to BNT, continuing to monitor with future collections",
-            "Resolution": "",
-            "Date Resolved": "09-Sep-25"
-        },
-        {
-            "Issue": "Trial sites requesting PACS transfer of radiology images",
-            "Category": "Trial site",
-            "Date Identified": "05-Sep-25",
-            "Detail": "Two trial sites have requested PACS transfer of radiology reports from CVLP sites. While CVLP sites have not yet requested reimbursement, the additional activity represents an extra burden on them.",
-            "Action Taken": "1. NHSE to consider re-imbursing the sites for this activity. SCTU will let them know the costs to approve before implementing 2. To escalate to BioNTech",
-            "Actions Outstanding": "1. SCTU to discuss with trial sites and assess if PACS is a requirement for all patients, or only certain cases",
-            "Resolution": "1. SCTU to gather information regarding costs and process around the PACS process and to continue monitoring any further requests",
-            "Date Resolved": "16-Sep-25"
-        },
-        {
-            "Issue": "Mount Vernon only accepting pre-screening referrals",
-            "Category": "Trial site",
-            "Date Identified": "01-Oct-25",
-            "Detail": "Luton and Mount Vernon PI did not see the benefit of referring CVLP patients through the main trial pathway as mount Vernon see these patients as part of SoC",
-            "Action Taken": "1. Held call on 01-Oct-25 to discuss with Mount Vernon and CVLP sites to consolidate an optimal pathway 2. Expanding the pre-screening pathway to high risk patients",
-            "Actions Outstanding": "1. SCTU to hold focus calls with Luton and Lister CVLP sites to ensure understanding of the pre-screening pathway.",
-            "Resolution": "Came to an agreement that main trial referrals are not required as Mt Vernon team will normally pick these up through SoC, just adds more work for everyone and Mt Vernon PI is still concerned that they are being funnelled into one trial instead of being offered all options. Focus is going to be on pre-screening to get PD-L1/HPV results as early as possible and then pt makes a decision at recurrence if they want to carry on with the study.",
-            "Date Resolved": "01-Oct-25"
-        },
-        {
-            "Issue": "Lincolnshire - not screened any patients",
-            "Category": "CVLP",
-            "Date Identified": "02/10/2025",
-            "Detail": "CVLP site has been opened for 6 weeks but have not been able to screen any patients",
-            "Action Taken": "",
-            "Actions Outstanding": "1. SCTU to hold focus calls and check in weekly regarding screening activity",
-            "Resolution": "",
-            "Date Resolved": ""
-        }
-    ]
-    
-    # Create DataFrame and display as styled table
-    issues_df = pd.DataFrame(issues_data)
-    # Set index to start from 1 instead of 0
-    issues_df.index = range(1, len(issues_df) + 1)
+    # Matching entries of the issues log, numbered by their place in the full log
+    issues_df = pd.DataFrame([ISSUES_AND_BARRIERS[i] for i in matching_issues],
+                             index=[i + 1 for i in matching_issues])
     
     # Style the issues table
     styled_issues = issues_df.style.set_properties(**{
@@ -6257,7 +4365,10 @@ if st.session_state.show_achievements:
     ">
     """, unsafe_allow_html=True)
     
-    st.write(styled_issues.to_html(escape=False), unsafe_allow_html=True)
+    if matching_issues:
+        st.write(styled_issues.to_html(escape=False), unsafe_allow_html=True)
+    else:
+        st.caption("No matching issues")
     
     st.markdown("</div>", unsafe_allow_html=True)
     
@@ -6284,120 +4395,7 @@ if st.session_state.show_cpgc_trial_setup:
     # CPGC Table
     st.markdown("### 🧬 CPGC Status")
     
-    cpgc_data = [
-        {
-            "GLH": "Central and South",
-            "CPGC": "Thames Valley (Oxford)",
-            "Actual Activation Date / Planned Activation Date": "No CVLP sites mapped to CPGC",
-            "Status (Active/Ready/In Set-Up/Suspended)": "In set up (No kits/disposable forceps/PCR clean)",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "Central and South",
-            "CPGC": "Wessex (Southampton)",
-            "Actual Activation Date / Planned Activation Date": "01-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "Central and South",
-            "CPGC": "Northen West Midlands (Wolverhampton)",
-            "Actual Activation Date / Planned Activation Date": "19-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "East",
-            "CPGC": "Nottingham",
-            "Actual Activation Date / Planned Activation Date": "26-Jun-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "East",
-            "CPGC": "Leicester",
-            "Actual Activation Date / Planned Activation Date": "15-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North East and Yorkshire",
-            "CPGC": "Leeds",
-            "Actual Activation Date / Planned Activation Date": "21-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North East and Yorkshire",
-            "CPGC": "Newcastle",
-            "Actual Activation Date / Planned Activation Date": "No CVLP sites mapped to CPGC",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North Thames",
-            "CPGC": "Barts",
-            "Actual Activation Date / Planned Activation Date": "01-Jul-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North Thames",
-            "CPGC": "Royal Marsden",
-            "Actual Activation Date / Planned Activation Date": "25-Jun-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Cheshire and Mersey (Liverpool)",
-            "Actual Activation Date / Planned Activation Date": "01-Jul-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Ready",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Lancashire and South Cumbria (Morecambe Bay)",
-            "Actual Activation Date / Planned Activation Date": "TBC",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Suspended",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Manchester",
-            "Actual Activation Date / Planned Activation Date": "No CVLP sites mapped to CPGC",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Ready",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "South East",
-            "CPGC": "Kings's",
-            "Actual Activation Date / Planned Activation Date": "22-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "South East",
-            "CPGC": "Maidstone & Tunbridge Wells",
-            "Actual Activation Date / Planned Activation Date": "28-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "South West",
-            "CPGC": "West of England (North Bristol)",
-            "Actual Activation Date / Planned Activation Date": "12-May-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Active",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        },
-        {
-            "GLH": "South West",
-            "CPGC": "Peninsula (Plymouth)",
-            "Actual Activation Date / Planned Activation Date": "09-Sep-25",
-            "Status (Active/Ready/In Set-Up/Suspended)": "Ready",
-            "Date of BNT113-01 Training Session": "02-Apr-25"
-        }
-    ]
+    cpgc_data = cpgc_content.cpgc_status
     
     # Create DataFrame and display as styled table
     cpgc_df = pd.DataFrame(cpgc_data)
@@ -6447,120 +4445,7 @@ if st.session_state.show_cpgc_trial_setup:
     # Trial Site Table
     st.markdown("### 🏥 Trial Site Status")
     
-    trial_site_data = [
-        {
-            "Trial Site": "Birmingham",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Paused - capacity concerns, to revisit September 2025",
-            "Actual Activation Date / Planned Activation Date": "TBC",
-            "Date of Intro/Training Session": "07-Feb-25",
-            "Date OID received": "",
-            "Date C&C received (where applicable)": ""
-        },
-        {
-            "Trial Site": "Preston",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Ready",
-            "Actual Activation Date / Planned Activation Date": "26-Mar-25",
-            "Date of Intro/Training Session": "13-Feb-25",
-            "Date OID received": "26-Mar-25",
-            "Date C&C received (where applicable)": "26-Mar-25"
-        },
-        {
-            "Trial Site": "Southampton",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "19-Mar-25",
-            "Date of Intro/Training Session": "24-Feb-25",
-            "Date OID received": "19-Mar-25",
-            "Date C&C received (where applicable)": "19-Mar-25"
-        },
-        {
-            "Trial Site": "Velindre",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "14-Apr-25",
-            "Date of Intro/Training Session": "06-Feb-25",
-            "Date OID received": "14-Apr-25",
-            "Date C&C received (where applicable)": "14-Apr-25"
-        },
-        {
-            "Trial Site": "Oxford",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "06-May-25",
-            "Date of Intro/Training Session": "13-Mar-25",
-            "Date OID received": "02-May-25",
-            "Date C&C received (where applicable)": "06-May-25"
-        },
-        {
-            "Trial Site": "UCLH",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "06-May-25",
-            "Date of Intro/Training Session": "14-Feb-25",
-            "Date OID received": "17-Apr-25",
-            "Date C&C received (where applicable)": "06-May-25"
-        },
-        {
-            "Trial Site": "Mount Vernon",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "07-May-25",
-            "Date of Intro/Training Session": "09-Apr-25",
-            "Date OID received": "07-May-25",
-            "Date C&C received (where applicable)": "07-May-25"
-        },
-        {
-            "Trial Site": "Leeds",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "13-May-25",
-            "Date of Intro/Training Session": "27-Feb-25",
-            "Date OID received": "09-May-25",
-            "Date C&C received (where applicable)": "13-May-25"
-        },
-        {
-            "Trial Site": "Nottingham",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Ready",
-            "Actual Activation Date / Planned Activation Date": "21-May-25",
-            "Date of Intro/Training Session": "12-Mar-25",
-            "Date OID received": "21-May-25",
-            "Date C&C received (where applicable)": "21-May-25"
-        },
-        {
-            "Trial Site": "Guys",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "Active",
-            "Actual Activation Date / Planned Activation Date": "30-Jun-25",
-            "Date of Intro/Training Session": "02-Apr-25",
-            "Date OID received": "16-May-25",
-            "Date C&C received (where applicable)": "16-May-25"
-        },
-        {
-            "Trial Site": "Cambridge",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "In set-up",
-            "Actual Activation Date / Planned Activation Date": "27-Aug-25",
-            "Date of Intro/Training Session": "07-Aug-25",
-            "Date OID received": "29-Jul-25",
-            "Date C&C received (where applicable)": "04-Aug-25"
-        },
-        {
-            "Trial Site": "Royal Marsden",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "In set-up (Refresher training session 03/10.)",
-            "Actual Activation Date / Planned Activation Date": "October",
-            "Date of Intro/Training Session": "13-Feb-25",
-            "Date OID received": "13-May-25",
-            "Date C&C received (where applicable)": ""
-        },
-        {
-            "Trial Site": "Christie",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "In set-up",
-            "Actual Activation Date / Planned Activation Date": "TBC",
-            "Date of Intro/Training Session": "27-May-25",
-            "Date OID received": "",
-            "Date C&C received (where applicable)": ""
-        },
-        {
-            "Trial Site": "Torbay",
-            "Status (Active for referrals/Ready to receive referrals/In Set-Up/Paused)": "In set-up",
-            "Actual Activation Date / Planned Activation Date": "TBC",
-            "Date of Intro/Training Session": "09-Jul-25",
-            "Date OID received": "",
-            "Date C&C received (where applicable)": ""
-        }
-    ]
+    trial_site_data = cpgc_content.trial_site_status
     
     # Create DataFrame and display as styled table
     trial_site_df = pd.DataFrame(trial_site_data)
@@ -6630,336 +4515,11 @@ if st.session_state.show_cpgc_reporting:
     # CPGC BNT Reporting Table
     st.markdown("### 🧬 CPGC Performance & LabCorp Reporting")
     
-    cpgc_reporting_data = [
-        {
-            "GLH": "Central and South",
-            "CPGC": "Thames Valley (Oxford)",
-            "UKAS number": "8415",
-            "UKAS Issue Date": "17-Jul-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "Central and South",
-            "CPGC": "Wessex (Southampton)",
-            "UKAS number": "8178",
-            "UKAS Issue Date": "05-Feb-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "University Hospitals Dorset",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "Central and South",
-            "CPGC": "Northen West Midlands (Wolverhampton)",
-            "UKAS number": "8665",
-            "UKAS Issue Date": "22-Jul-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Coventry & Warwickshire",
-            "Average number of days between CVLP dispatch & CPGC receipt": "4.3",
-            "Average number of days before shipment of samples": "0.0",
-            "% prepared within 3 working days": "100.00%",
-            "Instances of 1st set sent >3 days from notification": "0",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "17",
-            "Instances of urgent results provided outside of window": "1"
-        },
-        {
-            "GLH": "East",
-            "CPGC": "Nottingham",
-            "UKAS number": "8162",
-            "UKAS Issue Date": "27-Jun-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "East",
-            "CPGC": "Leicester",
-            "UKAS number": "8608",
-            "UKAS Issue Date": "02-Jul-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Bedfordshire",
-            "Average number of days between CVLP dispatch & CPGC receipt": "1",
-            "Average number of days before shipment of samples": "1.7",
-            "% prepared within 3 working days": "100.00%",
-            "Instances of 1st set sent >3 days from notification": "0",
-            "Number of deviations / reconciliations": "3.00",
-            "Average time to resolve deviations / reconciliations": "1.00",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "13.3",
-            "Instances of urgent results provided outside of window": "2"
-        },
-        {
-            "GLH": "North East and Yorkshire",
-            "CPGC": "Leeds",
-            "UKAS number": "9862",
-            "UKAS Issue Date": "10-Jun-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Hull / York & Scarborough",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North East and Yorkshire",
-            "CPGC": "Newcastle",
-            "UKAS number": "8534",
-            "UKAS Issue Date": "13-Jun-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North Thames",
-            "CPGC": "Barts",
-            "UKAS number": "8285",
-            "UKAS Issue Date": "29-Jul-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Mid & South Essex",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North Thames",
-            "CPGC": "Royal Marsden",
-            "UKAS number": "9929",
-            "UKAS Issue Date": "07-Oct-24",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Cheshire and Mersey (Liverpool)",
-            "UKAS number": "7924",
-            "UKAS Issue Date": "26-Jun-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Lancashire and South Cumbria (Morecambe Bay)",
-            "UKAS number": "9369",
-            "UKAS Issue Date": "Suspended from 17-Dec-2024",
-            "ISO Accrediation": "N/A",
-            "UKAS Comments": "Not handling samples until UKAS reinstated.",
-            "Corresponding CVLP recruiting sites": "",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "North West",
-            "CPGC": "Manchester",
-            "UKAS number": "8648",
-            "UKAS Issue Date": "04-Mar-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "South East",
-            "CPGC": "Kings's",
-            "UKAS number": "9705",
-            "UKAS Issue Date": "01-Nov-23",
-            "ISO Accrediation": "15189:2012",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "South East",
-            "CPGC": "Maidstone & Tunbridge Wells",
-            "UKAS number": "8062",
-            "UKAS Issue Date": "23-Feb-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Royal Surrey",
-            "Average number of days between CVLP dispatch & CPGC receipt": "2",
-            "Average number of days before shipment of samples": "2.0",
-            "% prepared within 3 working days": "100.00%",
-            "Instances of 1st set sent >3 days from notification": "0.0",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "11",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "South West",
-            "CPGC": "West of England (North Bristol)",
-            "UKAS number": "8130",
-            "UKAS Issue Date": "30-Jul-24",
-            "ISO Accrediation": "15189:2012",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "Gloucestershire / Royal United Hospitals Bath",
-            "Average number of days between CVLP dispatch & CPGC receipt": "2",
-            "Average number of days before shipment of samples": "8.0",
-            "% prepared within 3 working days": "0.00%",
-            "Instances of 1st set sent >3 days from notification": "1.0",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "5",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "South West",
-            "CPGC": "Peninsula (Plymouth)",
-            "UKAS number": "9881",
-            "UKAS Issue Date": "30-Jul-25",
-            "ISO Accrediation": "15189:2022",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "N/A",
-            "Average number of days between CVLP dispatch & CPGC receipt": "N/A",
-            "Average number of days before shipment of samples": "N/A",
-            "% prepared within 3 working days": "-",
-            "Instances of 1st set sent >3 days from notification": "-",
-            "Number of deviations / reconciliations": "",
-            "Average time to resolve deviations / reconciliations": "-",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "0",
-            "Instances of urgent results provided outside of window": "0"
-        },
-        {
-            "GLH": "Totals / Average",
-            "CPGC": "",
-            "UKAS number": "",
-            "UKAS Issue Date": "",
-            "ISO Accrediation": "",
-            "UKAS Comments": "",
-            "Corresponding CVLP recruiting sites": "",
-            "Average number of days between CVLP dispatch & CPGC receipt": "2.6",
-            "Average number of days before shipment of samples": "2.9",
-            "% prepared within 3 working days": "100.00%",
-            "Instances of 1st set sent >3 days from notification": "0",
-            "Number of deviations / reconciliations": "2",
-            "Average time to resolve deviations / reconciliations": "1.00",
-            "Average number of days to provide non-urgent results": "0",
-            "Instances of non-urgent results provided outside of window": "-",
-            "Average number of days to provide urgent results": "11.575",
-            "Instances of urgent results provided outside of window": "3"
-        }
-    ]
-    
-    # Create DataFrame and display as styled table
-    cpgc_reporting_df = pd.DataFrame(cpgc_reporting_data)
-    # Set index to start from 1 instead of 0
-    cpgc_reporting_df.index = range(1, len(cpgc_reporting_df) + 1)
+    # Turnaround columns come from the tracker's milestone dates where it has them
+    cpgc_reporting_df = cpgc_reporting_table()
+    computed_metrics = available_turnaround_metrics(master_df)
+    # Set index to start from 1 instead of 0 (on a copy; the cached table is shared)
+    cpgc_reporting_df = cpgc_reporting_df.set_axis(range(1, len(cpgc_reporting_df) + 1))
     
     # Style the CPGC Reporting table with color-coded headers
     styled_cpgc_reporting = cpgc_reporting_df.style.set_properties(**{
@@ -7061,6 +4621,11 @@ if st.session_state.show_cpgc_reporting:
     st.write(styled_cpgc_reporting.to_html(escape=False), unsafe_allow_html=True)
     
     st.markdown("</div>", unsafe_allow_html=True)
+    if computed_metrics:
+        st.caption(
+            f"Computed from the Master Tracker in working days (England & Wales bank holidays excluded): "
+            f"{', '.join(computed_metrics)}. Other columns are from the monthly CPGC report."
+        )
     
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -7069,71 +4634,80 @@ if st.session_state.show_cpgc_reporting:
         st.session_state.show_cpgc_reporting = False
         st.rerun()
 
+# === REPORT EXPORT (PDF / EXCEL) ===
+# Built from the shared results above, so it matches what every section shows
+st.sidebar.markdown("---")
+st.sidebar.subheader("📄 Report Export")
+if master_df.empty:
+    st.sidebar.caption("Load data to export a PDF report")
+else:
+    if st.sidebar.button("📄 Generate PDF", use_container_width=True):
+        with st.spinner("Building PDF report..."):
+            report_performance = result_store.get_or_compute(
+                dataset_key, privacy_mode, f"cvlp_site_performance@{results_as_of:%Y-%m-%d}",
+                lambda: compute_cvlp_site_performance(processed_df, master_source, funnel_cube)
+            )
+            report = ReportContent(
+                title="BNT113-01 Trial Dashboard",
+                as_of=results_as_of,
+                privacy_level=privacy_mode,
+                kpis=kpi_snapshot,
+                monthly=result_store.get_or_compute(
+                    dataset_key, privacy_mode, f"monthly_projections@{results_as_of:%Y-%m-%d}",
+                    lambda: compute_monthly_projections(processed_df, data_context, funnel_cube, patient_linkage)
+                ),
+                site_performance=report_performance['performance_df'],
+                cpgc_status=cpgc_content.cpgc_status,
+                trial_site_status=cpgc_content.trial_site_status,
+                cpgc_reporting=cpgc_reporting_table().to_dict('records'),
+            )
+            # Chart renders are cached in the shared store, keyed by figure hash
+            st.session_state.pdf_report = (dataset_key, privacy_mode, build_report_pdf(report, chart_cache=result_store))
+    pdf_report = st.session_state.get('pdf_report')
+    if pdf_report is not None and pdf_report[:2] == (dataset_key, privacy_mode):
+        st.sidebar.download_button(
+            "⬇️ Download PDF", data=pdf_report[2],
+            file_name=f"BNT113-01_dashboard_{results_as_of:%Y%m%d}.pdf",
+            mime="application/pdf", use_container_width=True
+        )
+
+    if st.sidebar.button("📊 Generate Excel", use_container_width=True):
+        # Only tables already computed for this dataset and privacy level; nothing is recalculated
+        cached_tables = [
+            ("Monthly Projections", f"monthly_projections@{results_as_of:%Y-%m-%d}", lambda frame: ()),
+            ("Trial Referral Reporting", "trial_referral_reporting", lambda frame: ()),
+            ("Site Metrics", "site_based_metrics", lambda frame: site_metrics_rag()),
+            ("CVLP Site Performance", f"cvlp_site_performance@{results_as_of:%Y-%m-%d}", status_rag),
+        ]
+        export_sheets, export_skipped = [], []
+        for title, name, rag in cached_tables:
+            frame = result_store.get(dataset_key, privacy_mode, name)
+            if isinstance(frame, dict):
+                frame = frame['performance_df']
+            if frame is None or frame.empty:
+                export_skipped.append(title)
+            else:
+                export_sheets.append(ExportSheet(title, frame, rag(frame)))
+        export_sheets.append(ExportSheet("CPGC Reporting", cpgc_reporting_table(), frozen_columns=2))
+        excel_buffer = io.BytesIO()
+        write_tables_xlsx(export_sheets, excel_buffer)
+        st.session_state.excel_export = (dataset_key, privacy_mode, excel_buffer.getvalue(), export_skipped)
+    excel_export = st.session_state.get('excel_export')
+    if excel_export is not None and excel_export[:2] == (dataset_key, privacy_mode):
+        st.sidebar.download_button(
+            "⬇️ Download Excel", data=excel_export[2],
+            file_name=f"BNT113-01_dashboard_tables_{results_as_of:%Y%m%d}.xlsx",
+            mime=XLSX_MIME, use_container_width=True
+        )
+        if excel_export[3]:
+            st.sidebar.caption(f"Not in the workbook (section not shown yet): {', '.join(excel_export[3])}")
+
 # Signature Section with Better UI/UX
 st.markdown("<br><br>", unsafe_allow_html=True)
 
 signature_container = st.container()
 with signature_container:
     st.markdown("""
-        <style>
-        .signature-card {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 40px;
-            border-radius: 20px;
-            box-shadow: 0 10px 40px rgba(102, 126, 234, 0.2);
-            text-align: center;
-            margin: 20px 0;
-        }
-        .signature-name {
-            font-size: 2.2rem;
-            font-weight: 800;
-            color: white;
-            margin-bottom: 10px;
-            letter-spacing: 0.5px;
-        }
-        .signature-title {
-            font-size: 1.1rem;
-            color: rgba(255, 255, 255, 0.95);
-            margin-bottom: 25px;
-            font-weight: 500;
-            letter-spacing: 1.5px;
-        }
-        .linkedin-btn {
-            display: inline-block;
-            padding: 14px 35px;
-            background: white;
-            color: #0077b5;
-            text-decoration: none;
-            border-radius: 30px;
-            font-weight: 700;
-            font-size: 1rem;
-            box-shadow: 0 5px 20px rgba(0, 0, 0, 0.2);
-            transition: all 0.3s ease;
-        }
-        .linkedin-btn:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 30px rgba(0, 0, 0, 0.3);
-            color: #005582;
-        }
-        </style>
-        
-        <div class="signature-card">
-            <div class="signature-name">Masood Nazari</div>
-            <div class="signature-title">Data | AI | Clinical Research</div>
-            <a href="https://www.linkedin.com/in/masood-nazari" target="_blank" class="linkedin-btn">
-                🔗 Connect on LinkedIn
-            </a>
-        </div>
-    """, unsafe_allow_html=True)
-
- 
-        .linkedin-btn:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 30px rgba(0, 0, 0, 0.3);
-            color: #005582;
-        }
-        </style>
-        
         <div class="signature-card">
             <div class="signature-name">Masood Nazari</div>
             <div class="signature-title">Data | AI | Clinical Research</div>
@@ -7143,4 +4717,26 @@ with signature_container:
         </div>
     """, unsafe_allow_html=True)
 
- 
\ No newline at end of file
+# Shared result store memory use (Advanced Options > Show Debug Information)
+if show_debug:
+    with st.sidebar.expander("🧠 Shared Result Cache"):
+        st.caption(
+            f"{result_store.total_bytes / 1024 ** 2:,.1f} MB of {result_store.max_bytes / 1024 ** 2:,.0f} MB · "
+            f"{result_store.hits} hits · {result_store.misses} misses · {result_store.evictions} evictions"
+        )
+        st.dataframe(result_store.memory_report(), use_container_width=True, hide_index=True)
+        if local_data_watcher.last_warm_error:
+            st.warning(f"⚠️ Local tracker caches not fully warmed, sessions compute the rest on first view: {local_data_watcher.last_warm_error}")
+
+# Loaded KPI schema (Advanced Options > Show Debug Information)
+if show_debug:
+    schema_kpi_engine.render_schema_info()
+
+# Page payload for this rerun (Advanced Options > Show Debug Information)
+if rerun_byte_meter is not None:
+    rerun_byte_meter.uninstall()
+    payload_note = f"📦 Sent to browser this rerun: {rerun_byte_meter.bytes_sent / 1024:,.1f} KB in {rerun_byte_meter.messages_sent} messages"
+    if 'last_rerun_payload_bytes' in st.session_state:
+        payload_note += f" (previous measured rerun: {st.session_state.last_rerun_payload_bytes / 1024:,.1f} KB)"
+    st.sidebar.caption(payload_note)
+    st.session_state.last_rerun_payload_bytes = rerun_byte_meter.bytes_sent
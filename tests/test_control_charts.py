@@ -0,0 +1,106 @@
+"""Control limits and Western Electric rule hits on known series, and the
+incremental update agreeing with a full rebuild."""
+
+import numpy as np
+import pandas as pd
+
+from control_charts import (
+    BASELINE_MONTHS, RULE_2_OF_3_BEYOND_2_SIGMA, RULE_4_OF_5_BEYOND_1_SIGMA, RULE_8_SAME_SIDE, RULE_BEYOND_3_SIGMA,
+    ChartMetric, ControlCharts, western_electric_violations,
+)
+from dashboard_metrics import PRESCREEN_REFERRAL_COLUMN
+
+RATE = ChartMetric('Randomisation Rate', 'p', 'is_randomised')
+COUNT = ChartMetric('Referrals', 'u', '')
+MONTHS = ('Jan-26', 'Feb-26', 'Mar-26', 'Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26')
+
+
+def rules_at(z):
+    return western_electric_violations(np.array(z, dtype=float))
+
+
+def test_single_point_beyond_three_sigma():
+    flags = rules_at([0, 3.2, 0, -3.1, 2.9])
+    assert flags.tolist() == [0, RULE_BEYOND_3_SIGMA, 0, RULE_BEYOND_3_SIGMA, 0]
+
+
+def test_two_of_three_beyond_two_sigma_on_one_side():
+    assert rules_at([2.5, 0, 2.5]).tolist() == [0, 0, RULE_2_OF_3_BEYOND_2_SIGMA]
+    # Opposite sides don't add up
+    assert rules_at([2.5, 0, -2.5]).tolist() == [0, 0, 0]
+
+
+def test_four_of_five_beyond_one_sigma():
+    flags = rules_at([-1.5, -1.5, 0, -1.5, -1.5])
+    assert flags.tolist() == [0, 0, 0, 0, RULE_4_OF_5_BEYOND_1_SIGMA]
+
+
+def test_eight_on_one_side():
+    flags = rules_at([0.5] * 9)
+    assert flags.tolist() == [0] * 7 + [RULE_8_SAME_SIDE] * 2
+    # Missing months break the run
+    assert not (rules_at([0.5] * 4 + [np.nan] + [0.5] * 4) & RULE_8_SAME_SIDE).any()
+
+
+def test_p_chart_limits_from_the_baseline_months():
+    denominators = np.full((1, 1, len(MONTHS)), 20.0)
+    numerators = np.array([[[4, 4, 6, 4, 4, 2, 16, 4]]], dtype=float)
+    charts = ControlCharts._evaluate((RATE,), ('Leeds',), MONTHS, numerators, denominators)
+
+    # Centre from the first six months only: 24 of 120
+    assert charts.centre[0, 0] == 24 / 120
+    lower, upper = charts.limits()
+    half_width = 3 * np.sqrt(0.2 * 0.8 / 20)
+    np.testing.assert_allclose(upper[0, 0], 0.2 + half_width)
+    np.testing.assert_allclose(lower[0, 0], max(0.2 - half_width, 0))
+    # 16 of 20 (z = 6.7) in July is the only signal
+    assert charts.violations[0, 0].tolist() == [0] * 6 + [RULE_BEYOND_3_SIGMA, 0]
+
+    frame = charts.chart('Randomisation Rate', 'Leeds')
+    assert frame['Value'].tolist() == [20, 20, 30, 20, 20, 10, 80, 20]
+    assert frame['Rules'].tolist()[6] == "1 point beyond 3σ"
+
+
+def test_u_chart_limits_scale_with_exposure():
+    # Half a month open in January, then full months; the p-chart's referrals start both series in January
+    exposure = [0.5] + [1.0] * (len(MONTHS) - 1)
+    denominators = np.array([[exposure], [[2.0] * len(MONTHS)]])
+    numerators = np.array([[[1, 2, 2, 2, 2, 2, 2, 2]], [[1] * len(MONTHS)]], dtype=float)
+    charts = ControlCharts._evaluate((COUNT, RATE), ('Hull',), MONTHS, numerators, denominators)
+
+    centre = 11 / 5.5
+    assert charts.centre[0, 0] == centre
+    lower, upper = charts.limits()
+    np.testing.assert_allclose(upper[0, 0], centre + 3 * np.sqrt(centre / np.array(exposure)))
+    assert (lower[0, 0] == 0).all()
+    assert not charts.violations.any()
+
+
+def synthetic_tracker():
+    """Two sites referring every month from Apr-25 to Feb-26, Leeds randomising every other referral"""
+    rows = []
+    for month in pd.date_range('2025-04-01', '2026-02-01', freq='MS'):
+        for day, site in ((3, 'Leeds'), (10, 'Leeds'), (17, 'Hull')):
+            rows.append({'CVLP Site': site, PRESCREEN_REFERRAL_COLUMN: month + pd.Timedelta(days=day - 1),
+                         'is_randomised': site == 'Leeds' and day == 3})
+    return pd.DataFrame(rows)
+
+
+def test_update_matches_a_full_build():
+    df = synthetic_tracker()
+    opened = {'Leeds': pd.Timestamp('2025-04-01'), 'Hull': pd.Timestamp('2025-04-01')}
+    metrics = (COUNT, RATE)
+    earlier = ControlCharts.build(df[df[PRESCREEN_REFERRAL_COLUMN] < '2025-12-01'], opened, '2025-12-15', metrics)
+    assert len(earlier.months) > BASELINE_MONTHS
+
+    updated = earlier.update(df, opened, '2026-03-15')
+    rebuilt = ControlCharts.build(df, opened, '2026-03-15', metrics)
+    assert updated.months == rebuilt.months and updated.months[-1] == 'Feb-26'
+    for field in ('numerators', 'denominators', 'centre', 'violations'):
+        np.testing.assert_array_equal(getattr(updated, field), getattr(rebuilt, field))
+
+
+def test_no_closed_months_gives_empty_charts():
+    charts = ControlCharts.build(synthetic_tracker(), {}, '2025-04-15', (COUNT, RATE))
+    assert charts.months == () and charts.violations.shape == (2, 2, 0)
+    assert charts.summary()['Signals (last 3 months)'].eq(0).all()
@@ -0,0 +1,64 @@
+"""Working days skip weekends and England and Wales bank holidays, Easter and
+Christmas included, and CVLP sites map to their CPGC by name."""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cpgc_turnaround import cpgc_of_sites, uk_bank_holidays, working_days_between
+
+
+def days(start, end):
+    return working_days_between([start], [end])[0]
+
+
+def test_bank_holidays_match_the_published_dates():
+    assert uk_bank_holidays(2025) == [
+        date(2025, 1, 1), date(2025, 4, 18), date(2025, 4, 21), date(2025, 5, 5),
+        date(2025, 5, 26), date(2025, 8, 25), date(2025, 12, 25), date(2025, 12, 26),
+    ]
+    # Boxing Day 2026 is a Saturday; both Christmas days 2027 fall on the weekend
+    assert uk_bank_holidays(2026)[-2:] == [date(2026, 12, 25), date(2026, 12, 28)]
+    assert uk_bank_holidays(2027)[-2:] == [date(2027, 12, 27), date(2027, 12, 28)]
+    # The Platinum Jubilee moved the spring bank holiday
+    assert {date(2022, 6, 2), date(2022, 6, 3)} <= set(uk_bank_holidays(2022))
+    assert date(2022, 5, 30) not in uk_bank_holidays(2022)
+
+
+def test_easter_weekend():
+    # Thursday before Good Friday to the Tuesday after Easter Monday 2025: only the Thursday counts
+    assert days('2025-04-17', '2025-04-22') == 1
+    assert days('2026-04-02', '2026-04-07') == 1
+    # A full week around Easter loses two days
+    assert days('2025-04-14', '2025-04-28') == 8
+
+
+def test_christmas_and_new_year():
+    # Christmas Eve 2026 (Thursday) to the Tuesday after the Boxing Day substitute
+    assert days('2026-12-24', '2026-12-29') == 1
+    # New Year's Eve 2026 to the first Monday of 2027, over a Friday bank holiday
+    assert days('2026-12-31', '2027-01-04') == 1
+    # Over two years: December 2026 and January 2027 together
+    assert days('2026-12-01', '2027-02-01') == 23 - 2 + 21 - 1
+
+
+def test_same_day_missing_and_reversed_dates():
+    result = working_days_between(
+        pd.Series([pd.Timestamp('2025-06-02'), None, pd.Timestamp('2025-06-10'), pd.Timestamp('2025-06-06')]),
+        pd.Series([pd.Timestamp('2025-06-02'), pd.Timestamp('2025-06-03'), pd.Timestamp('2025-06-09'), 'not a date']),
+    )
+    assert result[0] == 0
+    assert np.isnan(result[1:]).all()
+
+
+def test_sites_map_to_their_cpgc_by_word_order():
+    reporting = [
+        {'CPGC': 'Bath CPGC', 'Corresponding CVLP recruiting sites': 'Royal United Hospitals Bath / Salisbury'},
+        {'CPGC': 'Essex CPGC', 'Corresponding CVLP recruiting sites': 'Mid & South Essex, N/A'},
+    ]
+    mapping = cpgc_of_sites(['Bath', 'Salisbury District', 'Mid and South Essex - Southend', 'Hull'], reporting)
+    assert mapping == {
+        'Bath': 'Bath CPGC', 'Salisbury District': 'Bath CPGC',
+        'Mid and South Essex - Southend': 'Essex CPGC', 'Hull': None,
+    }
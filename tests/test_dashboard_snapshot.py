@@ -0,0 +1,39 @@
+"""Result classes survive a snapshot's write and read unchanged"""
+
+import numpy as np
+import pandas as pd
+
+from control_charts import CHART_METRICS, ControlCharts
+from dashboard_snapshot import _read_result, _write_result
+from sample_logistics import LogisticsLatency
+
+
+def test_control_charts_round_trip(tmp_path):
+    sites, months = ("Site A", "Site B"), ("Jan-26", "Feb-26", "Mar-26")
+    rng = np.random.default_rng(0)
+    denominators = rng.integers(1, 10, (len(CHART_METRICS), len(sites), len(months))).astype(float)
+    numerators = np.minimum(rng.integers(0, 10, denominators.shape), denominators)
+    charts = ControlCharts._evaluate(CHART_METRICS, sites, months, numerators, denominators)
+
+    restored = _read_result(str(tmp_path), _write_result(charts, str(tmp_path), "control_charts"))
+    assert restored.metrics == charts.metrics
+    assert restored.sites == sites and restored.months == charts.months
+    for field in ("numerators", "denominators", "centre", "violations"):
+        expected = getattr(charts, field)
+        assert getattr(restored, field).dtype == expected.dtype
+        np.testing.assert_array_equal(getattr(restored, field), expected)
+
+
+def test_sample_logistics_round_trip(tmp_path):
+    intervals = pd.DataFrame({
+        "leg": pd.Categorical(["Dispatch → CPGC receipt", "CPGC receipt → shipment"]),
+        "cvlp_site": ["Site A", "Site B"],
+        "cpgc": ["CPGC 1", None],
+        "working_days": np.array([2, 4], dtype=np.int64),
+        "breached": [False, True],
+    })
+    logistics = LogisticsLatency(intervals, tuple(intervals["leg"].cat.categories))
+
+    restored = _read_result(str(tmp_path), _write_result(logistics, str(tmp_path), "sample_logistics"))
+    assert restored.legs == logistics.legs
+    pd.testing.assert_frame_equal(restored.intervals, intervals)
@@ -0,0 +1,42 @@
+"""Local data files are swapped in once ingested, whatever happens while warming caches"""
+
+from data_watcher import LocalDataWatcher
+
+
+def test_warming_failure_keeps_the_new_file_live(tmp_path):
+    path = tmp_path / "tracker.xlsx"
+    path.write_bytes(b"first")
+    warmed = []
+
+    def warm(dataset):
+        warmed.append(dataset.data)
+        if dataset.data == "second":
+            raise RuntimeError("no Screening Logs")
+
+    watcher = LocalDataWatcher([str(path)], lambda content, version: content.decode(), warm=warm)
+    assert watcher.refresh(wait_for_stable=False)
+    assert watcher.current.data == "first" and watcher.last_warm_error is None
+
+    path.write_bytes(b"second")
+    assert watcher.refresh(wait_for_stable=False)
+    assert watcher.current.data == "second"
+    assert watcher.last_error is None
+    assert watcher.last_warm_error == "tracker.xlsx: no Screening Logs"
+    assert warmed == ["first", "second"]
+
+
+def test_rejected_file_keeps_the_previous_one_live(tmp_path):
+    path = tmp_path / "tracker.xlsx"
+    path.write_bytes(b"good")
+
+    def ingest(content, version):
+        if content == b"bad":
+            raise ValueError("no data rows")
+        return content.decode()
+
+    watcher = LocalDataWatcher([str(path)], ingest)
+    watcher.refresh(wait_for_stable=False)
+    path.write_bytes(b"bad")
+    assert not watcher.refresh(wait_for_stable=False)
+    assert watcher.current.data == "good"
+    assert watcher.last_error == "tracker.xlsx: no data rows"
@@ -0,0 +1,132 @@
+"""Every funnel cube rollup agrees with a plain pandas groupby of the stage events,
+and the per-patient stage bitmask holds exactly the stages each patient is in."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard_metrics import (
+    FUNNEL_MASK_COLUMN, FUNNEL_STAGE_BITS, FUNNEL_STAGES, MAIN_TRIAL_REFERRAL_COLUMN, PRESCREEN_REFERRAL_COLUMN,
+    FunnelCube, funnel_stage_events, funnel_stage_mask, prepare_tracker_data, stage_bits,
+)
+
+MONTHS = ['Dec-24', 'Jan-25', 'Feb-25', 'Mar-25', 'Apr-25', 'May-25']
+
+
+def synthetic_tracker():
+    """Twelve patients over three CVLP and two trial sites, some undated, some without a site"""
+    d = pd.Timestamp
+    return pd.DataFrame({
+        'Patient full name': [f'Patient {i}' for i in range(12)],
+        'CVLP Site': ['Leeds', 'Leeds', 'Leeds', 'Hull', 'Hull', 'York', 'York', 'York', None, 'Hull', 'Leeds', None],
+        'Trial Site': ['St James', 'Castle Hill', None, 'Castle Hill', 'Castle Hill', 'St James', None, 'St James',
+                       'St James', None, 'St James', None],
+        PRESCREEN_REFERRAL_COLUMN: [d('2025-01-10'), d('2025-01-28'), None, d('2025-03-15'), d('2025-02-01'), None,
+                                    d('2025-04-02'), d('2025-04-30'), d('2025-02-11'), None, d('2024-12-31'), None],
+        MAIN_TRIAL_REFERRAL_COLUMN: [d('2025-02-20'), None, d('2025-03-02'), d('2025-03-01'), None, d('2025-04-11'),
+                                     None, d('2025-05-06'), None, None, d('2025-01-05'), None],
+        'Date patient consented into CVLP': [d('2025-01-02'), d('2025-01-20'), None, d('2025-02-27'), d('2025-01-30'),
+                                             d('2025-03-30'), None, d('2025-04-15'), None, d('2025-02-02'), None, None],
+        'Please select the CVLP consent status': ['Obtained', 'Obtained', 'Declined', 'Obtained', 'Obtained',
+                                                  'Obtained', None, 'Obtained', 'Pending', 'Obtained', 'Obtained', None],
+        'To be confirmed by trial site (Yes = consent confirmed, No = screen fail)': [
+            'Yes', 'No', None, 'Yes', 'yes', None, None, 'Yes', None, None, 'Y', None],
+        'To be confirmed by trial site (enrolled = Yes, screen fail = No)': [
+            'Yes', None, None, 'No', 'Yes', None, None, 'yes', None, None, 'No', None],
+    })
+
+
+@pytest.fixture(scope='module')
+def prepared():
+    return prepare_tracker_data(synthetic_tracker(), "Full Data (Admin)")
+
+
+@pytest.fixture(scope='module')
+def stage_rows(prepared):
+    """One row per patient and stage they are in: stage, CVLP site, trial site, event date"""
+    frames = []
+    for stage, (in_stage, dates) in funnel_stage_events(prepared).items():
+        frames.append(pd.DataFrame({
+            'stage': stage,
+            'cvlp': prepared['CVLP Site'][in_stage],
+            'trial': prepared['Trial Site'][in_stage],
+            'date': dates[in_stage],
+        }))
+    rows = pd.concat(frames, ignore_index=True)
+    rows['month'] = rows['date'].dt.to_period('M')
+    return rows
+
+
+def test_totals_match_the_events(prepared, stage_rows):
+    cube = FunnelCube.build(prepared)
+    expected = stage_rows.groupby('stage').size()
+    for stage in FUNNEL_STAGES:
+        assert cube.total(stage) == expected.get(stage, 0), stage
+
+
+def test_site_rollups_match_a_groupby(prepared, stage_rows):
+    cube = FunnelCube.build(prepared)
+    by_cvlp = stage_rows.groupby(['stage', 'cvlp']).size()
+    by_trial = stage_rows.groupby(['stage', 'trial']).size()
+    by_both = stage_rows.groupby(['stage', 'cvlp', 'trial']).size()
+    for stage in FUNNEL_STAGES:
+        for site, count in cube.by_cvlp_site(stage).items():
+            assert count == by_cvlp.get((stage, site), 0), (stage, site)
+        for site, count in cube.by_trial_site(stage).items():
+            assert count == by_trial.get((stage, site), 0), (stage, site)
+        for site, count in cube.by_trial_site(stage, cvlp_site='Leeds').items():
+            assert count == by_both.get((stage, 'Leeds', site), 0), (stage, site)
+        assert cube.total(stage, cvlp_site='York', trial_site='St James') == by_both.get((stage, 'York', 'St James'), 0)
+
+
+def test_monthly_rollups_match_a_groupby(prepared, stage_rows):
+    cube = FunnelCube.build(prepared)
+    periods = [pd.Period(pd.to_datetime(f"01-{m}", format='%d-%b-%y'), freq='M') for m in MONTHS]
+    for stage in FUNNEL_STAGES:
+        for site in (None, 'Hull'):
+            rows = stage_rows[stage_rows['stage'] == stage]
+            if site is not None:
+                rows = rows[rows['cvlp'] == site]
+            per_month = rows.groupby('month').size()
+            expected = [per_month.get(p, 0) for p in periods]
+            assert cube.monthly(stage, MONTHS, cvlp_site=site).tolist() == expected, (stage, site)
+            cumulative = [int((rows['month'] <= p).sum()) for p in periods]
+            assert cube.monthly(stage, MONTHS, cvlp_site=site, cumulative=True).tolist() == cumulative, (stage, site)
+
+
+def test_first_and_last_dates_match_a_groupby(prepared, stage_rows):
+    cube = FunnelCube.build(prepared)
+    dated = stage_rows.dropna(subset=['date', 'cvlp'])
+    first, last = dated.groupby(['stage', 'cvlp'])['date'].min(), dated.groupby(['stage', 'cvlp'])['date'].max()
+    for stage in FUNNEL_STAGES:
+        for site in cube.cvlp_sites:
+            assert same_date(cube.first_date(stage, site), first.get((stage, site))), (stage, site)
+            assert same_date(cube.last_date(stage, site), last.get((stage, site))), (stage, site)
+
+
+def same_date(actual, expected):
+    return pd.isna(actual) if expected is None else actual == expected
+
+
+def test_unknown_sites_count_nothing(prepared):
+    cube = FunnelCube.build(prepared)
+    assert cube.total('referred', cvlp_site='Nowhere') == 0
+    assert pd.isna(cube.first_date('referred', 'Nowhere'))
+
+
+def test_stage_mask_holds_each_patients_stages(prepared):
+    mask = prepared[FUNNEL_MASK_COLUMN].to_numpy()
+    np.testing.assert_array_equal(mask, funnel_stage_mask(prepared))
+    for stage, (in_stage, _) in funnel_stage_events(prepared).items():
+        np.testing.assert_array_equal((mask & FUNNEL_STAGE_BITS[stage]) != 0, in_stage.to_numpy(dtype=bool), stage)
+    table = stage_bits(mask)
+    assert table.shape == (len(prepared), len(FUNNEL_STAGES))
+    assert (table.sum(axis=0) == [int(((mask & FUNNEL_STAGE_BITS[stage]) != 0).sum()) for stage in FUNNEL_STAGES]).all()
+
+
+def test_cube_from_the_stored_mask_matches_one_packed_on_the_fly(prepared):
+    stored = FunnelCube.build(prepared)
+    packed = FunnelCube.build(prepared.drop(columns=[FUNNEL_MASK_COLUMN]))
+    np.testing.assert_array_equal(stored.counts, packed.counts)
+    np.testing.assert_array_equal(stored.first_dates, packed.first_dates)
+    np.testing.assert_array_equal(stored.last_dates, packed.last_dates)
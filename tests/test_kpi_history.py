@@ -0,0 +1,85 @@
+"""KPI trends and week-over-week deltas read the same across history parts,
+the compacted file and a fresh process."""
+
+import numpy as np
+import pandas as pd
+
+import kpi_history
+from kpi_history import KPIHistory
+from kpi_plan import calculation_fingerprint
+
+LEVEL = "Pseudonymized (Safe)"
+KPIS = {
+    'total_referred': {'name': 'Total Referred', 'calculation': {'type': 'derived_column_sum', 'column': 'is_referred'}},
+    'randomised': {'name': 'Randomised', 'calculation': {'type': 'derived_column_sum', 'column': 'is_randomised'}},
+}
+REFERRED = calculation_fingerprint('total_referred', KPIS)
+
+# (dataset version, as-of date, total referred)
+VERSIONS = [
+    ('v1', '2026-09-01', 10), ('v2', '2026-09-04', 12), ('v3', '2026-09-08', 15),
+    ('v4', '2026-09-10', 16), ('v5', '2026-09-15', 21), ('v6', '2026-09-15', 22),
+]
+
+
+def results(referred):
+    return {
+        'total_referred': {'config': KPIS['total_referred'], 'value': referred},
+        'randomised': {'config': KPIS['randomised'], 'value': referred // 4},
+    }
+
+
+def record_all(history, versions=VERSIONS):
+    for version, as_of, referred in versions:
+        assert history.record(version, LEVEL, as_of, results(referred))
+
+
+def test_week_delta_uses_the_latest_point_a_week_back(tmp_path):
+    history = KPIHistory(str(tmp_path))
+    record_all(history)
+
+    trend = history.trend(LEVEL, 'total_referred', REFERRED)
+    # v6 replaces v5 on the same day; a week before 15 Sep the latest point is 8 Sep
+    assert trend.values.tolist() == [10, 12, 15, 16, 22]
+    assert trend.week_delta == 22 - 15
+    assert history.trend(LEVEL, 'total_referred', REFERRED, as_of='2026-09-10').week_delta == 16 - 10
+    # Nothing a week before the first points
+    assert history.trend(LEVEL, 'total_referred', REFERRED, as_of='2026-09-04').week_delta is None
+    assert history.trend(LEVEL, 'total_referred', REFERRED, as_of='2026-08-31') is None
+
+
+def test_trend_is_the_same_across_parts_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(kpi_history, 'COMPACT_EVERY', 4)
+    history = KPIHistory(str(tmp_path))
+    record_all(history)
+    # Four parts were folded into the compacted file, the last two are still parts
+    assert (tmp_path / kpi_history.COMPACTED_NAME).is_file()
+    assert len(list(tmp_path.glob('part-*.parquet'))) == 2
+
+    live = history.trend(LEVEL, 'total_referred', REFERRED)
+    reloaded = KPIHistory(str(tmp_path)).trend(LEVEL, 'total_referred', REFERRED)
+    np.testing.assert_array_equal(reloaded.values, live.values)
+    assert reloaded.dates.equals(live.dates)
+    assert reloaded.week_delta == live.week_delta == 7
+    assert KPIHistory(str(tmp_path)).is_recorded('v3', LEVEL)
+
+
+def test_a_version_is_recorded_once(tmp_path):
+    history = KPIHistory(str(tmp_path))
+    record_all(history, VERSIONS[:1])
+    assert not history.record('v1', LEVEL, '2026-09-30', results(99))
+    assert history.trend(LEVEL, 'total_referred', REFERRED).values.tolist() == [10]
+
+
+def test_changed_calculation_starts_a_new_series(tmp_path):
+    history = KPIHistory(str(tmp_path))
+    record_all(history, VERSIONS[:3])
+    changed = {**KPIS, 'total_referred': {'name': 'Total Referred', 'calculation': {
+        'type': 'derived_column_sum', 'column': 'is_referred_to_prescreen'}}}
+    history.record('v4', LEVEL, '2026-09-10', {
+        'total_referred': {'config': changed['total_referred'], 'value': 3},
+        'randomised': {'config': KPIS['randomised'], 'value': 4},
+    })
+    new_series = history.trend(LEVEL, 'total_referred', calculation_fingerprint('total_referred', changed))
+    assert new_series.values.tolist() == [3] and new_series.week_delta is None
+    assert history.trend(LEVEL, 'total_referred', REFERRED).dates[-1] == pd.Timestamp('2026-09-08')
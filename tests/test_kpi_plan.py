@@ -0,0 +1,48 @@
+"""KPI results cached per calculation in the shared result store"""
+
+import pandas as pd
+import pytest
+
+from kpi_plan import calculation_fingerprint, evaluate_kpis
+from result_store import ResultStore, ResultStoreView
+
+CONFIG = {
+    'metadata': {'version': 'test'},
+    'kpis': {
+        'referred': {'calculation': {'type': 'derived_column_sum', 'column': 'is_referred'}},
+        'randomised': {'calculation': {'type': 'derived_column_sum', 'column': 'is_randomised'}},
+        'conversion': {'calculation': {'type': 'ratio', 'numerator': 'randomised', 'denominator': 'referred'}},
+    },
+}
+
+
+def tracker():
+    return pd.DataFrame({'is_referred': [True, True, True, False], 'is_randomised': [True, False, False, False]})
+
+
+def test_each_kpi_is_its_own_store_entry():
+    store = ResultStore()
+    cache = ResultStoreView(store, 'dataset', 'Pseudonymized (Safe)', 'kpi@2025-05-01:')
+    first = evaluate_kpis(CONFIG, tracker(), cache=cache)
+    assert first['referred']['value'] == 3
+    assert first['conversion']['value'] == pytest.approx(100 / 3)
+    names = set(store.memory_report()['Result'])
+    assert names == {f"kpi@2025-05-01:{calculation_fingerprint(kpi_id, CONFIG['kpis'])}" for kpi_id in CONFIG['kpis']}
+
+    # A second session reads the same entries without recomputing
+    second = evaluate_kpis(CONFIG, tracker().iloc[:0], cache=cache)
+    assert all(second[kpi_id] is first[kpi_id] for kpi_id in CONFIG['kpis'])
+
+
+def test_changed_calculation_adds_an_entry():
+    store = ResultStore()
+    cache = ResultStoreView(store, 'dataset', 'Pseudonymized (Safe)', 'kpi@2025-05-01:')
+    first = evaluate_kpis(CONFIG, tracker(), cache=cache)
+    edited = {**CONFIG, 'kpis': {**CONFIG['kpis'], 'randomised': {'calculation': {'type': 'derived_column_sum', 'column': 'is_referred'}}}}
+    second = evaluate_kpis(edited, tracker(), cache=cache)
+    assert second['referred'] is first['referred']
+    # Identical calculations share one entry
+    assert second['randomised'] is first['referred']
+    # The ratio's fingerprint covers its operands, so it is evaluated again
+    assert second['conversion']['value'] == 100
+    assert len(store.memory_report()) == 4
@@ -0,0 +1,69 @@
+"""A KPI schema edit that fails validation is rejected whole and the previous
+schema stays live."""
+
+import os
+
+import pytest
+import yaml
+
+from kpi_schema import KPISchemaError, kpi_schema_watcher, parse_kpi_schema
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'kpi_schema.yaml')
+
+
+def shipped_config():
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def test_the_shipped_schema_is_valid():
+    with open(SCHEMA_PATH, 'rb') as f:
+        schema = parse_kpi_schema(f.read(), 'shipped')
+    assert 'total_referred' in schema.config['kpis']
+
+
+def test_every_problem_is_listed():
+    config = shipped_config()
+    config['kpis']['randomised']['calculation']['type'] = 'median'
+    config['kpis']['randomised']['targets']['default'] = -1
+    config['dashboard_layout']['sections']['rate_metrics']['kpis'].append('missing_kpi')
+    with pytest.raises(KPISchemaError) as error:
+        parse_kpi_schema(yaml.safe_dump(config), 'bad')
+    problems = error.value.problems
+    assert len(problems) == 3
+    assert any(p.startswith('randomised:') and 'median' in p for p in problems)
+    assert 'randomised: targets.default must be a number of at least 0' in problems
+    assert 'rate_metrics: unknown KPIs missing_kpi' in problems
+
+
+def test_rejected_edit_keeps_the_previous_schema_live(tmp_path):
+    path = tmp_path / 'kpi_schema.yaml'
+    config = shipped_config()
+    path.write_text(yaml.safe_dump(config), encoding='utf-8')
+    watcher = kpi_schema_watcher(str(path), interval=3600)
+    try:
+        live = watcher.current.data
+        assert live.config == config and watcher.last_error is None
+
+        # Not YAML at all, then valid YAML whose ratio points at an unknown KPI
+        path.write_text("kpis: [unclosed", encoding='utf-8')
+        assert not watcher.refresh(wait_for_stable=False)
+        assert watcher.current.data is live
+        assert 'not valid YAML' in watcher.last_error
+
+        broken = shipped_config()
+        broken['kpis']['referral_to_randomisation']['calculation']['numerator'] = 'no_such_kpi'
+        path.write_text(yaml.safe_dump(broken), encoding='utf-8')
+        assert not watcher.refresh(wait_for_stable=False)
+        assert watcher.current.data is live
+        assert watcher.last_error.startswith('kpi_schema.yaml: referral_to_randomisation:')
+
+        # A valid edit goes live and clears the error
+        config['kpis']['randomised']['targets']['default'] = 20
+        path.write_text(yaml.safe_dump(config), encoding='utf-8')
+        assert watcher.refresh(wait_for_stable=False)
+        assert watcher.current.data.config['kpis']['randomised']['targets']['default'] == 20
+        assert watcher.current.data.plan_fingerprint == live.plan_fingerprint
+        assert watcher.last_error is None
+    finally:
+        watcher.stop()
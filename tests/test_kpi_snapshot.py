@@ -0,0 +1,76 @@
+"""The overview tiles, the schema KPI engine and the referral chart all read the
+KPI snapshot; it must agree with the tracker's flag columns and with the KPI
+plan evaluated on its own."""
+
+import os
+
+import pandas as pd
+import pytest
+import yaml
+
+from dashboard_metrics import (
+    KPI_SNAPSHOT_COLUMNS, MAIN_TRIAL_REFERRAL_COLUMN, PRESCREEN_REFERRAL_COLUMN, FunnelCube,
+    compute_kpi_snapshot, prepare_tracker_data,
+)
+from kpi_plan import compile_plan
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'kpi_schema.yaml')
+
+
+def synthetic_tracker():
+    """Eight patients covering every headline flag, including patients referred by both routes"""
+    d = pd.Timestamp
+    return pd.DataFrame({
+        'Patient full name': [f'Patient {i}' for i in range(8)],
+        'CVLP Site': ['Leeds', 'Leeds', 'Hull', 'Hull', 'York', 'York', 'Leeds', None],
+        'Trial Site': ['St James', 'St James', 'Castle Hill', None, 'St James', 'Castle Hill', None, None],
+        PRESCREEN_REFERRAL_COLUMN: [d('2025-01-10'), d('2025-02-03'), None, d('2025-03-15'), None, d('2025-04-01'), None, None],
+        MAIN_TRIAL_REFERRAL_COLUMN: [d('2025-02-20'), None, d('2025-03-02'), None, d('2025-04-11'), None, None, None],
+        'Please select the CVLP consent status': ['Obtained', 'obtained ', 'Declined', 'Obtained', None, 'Obtained', 'Pending', None],
+        'To be confirmed by trial site (Yes = consent confirmed, No = screen fail)': ['Yes', 'No', 'yes', None, 'Y', 'No', None, None],
+        'To be confirmed by trial site (enrolled = Yes, screen fail = No)': ['Yes', None, 'No', None, 'yes', None, None, None],
+        'Clinical Liaison to confirm screen fail with CVLP site': [None, 'Confirmed', None, None, None, 'Confirmed', None, None],
+        'Email the CVLP site to confirm that patient has not consented to the main trial': [None, None, 'Sent', None, None, None, None, None],
+        'Email the CVLP site to confirm that patient has not enrolled to the trial': [None, 'Sent', None, None, None, None, None, None],
+    })
+
+
+@pytest.fixture(params=["Pseudonymized (Safe)", "Full Data (Admin)"])
+def prepared(request):
+    return prepare_tracker_data(synthetic_tracker(), request.param)
+
+
+@pytest.fixture
+def snapshot(prepared):
+    return compute_kpi_snapshot(prepared, FunnelCube.build(prepared))
+
+
+def test_snapshot_matches_flag_column_sums(prepared, snapshot):
+    assert set(snapshot) == set(KPI_SNAPSHOT_COLUMNS)
+    for name, col in KPI_SNAPSHOT_COLUMNS.items():
+        assert snapshot[name] == int(prepared[col].sum()), name
+
+
+def test_snapshot_counts(snapshot):
+    assert snapshot == {
+        'referred': 6, 'referred_to_prescreen': 4, 'referred_to_main_trial': 3, 'recruited_to_cvlp': 4,
+        'consented_prescreen': 3, 'randomised': 2, 'screen_failures': 3,
+    }
+
+
+def test_snapshot_matches_kpi_plan(prepared, snapshot):
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    # Evaluated from the data alone, without the snapshot's column totals
+    values = compile_plan(config).evaluate(prepared)
+    names = {col: name for name, col in KPI_SNAPSHOT_COLUMNS.items()}
+    compared = set()
+    for kpi_id, kpi in config['kpis'].items():
+        calculation = kpi['calculation']
+        if calculation['type'] == 'derived_column_sum' and calculation['column'] in names:
+            name = names[calculation['column']]
+            assert 'error' not in values[kpi_id], values[kpi_id]
+            assert values[kpi_id]['value'] == snapshot[name], kpi_id
+            compared.add(name)
+    # Every headline tile has a schema KPI
+    assert compared == set(KPI_SNAPSHOT_COLUMNS)
@@ -0,0 +1,94 @@
+"""Peak traced allocation of one rerun of the analytics path, and the peak RSS
+growth of a dashboard rerun, stay within their recorded budgets"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+
+from dashboard_metrics import PRIVACY_LEVELS, read_master_tracker
+from data_context import build_data_context
+from memory_benchmark import measure_rerun, synthetic_tracker
+from patient_linkage import link_patients
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACKER_PATH = os.path.join(REPO_DIR, 'data', 'BNT113-01 Master Tracker v1 15-Apr-2025.xlsx')
+SCREENING_LOGS_PATH = os.path.join(REPO_DIR, 'data', 'BNT113-01 Screening Logs1.xlsx')
+ROWS = 20_000
+
+# Recorded at 6.7 MB for ROWS rows (a 7.1 MB tracker); raise it only for a deliberate trade-off
+PEAK_BUDGET_MB = 10
+# Recorded at 12 MB for the first rerun after loading the sample tracker and Screening Logs
+RERUN_RSS_BUDGET_MB = 32
+
+# The dashboard with the sample files as its uploads (AppTest has no file uploader)
+DASHBOARD_WITH_UPLOADS = """
+import io, runpy
+from streamlit.delta_generator import DeltaGenerator
+
+UPLOADS = {{'📁 Upload Master Tracker': {tracker!r}, '📋 Upload Screening Logs': {logs!r}}}
+
+
+class Upload(io.BytesIO):
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            super().__init__(f.read())
+        self.name = self.file_id = path
+
+
+DeltaGenerator.file_uploader = lambda self, label, *args, **kwargs: Upload(UPLOADS[label]) if label in UPLOADS else None
+runpy.run_path('streamlit_dashboard_bnt113_real_data.py', run_name='__main__')
+"""
+
+# Runs the dashboard once, then reports the peak RSS growth of each rerun, in a fresh process
+MEASURE_RERUNS = """
+import gc, json, resource, sys
+from streamlit.testing.v1 import AppTest
+from memory_benchmark import _reset_peak_rss, _rss
+
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+app.run()
+if app.exception:
+    sys.exit('\\n'.join(e.message for e in app.exception))
+deltas = []
+for _ in range(int(sys.argv[2])):
+    gc.collect()
+    if _reset_peak_rss():
+        before = _rss('VmRSS')
+        app.run()
+        deltas.append(_rss() - before)
+    else:
+        # ru_maxrss can't be reset; its growth is a lower bound
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        app.run()
+        deltas.append(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - before)
+print(json.dumps(deltas))
+"""
+
+
+def test_rerun_peak_allocation_within_budget():
+    with open(TRACKER_PATH, 'rb') as f:
+        tracker_bytes = f.read()
+    tracker = synthetic_tracker(read_master_tracker(io.BytesIO(tracker_bytes), header=0), ROWS)
+    context = build_data_context("memory-budget", io.BytesIO(tracker_bytes), None)
+    linkage = link_patients(tracker, context.screening_logs.patients)
+
+    _, _, _, traced = measure_rerun(tracker, tracker_bytes, context, PRIVACY_LEVELS[0], linkage)
+    assert traced <= PEAK_BUDGET_MB * 2**20, f"peak traced allocation {traced / 2**20:.1f} MB over the {PEAK_BUDGET_MB} MB budget"
+
+
+def test_dashboard_rerun_rss_growth_within_budget(tmp_path):
+    app = tmp_path / 'dashboard_with_uploads.py'
+    app.write_text(DASHBOARD_WITH_UPLOADS.format(tracker=TRACKER_PATH, logs=SCREENING_LOGS_PATH), encoding='utf-8')
+    env = {**os.environ, 'BNT113_HISTORY_DIR': str(tmp_path / 'history'),
+           'BNT113_KPI_HISTORY_DIR': str(tmp_path / 'history' / 'kpis'), 'PYTHONWARNINGS': 'ignore'}
+    env.pop('BNT113_SNAPSHOT_DIR', None)
+    result = subprocess.run([sys.executable, '-c', MEASURE_RERUNS, str(app), '2'], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True, timeout=900)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    deltas = json.loads(result.stdout.strip().splitlines()[-1])
+    worst = max(deltas)
+    assert worst <= RERUN_RSS_BUDGET_MB * 2**20, \
+        f"a dashboard rerun grew RSS by {worst / 2**20:.1f} MB, over the {RERUN_RSS_BUDGET_MB} MB budget"
@@ -0,0 +1,89 @@
+"""Screening Logs dates as read from the sheets, and Screening Logs patients linked with the
+Master Tracker's across differently spelled sites"""
+
+import warnings
+
+import pandas as pd
+
+from dashboard_metrics import PRESCREEN_REFERRAL_COLUMN
+from patient_linkage import canonical_sites, link_patients, normalize_site, screening_log_link_records
+
+
+def test_consent_answers_and_dates_parse_without_warnings():
+    sheet = pd.DataFrame({
+        'Screening Number': ['S1', 'S2', 'S3', 'S4'],
+        'Date of Screening': [pd.Timestamp('2025-01-06'), '03/02/2025', pd.Timestamp('2025-03-10'), None],
+        'Consented to CVLP': ['Yes', 'No', '04/03/2025', None],
+    })
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        records = screening_log_link_records(sheet, 'Leeds', screening_col='Date of Screening', consent_col='Consented to CVLP')
+    # Text dates are day first; a Yes answer dates the consent at screening
+    assert records['screened'].tolist()[:3] == [pd.Timestamp('2025-01-06'), pd.Timestamp('2025-02-03'), pd.Timestamp('2025-03-10')]
+    assert records['cvlp_consented'].tolist()[:3] == [pd.Timestamp('2025-01-06'), pd.NaT, pd.Timestamp('2025-03-04')]
+    assert records['cvlp_consented'].isna().tolist() == [False, True, False, True]
+
+
+def test_site_spellings_map_onto_one_canonical_site():
+    names = pd.Series([
+        'University Hospitals Dorset', 'Univeristy Hospitals Dorset', 'Royal Surrey County', 'Royal Surrey',
+        'Southend', 'Mid & South Essex - Southend', 'Mid & South Essex - Broomfield', 'Mid and South Essex',
+        'BHRUT', 'Barking Havering and Redbridge', 'Bath',
+    ])
+    canonical = canonical_sites(normalize_site(names))
+    site = dict(zip(names, normalize_site(names).map(canonical)))
+    assert site['University Hospitals Dorset'] == site['Univeristy Hospitals Dorset']
+    assert site['Royal Surrey'] == 'royal surrey county'
+    assert site['Southend'] == 'mid and south essex southend'
+    assert site['BHRUT'] == site['Barking Havering and Redbridge'] == 'barking havering and redbridge'
+    # A name within two sites is neither
+    assert site['Mid and South Essex'] == 'mid and south essex'
+    assert len(set(canonical.values())) == 7
+
+
+def test_tracker_and_log_patients_link_across_site_spellings():
+    d = pd.Timestamp
+    tracker = pd.DataFrame({
+        'CVLP Site': ['Univeristy Hospitals Dorset', 'Royal Surrey', 'Mid & South Essex - Southend', 'Barking Havering and Redbridge'],
+        'Screening Number': ['S1', 'S2', 'S3', 'S4'],
+        'CVLP Participant ID': ['P1', 'P2', 'P3', 'P4'],
+        'Participant Year of Birth': [1950, 1960, 1970, 1980],
+        PRESCREEN_REFERRAL_COLUMN: [d('2025-02-10'), d('2025-03-05'), None, d('2025-04-01')],
+        'Date patient consented into CVLP': [d('2025-02-01'), d('2025-03-01'), d('2025-03-20'), None],
+        'Please select the CVLP consent status': ['Obtained', 'Obtained', 'Obtained', None],
+    })
+    log = pd.DataFrame({
+        # S1 by screening number, P2 by participant ID and year of birth; S9 is only in the logs,
+        # and S4 at BHRUT is another site's screening number
+        'Site': ['University Hospitals Dorset', 'Royal Surrey County', 'Southend', 'Southend', 'Bath'],
+        'Screening Number': ['S1', 'X2', 'S3', 'S9', 'S4'],
+        'CVLP Participant ID': ['Q1', 'P2', 'Q3', 'Q9', 'P4'],
+        'Participant Year of Birth': [1951, 1960, 1970, 1990, 1980],
+        'Date of Screening': [d('2025-01-15'), d('2025-02-20'), d('2025-03-10'), d('2025-04-05'), d('2025-04-06')],
+        'Consented to CVLP': ['Yes', 'Yes', 'No', 'Yes', 'No'],
+    })
+    log_records = screening_log_link_records(log, 'Logs', screening_col='Date of Screening', consent_col='Consented to CVLP')
+    linkage = link_patients(tracker, log_records)
+
+    assert linkage.linked == 3
+    assert len(linkage.patients) == 6
+    month_ends = [d('2025-01-31'), d('2025-02-28'), d('2025-03-31'), d('2025-04-30')]
+    # Consent on the earliest date from either source; S3's log says No but the tracker has a consent date
+    assert linkage.cumulative('cvlp_consented', month_ends).tolist() == [1, 2, 3, 4]
+    assert linkage.cumulative('referred', month_ends).tolist() == [0, 1, 2, 3]
+    assert linkage.cumulative('screened', month_ends).tolist() == [1, 2, 3, 5]
+
+
+def test_log_rows_without_identifiers_are_patients_of_their_own():
+    d = pd.Timestamp
+    sheet = pd.DataFrame({
+        'Referral Date': [d('2025-01-10'), d('2025-01-10'), None],
+        'Note': ['first', 'second', 'blank row'],
+    })
+    records = screening_log_link_records(sheet, 'Southend', referral_col='Referral Date')
+    assert len(records) == 2
+    linkage = link_patients(pd.DataFrame(), records)
+    assert linkage.has_logs and linkage.linked == 0
+    assert linkage.cumulative('referred', [d('2025-01-31')]).tolist() == [2]
+    # Sheets with neither identifiers nor stage columns (summaries, notes) hold no patients
+    assert screening_log_link_records(pd.DataFrame({'Site': ['Bath'], 'Total Screened': [3]}), 'Summary').empty
@@ -0,0 +1,75 @@
+"""The Monte Carlo forecast is reproducible for a seed and its percentile bands
+agree with the fitted site rates."""
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import PRESCREEN_REFERRAL_COLUMN, PROJECTED_REFERRAL_TARGETS
+from recruitment_forecast import PERCENTILES, fit_site_rates, forecast_recruitment
+
+AS_OF = pd.Timestamp('2026-03-31')
+OPENED = {'Leeds': pd.Timestamp('2025-03-31'), 'Hull': pd.Timestamp('2025-09-30')}
+
+
+def synthetic_tracker():
+    """Leeds refers twice a month for a year, Hull three times in six months; every fourth referral randomised"""
+    leeds = pd.date_range('2025-04-01', periods=24, freq='SMS')
+    hull = pd.to_datetime(['2025-11-03', '2026-01-12', '2026-03-09'])
+    dates = list(leeds) + list(hull)
+    return pd.DataFrame({
+        'CVLP Site': ['Leeds'] * len(leeds) + ['Hull'] * len(hull),
+        PRESCREEN_REFERRAL_COLUMN: dates,
+        'is_randomised': [i % 4 == 0 for i in range(len(dates))],
+    })
+
+
+def test_site_rates_shrink_towards_the_network_rate():
+    rates = fit_site_rates(synthetic_tracker(), OPENED, AS_OF).set_index('Site')
+    assert rates.loc['Leeds', 'Referrals'] == 24 and rates.loc['Hull', 'Referrals'] == 3
+    network_rate = 27 / rates['Months Open'].sum()
+    for site in rates.index:
+        raw_rate = rates.loc[site, 'Referrals'] / rates.loc[site, 'Months Open']
+        fitted = rates.loc[site, 'Referrals / Month']
+        assert min(raw_rate, network_rate) < fitted < max(raw_rate, network_rate)
+
+
+def test_forecast_is_reproducible_and_its_bands_are_ordered():
+    df = synthetic_tracker()
+    forecast = forecast_recruitment(df, OPENED, AS_OF, simulations=2000, seed=7)
+    again = forecast_recruitment(df, OPENED, AS_OF, simulations=2000, seed=7)
+    pd.testing.assert_frame_equal(forecast.referrals, again.referrals)
+    pd.testing.assert_frame_equal(forecast.randomised, again.randomised)
+    assert forecast.target_probability == again.target_probability
+
+    # Only the months after the as-of date are forecast, starting from the tracker's count so far
+    assert forecast.referrals['Month'].tolist() == ['Apr-26', 'May-26', 'Jun-26', 'Jul-26', 'Aug-26', 'Sep-26',
+                                                    'Oct-26', 'Nov-26']
+    assert forecast.baseline_referrals == len(df)
+    for bands in (forecast.referrals, forecast.randomised):
+        values = bands[[f"P{p}" for p in PERCENTILES]].to_numpy()
+        assert (np.diff(values, axis=1) >= 0).all()
+        assert (np.diff(values, axis=0) >= 0).all()
+    assert (forecast.randomised['P50'] <= forecast.referrals['P50']).all()
+
+
+def test_median_follows_the_fitted_rates():
+    df = synthetic_tracker()
+    forecast = forecast_recruitment(df, OPENED, AS_OF, simulations=5000, seed=113)
+    rates = fit_site_rates(df, OPENED, AS_OF)
+    months = len(forecast.referrals)
+    expected = len(df) + rates['Referrals / Month'].sum() * months
+    assert abs(forecast.referrals['P50'].iloc[-1] - expected) <= 0.05 * expected
+    # Under three referrals a month over eight months never reach 136 from 27
+    assert forecast.target == PROJECTED_REFERRAL_TARGETS[-1]
+    assert forecast.target_probability == 0.0 and forecast.target_reached_month is None
+
+
+def test_baseline_past_the_target_reaches_it_in_the_first_month():
+    forecast = forecast_recruitment(synthetic_tracker(), OPENED, AS_OF, baseline_referrals=PROJECTED_REFERRAL_TARGETS[-1],
+                                    simulations=500, seed=1)
+    assert forecast.target_probability == 1.0
+    assert forecast.target_reached_month == 'Apr-26'
+
+
+def test_no_forecast_after_the_projection_period():
+    assert forecast_recruitment(synthetic_tracker(), OPENED, pd.Timestamp('2026-12-31')) is None
@@ -0,0 +1,71 @@
+"""Achievements & Barriers search: words (the last one as a prefix), facets and
+date ranges combine as an intersection."""
+
+import pytest
+
+from reporting_log import ReportingLogIndex
+
+ACHIEVEMENTS = [
+    "First patient randomised at <b>Leeds</b>",
+    "Hull opened for referrals",
+    "Screening logs returned by Royal Surrey County",
+]
+AIMS = ["Open York to referrals", "Randomise two patients at Leeds"]
+ISSUES = [
+    {'Issue': 'Courier delays', 'Category': 'Logistics', 'Detail': 'Blocks from Hull held over the weekend',
+     'Date Identified': '03-Feb-25', 'Date Resolved': '10-Feb-25'},
+    {'Issue': 'Pathology backlog', 'Category': 'Staffing', 'Detail': 'Leeds pathology short staffed',
+     'Date Identified': '14/03/2025', 'Date Resolved': ''},
+    {'Issue': 'Referral form rejected', 'Category': 'Logistics', 'Detail': 'Royal Surrey used the old form',
+     'Date Identified': '02-Apr-2025'},
+    {'Issue': 'Randomisation system outage', 'Category': 'IT', 'Detail': '', 'Date Identified': ''},
+]
+SITES = ['Leeds', 'Hull', 'York', 'Royal Surrey County', 'Surrey']
+
+# Entry numbers: achievements 0-2, aims 3-4, issues 5-8
+
+
+@pytest.fixture(scope='module')
+def index():
+    return ReportingLogIndex.build(ACHIEVEMENTS, AIMS, ISSUES, SITES)
+
+
+def test_words_match_whole_and_the_last_as_a_prefix(index):
+    assert index.search('randomis').tolist() == [0, 4, 8]
+    assert index.search('randomis ').tolist() == []
+    assert index.search('referral').tolist() == [1, 3, 7]
+    # Every word must match; HTML tags are not text
+    assert index.search('patient leeds').tolist() == [0]
+    assert index.search('b ').tolist() == []
+    assert index.search('').tolist() == list(range(9))
+
+
+def test_facets(index):
+    assert index.facet_values('kind') == {'Achievement': 3, 'Aim': 2, 'Issue': 4}
+    assert index.facet_values('status') == {'Open': 3, 'Resolved': 1}
+    assert index.search(kind='Issue', category='Logistics').tolist() == [5, 7]
+    # Several values of one facet match any of them
+    assert index.search(kind=['Achievement', 'Aim'], site='Leeds').tolist() == [0, 4]
+    assert index.search('courier', status='Open').tolist() == []
+    assert index.search(category=[], site=None).tolist() == list(range(9))
+
+
+def test_sites_are_matched_as_whole_words_in_order(index):
+    assert index.facet_values('site') == {'Hull': 2, 'Leeds': 3, 'Royal Surrey County': 1, 'Surrey': 2, 'York': 1}
+    assert index.search(site='Royal Surrey County').tolist() == [2]
+    assert index.entries.loc[2, 'sites'] == ['Royal Surrey County', 'Surrey']
+
+
+def test_date_ranges_keep_dated_entries_inside_them(index):
+    # Both date formats of the log are read; undated entries never match a range
+    assert index.search(date_from='2025-02-03', date_to='2025-03-14').tolist() == [5, 6]
+    assert index.search(date_from='2025-02-04').tolist() == [6, 7]
+    assert index.search(date_to='2025-04-01').tolist() == [5, 6]
+    assert index.search('logistics', kind='Issue', date_from='2025-03-01').tolist() == [7]
+
+
+def test_positions_within_each_list(index):
+    ids = index.search('leeds')
+    assert index.positions(ids, 'Achievement') == [0]
+    assert index.positions(ids, 'Aim') == [1]
+    assert index.positions(ids, 'Issue') == [1]
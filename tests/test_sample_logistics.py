@@ -0,0 +1,77 @@
+"""Sample logistics legs are measured in working days and breach their service
+level only when they take longer than it, urgent results against the tighter limit."""
+
+import pandas as pd
+import pytest
+
+from sample_logistics import LogisticsLatency
+
+DISPATCH_TO_RECEIPT = 'Dispatch → CPGC receipt'
+RECEIPT_TO_SHIPMENT = 'CPGC receipt → shipment'
+SHIPMENT_TO_RESULT = 'Shipment → result'
+DISPATCH_TO_RESULT = 'Dispatch → result'
+
+REPORTING = [{'CPGC': 'North CPGC', 'Corresponding CVLP recruiting sites': 'Leeds Teaching Hospitals'}]
+
+
+def synthetic_tracker():
+    """Four samples dispatched on Monday 2 June 2025 (no bank holidays that month)"""
+    d = pd.Timestamp
+    return pd.DataFrame({
+        'CVLP Site': ['Leeds Teaching Hospitals', 'Leeds Teaching Hospitals', 'Hull', 'Hull'],
+        'Date tissue block sent to CPGC': [d('2025-06-02')] * 4,
+        # 2 days (limit 2), 3 days, 1 day, not received
+        'Date tissue block received by CPGC': [d('2025-06-04'), d('2025-06-05'), d('2025-06-03'), None],
+        # 4 days (limit 3), 1 day
+        'Date samples shipped to LabCorp': [d('2025-06-10'), d('2025-06-06'), None, None],
+        # Non-urgent 8 days (limit 10); urgent 6 days (limit 5); end to end 14, 10 (urgent limit 10) and 16 days
+        'Date result received': [d('2025-06-20'), d('2025-06-16'), None, d('2025-06-24')],
+        'Urgent result requested': ['No', 'Yes', None, 'No'],
+    })
+
+
+@pytest.fixture(scope='module')
+def logistics():
+    return LogisticsLatency.build(synthetic_tracker(), REPORTING)
+
+
+def test_only_legs_with_both_dates_are_measured(logistics):
+    assert logistics.legs == (DISPATCH_TO_RECEIPT, RECEIPT_TO_SHIPMENT, SHIPMENT_TO_RESULT, DISPATCH_TO_RESULT)
+    measured = logistics.intervals.groupby('leg', observed=True)['working_days'].apply(list).to_dict()
+    assert measured == {
+        DISPATCH_TO_RECEIPT: [2, 3, 1],
+        RECEIPT_TO_SHIPMENT: [4, 1],
+        SHIPMENT_TO_RESULT: [8, 6],
+        DISPATCH_TO_RESULT: [14, 10, 16],
+    }
+
+
+def test_breach_counts_per_site(logistics):
+    summary = logistics.summary('CVLP site').set_index(['CVLP site', 'Leg'])
+    leeds, hull = 'Leeds Teaching Hospitals', 'Hull'
+    assert summary.loc[(leeds, DISPATCH_TO_RECEIPT), ['Samples', 'SLA Breaches']].tolist() == [2, 1]
+    assert summary.loc[(leeds, RECEIPT_TO_SHIPMENT), ['Samples', 'SLA Breaches']].tolist() == [2, 1]
+    # The urgent result is late at 6 working days; the non-urgent one is in time at 8
+    assert summary.loc[(leeds, SHIPMENT_TO_RESULT), ['Samples', 'SLA Breaches']].tolist() == [2, 1]
+    # 10 days end to end is on the urgent limit, not over it
+    assert summary.loc[(leeds, DISPATCH_TO_RESULT), ['Samples', 'SLA Breaches']].tolist() == [2, 0]
+    assert summary.loc[(hull, DISPATCH_TO_RECEIPT), ['Samples', 'SLA Breaches']].tolist() == [1, 0]
+    assert summary.loc[(hull, DISPATCH_TO_RESULT), ['Samples', 'SLA Breaches', 'Breach %']].tolist() == [1, 1, 100.0]
+    assert int(summary['SLA Breaches'].sum()) == 4
+
+
+def test_unmapped_sites_are_left_out_of_the_cpgc_summary(logistics):
+    summary = logistics.summary('CPGC')
+    assert set(summary['CPGC']) == {'North CPGC'}
+    assert summary['Samples'].sum() == 8 and summary['SLA Breaches'].sum() == 3
+
+
+def test_histogram_counts_whole_working_days(logistics):
+    assert logistics.histogram(DISPATCH_TO_RECEIPT).tolist() == [0, 1, 1, 1]
+    assert logistics.histogram(DISPATCH_TO_RESULT, 'CVLP site', 'Hull').tolist() == [0] * 16 + [1]
+    assert logistics.sla_days(SHIPMENT_TO_RESULT) == (10, 5)
+
+
+def test_tracker_without_milestones_has_no_legs():
+    logistics = LogisticsLatency.build(pd.DataFrame({'CVLP Site': ['Leeds']}), REPORTING)
+    assert logistics.legs == () and logistics.summary().empty
@@ -0,0 +1,521 @@
+"""
+Local version history of the BNT113 Master Tracker.
+
+    python -m tracker_history add "BNT113-01 Master Tracker v1 15-Apr-2025.xlsx"
+    python -m tracker_history list
+    python -m tracker_history compare <version A> <version B>
+
+Every tracker version the dashboard ingests (or that is added from the command
+line) is recorded once, keyed by its content fingerprint. Rows are stored in
+Parquet, keyed by a salted hash of the participant ID, with the patient
+identifier columns dropped. Every version after the first stores its
+row-level deltas against the previous version (one record per added, removed
+or changed cell); every CHECKPOINT_EVERY-th version is also stored in full, so
+rebuilding a version never replays more than a few deltas.
+
+The manifest also keeps each version's KPI counts and per-site counts, so a
+comparison of two versions is answered from the manifest and the deltas in
+between; old workbooks are never re-read.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from dashboard_metrics import (
+    KPI_SNAPSHOT_COLUMNS, KPI_SNAPSHOT_LABELS, PRIVACY_LEVELS, SENSITIVE_COLUMNS, compute_kpi_snapshot,
+    prepare_tracker_data, read_master_tracker, resolve_cvlp_site_column,
+)
+from dashboard_snapshot import from_json_value, to_json_value
+from result_store import dataset_fingerprint
+
+# Where the history lives (overridable via environment)
+HISTORY_DIR = os.environ.get("BNT113_HISTORY_DIR", "tracker_history")
+MANIFEST_NAME = "manifest.json"
+HISTORY_FORMAT_VERSION = 1
+
+# Also store a full copy every this many versions, bounding the deltas replayed to rebuild one
+CHECKPOINT_EVERY = 10
+
+# Columns identifying a participant, in order of preference; rows are keyed by a salted hash of one
+ROW_KEY_COLUMNS = ['CVLP Participant ID', 'Screening Number', 'Main trial participant ID', 'Pre-screening ID']
+
+# Version dates in tracker file names, e.g. "Master Tracker v1 15-Apr-2025"
+VERSION_DATE_PATTERN = re.compile(r'(\d{1,2}-[A-Za-z]{3}-\d{4})')
+
+DELTA_COLUMNS = ['row_key', 'site', 'column', 'op', 'old', 'new']
+
+
+@dataclass(frozen=True)
+class TrackerVersion:
+    """One recorded tracker version, as listed in the manifest"""
+    # Content fingerprint of the tracker file
+    version: str
+    label: str
+    source: str
+    as_of: pd.Timestamp
+    ingested_at: float
+    rows: int
+    # Position in the history (versions are numbered in the order they were recorded)
+    seq: int
+    # Full copy of the rows (checkpoints only) and deltas against the previous version (all but the first)
+    rows_file: str
+    delta_file: str
+    columns: list
+    kpis: dict
+    # site -> KPI name -> count (plus 'rows')
+    sites: dict
+
+    @classmethod
+    def from_manifest(cls, entry):
+        return cls(**{**entry, "as_of": pd.Timestamp(entry["as_of"])})
+
+    def to_manifest(self):
+        return {**self.__dict__, "as_of": self.as_of.isoformat()}
+
+    @property
+    def checkpoint(self):
+        return self.rows_file is not None
+
+    @property
+    def display_name(self):
+        return f"{self.label} ({self.as_of:%d %b %Y})"
+
+
+@dataclass(frozen=True)
+class VersionComparison:
+    """Differences between two recorded versions, ``a`` being the earlier one"""
+    a: TrackerVersion
+    b: TrackerVersion
+    # KPI, A, B, Change
+    kpi_deltas: pd.DataFrame
+    # Site, KPI, A, B, Change (only where something changed)
+    site_changes: pd.DataFrame
+    # Site, Participant (hashed row key), Randomised In (label of the version it first shows in)
+    newly_randomised: pd.DataFrame
+    # Column, Rows Changed
+    column_changes: pd.DataFrame
+    rows_added: int
+    rows_removed: int
+
+
+def version_as_of(label, default=None):
+    """The date in a tracker file name ("... 15-Apr-2025.xlsx"), else ``default`` (or now)"""
+    match = VERSION_DATE_PATTERN.search(label or "")
+    if match:
+        try:
+            return pd.to_datetime(match.group(1), format="%d-%b-%Y")
+        except ValueError:
+            pass
+    return pd.Timestamp(default) if default is not None else pd.Timestamp.now().floor("s")
+
+
+# ---------------------------------------------------------------------------
+# Row encoding and deltas
+# ---------------------------------------------------------------------------
+
+def _encode_cell(value):
+    """A cell as a JSON string (None for blanks), so every version compares cell by cell as text"""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return json.dumps(to_json_value(value), allow_nan=True)
+
+
+def _decode_cell(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return from_json_value(json.loads(value))
+
+
+def row_keys(raw_tracker, salt):
+    """Salted participant-ID hashes, one per row; repeated IDs get '#2', '#3', ... and blank IDs the row position"""
+    key_col = next((c for c in ROW_KEY_COLUMNS if c in raw_tracker.columns and raw_tracker[c].notna().any()), None)
+    ids = raw_tracker[key_col] if key_col is not None else pd.Series(None, index=raw_tracker.index, dtype=object)
+    keys = [
+        hashlib.sha256(f"{salt}:{str(v).strip()}".encode()).hexdigest()[:16] if pd.notna(v) and str(v).strip()
+        else f"row-{i}"
+        for i, v in enumerate(ids)
+    ]
+    keys = pd.Series(keys, index=raw_tracker.index)
+    repeat = keys.groupby(keys).cumcount()
+    return keys.where(repeat == 0, keys + "#" + (repeat + 1).astype(str))
+
+
+def encode_tracker(raw_tracker, salt):
+    """Prepare a raw tracker for the history: (encoded rows indexed by row key, site column, KPI counts, site counts)"""
+    # Pseudonymized preparation, with the identifier columns dropped altogether
+    prepared = prepare_tracker_data(raw_tracker, PRIVACY_LEVELS[0])
+    prepared = prepared.drop(columns=[c for c in SENSITIVE_COLUMNS if c in prepared.columns])
+    prepared.index = pd.Index(row_keys(raw_tracker, salt), name="row_key")
+
+    site_col, _ = resolve_cvlp_site_column(prepared)
+    flag_columns = {name: col for name, col in KPI_SNAPSHOT_COLUMNS.items() if col in prepared.columns}
+    sites = {}
+    if site_col is not None:
+        by_site = prepared.groupby(prepared[site_col].fillna("(blank)").astype(str))
+        counts = by_site[list(flag_columns.values())].sum().rename(columns={v: k for k, v in flag_columns.items()})
+        counts['rows'] = by_site.size()
+        sites = {site: {k: int(v) for k, v in row.items()} for site, row in counts.iterrows()}
+
+    encoded = pd.DataFrame(
+        {str(col): prepared[col].map(_encode_cell).astype(object) for col in prepared.columns},
+        index=prepared.index,
+    )
+    return encoded, site_col, compute_kpi_snapshot(prepared), sites
+
+
+def row_deltas(old, new, site_col=None):
+    """Long-format cell deltas turning the encoded rows ``old`` into ``new``.
+
+    Added and removed rows give one record per non-blank cell (so deltas can be
+    replayed in either direction); kept rows give one record per changed cell.
+    """
+    columns = old.columns.union(new.columns, sort=False)
+    old, new = old.reindex(columns=columns), new.reindex(columns=columns)
+    common = new.index.intersection(old.index, sort=False)
+    parts = []
+
+    def cells(op, keys, old_values, new_values, mask, site_values):
+        rows, cols = np.nonzero(mask)
+        parts.append(pd.DataFrame({
+            'row_key': np.asarray(keys, dtype=object)[rows],
+            'site': np.asarray(site_values, dtype=object)[rows],
+            'column': np.asarray(columns, dtype=object)[cols],
+            'op': op,
+            'old': old_values[rows, cols] if old_values is not None else None,
+            'new': new_values[rows, cols] if new_values is not None else None,
+        }))
+
+    def site_of(frame):
+        if site_col is None or site_col not in frame.columns:
+            return [None] * len(frame)
+        return [_decode_cell(v) for v in frame[site_col]]
+
+    before = old.loc[common].to_numpy(dtype=object)
+    after = new.loc[common].to_numpy(dtype=object)
+    changed = (before != after) & ~(pd.isna(before) & pd.isna(after))
+    cells('changed', common, before, after, changed, site_of(new.loc[common]))
+
+    added = new.loc[new.index.difference(old.index, sort=False)]
+    added_values = added.to_numpy(dtype=object)
+    cells('added', added.index, None, added_values, pd.notna(added_values), site_of(added))
+
+    removed = old.loc[old.index.difference(new.index, sort=False)]
+    removed_values = removed.to_numpy(dtype=object)
+    cells('removed', removed.index, removed_values, None, pd.notna(removed_values), site_of(removed))
+
+    deltas = pd.concat(parts, ignore_index=True)
+    return deltas.astype({c: object for c in DELTA_COLUMNS})
+
+
+def apply_deltas(rows, deltas):
+    """Replay deltas written by row_deltas onto encoded rows"""
+    removed = deltas.loc[deltas['op'] == 'removed', 'row_key'].unique()
+    rows = rows.drop(index=removed)
+    added = deltas[deltas['op'] == 'added']
+    if len(added):
+        new_rows = added.pivot(index='row_key', columns='column', values='new')
+        rows = pd.concat([rows, new_rows.reindex(columns=rows.columns.union(new_rows.columns, sort=False))])
+    changed = deltas[deltas['op'] == 'changed']
+    for column, cells in changed.groupby('column', sort=False):
+        if column not in rows.columns:
+            rows[column] = pd.Series(None, index=rows.index, dtype=object)
+        rows.loc[cells['row_key'].to_numpy(), column] = cells['new'].to_numpy()
+    return rows
+
+
+def _cell_transitions(deltas, column):
+    """Per row key: the value of ``column`` before the first delta and after the last one, and the last site"""
+    cells = deltas[deltas['column'] == column]
+    if cells.empty:
+        return pd.DataFrame(columns=['start', 'end', 'site', 'seq'])
+    by_key = cells.groupby('row_key', sort=False)
+    return pd.DataFrame({
+        'start': by_key['old'].first(),
+        'end': by_key['new'].last(),
+        'site': by_key['site'].last(),
+        'seq': by_key['seq'].last(),
+    })
+
+
+# ---------------------------------------------------------------------------
+# The history store
+# ---------------------------------------------------------------------------
+
+class TrackerHistory:
+    """Record tracker versions on disk and compare any two of them"""
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Encoded rows of the most recently recorded version, the base of the next delta
+        self._latest_rows = None
+        # Versions known to be recorded, so repeat calls for the same file skip the manifest
+        self._recorded = set()
+        # A recording failure noted by a caller for display; cleared by the next successful record
+        self.last_error = None
+
+    # -- manifest -----------------------------------------------------------
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        if not os.path.isfile(path):
+            return {"format_version": HISTORY_FORMAT_VERSION, "key_salt": secrets.token_hex(16), "versions": []}
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != HISTORY_FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported history format {manifest.get('format_version')!r}")
+        return manifest
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{MANIFEST_NAME}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST_NAME))
+
+    @property
+    def versions(self):
+        """Recorded versions, in the order they were recorded"""
+        return [TrackerVersion.from_manifest(entry) for entry in self._read_manifest()["versions"]]
+
+    def get(self, version):
+        """Look a version up by fingerprint (or a unique prefix of it), label or sequence number"""
+        versions = self.versions
+        for match in (
+            lambda v: v.version == version,
+            lambda v: v.label == version,
+            lambda v: str(v.seq) == str(version),
+            lambda v: v.version.startswith(str(version)),
+        ):
+            found = [v for v in versions if match(v)]
+            if len(found) == 1:
+                return found[0]
+        raise KeyError(f"No single tracker version matches {version!r}")
+
+    # -- recording ----------------------------------------------------------
+
+    def record(self, raw_tracker, version=None, label="", source="", as_of=None):
+        """Record a raw tracker frame once per version; returns (TrackerVersion, newly recorded)"""
+        if raw_tracker.empty:
+            raise ValueError("the tracker has no data rows")
+        version = version or dataset_fingerprint(raw_tracker.to_csv().encode())
+        with self._lock:
+            manifest = self._read_manifest()
+            for entry in manifest["versions"]:
+                if entry["version"] == version:
+                    self._recorded.add(version)
+                    self.last_error = None
+                    return TrackerVersion.from_manifest(entry), False
+
+            rows, site_col, kpis, sites = encode_tracker(raw_tracker, manifest["key_salt"])
+            seq = len(manifest["versions"])
+            checkpoint = seq % CHECKPOINT_EVERY == 0
+            rows_file = f"{seq:05d}-{version}.rows.parquet" if checkpoint else None
+            delta_file = f"{seq:05d}-{version}.delta.parquet" if seq else None
+            os.makedirs(self.directory, exist_ok=True)
+            if rows_file:
+                self._write_parquet(rows, rows_file)
+            if delta_file:
+                previous = TrackerVersion.from_manifest(manifest["versions"][-1])
+                self._write_parquet(row_deltas(self._rows_of(manifest, previous), rows, site_col), delta_file)
+
+            ingested_at = time.time()
+            entry = TrackerVersion(
+                version=version,
+                label=label or version,
+                source=source,
+                as_of=pd.Timestamp(as_of) if as_of is not None else version_as_of(label, pd.Timestamp.fromtimestamp(ingested_at).floor("s")),
+                ingested_at=ingested_at,
+                rows=len(rows),
+                seq=seq,
+                rows_file=rows_file,
+                delta_file=delta_file,
+                columns=list(rows.columns),
+                kpis=kpis,
+                sites=sites,
+            )
+            manifest["versions"].append(entry.to_manifest())
+            self._write_manifest(manifest)
+            self._latest_rows = (version, rows)
+            self._recorded.add(version)
+            self.last_error = None
+            return entry, True
+
+    def is_recorded(self, version):
+        return version in self._recorded or any(v.version == version for v in self.versions)
+
+    def record_file(self, path, header_row=0, label=None, source="file"):
+        """Read a tracker workbook and record it"""
+        with open(path, "rb") as f:
+            content = f.read()
+        raw = read_master_tracker(io.BytesIO(content), header=header_row)
+        return self.record(raw, dataset_fingerprint(content), label or os.path.basename(path), source)
+
+    def _write_parquet(self, frame, file):
+        tmp_path = os.path.join(self.directory, f".{file}.tmp")
+        frame.to_parquet(tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, file))
+
+    # -- reading ------------------------------------------------------------
+
+    def _read_deltas(self, versions):
+        frames = []
+        for v in versions:
+            deltas = pd.read_parquet(os.path.join(self.directory, v.delta_file))
+            frames.append(deltas.astype({c: object for c in DELTA_COLUMNS}).assign(seq=v.seq))
+        if not frames:
+            return pd.DataFrame(columns=DELTA_COLUMNS + ['seq'])
+        return pd.concat(frames, ignore_index=True)
+
+    def _deltas_between(self, versions, a, b):
+        """Deltas taking version ``a`` to ``b``, in order; replayed backwards if ``b`` was recorded first"""
+        if a.seq <= b.seq:
+            return self._read_deltas(versions[a.seq + 1:b.seq + 1])
+        deltas = self._read_deltas(versions[b.seq + 1:a.seq + 1])
+        deltas = deltas.iloc[::-1].reset_index(drop=True)
+        # Undoing version n's delta leads back to version n - 1
+        return deltas.assign(
+            old=deltas['new'], new=deltas['old'], seq=deltas['seq'] - 1,
+            op=deltas['op'].replace({'added': 'removed', 'removed': 'added'}),
+        )
+
+    def _rows_of(self, manifest, target):
+        """Encoded rows of a version: its nearest checkpoint with the later deltas replayed"""
+        if self._latest_rows is not None and self._latest_rows[0] == target.version:
+            return self._latest_rows[1]
+        versions = [TrackerVersion.from_manifest(entry) for entry in manifest["versions"][:target.seq + 1]]
+        base = max(v.seq for v in versions if v.checkpoint)
+        rows = pd.read_parquet(os.path.join(self.directory, versions[base].rows_file)).astype(object)
+        for v in versions[base + 1:]:
+            rows = apply_deltas(rows, self._read_deltas([v]))
+        return rows.reindex(columns=target.columns)
+
+    def materialize(self, version):
+        """A recorded version's rows (identifier columns excluded), indexed by hashed row key"""
+        target = self.get(version)
+        rows = self._rows_of(self._read_manifest(), target)
+        return rows.apply(lambda col: col.map(_decode_cell))
+
+    # -- comparing ----------------------------------------------------------
+
+    def compare(self, a, b):
+        """Compare two recorded versions; the one with the earlier tracker date is treated as A"""
+        a, b = self.get(a), self.get(b)
+        if (a.as_of, a.seq) > (b.as_of, b.seq):
+            a, b = b, a
+        versions = self.versions
+        deltas = self._deltas_between(versions, a, b)
+        labels = {v.seq: v.label for v in versions}
+
+        kpi_deltas = pd.DataFrame([
+            {'KPI': KPI_SNAPSHOT_LABELS.get(name, name), 'A': a.kpis.get(name, 0), 'B': b.kpis.get(name, 0)}
+            for name in KPI_SNAPSHOT_COLUMNS
+        ])
+        kpi_deltas['Change'] = kpi_deltas['B'] - kpi_deltas['A']
+
+        site_rows = []
+        for site in sorted(set(a.sites) | set(b.sites)):
+            for name in [*KPI_SNAPSHOT_COLUMNS, 'rows']:
+                before = a.sites.get(site, {}).get(name, 0)
+                after = b.sites.get(site, {}).get(name, 0)
+                if before != after:
+                    site_rows.append({'Site': site, 'KPI': KPI_SNAPSHOT_LABELS.get(name, 'Rows'),
+                                      'A': before, 'B': after, 'Change': after - before})
+        site_changes = pd.DataFrame(site_rows, columns=['Site', 'KPI', 'A', 'B', 'Change'])
+
+        randomised = _cell_transitions(deltas, KPI_SNAPSHOT_COLUMNS['randomised'])
+        newly = randomised[(randomised['end'] == 'true') & (randomised['start'] != 'true')]
+        newly_randomised = pd.DataFrame({
+            'Site': newly['site'].fillna('(blank)').to_numpy(),
+            'Participant': newly.index.to_numpy(),
+            'Randomised In': newly['seq'].map(labels).to_numpy(),
+        }).sort_values(['Site', 'Participant'], ignore_index=True)
+
+        rows_ops = deltas.groupby('row_key', sort=False)['op'].agg(['first', 'last'])
+        changed = deltas[deltas['op'] == 'changed']
+        column_changes = (
+            changed.groupby('column')['row_key'].nunique().sort_values(ascending=False)
+            .rename_axis('Column').reset_index(name='Rows Changed')
+        )
+        return VersionComparison(
+            a=a, b=b,
+            kpi_deltas=kpi_deltas,
+            site_changes=site_changes,
+            newly_randomised=newly_randomised,
+            column_changes=column_changes,
+            rows_added=int(((rows_ops['first'] == 'added') & (rows_ops['last'] != 'removed')).sum()),
+            rows_removed=int(((rows_ops['first'] != 'added') & (rows_ops['last'] == 'removed')).sum()),
+        )
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m tracker_history",
+        description="Record Master Tracker versions and compare them.",
+    )
+    parser.add_argument("--dir", default=HISTORY_DIR, help=f"History directory (default: {HISTORY_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Record one or more tracker workbooks")
+    add.add_argument("trackers", nargs="+", help="Master Tracker workbooks (.xlsx), oldest first")
+    add.add_argument("--header-row", type=int, default=0,
+                     help="Row holding the tracker's column headers: 0 for local copies (default), "
+                          "2 for the export uploaded in the dashboard")
+    commands.add_parser("list", help="List the recorded versions")
+    compare = commands.add_parser("compare", help="Compare two versions (fingerprint, label or number)")
+    compare.add_argument("a")
+    compare.add_argument("b")
+    args = parser.parse_args(argv)
+
+    history = TrackerHistory(args.dir)
+    try:
+        if args.command == "add":
+            for path in args.trackers:
+                start = time.perf_counter()
+                entry, created = history.record_file(path, args.header_row)
+                status = "recorded" if created else "already recorded"
+                print(f"{entry.seq:>3}  {entry.version}  {entry.label}: {status} "
+                      f"({entry.rows} rows, {(time.perf_counter() - start) * 1000:.0f} ms)")
+        elif args.command == "list":
+            for v in history.versions:
+                kind = "full " if v.checkpoint else "delta"
+                size = sum(os.path.getsize(os.path.join(history.directory, f))
+                           for f in (v.rows_file, v.delta_file) if f) / 1024
+                print(f"{v.seq:>3}  {v.version}  {v.as_of:%Y-%m-%d}  {kind} {size:8.1f} KB  {v.rows:>6} rows  {v.label}")
+        else:
+            start = time.perf_counter()
+            comparison = history.compare(args.a, args.b)
+            print(f"A: {comparison.a.display_name}\nB: {comparison.b.display_name}")
+            print(f"Rows added: {comparison.rows_added}, removed: {comparison.rows_removed}\n")
+            print(comparison.kpi_deltas.to_string(index=False), end="\n\n")
+            if not comparison.site_changes.empty:
+                print(comparison.site_changes.to_string(index=False), end="\n\n")
+            print(f"Newly randomised: {len(comparison.newly_randomised)}")
+            if not comparison.newly_randomised.empty:
+                print(comparison.newly_randomised.to_string(index=False))
+            print(f"\nCompared in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except (KeyError, ValueError, OSError) as e:
+        print(f"Tracker history failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
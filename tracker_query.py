@@ -0,0 +1,189 @@
+"""
+Embedded DuckDB query layer over the typed tracker.
+
+The prepared tracker, a typed one-row-per-patient funnel table, the Screening
+Logs columns and the CVLP site opening dates are registered with an in-process
+DuckDB connection as views over the pandas frames already in memory. DuckDB
+scans those frames in place: nothing is copied into a database, nothing is
+written to disk and there is no server. Each query gets its own short-lived
+connection, so concurrent sessions never share one.
+
+Sections declare their aggregations as SQL in SECTION_QUERIES and run them with
+section_query(); the admin query box runs one-off SELECT statements against the
+same views. File system access is disabled on every connection, so a query can
+only read the registered frames.
+
+DuckDB is in requirements.txt but imported optionally: without it
+DUCKDB_AVAILABLE is False and the dashboard shows a notice in place of the
+query box.
+"""
+
+import pandas as pd
+
+from dashboard_metrics import funnel_stage_events, resolve_cvlp_site_column, resolve_trial_site_column
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+# Rows returned by a single query; the admin box shows them all
+MAX_RESULT_ROWS = 5000
+
+# Funnel table columns: (column, stage whose membership it holds)
+FUNNEL_FLAGS = (
+    ('referred', 'referred'),
+    ('referred_to_prescreen', 'referred_to_prescreen'),
+    ('referred_to_main_trial', 'referred_to_main_trial'),
+    ('cvlp_consented', 'cvlp_consented'),
+    ('recruited_to_cvlp', 'recruited_to_cvlp'),
+    ('consented_prescreen', 'consented_prescreen'),
+    ('consented_main_trial', 'consented_main_trial'),
+    ('randomised', 'randomised'),
+    ('screen_failure', 'screen_failures'),
+)
+
+# Funnel table columns: (column, stage whose event date it holds)
+FUNNEL_DATES = (
+    ('referral_date', 'referred'),
+    ('prescreen_referral_date', 'referred_to_prescreen'),
+    ('main_trial_referral_date', 'referred_to_main_trial'),
+    ('cvlp_consent_date', 'cvlp_consented'),
+    ('prescreen_consent_date', 'consented_prescreen_dated'),
+    ('main_trial_consent_date', 'consented_main_trial_dated'),
+    ('randomisation_date', 'randomised_dated'),
+    ('screen_fail_date', 'screen_failures_dated'),
+)
+
+TABLE_DESCRIPTIONS = {
+    'funnel': "One row per patient: CVLP and trial site, funnel stage flags and event dates",
+    'tracker': "The prepared Master Tracker, every column as loaded (quote names with double quotes)",
+    'screening': "'Date of Screening' from every Screening Logs sheet",
+    'screening_consents': "'CVLP Consent Date' from every Screening Logs sheet (dates or Yes/No)",
+    'screening_referrals': "'Referral Date' from every Screening Logs sheet",
+    'sites': "CVLP site opening dates",
+}
+
+# Aggregations declared by sections; $name placeholders are bound from section_query() keywords
+SECTION_QUERIES = {
+    'referrals_by_cvlp_site': """
+        SELECT cvlp_site, count(*) AS referrals
+        FROM funnel
+        WHERE referred AND trial_site = $trial_site AND referral_date >= $since
+        GROUP BY cvlp_site
+        ORDER BY referrals DESC, cvlp_site
+    """,
+    'days_open_to_first_referral': """
+        SELECT s.site, s.opening_date, min(f.referral_date) AS first_referral,
+               date_diff('day', s.opening_date, min(f.referral_date)) AS days_to_first_referral
+        FROM sites s LEFT JOIN funnel f ON f.cvlp_site = s.site AND f.referred
+        GROUP BY s.site, s.opening_date
+        ORDER BY s.opening_date, s.site
+    """,
+}
+
+# Starting points for the admin query box
+EXAMPLE_QUERIES = {
+    "Referrals by CVLP site to a trial site since a date": """
+SELECT cvlp_site, count(*) AS referrals
+FROM funnel
+WHERE referred AND trial_site = 'Oxford University Hospitals' AND referral_date >= DATE '2025-06-01'
+GROUP BY cvlp_site
+ORDER BY referrals DESC""",
+    "Funnel by trial site": """
+SELECT trial_site,
+       count(*) FILTER (WHERE referred) AS referred,
+       count(*) FILTER (WHERE consented_prescreen) AS consented_prescreen,
+       count(*) FILTER (WHERE randomised) AS randomised
+FROM funnel
+GROUP BY trial_site
+ORDER BY referred DESC""",
+    "Screening Logs entries per month": """
+SELECT date_trunc('month', try_cast("Date of Screening" AS DATE)) AS month, count(*) AS screened
+FROM screening
+GROUP BY month
+ORDER BY month""",
+}
+
+
+def funnel_table(df):
+    """One row per patient with the CVLP and trial site, stage flags and event dates"""
+    events = funnel_stage_events(df)
+    cvlp_site_col, _ = resolve_cvlp_site_column(df)
+    trial_site_col, _ = resolve_trial_site_column(df)
+
+    def site(col):
+        if col is None:
+            return pd.Series(None, index=df.index, dtype='str')
+        return df[col].astype('str').str.strip().where(df[col].notna())
+
+    columns = {'cvlp_site': site(cvlp_site_col), 'trial_site': site(trial_site_col)}
+    columns.update({name: events[stage][0].to_numpy(dtype=bool) for name, stage in FUNNEL_FLAGS})
+    columns.update({name: events[stage][1].where(events[stage][0]) for name, stage in FUNNEL_DATES})
+    return pd.DataFrame(columns, index=df.index).reset_index(drop=True)
+
+
+def query_tables(df, data_context=None):
+    """The frames registered as views, by view name"""
+    tables = {'funnel': funnel_table(df), 'tracker': df}
+    if data_context is not None:
+        logs = data_context.screening_logs
+        tables.update({
+            'screening': logs.screening,
+            'screening_consents': logs.cvlp_consent,
+            'screening_referrals': logs.referrals,
+            'sites': pd.DataFrame({
+                'site': list(data_context.site_opening_dates),
+                'opening_date': pd.to_datetime(list(data_context.site_opening_dates.values())),
+            }),
+        })
+    # DuckDB can't register a frame without columns
+    return {name: frame for name, frame in tables.items() if len(frame.columns)}
+
+
+def connect(tables):
+    """In-memory DuckDB connection with every frame registered as a view and no file system access"""
+    if not DUCKDB_AVAILABLE:
+        raise RuntimeError("DuckDB is not installed (pip install duckdb)")
+    con = duckdb.connect(config={'enable_external_access': False})
+    for name, frame in tables.items():
+        con.register(name, frame)
+    return con
+
+
+def run_query(tables, sql, params=None, limit=MAX_RESULT_ROWS):
+    """Result of one SELECT statement as a DataFrame, capped at ``limit`` rows.
+
+    The SQL is parsed first and rejected (duckdb.InvalidInputException) unless
+    it is exactly one SELECT (or WITH ... SELECT) statement; only then is it
+    run, wrapped as a subquery to apply the row cap. DuckDB errors propagate as
+    duckdb.Error.
+    """
+    con = connect(tables)
+    try:
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise duckdb.InvalidInputException("only a single SELECT statement can be run")
+        sql = statements[0].query.strip().rstrip(';')
+        return con.execute(f"SELECT * FROM ({sql}) LIMIT {int(limit)}", params or {}).df()
+    finally:
+        con.close()
+
+
+def section_query(name, tables, **params):
+    """Run one of the SECTION_QUERIES with its $placeholders bound from keywords"""
+    return run_query(tables, SECTION_QUERIES[name], params)
+
+
+def describe_tables(tables):
+    """View, column and DuckDB type of every registered column"""
+    con = connect(tables)
+    try:
+        rows = []
+        for name in tables:
+            for column, column_type, *_ in con.execute(f'DESCRIBE "{name}"').fetchall():
+                rows.append({'View': name, 'Column': column, 'Type': column_type})
+        return pd.DataFrame(rows)
+    finally:
+        con.close()